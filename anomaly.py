@@ -0,0 +1,274 @@
+"""
+异常消费检测模块
+基于分组滚动窗口的稳健基线（中位数 / MAD）和环比，标记异常的单笔交易与月度支出
+"""
+import warnings
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from utils import MONTH_KEY, month_index, month_labels
+
+
+TIME_COL = '交易时间'
+AMOUNT_COL = '金额(元)'
+MERCHANT_COL = '交易对方'
+CATEGORY_COL = '分类'
+TYPE_COLS = ['收/支/其他', '收/支']
+
+ALERT_COLUMNS = ['类型', '维度', '对象', '月份', '交易时间', '金额(元)', '基线', '偏离度', '环比', '说明']
+
+# MAD 换算为标准差的系数
+MAD_SCALE = 1.4826
+
+
+def _window_stats(windows: np.ndarray, min_history: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    对形如 (..., window) 的历史窗口矩阵计算中位数和 MAD（忽略 NaN）
+
+    Returns:
+        (中位数, MAD)，有效历史不足 min_history 的位置为 NaN
+    """
+    enough = np.count_nonzero(~np.isnan(windows), axis=-1) >= min_history
+    # 全 NaN 的窗口会触发 RuntimeWarning，结果随后按 enough 置为 NaN
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=-1)
+        mad = np.nanmedian(np.abs(windows - median[..., None]), axis=-1)
+    median[~enough] = np.nan
+    mad[~enough] = np.nan
+    return median, mad
+
+
+def _expense_rows(df: pd.DataFrame) -> pd.DataFrame:
+    for col in TYPE_COLS:
+        if col in df.columns:
+            df = df[df[col] == '支出']
+            break
+    return df[df[TIME_COL].notna()]
+
+
+class AnomalyDetector:
+    """
+    增量异常消费检测器
+
+    只保留每个商户最近 window 笔交易和各维度的月度汇总作为状态，
+    追加新账单时仅对新数据评分，计算量与新数据规模成正比。
+    """
+
+    def __init__(
+        self,
+        window: int = 10,
+        min_history: int = 5,
+        z_threshold: float = 3.5,
+        ratio_threshold: float = 2.0,
+        min_amount: float = 50.0,
+        month_window: int = 6
+    ):
+        """
+        Args:
+            window: 单笔交易基线使用的历史交易笔数
+            min_history: 参与评分所需的最少历史条数
+            z_threshold: 稳健 z 分数阈值
+            ratio_threshold: 相对基线的倍数阈值（单笔金额 / 中位数，月度环比）
+            min_amount: 低于该金额的交易/月度支出不报警
+            month_window: 月度基线使用的历史月数
+        """
+        self.window = window
+        self.min_history = min_history
+        self.z_threshold = z_threshold
+        self.ratio_threshold = ratio_threshold
+        self.min_amount = min_amount
+        self.month_window = month_window
+        self._tail: Optional[pd.DataFrame] = None
+        self._monthly: Optional[pd.DataFrame] = None
+
+    def _robust_score(self, values: pd.Series, median: pd.Series, mad: pd.Series) -> pd.Series:
+        # 历史很短时 MAD 可能接近 0，用中位数的 10%（至少 1 元）作为尺度下限
+        floor = np.maximum(median.abs() * 0.1, 1.0)
+        scale = np.maximum(MAD_SCALE * mad.fillna(0), floor)
+        return (values - median) / scale
+
+    def _transaction_alerts(self, expense: pd.DataFrame) -> pd.DataFrame:
+        """按商户检测异常单笔交易"""
+        if MERCHANT_COL not in expense.columns or expense.empty:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+
+        frame = expense[[TIME_COL, MERCHANT_COL, AMOUNT_COL]].copy()
+        frame['_new'] = True
+        if self._tail is not None:
+            tail = self._tail.copy()
+            tail['_new'] = False
+            frame = pd.concat([tail, frame], ignore_index=True)
+        frame = frame.sort_values(TIME_COL, kind='stable').reset_index(drop=True)
+
+        # 按商户排序后，用 window 次错位构造“前 window 笔交易”矩阵，一次性计算中位数和 MAD
+        codes = pd.factorize(frame[MERCHANT_COL])[0]
+        order = np.lexsort((np.arange(len(frame)), codes))
+        sorted_codes = codes[order]
+        sorted_amounts = frame[AMOUNT_COL].to_numpy(dtype=float)[order]
+        windows = np.full((len(frame), self.window), np.nan)
+        for k in range(1, self.window + 1):
+            same = np.zeros(len(frame), dtype=bool)
+            same[k:] = sorted_codes[k:] == sorted_codes[:-k]
+            windows[k:, k - 1] = np.where(same[k:], sorted_amounts[:-k], np.nan)
+        median_sorted, mad_sorted = _window_stats(windows, self.min_history)
+        median = pd.Series(np.empty(len(frame)), index=frame.index)
+        mad = pd.Series(np.empty(len(frame)), index=frame.index)
+        median.iloc[order] = median_sorted
+        mad.iloc[order] = mad_sorted
+
+        amounts = frame[AMOUNT_COL]
+        score = self._robust_score(amounts, median, mad)
+        flagged = (
+            frame['_new']
+            & median.notna()
+            & (amounts >= self.min_amount)
+            & (amounts >= self.ratio_threshold * median)
+            & (score >= self.z_threshold)
+        )
+
+        # 更新状态：每个商户保留最近 window 笔交易
+        self._tail = frame.drop(columns='_new').groupby(MERCHANT_COL, sort=False).tail(self.window)
+
+        hits = frame[flagged]
+        if hits.empty:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        months = month_index(hits[TIME_COL])
+        return pd.DataFrame({
+            '类型': '单笔异常',
+            '维度': '商户',
+            '对象': hits[MERCHANT_COL].to_numpy(),
+            '月份': month_labels(months),
+            '交易时间': hits[TIME_COL].to_numpy(),
+            '金额(元)': hits[AMOUNT_COL].round(2).to_numpy(),
+            '基线': median[flagged].round(2).to_numpy(),
+            '偏离度': score[flagged].round(2).to_numpy(),
+            '环比': np.nan,
+            '说明': [f"单笔 {a:.2f} 元，约为该商户常规金额 {b:.2f} 元的 {a / b:.1f} 倍" if b > 0 else f"单笔 {a:.2f} 元"
+                   for a, b in zip(hits[AMOUNT_COL], median[flagged])],
+        })
+
+    def _monthly_alerts(self, expense: pd.DataFrame) -> pd.DataFrame:
+        """按分类和商户检测异常的月度支出"""
+        dims = [(CATEGORY_COL, '分类'), (MERCHANT_COL, '商户')]
+        dims = [(col, label) for col, label in dims if col in expense.columns]
+        if not dims or expense.empty:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+
+        # 优先使用解析时预先计算的月序号
+        if MONTH_KEY in expense.columns:
+            month = expense[MONTH_KEY].astype(np.int64)
+        else:
+            month = pd.Series(month_index(expense[TIME_COL]).astype(np.int64), index=expense.index)
+        new_parts = []
+        for col, label in dims:
+            part = expense.groupby([expense[col], month])[AMOUNT_COL].sum()
+            part.index.names = ['对象', '月序号']
+            part = part.reset_index()
+            part['维度'] = label
+            new_parts.append(part)
+        new_monthly = pd.concat(new_parts, ignore_index=True)
+        new_months = np.sort(new_monthly['月序号'].unique())
+
+        monthly = new_monthly if self._monthly is None else pd.concat([self._monthly, new_monthly], ignore_index=True)
+        monthly = monthly.groupby(['维度', '对象', '月序号'], as_index=False)[AMOUNT_COL].sum()
+        self._monthly = monthly
+
+        # 只取评估新月份所需的历史区间，构建 (维度, 对象) × 月份 的宽表
+        lo = int(new_months.min()) - self.month_window
+        hi = int(new_months.max())
+        recent = monthly[(monthly['月序号'] >= lo) & (monthly['月序号'] <= hi)]
+        pivot = recent.pivot_table(index=['维度', '对象'], columns='月序号', values=AMOUNT_COL,
+                                   aggfunc='sum', fill_value=0.0)
+        pivot = pivot.reindex(columns=range(lo, hi + 1), fill_value=0.0)
+
+        # 对象首次出现之前的月份不计入基线（置为 NaN），之后无支出的月份计为 0
+        first_month = monthly.groupby(['维度', '对象'])['月序号'].min().reindex(pivot.index)
+        before_first = pivot.columns.to_numpy()[None, :] < first_month.to_numpy()[:, None]
+        values = pivot.mask(before_first).T
+
+        # 沿月份方向的滚动基线：构造 (月份, 对象, 窗口) 的历史矩阵，对所有对象一次性计算
+        history = values.shift(1)
+        padded = np.vstack([np.full((self.month_window - 1, history.shape[1]), np.nan), history.to_numpy()])
+        windows = np.lib.stride_tricks.sliding_window_view(padded, self.month_window, axis=0)
+        median_arr, mad_arr = _window_stats(windows, self.min_history)
+        median = pd.DataFrame(median_arr, index=values.index, columns=values.columns)
+        mad = pd.DataFrame(mad_arr, index=values.index, columns=values.columns)
+        ratio = values / history.replace(0, np.nan)
+        score = self._robust_score(values, median, mad)
+
+        flagged = (
+            (median > 0)
+            & (values >= self.min_amount)
+            & (score >= self.z_threshold)
+            & (ratio.fillna(np.inf) >= self.ratio_threshold)
+        )
+        flagged = flagged.loc[flagged.index.isin(new_months)]
+        rows, cols = np.nonzero(flagged.to_numpy())
+        if len(rows) == 0:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+
+        # 按 (月份, 对象) 位置一次性取出金额、基线、偏离度和环比
+        positions = values.index.get_indexer(flagged.index[rows])
+        keys = flagged.columns[cols]
+        amount = values.to_numpy()[positions, cols]
+        base = median.to_numpy()[positions, cols]
+        dev = score.to_numpy()[positions, cols]
+        mom = ratio.to_numpy()[positions, cols]
+        rows = pd.DataFrame({
+            '月序号': flagged.index[rows],
+            '维度': keys.get_level_values(0),
+            '对象': keys.get_level_values(1),
+        })
+        return pd.DataFrame({
+            '类型': '月度激增',
+            '维度': rows['维度'],
+            '对象': rows['对象'],
+            '月份': month_labels(rows['月序号'].to_numpy()),
+            '交易时间': pd.NaT,
+            '金额(元)': amount.round(2),
+            '基线': base.round(2),
+            '偏离度': dev.round(2),
+            '环比': np.round(mom, 2),
+            '说明': [f"本月{d} {o} 支出 {a:.2f} 元，高于近期中位数 {b:.2f} 元"
+                   for d, o, a, b in zip(rows['维度'], rows['对象'], amount, base)],
+        })
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        追加一批交易数据并返回其中的异常提醒
+
+        Args:
+            df: 新增的交易数据
+
+        Returns:
+            异常提醒表，按偏离度降序排列
+        """
+        if df is None or df.empty or TIME_COL not in df.columns or AMOUNT_COL not in df.columns:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+
+        expense = _expense_rows(df)
+        parts = [p for p in (self._transaction_alerts(expense), self._monthly_alerts(expense)) if not p.empty]
+        if not parts:
+            return pd.DataFrame(columns=ALERT_COLUMNS)
+        alerts = pd.concat(parts, ignore_index=True)
+        return alerts.sort_values('偏离度', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def detect_spending_anomalies(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """
+    检测交易数据中的异常消费
+
+    Args:
+        df: 交易数据
+        **kwargs: 传递给 AnomalyDetector 的参数
+
+    Returns:
+        异常提醒表
+    """
+    alerts = AnomalyDetector(**kwargs).update(df)
+    logger.info(f"异常消费检测完成，共 {len(alerts)} 条提醒")
+    return alerts
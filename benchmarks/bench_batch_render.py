@@ -0,0 +1,62 @@
+"""
+批量报表渲染基准测试
+对比逐个调用 generate_visualizations 与 generate_visualizations_batch 的吞吐量（份/秒）
+
+用法:
+    python benchmarks/bench_batch_render.py [--reports 200] [--rows 400] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import visualize  # noqa: E402
+
+
+def make_bill(seed: int, rows: int) -> pd.DataFrame:
+    """生成一份半年跨度的随机账单"""
+    rng = np.random.default_rng(seed)
+    offsets = pd.to_timedelta(rng.integers(0, 86400 * 180, rows), unit='s')
+    return pd.DataFrame({
+        '交易时间': pd.Timestamp('2024-01-01') + offsets,
+        '收/支': rng.choice(['支出', '收入'], rows, p=[0.85, 0.15]),
+        '金额(元)': rng.gamma(2, 40, rows).round(2),
+        '交易对方': [f"商户{i}" for i in rng.integers(0, 60, rows)],
+        '分类': rng.choice(['餐饮', '交通', '购物', '其他'], rows),
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量报表渲染基准测试")
+    parser.add_argument('--reports', type=int, default=200, help="报表份数")
+    parser.add_argument('--rows', type=int, default=400, help="每份账单的交易笔数")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="并发数")
+    args = parser.parse_args()
+
+    bills = [make_bill(i, args.rows) for i in range(args.reports)]
+    with tempfile.TemporaryDirectory() as out_dir:
+        jobs = [(df, os.path.join(out_dir, f"report_{i}.html")) for i, df in enumerate(bills)]
+
+        start = time.perf_counter()
+        for df, path in jobs:
+            visualize.generate_visualizations(df, path, snapshot=False)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        visualize.generate_visualizations_batch(jobs, max_workers=args.workers)
+        batch = time.perf_counter() - start
+
+    encoder = "orjson" if visualize.orjson is not None else "json"
+    print(f"{args.reports} 份报表，每份 {args.rows} 笔交易，序列化: {encoder}")
+    print(f"  逐个生成  {args.reports / sequential:8.1f} 份/秒")
+    print(f"  批量生成  {args.reports / batch:8.1f} 份/秒（并发 {args.workers}）")
+
+
+if __name__ == '__main__':
+    main()
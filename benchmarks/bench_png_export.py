@@ -0,0 +1,58 @@
+"""
+报表 PNG 导出基准测试
+对比 Chrome 整页截图（未安装 Chrome 时跳过）与 matplotlib 进程内绘制的耗时，以及 matplotlib 的串行与进程池并发
+
+用法:
+    python benchmarks/bench_png_export.py [--reports 8] [--rows 2000] [--workers 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_batch_render import make_bill  # noqa: E402
+
+import visualize  # noqa: E402
+from static_report import render_report_png, render_report_pngs  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="报表 PNG 导出基准测试")
+    parser.add_argument('--reports', type=int, default=8, help="报表份数")
+    parser.add_argument('--rows', type=int, default=2000, help="每份账单的交易笔数")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="并发数")
+    args = parser.parse_args()
+
+    bills = [make_bill(i, args.rows) for i in range(args.reports)]
+    aggregates = [visualize.compute_report_aggregates(df) for df in bills]
+    with tempfile.TemporaryDirectory() as out_dir:
+        # Chrome：先渲染 HTML，再启动浏览器截图
+        try:
+            from screenshot_utils import make_full_page_snapshot
+            html_path = os.path.join(out_dir, "chrome.html")
+            visualize.generate_visualizations(bills[0], html_path, snapshot=False)
+            start = time.perf_counter()
+            ok = make_full_page_snapshot(html_path, html_path.replace('.html', '.png'), width=1400)
+            chrome = time.perf_counter() - start
+            print(f"chrome       {chrome:8.2f} s/份" if ok else "chrome       不可用（未安装 Chrome），跳过")
+        except ImportError:
+            print("chrome       不可用（缺少 selenium），跳过")
+
+        items = [(agg, os.path.join(out_dir, f"report_{i}.png")) for i, agg in enumerate(aggregates)]
+        start = time.perf_counter()
+        for agg, path in items:
+            render_report_png(agg, path)
+        serial = time.perf_counter() - start
+        print(f"matplotlib   {serial / len(items):8.2f} s/份（串行 {len(items)} 份共 {serial:.2f}s）")
+
+        start = time.perf_counter()
+        render_report_pngs(items, max_workers=args.workers)
+        pooled = time.perf_counter() - start
+        print(f"matplotlib   {pooled / len(items):8.2f} s/份（进程池 {args.workers} 并发，加速 {serial / pooled:.1f}x）")
+
+
+if __name__ == '__main__':
+    main()
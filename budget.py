@@ -0,0 +1,337 @@
+"""
+预算模块
+在本地配置文件中按分类 / 商户设置月度预算。每解析一份账单，只把这份账单的支出累加到持久化的
+月度累计中并检查是否越过提醒阈值，计算量与新账单的行数成正比，不重新扫描历史；
+报表中绘制预算消耗进度图，并列出各预算在哪一天越过阈值
+
+配置文件（默认 ~/.bill-hub/budgets.json，或 BILL_HUB_BUDGETS 指定）:
+    {
+        "categories": {"餐饮": 1500, "交通": 400},
+        "merchants": {"星巴克": 300},
+        "thresholds": [0.8, 1.0]
+    }
+"""
+import html
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from password_provider import DEFAULT_CONFIG_DIR
+from utils import DAY_KEY, MISSING_TIME_KEY, MONTH_KEY, day_index_to_datetime, ensure_time_keys, month_labels
+
+
+TIME_COL = '交易时间'
+AMOUNT_COL = '金额(元)'
+MERCHANT_COL = '交易对方'
+CATEGORY_COL = '分类'
+TYPE_COLS = ['收/支/其他', '收/支']
+
+ENV_BUDGETS = 'BILL_HUB_BUDGETS'
+DEFAULT_BUDGET_FILE = os.path.join(DEFAULT_CONFIG_DIR, 'budgets.json')
+STATE_FORMAT_VERSION = 1
+DEFAULT_THRESHOLDS = (0.8, 1.0)
+
+# 维度 -> (配置中的键, 交易数据中的列)
+DIMENSIONS = {
+    '分类': ('categories', CATEGORY_COL),
+    '商户': ('merchants', MERCHANT_COL),
+}
+
+
+@dataclass
+class BudgetConfig:
+    """
+    月度预算配置
+
+    Attributes:
+        limits: 维度 -> {对象: 月度预算}
+        thresholds: 提醒阈值（预算的比例，升序）
+    """
+    limits: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    thresholds: Tuple[float, ...] = DEFAULT_THRESHOLDS
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "BudgetConfig":
+        """从配置字典构建（金额必须为正数）"""
+        limits = {}
+        for dim, (key, _) in DIMENSIONS.items():
+            items = {str(name): float(limit) for name, limit in (data.get(key) or {}).items()}
+            bad = [name for name, limit in items.items() if not limit > 0]
+            if bad:
+                raise ValueError(f"预算金额必须为正数: {', '.join(bad)}")
+            if items:
+                limits[dim] = items
+        thresholds = tuple(sorted(float(t) for t in data.get('thresholds') or DEFAULT_THRESHOLDS))
+        return cls(limits, thresholds)
+
+    def __bool__(self) -> bool:
+        return any(self.limits.values())
+
+    def items(self) -> List[Tuple[str, str, float]]:
+        """全部预算项 (维度, 对象, 预算)"""
+        return [(dim, name, limit) for dim, items in self.limits.items() for name, limit in items.items()]
+
+
+def budget_file() -> str:
+    """预算配置文件路径（BILL_HUB_BUDGETS，默认 ~/.bill-hub/budgets.json）"""
+    return os.environ.get(ENV_BUDGETS) or DEFAULT_BUDGET_FILE
+
+
+def load_budgets(path: Optional[str] = None) -> Optional[BudgetConfig]:
+    """
+    读取预算配置
+
+    Args:
+        path: 配置文件路径（默认 budget_file()）
+
+    Returns:
+        预算配置；文件不存在、为空或格式错误时返回 None（不启用预算）
+    """
+    path = path or budget_file()
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = BudgetConfig.from_dict(json.load(f))
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"预算配置读取失败 {path}: {e}")
+        return None
+    return config or None
+
+
+def _expense(df: pd.DataFrame) -> pd.DataFrame:
+    """有月份的支出行"""
+    df = ensure_time_keys(df)
+    mask = df[MONTH_KEY].to_numpy() != MISSING_TIME_KEY
+    type_col = next((col for col in TYPE_COLS if col in df.columns), None)
+    if type_col is not None:
+        mask &= (df[type_col] == '支出').to_numpy()
+    return df.loc[mask]
+
+
+def _describe(dim: str, name: str) -> str:
+    return f"「{name}」类支出" if dim == '分类' else f"在「{name}」的支出"
+
+
+@dataclass
+class BudgetAlert:
+    """
+    预算提醒：某预算项的月度累计支出越过了提醒阈值
+
+    Attributes:
+        dimension: 维度（分类 / 商户）
+        subject: 对象
+        month: 月份（YYYY-MM）
+        spent: 月度累计支出
+        limit: 月度预算
+        threshold: 越过的阈值（预算的比例）
+        date: 越过阈值的日期（报表中根据明细计算；增量累计时为 None）
+    """
+    dimension: str
+    subject: str
+    month: str
+    spent: float
+    limit: float
+    threshold: float
+    date: Optional[pd.Timestamp] = None
+
+    @property
+    def text(self) -> str:
+        when = f"{self.date:%Y-%m-%d}" if self.date is not None else self.month
+        state = '超出预算' if self.threshold >= 1.0 else f"达到预算的 {self.threshold:.0%}"
+        return (f"{when} {_describe(self.dimension, self.subject)}累计 {self.spent:.2f} 元，"
+                f"{state}（预算 {self.limit:.2f} 元）")
+
+
+class BudgetTracker:
+    """
+    按月累计预算项支出的增量跟踪器
+
+    状态（已计入的账单指纹和 (维度, 对象, 月序号) 的累计支出）保存在配置文件旁的 *_state.json 中，
+    每份账单只计入一次。
+    """
+
+    def __init__(self, config: BudgetConfig, state_path: Optional[str] = None):
+        """
+        Args:
+            config: 预算配置
+            state_path: 累计状态文件（不提供时只在内存中累计）
+        """
+        self.config = config
+        self.state_path = state_path
+        self.totals: Dict[Tuple[str, str, int], float] = {}
+        self.sources: set = set()
+        self._lock = threading.Lock()
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == STATE_FORMAT_VERSION:
+                    self.sources = set(data.get('sources', []))
+                    self.totals = {(dim, name, int(month)): float(amount)
+                                   for dim, name, month, amount in data.get('totals', [])}
+            except (OSError, ValueError, TypeError) as e:
+                logger.warning(f"预算累计状态读取失败，重新累计 {state_path}: {e}")
+
+    def save(self) -> None:
+        """把累计状态写回文件"""
+        if not self.state_path:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            'version': STATE_FORMAT_VERSION,
+            'sources': sorted(self.sources),
+            'totals': [[dim, name, month, round(amount, 2)] for (dim, name, month), amount in self.totals.items()],
+        }
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.state_path)
+
+    def spent(self, dimension: str, subject: str, month: int) -> float:
+        """某预算项某月（月序号）的累计支出"""
+        return self.totals.get((dimension, subject, month), 0.0)
+
+    def update(self, df: pd.DataFrame, source: Optional[str] = None) -> List[BudgetAlert]:
+        """
+        把一份账单的支出计入月度累计，返回这份账单导致越过阈值的提醒
+
+        Args:
+            df: 新账单的交易数据
+            source: 账单标识（如文件指纹），已计入过的账单直接跳过
+
+        Returns:
+            新越过阈值的提醒
+        """
+        if df is None or df.empty or AMOUNT_COL not in df.columns or TIME_COL not in df.columns:
+            return []
+        with self._lock:
+            if source is not None and source in self.sources:
+                logger.info("账单已计入预算累计，跳过")
+                return []
+            expense = _expense(df)
+            alerts: List[BudgetAlert] = []
+            for dim, items in self.config.limits.items():
+                col = DIMENSIONS[dim][1]
+                if col not in expense.columns:
+                    continue
+                rows = expense[expense[col].isin(list(items))]
+                if rows.empty:
+                    continue
+                sums = rows.groupby([rows[col], rows[MONTH_KEY].astype(np.int64)])[AMOUNT_COL].sum()
+                for (name, month), amount in sums.items():
+                    key = (dim, name, int(month))
+                    before = self.totals.get(key, 0.0)
+                    after = before + float(amount)
+                    self.totals[key] = after
+                    limit = items[name]
+                    crossed = [t for t in self.config.thresholds if before < t * limit <= after]
+                    if crossed:
+                        alerts.append(BudgetAlert(dim, name, month_labels([month])[0], round(after, 2),
+                                                  limit, crossed[-1]))
+            if source is not None:
+                self.sources.add(source)
+            try:
+                self.save()
+            except OSError as e:
+                logger.warning(f"预算累计状态写入失败 {self.state_path}: {e}")
+        return alerts
+
+
+_default_tracker: Optional[BudgetTracker] = None
+_default_lock = threading.Lock()
+
+
+def get_default_tracker() -> Optional[BudgetTracker]:
+    """进程内共享的预算跟踪器（没有预算配置时返回 None）"""
+    global _default_tracker
+    with _default_lock:
+        if _default_tracker is None:
+            config = load_budgets()
+            if config is None:
+                return None
+            path = budget_file()
+            _default_tracker = BudgetTracker(config, os.path.splitext(path)[0] + '_state.json')
+        return _default_tracker
+
+
+@dataclass
+class BudgetBurn:
+    """
+    报表中的预算消耗进度（数据中最后一个月）
+
+    Attributes:
+        month: 月份（YYYY-MM）
+        days: 当月每天的日期标签
+        series: 预算项名称 -> 每天的累计支出占预算的百分比
+        alerts: 当月越过阈值的提醒（含越过的日期）
+    """
+    month: str
+    days: List[str]
+    series: Dict[str, List[float]]
+    alerts: List[BudgetAlert]
+
+
+def compute_budget_burn(df: pd.DataFrame, config: Optional[BudgetConfig]) -> Optional[BudgetBurn]:
+    """
+    计算数据中最后一个月各预算项的逐日累计消耗和越过阈值的日期
+
+    Args:
+        df: 交易数据
+        config: 预算配置（为 None 时返回 None）
+
+    Returns:
+        预算消耗进度；没有预算或当月没有预算项的支出时返回 None
+    """
+    if not config or df is None or df.empty or AMOUNT_COL not in df.columns or TIME_COL not in df.columns:
+        return None
+    expense = _expense(df)
+    if expense.empty:
+        return None
+    month = int(expense[MONTH_KEY].max())
+    expense = expense[expense[MONTH_KEY] == month]
+    # 月序号 -> 当月第一天和下月第一天的日序号
+    bounds = (np.array([month, month + 1]) - 1970 * 12).astype('datetime64[M]').astype('datetime64[D]')
+    month_start, month_end = bounds.astype(np.int64).tolist()
+    n_days = month_end - month_start
+    dates = day_index_to_datetime(np.arange(month_start, month_start + n_days))
+
+    series: Dict[str, List[float]] = {}
+    alerts: List[BudgetAlert] = []
+    label = month_labels([month])[0]
+    for dim, name, limit in config.items():
+        col = DIMENSIONS[dim][1]
+        if col not in expense.columns:
+            continue
+        rows = expense[expense[col] == name]
+        if rows.empty:
+            continue
+        daily = np.bincount(rows[DAY_KEY].to_numpy(dtype=np.int64) - month_start,
+                            weights=rows[AMOUNT_COL].to_numpy(dtype=float), minlength=n_days)
+        cumulative = np.cumsum(daily)
+        series[f"{dim}: {name}"] = np.round(cumulative / limit * 100, 1).tolist()
+        for threshold in config.thresholds:
+            hit = np.flatnonzero(cumulative >= threshold * limit)
+            if len(hit):
+                alerts.append(BudgetAlert(dim, name, label, round(float(cumulative[-1]), 2), limit,
+                                          threshold, dates[hit[0]]))
+    if not series:
+        return None
+    alerts.sort(key=lambda a: (a.date, -a.threshold))
+    return BudgetBurn(label, [f"{d:%m-%d}" for d in dates], series, alerts)
+
+
+def budget_alerts_html(burn: Optional[BudgetBurn]) -> str:
+    """把报表月份的预算提醒渲染为报表顶部的 HTML 列表（没有提醒时返回空字符串）"""
+    if burn is None or not burn.alerts:
+        return ''
+    items = ''.join(f'<li>{html.escape(alert.text)}</li>' for alert in burn.alerts)
+    return f'<div class="insights budget-alerts"><h2>🎯 预算提醒</h2><ol>{items}</ol></div>'
@@ -0,0 +1,262 @@
+"""
+产物打包模块
+把输出目录中的 Excel、HTML、PNG 等产物在生成后立即交给打包器：各文件在线程池中并行压缩（zlib 压缩时释放 GIL），
+压缩完成即按完成顺序追加写入同一个 ZIP，运行结束时只需写出中央目录，归档随即可用。
+设置密码时改用 pyzipper 写出 WinZip AES 加密的归档（与 utils.extract_zip 读取的格式一致），加密压缩为串行
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import pyzipper
+
+from logger_config import console, logger
+
+
+# 归档名称（如 "customer_a"，写入 output/customer_a.zip；也可以是以 .zip 结尾的路径），未设置时不打包
+ENV_PACKAGE = 'BILL_HUB_PACKAGE'
+# 归档密码（设置时使用 AES 加密）
+ENV_PACKAGE_PASSWORD = 'BILL_HUB_PACKAGE_PASSWORD'
+DEFAULT_LEVEL = 6
+# 每个账单的产物：Excel、HTML 报表、截图 / 静态汇总图、洞察和异常提醒
+ARTIFACT_SUFFIXES = ('.xlsx', '.html', '_full_page.png', '_summary.png', '_insights.json', '_alerts.xlsx')
+
+# ZIP 文件结构（APPNOTE 4.3），不使用 Zip64：单个成员和归档都不超过 4 GB
+_LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_RECORD = struct.Struct('<IHHHHIIH')
+_VERSION = 20                     # 2.0：deflate
+_MADE_BY = (3 << 8) | _VERSION    # Unix
+_UTF8_FLAG = 0x800
+_DEFLATED = 8
+_ZIP32_LIMIT = 0xFFFFFFFF
+_FILE_MODE = 0o100644 << 16
+
+
+@dataclass
+class PackageReport:
+    """
+    打包结果
+
+    Attributes:
+        path: 归档路径
+        members: 写入的文件数
+        raw_bytes: 原始大小合计
+        packed_bytes: 归档大小
+        seconds: 从创建打包器到写完归档的耗时
+        failed: 读取或压缩失败而未写入的文件
+    """
+    path: str
+    members: int = 0
+    raw_bytes: int = 0
+    packed_bytes: int = 0
+    seconds: float = 0.0
+    failed: List[str] = field(default_factory=list)
+
+
+@dataclass
+class _Member:
+    name: bytes
+    crc: int
+    size: int
+    packed_size: int
+    dos_time: int
+    dos_date: int
+    offset: int = 0
+
+
+def _dos_datetime(timestamp: float):
+    t = time.localtime(timestamp)
+    year = min(max(t.tm_year, 1980), 2107)
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+def _deflate_file(path: str, level: int):
+    """读取并以原始 deflate 格式压缩一个文件（在线程池中执行），返回 (CRC, 原始大小, 压缩数据, 修改时间)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    packed = compressor.compress(data) + compressor.flush()
+    return zlib.crc32(data), len(data), packed, os.path.getmtime(path)
+
+
+def artifact_paths(output_dir: str, base_name: str) -> List[str]:
+    """
+    输出目录中已生成的某个账单的产物（见 ARTIFACT_SUFFIXES）
+
+    Args:
+        output_dir: 输出目录
+        base_name: 文件名（不含扩展名），如 merged_bill
+
+    Returns:
+        存在的产物路径
+    """
+    paths = [os.path.join(output_dir, base_name + suffix) for suffix in ARTIFACT_SUFFIXES]
+    return [path for path in paths if os.path.isfile(path)]
+
+
+class ArtifactPackager:
+    """
+    把产物流式写入一个 ZIP 归档
+
+    add() 立即把文件交给线程池压缩，压缩完成的成员在工作线程中加锁追加到归档；
+    close() 等待剩余的压缩任务，写出中央目录后把临时文件原子替换为最终归档。
+    同名成员只写入一次。
+    """
+
+    def __init__(self, archive_path: str, password: Optional[str] = None,
+                 workers: Optional[int] = None, level: int = DEFAULT_LEVEL):
+        """
+        Args:
+            archive_path: 归档路径
+            password: 归档密码（设置时使用 AES 加密，压缩和加密在单个后台线程中串行执行）
+            workers: 压缩线程数（默认为 CPU 核数）
+            level: deflate 压缩级别
+        """
+        self.archive_path = archive_path
+        self.level = level
+        self.encrypted = bool(password)
+        self.report = PackageReport(archive_path)
+        self._start = time.perf_counter()
+        self._tmp = f"{archive_path}.{os.getpid()}.tmp"
+        self._lock = threading.Lock()
+        self._names: Dict[str, Future] = {}
+        self._members: List[_Member] = []
+        self._closed = False
+        os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+        if self.encrypted:
+            self._zip = pyzipper.AESZipFile(self._tmp, 'w', compression=pyzipper.ZIP_DEFLATED,
+                                            compresslevel=level, encryption=pyzipper.WZ_AES)
+            self._zip.setpassword(password.encode('utf-8'))
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='package')
+        else:
+            self._fp = open(self._tmp, 'wb')
+            self._pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix='package')
+
+    def add(self, path: str, arcname: Optional[str] = None) -> None:
+        """
+        加入一个文件（立即开始压缩，不等待完成）
+
+        Args:
+            path: 文件路径
+            arcname: 归档中的名称（默认为文件名）
+        """
+        arcname = (arcname or os.path.basename(path)).replace(os.sep, '/')
+        with self._lock:
+            if self._closed:
+                raise ValueError("打包器已关闭")
+            if arcname in self._names:
+                return
+            if self.encrypted:
+                future = self._pool.submit(self._zip.write, path, arcname)
+            else:
+                future = self._pool.submit(_deflate_file, path, self.level)
+            self._names[arcname] = future
+        if not self.encrypted:
+            # 已完成的任务会在当前线程立即回调，必须在锁外注册
+            future.add_done_callback(lambda f: self._append(arcname, path, f))
+
+    def add_artifacts(self, output_dir: str, base_name: str) -> None:
+        """加入某个账单的全部产物（见 artifact_paths）"""
+        for path in artifact_paths(output_dir, base_name):
+            self.add(path)
+
+    def _append(self, arcname: str, path: str, future: Future) -> None:
+        """把压缩完成的成员写入归档（在工作线程中执行）"""
+        try:
+            crc, size, packed, mtime = future.result()
+            if size > _ZIP32_LIMIT or len(packed) > _ZIP32_LIMIT:
+                raise ValueError("文件超过 4 GB")
+        except Exception as e:
+            logger.warning(f"打包 {path} 失败: {e}")
+            with self._lock:
+                self.report.failed.append(path)
+            return
+        name = arcname.encode('utf-8')
+        member = _Member(name, crc, size, len(packed), *_dos_datetime(mtime))
+        with self._lock:
+            member.offset = self._fp.tell()
+            self._fp.write(_LOCAL_HEADER.pack(
+                0x04034b50, _VERSION, _UTF8_FLAG, _DEFLATED, member.dos_time, member.dos_date,
+                crc, member.packed_size, size, len(name), 0))
+            self._fp.write(name)
+            self._fp.write(packed)
+            self._members.append(member)
+            self.report.members += 1
+            self.report.raw_bytes += size
+
+    def _write_central_directory(self) -> None:
+        start = self._fp.tell()
+        for m in self._members:
+            self._fp.write(_CENTRAL_HEADER.pack(
+                0x02014b50, _MADE_BY, _VERSION, _UTF8_FLAG, _DEFLATED, m.dos_time, m.dos_date,
+                m.crc, m.packed_size, m.size, len(m.name), 0, 0, 0, 0, _FILE_MODE, m.offset))
+            self._fp.write(m.name)
+        end = self._fp.tell()
+        if len(self._members) > 0xFFFF or end > _ZIP32_LIMIT:
+            raise ValueError("归档超过 65535 个文件或 4 GB，请拆分打包")
+        self._fp.write(_END_RECORD.pack(
+            0x06054b50, 0, 0, len(self._members), len(self._members), end - start, start, 0))
+
+    def close(self) -> PackageReport:
+        """
+        等待压缩完成并写出归档
+
+        Returns:
+            PackageReport
+        """
+        with self._lock:
+            if self._closed:
+                return self.report
+            self._closed = True
+        self._pool.shutdown(wait=True)
+        try:
+            if self.encrypted:
+                for arcname, future in self._names.items():
+                    if future.exception() is not None:
+                        logger.warning(f"打包 {arcname} 失败: {future.exception()}")
+                        self.report.failed.append(arcname)
+                    else:
+                        self.report.members += 1
+                        self.report.raw_bytes += self._zip.getinfo(arcname).file_size
+                self._zip.close()
+            else:
+                self._write_central_directory()
+                self._fp.close()
+            os.replace(self._tmp, self.archive_path)
+        except Exception:
+            if os.path.exists(self._tmp):
+                os.remove(self._tmp)
+            raise
+        self.report.packed_bytes = os.path.getsize(self.archive_path)
+        self.report.seconds = time.perf_counter() - self._start
+        logger.info(f"打包完成: {self.archive_path}，{self.report.members} 个文件，"
+                    f"{self.report.raw_bytes / 1024:.1f} KB -> {self.report.packed_bytes / 1024:.1f} KB")
+        return self.report
+
+    def __enter__(self) -> 'ArtifactPackager':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def packager_from_env(output_dir: str) -> Optional[ArtifactPackager]:
+    """
+    按 BILL_HUB_PACKAGE / BILL_HUB_PACKAGE_PASSWORD 创建打包器（未设置时返回 None）
+
+    Args:
+        output_dir: 输出目录（归档名称不是路径时写入该目录）
+    """
+    name = os.environ.get(ENV_PACKAGE)
+    if not name:
+        return None
+    path = name if name.lower().endswith('.zip') else os.path.join(output_dir, f"{name}.zip")
+    packager = ArtifactPackager(path, password=os.environ.get(ENV_PACKAGE_PASSWORD))
+    console.info(f"产物将打包到: {path}{'（AES 加密）' if packager.encrypted else ''}")
+    return packager
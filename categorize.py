@@ -0,0 +1,315 @@
+"""
+自动分类模块
+将用户可编辑的关键词/正则规则编译为 Aho-Corasick 自动机，对交易进行本地分类
+"""
+import json
+import os
+import re
+from collections import deque
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+
+
+CATEGORY_COL = '分类'
+DEFAULT_CATEGORY = '其他'
+TEXT_COLUMNS = ['交易对方', '商品', '交易类型']
+
+# 匹配编码：用户关键词编码为 序号 - _USER_OFFSET（负数），未命中为 _NO_MATCH
+_USER_OFFSET = 1 << 30
+_NO_MATCH = 1 << 40
+
+ENV_RULES_FILE = "BILL_HUB_CATEGORY_RULES"
+DEFAULT_RULES_FILE = os.path.join(os.path.expanduser("~"), ".bill-hub", "categories.json")
+
+# 内置的默认规则，顺序即优先级
+DEFAULT_RULES: List[Dict[str, object]] = [
+    {"category": "餐饮", "keywords": ["餐厅", "饭店", "美团", "饿了么", "外卖", "麦当劳", "肯德基", "kfc",
+                                   "星巴克", "瑞幸", "咖啡", "奶茶", "喜茶", "蜜雪", "小吃", "火锅", "餐饮", "食堂"]},
+    {"category": "交通", "keywords": ["滴滴", "地铁", "公交", "出租", "高德打车", "曹操出行", "12306", "铁路",
+                                   "航空", "机票", "加油", "中石化", "中石油", "停车", "交通", "哈啰"]},
+    {"category": "购物", "keywords": ["超市", "便利店", "京东", "淘宝", "天猫", "拼多多", "唯品会", "商场",
+                                   "盒马", "沃尔玛", "永辉", "罗森", "全家", "7-eleven", "购物"]},
+    {"category": "生活缴费", "keywords": ["电费", "水费", "燃气", "话费", "中国移动", "中国联通", "中国电信",
+                                     "宽带", "物业", "缴费"]},
+    {"category": "娱乐", "keywords": ["电影", "影城", "腾讯视频", "爱奇艺", "优酷", "网易云", "游戏", "ktv",
+                                   "哔哩哔哩", "bilibili"]},
+    {"category": "医疗", "keywords": ["医院", "药店", "药房", "诊所", "医疗"]},
+    {"category": "转账红包", "keywords": ["转账", "红包"]},
+    {"category": "收入", "keywords": ["工资", "退款", "报销"]},
+]
+
+
+class _Automaton:
+    """Aho-Corasick 自动机，每个节点只保留优先级最高（数值最小）的规则编号"""
+
+    def __init__(self):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.best: List[int] = [-1]
+        self.size = 0
+
+    def add(self, word: str, priority: int) -> None:
+        node = 0
+        for ch in word:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.best.append(-1)
+            node = nxt
+        if self.best[node] == -1 or priority < self.best[node]:
+            self.best[node] = priority
+        self.size += 1
+
+    def build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                target = self.goto[state].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                inherited = self.best[self.fail[child]]
+                if inherited != -1 and (self.best[child] == -1 or inherited < self.best[child]):
+                    self.best[child] = inherited
+
+    def search(self, text: str) -> int:
+        """返回文本中命中的最高优先级规则编号，未命中返回 -1"""
+        goto, fail, best = self.goto, self.fail, self.best
+        node = 0
+        found = -1
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = best[node]
+            if hit != -1 and (found == -1 or hit < found):
+                found = hit
+        return found
+
+
+class Categorizer:
+    """
+    基于规则的交易分类器
+
+    规则按声明顺序确定优先级；分类只对唯一文本进行并缓存结果，再按编码广播回每一行。
+    用户纠正（按交易对方精确覆盖）和新增关键词都是增量生效的，不会重新编译全部规则。
+    """
+
+    def __init__(self, rules: Optional[Sequence[Dict[str, object]]] = None,
+                 overrides: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            rules: 规则列表，每条包含 category、keywords（可选）、patterns（可选正则）
+            overrides: 交易对方到分类的精确映射（用户纠正）
+        """
+        self.rules: List[Dict[str, object]] = [dict(r) for r in (DEFAULT_RULES if rules is None else rules)]
+        self.overrides: Dict[str, str] = dict(overrides or {})
+        self.categories: List[str] = [str(r['category']) for r in self.rules]
+        self._automaton = _Automaton()
+        self._patterns: List[Tuple[int, Pattern]] = []
+        for priority, rule in enumerate(self.rules):
+            for keyword in rule.get('keywords', []) or []:
+                self._automaton.add(str(keyword).lower(), priority)
+            for pattern in rule.get('patterns', []) or []:
+                self._patterns.append((priority, re.compile(str(pattern), re.IGNORECASE)))
+        self._automaton.build()
+        # 用户新增的关键词单独放在一个小自动机中，优先级高于基础规则
+        self._user_keywords: List[Tuple[str, str]] = []
+        self._user_automaton: Optional[_Automaton] = None
+        self._memo: Dict[str, int] = {}
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "Categorizer":
+        """
+        从 JSON 规则文件加载分类器，文件不存在时使用内置规则
+
+        Args:
+            path: 规则文件路径（默认读取 BILL_HUB_CATEGORY_RULES 或 ~/.bill-hub/categories.json）
+
+        Returns:
+            Categorizer 实例
+        """
+        path = path or os.environ.get(ENV_RULES_FILE, DEFAULT_RULES_FILE)
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取分类规则失败 {path}，使用内置规则: {e}")
+            return cls()
+        categorizer = cls(config.get('rules'), config.get('overrides'))
+        for category, keyword in config.get('user_keywords', []):
+            categorizer.add_keyword(category, keyword)
+        return categorizer
+
+    def save(self, path: str) -> None:
+        """
+        保存规则、用户纠正和新增关键词到 JSON 文件
+
+        Args:
+            path: 规则文件路径
+        """
+        rules_dir = os.path.dirname(path)
+        if rules_dir and not os.path.exists(rules_dir):
+            os.makedirs(rules_dir)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'rules': self.rules,
+                'overrides': self.overrides,
+                'user_keywords': self._user_keywords,
+            }, f, ensure_ascii=False, indent=2)
+
+    def correct(self, counterparty: str, category: str) -> None:
+        """
+        记录用户纠正：指定交易对方的所有交易归入该分类
+
+        Args:
+            counterparty: 交易对方
+            category: 分类名称
+        """
+        self.overrides[counterparty] = category
+
+    def add_keyword(self, category: str, keyword: str) -> None:
+        """
+        增量添加关键词：只重建用户关键词的小自动机，并只更新缓存中受影响的条目
+
+        Args:
+            category: 分类名称
+            keyword: 关键词
+        """
+        keyword = keyword.lower()
+        self._user_keywords.append((category, keyword))
+        automaton = _Automaton()
+        for priority, (_, word) in enumerate(self._user_keywords):
+            automaton.add(word, priority)
+        automaton.build()
+        self._user_automaton = automaton
+
+        for text in self._memo:
+            if keyword in text:
+                self._memo[text] = self._match(text)
+
+    def _match(self, text: str) -> int:
+        """返回命中规则的编码：用户关键词为负数（优先），基础规则为其序号，未命中为 _NO_MATCH"""
+        if self._user_automaton is not None:
+            hit = self._user_automaton.search(text)
+            if hit != -1:
+                return hit - _USER_OFFSET
+
+        best = self._automaton.search(text)
+        for priority, pattern in self._patterns:
+            if best != -1 and priority >= best:
+                break
+            if pattern.search(text):
+                best = priority
+                break
+        return best if best != -1 else _NO_MATCH
+
+    def _category_of(self, code: int) -> str:
+        if code == _NO_MATCH:
+            return DEFAULT_CATEGORY
+        if code < 0:
+            return self._user_keywords[code + _USER_OFFSET][0]
+        return self.categories[code]
+
+    def _match_cached(self, text: str) -> int:
+        key = text.lower()
+        code = self._memo.get(key)
+        if code is None:
+            code = self._match(key)
+            self._memo[key] = code
+        return code
+
+    def classify(self, text: str) -> str:
+        """
+        对单条文本分类（结果会被缓存）
+
+        Args:
+            text: 交易文本
+
+        Returns:
+            分类名称
+        """
+        return self._category_of(self._match_cached(text))
+
+    def categorize(self, df: pd.DataFrame) -> pd.Series:
+        """
+        对 DataFrame 中的每条交易分类
+
+        每个文本列分别做分解，只对唯一值匹配规则，再按编码广播回行并逐行取优先级最高的命中。
+
+        Args:
+            df: 交易数据
+
+        Returns:
+            与 df 行索引对齐的分类 Series
+        """
+        columns = [c for c in TEXT_COLUMNS if c in df.columns]
+        if df.empty or not columns:
+            return pd.Series(DEFAULT_CATEGORY, index=df.index, dtype=object)
+
+        best = np.full(len(df), _NO_MATCH, dtype=np.int64)
+        unique_count = 0
+        override_codes: Optional[np.ndarray] = None
+        override_labels: Optional[np.ndarray] = None
+        for col in columns:
+            codes, uniques = pd.factorize(df[col])
+            values = uniques.astype(str).tolist()
+            unique_count += len(values)
+            matched = np.fromiter((self._match_cached(v) for v in values), dtype=np.int64, count=len(values))
+            # 只按有效编码取值：整列缺失时 uniques 为空，不能用 -1 编码索引 matched
+            valid = codes >= 0
+            best[valid] = np.minimum(best[valid], matched[codes[valid]])
+            if col == '交易对方' and self.overrides:
+                override_codes = codes
+                override_labels = np.array([self.overrides.get(v) for v in values] + [None], dtype=object)
+
+        # 只对少量唯一命中编码解析分类名称
+        match_codes, match_index = np.unique(best, return_inverse=True)
+        labels = np.array([self._category_of(int(c)) for c in match_codes], dtype=object)[match_index]
+
+        if override_codes is not None:
+            corrected = override_labels[override_codes]
+            has_override = pd.notna(corrected)
+            labels[has_override] = corrected[has_override]
+
+        logger.debug(f"分类完成: {len(df)} 条记录，{unique_count} 个唯一文本")
+        return pd.Series(labels, index=df.index, dtype=object)
+
+
+_default_categorizer: Optional[Categorizer] = None
+
+
+def get_default_categorizer() -> Categorizer:
+    """获取进程内共享的默认分类器（首次调用时加载规则文件）"""
+    global _default_categorizer
+    if _default_categorizer is None:
+        _default_categorizer = Categorizer.from_file()
+    return _default_categorizer
+
+
+def assign_categories(df: pd.DataFrame, categorizer: Optional[Categorizer] = None) -> pd.DataFrame:
+    """
+    为交易数据添加分类列
+
+    Args:
+        df: 交易数据
+        categorizer: 分类器（默认使用共享的默认分类器）
+
+    Returns:
+        添加了分类列的 DataFrame（原地修改并返回）
+    """
+    categorizer = categorizer or get_default_categorizer()
+    df[CATEGORY_COL] = categorizer.categorize(df)
+    return df
@@ -0,0 +1,367 @@
+"""
+账单数据命令行工具
+先用 ingest 把账单解析后存入按月份分区的存储，之后的查询和报表直接读取存储，不再重新解析 PDF
+
+用法:
+    python cli.py ingest input/
+    python cli.py query --quarter 2 --merchant 星巴克 --by year
+    python cli.py top-merchants --year 2024 -n 10
+    python cli.py report --from 2024-04-01 --to 2024-06-30 --output output/q2
+    python cli.py export --category 餐饮 --output output/food.xlsx
+    python cli.py stream input/ --output output/stream --parquet
+"""
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from logger_config import console, logger
+from password_provider import PasswordProvider, file_fingerprint
+from pipeline import Pipeline, Stage
+from progress import ProgressService
+from store import BillStore, QueryFilter
+from utils import (
+    TIME_KEY_COLUMNS, artifact_is_fresh, data_fingerprint, force_refresh_requested, month_labels,
+    read_artifact_fingerprint, record_artifact_fingerprint,
+)
+
+
+GROUP_CHOICES = ('month', 'year', 'merchant', 'category', 'none')
+TYPE_COLS = ['收/支/其他', '收/支']
+# report 命令记录查询结果指纹的文件：<报表>.html.source.fingerprint
+REPORT_SOURCE_SUFFIX = '.source'
+
+
+def build_filter(args: argparse.Namespace) -> QueryFilter:
+    """根据命令行参数构建查询条件（日期均为闭区间）"""
+    start = pd.Timestamp(args.date_from) if args.date_from else None
+    end = pd.Timestamp(args.date_to) + pd.Timedelta(days=1) if args.date_to else None
+    if args.year:
+        year_start, year_end = pd.Timestamp(year=args.year, month=1, day=1), pd.Timestamp(year=args.year + 1, month=1, day=1)
+        start = max(start, year_start) if start is not None else year_start
+        end = min(end, year_end) if end is not None else year_end
+
+    # --quarter 与 --month 同时指定时取交集（没有重叠时不匹配任何记录）
+    months = set(args.month) if args.month else None
+    if args.quarter:
+        quarter = set(range(args.quarter * 3 - 2, args.quarter * 3 + 1))
+        months = quarter if months is None else months & quarter
+        if not months:
+            logger.warning(f"--month {' '.join(map(str, sorted(args.month)))} 不在第 {args.quarter} 季度内")
+    return QueryFilter(start=start, end=end, months_of_year=sorted(months) if months is not None else None,
+                       merchants=args.merchant or None, categories=args.category or None)
+
+
+def filter_slug(args: argparse.Namespace) -> str:
+    """根据查询条件生成产物文件名"""
+    parts = []
+    if args.year:
+        parts.append(str(args.year))
+    if args.date_from or args.date_to:
+        parts.append(f"{args.date_from or ''}~{args.date_to or ''}")
+    if args.quarter:
+        parts.append(f"Q{args.quarter}")
+    if args.month:
+        parts.append('M' + '-'.join(str(m) for m in sorted(args.month)))
+    parts.extend(args.merchant or [])
+    parts.extend(args.category or [])
+    slug = '_'.join(parts) or 'all'
+    return re.sub(r'[\\/:*?"<>|\s]+', '-', slug)
+
+
+def _type_col(df: pd.DataFrame) -> Optional[str]:
+    return next((col for col in TYPE_COLS if col in df.columns), None)
+
+
+def _scan(store: BillStore, args: argparse.Namespace, timings: Dict[str, float],
+          columns: Optional[List[str]] = None) -> pd.DataFrame:
+    start = time.perf_counter()
+    df = store.scan(build_filter(args), columns=columns)
+    timings['扫描'] = time.perf_counter() - start
+    if df.empty:
+        console.info("没有符合条件的记录", indent=False)
+    return df
+
+
+def summarize(df: pd.DataFrame, by: str) -> pd.DataFrame:
+    """按维度汇总支出、收入和笔数"""
+    type_col = _type_col(df)
+    amount = df['金额(元)']
+    frame = pd.DataFrame({
+        '支出': amount.where(df[type_col] == '支出', 0.0) if type_col else amount,
+        '收入': amount.where(df[type_col] == '收入', 0.0) if type_col else 0.0,
+        '笔数': 1,
+    })
+    if by == 'none':
+        return frame.sum().to_frame('合计').T.round(2)
+    if by == 'month':
+        keys = df['月序号']
+    elif by == 'year':
+        keys = df['交易时间'].dt.year.rename('年份')
+    elif by == 'merchant':
+        keys = df['交易对方']
+    else:
+        keys = df['分类'] if '分类' in df.columns else pd.Series('未分类', index=df.index)
+    table = frame.groupby(keys).sum().round(2)
+    if by == 'month':
+        table.index = pd.Index(month_labels(table.index), name='月份')
+    elif by in ('merchant', 'category'):
+        table = table.sort_values('支出', ascending=False)
+    return table
+
+
+def _collect_sources(paths: List[str]) -> List[str]:
+    """展开目录中的 ZIP / PDF 文件"""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources.extend(sorted(os.path.join(path, f) for f in os.listdir(path)
+                                  if f.lower().endswith(('.zip', '.pdf'))))
+        else:
+            sources.append(path)
+    return sources
+
+
+def cmd_ingest(args: argparse.Namespace, store: BillStore, timings: Dict[str, float]) -> None:
+    """解析 ZIP / PDF 并存入存储（内容已存在的文件跳过）"""
+    from main import BillJob, _normalize_stage, _parse_stage, extract_zip_pdfs, job_label
+
+    sources = _collect_sources(args.paths)
+    provider = PasswordProvider.from_env(args.paths[0] if os.path.isdir(args.paths[0]) else 'input')
+    interactive = sys.stdin is not None and sys.stdin.isatty()
+    temp_dir = tempfile.mkdtemp(prefix='bill-hub-ingest-')
+    fingerprints: Dict[str, str] = {}
+
+    def decrypt(item) -> List[BillJob]:
+        index, source = item
+        if source.lower().endswith('.zip'):
+            pdfs = extract_zip_pdfs(source, temp_dir, provider, interactive)
+        else:
+            pdfs = [(source, provider.resolve_pdf_password(source))]
+        jobs = []
+        for k, (path, password) in enumerate(pdfs):
+            fingerprint = file_fingerprint(path)
+            if store.has_source(fingerprint) and not args.force:
+                console.info(f"跳过已存入的文件: {os.path.basename(path)}")
+                continue
+            fingerprints[path] = fingerprint
+            jobs.append(BillJob((index, k), path, password))
+        return jobs
+
+    def persist(job: BillJob) -> BillJob:
+        store.ingest(job.df, fingerprints[job.pdf_path], os.path.basename(job.pdf_path))
+        console.info(f"已存入: {os.path.basename(job.pdf_path)}（{len(job.df)} 行）")
+        return job
+
+    pipeline = Pipeline([
+        Stage('decrypt', decrypt, concurrency=1, fan_out=True),
+        Stage('parse', _parse_stage, concurrency=args.workers, executor='process'),
+        Stage('normalize', _normalize_stage),
+        # 清单文件只由一个线程写入
+        Stage('store', persist, concurrency=1),
+    ], label=job_label)
+    try:
+        start = time.perf_counter()
+        with ProgressService("解析入库"):
+            jobs = pipeline.run_sync(enumerate(sources))
+        timings['解析入库'] = time.perf_counter() - start
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    logger.info(f"流水线阶段统计:\n{pipeline.report()}")
+    console.info(f"新存入 {len(jobs)} 个文件，存储中共 {len(store.sources())} 个文件", indent=False)
+
+
+def cmd_query(args: argparse.Namespace, store: BillStore, timings: Dict[str, float]) -> None:
+    """按维度汇总收支"""
+    df = _scan(store, args, timings, columns=['交易时间', '月序号', '收/支/其他', '收/支', '金额(元)', '交易对方', '分类'])
+    if df.empty:
+        return
+    start = time.perf_counter()
+    table = summarize(df, args.by)
+    timings['汇总'] = time.perf_counter() - start
+    print(table.to_string())
+
+
+def cmd_top_merchants(args: argparse.Namespace, store: BillStore, timings: Dict[str, float]) -> None:
+    """按支出金额列出商户排行"""
+    df = _scan(store, args, timings, columns=['交易时间', '月序号', '收/支/其他', '收/支', '金额(元)', '交易对方'])
+    if df.empty:
+        return
+    start = time.perf_counter()
+    table = summarize(df, 'merchant').head(args.n)
+    timings['汇总'] = time.perf_counter() - start
+    print(table.to_string())
+
+
+def cmd_report(args: argparse.Namespace, store: BillStore, timings: Dict[str, float]) -> None:
+    """
+    只为查询结果生成 HTML 报表（可选 PNG）
+
+    查询结果和渲染选项的指纹记录在 report_<条件>.html.source.fingerprint，与上次一致且产物齐全时
+    跳过异常检测、汇总和渲染（--force 或 BILL_HUB_FORCE_REFRESH=1 时总是重新生成）。
+    """
+    from anomaly import detect_spending_anomalies
+    from visualize import generate_visualizations, insights_path, report_png_path, report_source_fingerprint
+
+    df = _scan(store, args, timings)
+    if df.empty:
+        return
+    os.makedirs(args.output, exist_ok=True)
+    html_path = os.path.join(args.output, f"report_{filter_slug(args)}.html")
+    source_key = f"{html_path}{REPORT_SOURCE_SUFFIX}"
+    start = time.perf_counter()
+    fingerprint = report_source_fingerprint(df, snapshot=args.png)
+    outputs = [html_path, insights_path(html_path)] + ([report_png_path(html_path)] if args.png else [])
+    if (not args.force and not force_refresh_requested() and all(os.path.exists(p) for p in outputs)
+            and read_artifact_fingerprint(source_key) == fingerprint):
+        console.info(f"查询结果未变化，跳过报表: {html_path}", indent=False)
+    else:
+        alerts = detect_spending_anomalies(df)
+        generate_visualizations(df, html_path, alerts=alerts, snapshot=args.png, force=args.force)
+        record_artifact_fingerprint(source_key, fingerprint)
+    timings['渲染'] = time.perf_counter() - start
+
+
+def cmd_export(args: argparse.Namespace, store: BillStore, timings: Dict[str, float]) -> None:
+    """
+    把查询结果导出为 Excel / CSV / Parquet
+
+    查询结果和输出格式的指纹记录在 <输出文件>.fingerprint，与上次一致且文件存在时跳过写出
+    （--force 或 BILL_HUB_FORCE_REFRESH=1 时总是重新导出）。
+    """
+    df = _scan(store, args, timings)
+    if df.empty:
+        return
+    output = args.output or os.path.join('output', f"export_{filter_slug(args)}.xlsx")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    df = df.drop(columns=TIME_KEY_COLUMNS, errors='ignore')
+    start = time.perf_counter()
+    ext = os.path.splitext(output)[1].lower()
+    fingerprint = data_fingerprint(ext, df)
+    if artifact_is_fresh(output, fingerprint, force=args.force):
+        console.info(f"查询结果未变化，跳过导出: {output}", indent=False)
+        timings['导出'] = time.perf_counter() - start
+        return
+    if ext == '.csv':
+        df.to_csv(output, index=False, encoding='utf-8-sig')
+    elif ext == '.parquet':
+        df.to_parquet(output, index=False)
+    else:
+        with pd.ExcelWriter(output, engine='xlsxwriter', datetime_format='yyyy-mm-dd hh:mm:ss') as writer:
+            df.to_excel(writer, index=False)
+    record_artifact_fingerprint(output, fingerprint)
+    timings['导出'] = time.perf_counter() - start
+    console.info(f"已导出 {len(df)} 行: {output}", indent=False)
+
+
+def cmd_stream(args: argparse.Namespace, store: BillStore, timings: Dict[str, float]) -> None:
+    """
+    流式转换 ZIP / PDF：按批解析并逐批写出 Excel（可选 Parquet）和月度汇总，不在内存中保留整份账单
+
+    适合单个文件过大、不需要 HTML 报表的场景；不写入存储。
+    """
+    from main import extract_zip_pdfs
+    from writers import AggregateWriter, ExcelStreamWriter, ParquetStreamWriter, stream_pdf_to_writers
+
+    sources = _collect_sources(args.paths)
+    provider = PasswordProvider.from_env(args.paths[0] if os.path.isdir(args.paths[0]) else 'input')
+    interactive = sys.stdin is not None and sys.stdin.isatty()
+    os.makedirs(args.output, exist_ok=True)
+    temp_dir = tempfile.mkdtemp(prefix='bill-hub-stream-')
+    start = time.perf_counter()
+    try:
+        for source in sources:
+            if source.lower().endswith('.zip'):
+                pdfs = extract_zip_pdfs(source, temp_dir, provider, interactive)
+            else:
+                pdfs = [(source, provider.resolve_pdf_password(source))]
+            for pdf_path, password in pdfs:
+                base = os.path.join(args.output, os.path.splitext(os.path.basename(pdf_path))[0])
+                aggregate = AggregateWriter()
+                writers = [ExcelStreamWriter(f"{base}.xlsx"), aggregate]
+                if args.parquet:
+                    writers.append(ParquetStreamWriter(f"{base}.parquet"))
+                report = stream_pdf_to_writers(pdf_path, writers, password, batch_rows=args.batch_rows)
+                if not report.is_valid:
+                    logger.warning(f"数据验证失败 {pdf_path}: {', '.join(report.messages())}")
+                console.info(f"已转换: {os.path.basename(pdf_path)}（{report.total_rows} 行）", indent=False)
+                print(aggregate.result().to_string(index=False))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    timings['流式转换'] = time.perf_counter() - start
+
+
+COMMANDS = {
+    'ingest': cmd_ingest,
+    'query': cmd_query,
+    'top-merchants': cmd_top_merchants,
+    'report': cmd_report,
+    'export': cmd_export,
+    'stream': cmd_stream,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="账单数据存储、查询与报表")
+    parser.add_argument('--store', default=None, help="存储目录（默认 BILL_HUB_STORE 或 output/store）")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ingest = sub.add_parser('ingest', help="解析 ZIP / PDF 并存入存储")
+    ingest.add_argument('paths', nargs='+', help="ZIP / PDF 文件或目录")
+    ingest.add_argument('--workers', type=int, default=1, help="解析进程数")
+    ingest.add_argument('--force', action='store_true', help="重新解析已存入的文件")
+
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument('--from', dest='date_from', help="起始日期 YYYY-MM-DD（含）")
+    filters.add_argument('--to', dest='date_to', help="结束日期 YYYY-MM-DD（含）")
+    filters.add_argument('--year', type=int, help="年份")
+    filters.add_argument('--quarter', type=int, choices=[1, 2, 3, 4], help="季度（跨年份）")
+    filters.add_argument('--month', type=int, action='append', choices=range(1, 13), help="月份（跨年份，可重复）")
+    filters.add_argument('--merchant', action='append', help="交易对方关键字（可重复）")
+    filters.add_argument('--category', action='append', help="分类（可重复）")
+
+    query = sub.add_parser('query', parents=[filters], help="汇总收支")
+    query.add_argument('--by', choices=GROUP_CHOICES, default='month', help="汇总维度")
+    top = sub.add_parser('top-merchants', parents=[filters], help="商户支出排行")
+    top.add_argument('-n', type=int, default=20, help="显示前 N 个商户")
+    report = sub.add_parser('report', parents=[filters], help="为查询结果生成报表")
+    report.add_argument('--output', default='output', help="输出目录")
+    report.add_argument('--png', action='store_true', help="同时导出 PNG")
+    report.add_argument('--force', action='store_true', help="忽略报表指纹，强制重新渲染")
+    export = sub.add_parser('export', parents=[filters], help="导出查询结果")
+    export.add_argument('--output', default=None, help="输出文件（.xlsx / .csv / .parquet）")
+    export.add_argument('--force', action='store_true', help="忽略导出指纹，强制重新导出")
+
+    stream = sub.add_parser('stream', help="流式转换 ZIP / PDF 为 Excel（可选 Parquet），不写入存储")
+    stream.add_argument('paths', nargs='+', help="ZIP / PDF 文件或目录")
+    stream.add_argument('--output', default='output', help="输出目录")
+    stream.add_argument('--parquet', action='store_true', help="同时写出 Parquet（需要安装 pyarrow）")
+    stream.add_argument('--batch-rows', type=int, default=5000, help="每批的行数")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口，返回退出码"""
+    args = build_parser().parse_args(argv)
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    try:
+        store = BillStore(args.store)
+        COMMANDS[args.command](args, store, timings)
+    except (ValueError, ImportError) as e:
+        console.error(f"错误: {e}", indent=False)
+        return 1
+    total = time.perf_counter() - start
+    details = '，'.join(f"{name} {seconds:.2f}s" for name, seconds in timings.items())
+    console.info(f"[{args.command}] 耗时 {total:.2f}s" + (f"（{details}）" if details else ""), indent=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
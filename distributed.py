@@ -0,0 +1,536 @@
+"""
+分布式批处理模块
+协调者把输入文件（大文件按页码范围）拆分为分片，写入共享目录上的任务队列；
+多台机器上的 worker 认领分片并写回规范化后的部分结果，协调者按内容哈希恰好一次地合并
+
+队列目录结构:
+    queue.json        队列配置（最大尝试次数、租约时长）
+    pending/          待处理分片
+    claimed/          已认领分片（文件修改时间即租约心跳）
+    done/ failed/     已完成 / 超过重试次数的分片
+    results/          部分结果（<分片 ID>.parquet，未安装 pyarrow 时为 <分片 ID>.json）
+    closed            协调者写入的结束标记，空闲 worker 看到后退出
+
+认领和提交都依赖同一文件系统内 os.rename / os.replace 的原子性。分片 ID 由文件内容的
+SHA-256 和页码范围组成，同一内容的文件只处理一次，重复提交或重试产生的结果会覆盖为同一份。
+分片不携带 PDF 密码，worker 通过本机的 PasswordProvider（环境变量、密码文件、keyring、缓存）查找；
+部分结果只使用 Parquet / JSON 这类纯数据格式，协调者读取共享目录中的文件不会执行其中的代码。
+队列目录中是解析后的账单数据，应只对运行账户可读。
+"""
+import glob
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from multiprocessing import Process
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from categorize import assign_categories
+from logger_config import log_context, logger
+from merchants import canonicalize_merchants
+from password_provider import PasswordProvider, file_fingerprint
+from utils import iter_pdf_batches, pdf_page_count
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+ENV_QUEUE = 'BILL_HUB_QUEUE'
+ENV_LOCAL_WORKERS = 'BILL_HUB_LOCAL_WORKERS'
+DEFAULT_PAGES_PER_SHARD = 50
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_LEASE_SECONDS = 60.0
+STATES = ('pending', 'claimed', 'done', 'failed')
+# 部分结果的格式：不使用 pickle，读取共享目录中的结果不会执行代码
+RESULT_FORMATS = ('parquet', 'json')
+RESULT_FORMAT = 'parquet' if pq is not None else 'json'
+
+
+@dataclass
+class Shard:
+    """一个分片：某个 PDF 的 [page_start, page_end) 页"""
+    shard_id: str
+    path: str
+    page_start: int
+    page_end: int
+    attempts: int = 0
+    errors: List[str] = field(default_factory=list)
+    worker: Optional[str] = None
+
+    @property
+    def content_hash(self) -> str:
+        return self.shard_id.split('-')[0]
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Shard':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        # 旧版本的分片文件带有 password 字段，读取时丢弃
+        data.pop('password', None)
+        return cls(**data)
+
+
+def _atomic_write(path: str, data: str) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _write_result(df: pd.DataFrame, path: str, fmt: str) -> None:
+    """写出部分结果：parquet 使用 pyarrow，json 记录各列的 dtype 和按列拆分的数据"""
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+        return
+    dtypes = json.dumps({str(col): str(dtype) for col, dtype in df.dtypes.items()}, ensure_ascii=False)
+    frame = df.to_json(orient='split', index=False, date_format='iso', date_unit='ns', force_ascii=False)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'{{"dtypes": {dtypes}, "frame": {frame}}}')
+
+
+def _read_result(path: str) -> pd.DataFrame:
+    """读取部分结果（只解析数据，不反序列化任何对象）"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    frame = payload['frame']
+    df = pd.DataFrame(frame['data'], columns=frame['columns'])
+    for col, dtype in payload['dtypes'].items():
+        if dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col]).astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+class JobQueue:
+    """基于共享文件系统的分片任务队列"""
+
+    def __init__(self, root: str, max_attempts: Optional[int] = None, lease_seconds: Optional[float] = None):
+        """
+        Args:
+            root: 队列目录（协调者和所有 worker 需挂载同一路径）
+            max_attempts: 每个分片的最大尝试次数（为 None 时读取已有的 queue.json）
+            lease_seconds: 认领租约时长，超过该时间没有心跳的分片会被重新放回待处理
+        """
+        self.root = root
+        for state in STATES + ('results',):
+            os.makedirs(os.path.join(root, state), mode=0o700, exist_ok=True)
+
+        config_path = os.path.join(root, 'queue.json')
+        config = {'max_attempts': DEFAULT_MAX_ATTEMPTS, 'lease_seconds': DEFAULT_LEASE_SECONDS}
+        if os.path.exists(config_path):
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        if max_attempts is not None or lease_seconds is not None or not os.path.exists(config_path):
+            if max_attempts is not None:
+                config['max_attempts'] = max_attempts
+            if lease_seconds is not None:
+                config['lease_seconds'] = lease_seconds
+            _atomic_write(config_path, json.dumps(config))
+        self.max_attempts = int(config['max_attempts'])
+        self.lease_seconds = float(config['lease_seconds'])
+
+    def _path(self, state: str, shard_id: str) -> str:
+        return os.path.join(self.root, state, f"{shard_id}.json")
+
+    def result_path(self, shard_id: str) -> str:
+        """本进程写出部分结果的路径（有 pyarrow 时为 Parquet，否则为 JSON）"""
+        return os.path.join(self.root, 'results', f"{shard_id}.{RESULT_FORMAT}")
+
+    def _find_result(self, shard_id: str) -> Optional[str]:
+        """已写出的部分结果（worker 可能使用另一种格式）"""
+        for fmt in RESULT_FORMATS:
+            path = os.path.join(self.root, 'results', f"{shard_id}.{fmt}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    # ---- 协调者 ----
+
+    def submit(
+        self,
+        pdfs: Iterable[Tuple[str, Optional[str]]],
+        pages_per_shard: int = DEFAULT_PAGES_PER_SHARD
+    ) -> List[List[str]]:
+        """
+        把 PDF 拆分为分片并放入队列
+
+        内容相同的文件只提交一次；已有结果的分片不会重复处理（可用于中断后继续）。
+
+        Args:
+            pdfs: (PDF 路径, 密码) 列表（密码只用于统计页数，不写入队列）
+            pages_per_shard: 每个分片的最大页数
+
+        Returns:
+            每个文件对应的分片 ID 列表（重复内容的文件为空列表）
+        """
+        seen = set()
+        per_file: List[List[str]] = []
+        for path, password in pdfs:
+            content_hash = file_fingerprint(path)[:16]
+            if content_hash in seen:
+                logger.info(f"跳过内容重复的文件: {os.path.basename(path)}")
+                per_file.append([])
+                continue
+            seen.add(content_hash)
+
+            pages = pdf_page_count(path, password)
+            shard_ids = []
+            for start in range(0, max(pages, 1), pages_per_shard):
+                end = min(start + pages_per_shard, pages)
+                shard = Shard(f"{content_hash}-p{start:05d}-{end:05d}", os.path.abspath(path), start, end)
+                shard_ids.append(shard.shard_id)
+                state = self.state(shard.shard_id)
+                if state == 'failed':
+                    # 重新提交时再给失败的分片一轮重试机会
+                    os.remove(self._path('failed', shard.shard_id))
+                elif state is not None:
+                    continue
+                _atomic_write(self._path('pending', shard.shard_id), shard.to_json())
+            per_file.append(shard_ids)
+        total = sum(len(ids) for ids in per_file)
+        logger.info(f"已提交 {len(seen)} 个文件，共 {total} 个分片到 {self.root}")
+        return per_file
+
+    def state(self, shard_id: str) -> Optional[str]:
+        """返回分片当前状态（不在队列中时返回 None，已有结果即视为 done）"""
+        if self._find_result(shard_id) is not None:
+            return 'done'
+        for state in ('done', 'failed', 'claimed', 'pending'):
+            if os.path.exists(self._path(state, shard_id)):
+                return state
+        return None
+
+    def status(self) -> Dict[str, int]:
+        """各状态的分片数"""
+        return {state: len(glob.glob(os.path.join(self.root, state, '*.json'))) for state in STATES}
+
+    def requeue_expired(self) -> int:
+        """把租约过期（worker 失联）的分片按一次失败处理，返回处理的分片数"""
+        now = time.time()
+        count = 0
+        for path in glob.glob(os.path.join(self.root, 'claimed', '*.json')):
+            try:
+                if now - os.path.getmtime(path) < self.lease_seconds:
+                    continue
+                shard = Shard.from_file(path)
+            except (OSError, ValueError):
+                continue
+            logger.warning(f"分片 {shard.shard_id} 租约超时（worker {shard.worker}），重新放回队列")
+            self.fail(shard, "租约超时")
+            count += 1
+        return count
+
+    def close(self) -> None:
+        """写入结束标记，通知空闲的 worker 退出"""
+        _atomic_write(os.path.join(self.root, 'closed'), str(time.time()))
+
+    @property
+    def closed(self) -> bool:
+        return os.path.exists(os.path.join(self.root, 'closed'))
+
+    def collect(self, shard_ids: Iterable[str]) -> pd.DataFrame:
+        """
+        按给定顺序合并分片结果，每个分片 ID 只合并一次
+
+        Args:
+            shard_ids: 分片 ID（通常为同一个文件的全部分片）
+
+        Returns:
+            合并后的 DataFrame
+
+        Raises:
+            RuntimeError: 有分片没有结果（处理失败或尚未完成），合并结果会缺页
+        """
+        shard_ids = list(dict.fromkeys(shard_ids))
+        paths = {shard_id: self._find_result(shard_id) for shard_id in shard_ids}
+        missing = [shard_id for shard_id, path in paths.items() if path is None]
+        if missing:
+            raise RuntimeError(f"{len(missing)} 个分片没有结果: {', '.join(missing)}")
+        frames = [_read_result(paths[shard_id]) for shard_id in shard_ids]
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    # ---- worker ----
+
+    def claim(self, worker_id: str) -> Optional[Shard]:
+        """认领一个待处理分片（通过原子重命名保证只有一个 worker 成功）"""
+        for path in sorted(glob.glob(os.path.join(self.root, 'pending', '*.json'))):
+            shard_id = os.path.basename(path)[:-len('.json')]
+            claimed = self._path('claimed', shard_id)
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue  # 已被其他 worker 认领
+            try:
+                shard = Shard.from_file(claimed)
+            except (OSError, ValueError):
+                continue
+            # 之前超时的 worker 可能已经写出了结果
+            if self._find_result(shard_id) is not None:
+                self._move(claimed, self._path('done', shard_id))
+                continue
+            shard.worker = worker_id
+            shard.attempts += 1
+            _atomic_write(claimed, shard.to_json())
+            return shard
+        return None
+
+    def heartbeat(self, shard: Shard) -> None:
+        """刷新租约"""
+        try:
+            os.utime(self._path('claimed', shard.shard_id))
+        except OSError:
+            pass
+
+    def complete(self, shard: Shard, df: pd.DataFrame) -> None:
+        """写出分片结果并标记完成（同一分片重复提交时结果被原子覆盖）"""
+        result = self.result_path(shard.shard_id)
+        tmp = f"{result}.{shard.worker}.tmp"
+        _write_result(df, tmp, RESULT_FORMAT)
+        os.replace(tmp, result)
+        self._move(self._path('claimed', shard.shard_id), self._path('done', shard.shard_id))
+
+    def fail(self, shard: Shard, error: str) -> None:
+        """记录失败；未超过最大尝试次数时放回待处理，否则移入 failed"""
+        claimed = self._path('claimed', shard.shard_id)
+        shard.errors.append(f"{shard.worker}: {error}")
+        shard.worker = None
+        state = 'pending' if shard.attempts < self.max_attempts else 'failed'
+        _atomic_write(self._path(state, shard.shard_id), shard.to_json())
+        try:
+            os.remove(claimed)
+        except OSError:
+            pass
+        if state == 'failed':
+            logger.error(f"分片 {shard.shard_id} 已失败 {shard.attempts} 次，放弃: {error}")
+
+    @staticmethod
+    def _move(src: str, dst: str) -> None:
+        try:
+            os.replace(src, dst)
+        except OSError:
+            pass  # 已被协调者因超时收回
+
+
+class _Heartbeat:
+    """处理分片期间在后台线程中定期刷新租约"""
+
+    def __init__(self, queue: JobQueue, shard: Shard):
+        self.queue = queue
+        self.shard = shard
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        interval = max(self.queue.lease_seconds / 3, 0.05)
+        while not self._stop.wait(interval):
+            self.queue.heartbeat(self.shard)
+
+    def __enter__(self) -> '_Heartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def process_shard(shard: Shard, provider: Optional[PasswordProvider] = None) -> pd.DataFrame:
+    """
+    解析分片中的页并完成规范化（清洗和自动分类；商户名称由协调者统一规范化）
+
+    Args:
+        shard: 分片
+        provider: 用于查找加密 PDF 的密码（分片本身不携带密码）
+
+    Returns:
+        规范化后的部分结果
+    """
+    password = provider.resolve_pdf_password(shard.path) if provider is not None else None
+    batches = list(iter_pdf_batches(shard.path, password, pages=range(shard.page_start, shard.page_end)))
+    if not batches:
+        return pd.DataFrame()
+    df = pd.concat(batches, ignore_index=True)
+    assign_categories(df)
+    return df
+
+
+def run_worker(
+    root: str,
+    worker_id: Optional[str] = None,
+    poll_interval: float = 1.0,
+    idle_timeout: Optional[float] = None
+) -> int:
+    """
+    worker 主循环：反复认领并处理分片，直到队列关闭（或空闲超时）
+
+    Args:
+        root: 队列目录
+        worker_id: worker 标识（默认 主机名:进程号）
+        poll_interval: 没有分片时的轮询间隔（秒）
+        idle_timeout: 连续空闲超过该时长后退出（默认一直等到队列关闭）
+
+    Returns:
+        本 worker 成功处理的分片数
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    queue = JobQueue(root)
+    provider = PasswordProvider.from_env()
+    processed = 0
+    idle_since = time.monotonic()
+    logger.info(f"worker {worker_id} 已启动，队列: {root}")
+
+    while True:
+        shard = queue.claim(worker_id)
+        if shard is None:
+            if queue.closed:
+                break
+            if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        start = time.perf_counter()
+        try:
+            with _Heartbeat(queue, shard), log_context(file=os.path.basename(shard.path), stage='shard'):
+                df = process_shard(shard, provider)
+            queue.complete(shard, df)
+            processed += 1
+            logger.info(f"worker {worker_id} 完成分片 {shard.shard_id}（{len(df)} 行，"
+                        f"{time.perf_counter() - start:.2f}s）")
+        except Exception as e:
+            logger.warning(f"worker {worker_id} 处理分片 {shard.shard_id} 失败（第 {shard.attempts} 次）: {e}")
+            queue.fail(shard, str(e))
+        idle_since = time.monotonic()
+
+    logger.info(f"worker {worker_id} 退出，共处理 {processed} 个分片")
+    return processed
+
+
+def spawn_local_workers(root: str, count: int, poll_interval: float = 0.2) -> List[Process]:
+    """在本机启动 count 个 worker 进程（用于单机测试或单机多核运行）"""
+    workers = []
+    for i in range(count):
+        worker = Process(target=run_worker, args=(root, f"{socket.gethostname()}:local{i}", poll_interval),
+                         daemon=True)
+        worker.start()
+        workers.append(worker)
+    return workers
+
+
+def run_coordinator(
+    pdfs: List[Tuple[str, Optional[str]]],
+    root: str,
+    pages_per_shard: int = DEFAULT_PAGES_PER_SHARD,
+    local_workers: int = 0,
+    timeout: Optional[float] = None,
+    poll_interval: float = 1.0,
+    max_attempts: Optional[int] = None,
+    lease_seconds: Optional[float] = None
+) -> List[Tuple[str, pd.DataFrame]]:
+    """
+    分发分片并等待所有分片完成，返回每个文件的规范化结果及其 PDF 路径
+
+    Args:
+        pdfs: (PDF 路径, 密码) 列表，路径需位于所有 worker 都能访问的共享目录
+        root: 队列目录
+        pages_per_shard: 每个分片的最大页数
+        local_workers: 在本机额外启动的 worker 进程数
+        timeout: 等待的最长时间（秒），超时抛出 TimeoutError
+        poll_interval: 检查进度的间隔（秒）
+        max_attempts: 每个分片的最大尝试次数
+        lease_seconds: 认领租约时长（秒）
+
+    Returns:
+        (PDF 路径, 合并后的 DataFrame) 列表（按输入顺序，跳过无数据、内容重复和有分片失败的文件）
+    """
+    queue = JobQueue(root, max_attempts=max_attempts, lease_seconds=lease_seconds)
+    if queue.closed:
+        os.remove(os.path.join(root, 'closed'))
+    per_file = queue.submit(pdfs, pages_per_shard)
+    shard_ids = [shard_id for ids in per_file for shard_id in ids]
+    workers = spawn_local_workers(root, local_workers) if local_workers else []
+
+    start = time.monotonic()
+    try:
+        while True:
+            queue.requeue_expired()
+            states = [queue.state(shard_id) for shard_id in shard_ids]
+            finished = sum(state in ('done', 'failed') for state in states)
+            if finished == len(shard_ids):
+                break
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(f"等待分片超时：{finished}/{len(shard_ids)} 已结束")
+            time.sleep(poll_interval)
+    finally:
+        queue.close()
+        for worker in workers:
+            worker.join(timeout=max(poll_interval * 5, 5))
+
+    failed = {shard_id for shard_id in shard_ids if queue.state(shard_id) == 'failed'}
+    if failed:
+        logger.error(f"{len(failed)} 个分片处理失败: {', '.join(sorted(failed))}")
+    logger.info(f"分布式处理完成：{len(shard_ids) - len(failed)}/{len(shard_ids)} 个分片，"
+                f"耗时 {time.monotonic() - start:.2f}s")
+
+    results = []
+    for (path, _), ids in zip(pdfs, per_file):
+        lost = [shard_id for shard_id in ids if shard_id in failed]
+        if lost:
+            # 缺少分片的文件只有部分页，不参与合并，避免汇总中出现不完整的账单
+            logger.error(f"文件 {os.path.basename(path)} 不完整（{len(lost)}/{len(ids)} 个分片失败），未合并")
+            continue
+        df = queue.collect(ids)
+        if not df.empty:
+            # 在协调者上统一规范化商户名称，不同 worker 的别名缓存不会产生不同的规范名称
+            results.append((path, canonicalize_merchants(df)))
+    return results
+
+
+def main() -> None:
+    """命令行入口：python distributed.py worker|coordinator ..."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="分布式账单批处理")
+    sub = parser.add_subparsers(dest='command', required=True)
+    worker = sub.add_parser('worker', help="启动 worker")
+    worker.add_argument('--queue', default=os.environ.get(ENV_QUEUE), required=ENV_QUEUE not in os.environ)
+    worker.add_argument('--idle-timeout', type=float, default=None)
+    coordinator = sub.add_parser('coordinator', help="分发 PDF 并合并结果")
+    coordinator.add_argument('pdfs', nargs='+')
+    coordinator.add_argument('--queue', default=os.environ.get(ENV_QUEUE), required=ENV_QUEUE not in os.environ)
+    coordinator.add_argument('--output', default='output')
+    coordinator.add_argument('--pages-per-shard', type=int, default=DEFAULT_PAGES_PER_SHARD)
+    coordinator.add_argument('--local-workers', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'worker':
+        run_worker(args.queue, idle_timeout=args.idle_timeout)
+        return
+
+    from main import merge_and_report
+
+    provider = PasswordProvider.from_env()
+    pdfs = [(path, provider.resolve_pdf_password(path)) for path in args.pdfs]
+    results = run_coordinator(pdfs, args.queue, args.pages_per_shard, args.local_workers)
+    if results:
+        os.makedirs(args.output, exist_ok=True)
+        merge_and_report(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
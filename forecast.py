@@ -0,0 +1,227 @@
+"""
+月末支出预测模块
+基于按日汇总的分类支出序列，批量拟合季节性朴素模型和指数平滑模型，预测当月月末支出
+"""
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from utils import DAY_KEY, day_index_to_datetime
+
+
+TIME_COL = '交易时间'
+AMOUNT_COL = '金额(元)'
+CATEGORY_COL = '分类'
+TYPE_COLS = ['收/支/其他', '收/支']
+
+SEASON = 7
+ALPHAS = (0.1, 0.2, 0.3, 0.5, 0.7)
+# 双侧预测区间对应的正态分位数
+Z_SCORES = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.9600}
+FORECAST_COLUMNS = ['分类', '本月已支出', '预测剩余', '预测月末', '下限', '上限', '模型']
+
+
+@dataclass
+class MonthEndForecast:
+    """
+    月末支出预测结果
+
+    Attributes:
+        month: 预测的月份（YYYY-MM）
+        as_of: 已有数据的最后日期
+        remaining_days: 距月末的剩余天数
+        table: 按分类的预测明细（最后一行为合计）
+    """
+    month: str
+    as_of: pd.Timestamp
+    remaining_days: int
+    table: pd.DataFrame
+
+    @property
+    def total(self) -> Tuple[float, float, float]:
+        """合计的 (预测月末, 下限, 上限)"""
+        row = self.table.iloc[-1]
+        return float(row['预测月末']), float(row['下限']), float(row['上限'])
+
+
+def build_daily_matrix(df: pd.DataFrame) -> Tuple[np.ndarray, pd.Index, pd.DatetimeIndex]:
+    """
+    将支出明细汇总为 分类 × 日期 的矩阵（无支出的日期为 0）
+
+    Args:
+        df: 支出明细，需包含交易时间和金额列，分类列可选
+
+    Returns:
+        (矩阵, 分类索引, 日期索引)
+    """
+    # 优先使用解析时预先计算的日序号
+    if DAY_KEY in df.columns:
+        ordinals = df[DAY_KEY].to_numpy(dtype=np.int64)
+    else:
+        ordinals = df[TIME_COL].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    first = int(ordinals.min())
+    day_idx = ordinals - first
+    n_days = int(day_idx.max()) + 1
+    start = day_index_to_datetime([first])[0]
+
+    if CATEGORY_COL in df.columns:
+        cat_codes, categories = pd.factorize(df[CATEGORY_COL].fillna('其他'), sort=True)
+        categories = pd.Index(categories)
+    else:
+        cat_codes = np.zeros(len(df), dtype=np.int64)
+        categories = pd.Index(['全部'])
+
+    flat = cat_codes * n_days + day_idx
+    totals = np.bincount(flat, weights=df[AMOUNT_COL].to_numpy(dtype=float),
+                         minlength=len(categories) * n_days)
+    matrix = totals.reshape(len(categories), n_days)
+    return matrix, categories, pd.date_range(start, periods=n_days, freq='D')
+
+
+def _seasonal_naive(matrix: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray]:
+    """季节性朴素模型：用上一周同一天的值作为预测，返回 (预测, 一步残差)"""
+    n_days = matrix.shape[1]
+    if n_days <= SEASON:
+        last = matrix[:, -1:]
+        residuals = np.diff(matrix, axis=1) if n_days > 1 else np.zeros_like(matrix)
+        return np.repeat(last, horizon, axis=1), residuals
+    last_season = matrix[:, -SEASON:]
+    reps = int(np.ceil(horizon / SEASON))
+    forecast = np.tile(last_season, reps)[:, :horizon]
+    residuals = matrix[:, SEASON:] - matrix[:, :-SEASON]
+    return forecast, residuals
+
+
+def _exponential_smoothing(
+    matrix: np.ndarray,
+    alphas: Sequence[float],
+    keep: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    简单指数平滑：对所有分类和所有候选 alpha 同时递推，按一步误差平方和为每个分类选择 alpha
+
+    Args:
+        matrix: 分类 × 日期 矩阵
+        alphas: 候选平滑系数
+        keep: 保留最近多少天的一步残差
+
+    Returns:
+        (每个分类的最终水平, 最近 keep 天的一步残差, 选中的 alpha)
+    """
+    n_cats, n_days = matrix.shape
+    alpha = np.asarray(alphas, dtype=float)[:, None]
+    level = np.repeat(matrix[None, :, 0], len(alphas), axis=0)
+    sse = np.zeros((len(alphas), n_cats))
+    keep = min(keep, n_days - 1)
+    recent = np.empty((len(alphas), n_cats, keep))
+    for t in range(1, n_days):
+        error = matrix[None, :, t] - level
+        sse += error ** 2
+        slot = t - (n_days - keep)
+        if slot >= 0:
+            recent[:, :, slot] = error
+        level = level + alpha * error
+
+    best = np.argmin(sse, axis=0)
+    rows = np.arange(n_cats)
+    return level[best, rows], recent[best, rows], alpha[best, 0]
+
+
+def forecast_month_end(
+    df: pd.DataFrame,
+    level: float = 0.8,
+    eval_days: int = 56
+) -> Optional[MonthEndForecast]:
+    """
+    预测数据中最后一个月的月末支出
+
+    Args:
+        df: 交易明细（收入会被忽略）
+        level: 预测区间置信水平（0.8 / 0.9 / 0.95）
+        eval_days: 用于模型选择和残差估计的最近天数
+
+    Returns:
+        MonthEndForecast，没有支出数据时返回 None
+    """
+    if df is None or df.empty or TIME_COL not in df.columns or AMOUNT_COL not in df.columns:
+        return None
+
+    expense = df[df[TIME_COL].notna()]
+    for col in TYPE_COLS:
+        if col in expense.columns:
+            expense = expense[expense[col] == '支出']
+            break
+    if expense.empty:
+        return None
+
+    matrix, categories, dates = build_daily_matrix(expense)
+    as_of = dates[-1]
+    month_start = as_of.replace(day=1)
+    remaining = int(as_of.days_in_month - as_of.day)
+    horizon = max(remaining, 1)
+
+    # 批量拟合两个模型，按最近 eval_days 的一步误差为每个分类选择模型
+    naive_fc, naive_res = _seasonal_naive(matrix, horizon)
+    ses_level, ses_res, ses_alpha = _exponential_smoothing(matrix, ALPHAS, eval_days)
+    ses_fc = np.repeat(ses_level[:, None], horizon, axis=1)
+
+    def recent_mae(res: np.ndarray) -> np.ndarray:
+        if res.shape[1] == 0:
+            return np.full(res.shape[0], np.inf)
+        return np.mean(np.abs(res[:, -eval_days:]), axis=1)
+
+    use_ses = recent_mae(ses_res) <= recent_mae(naive_res)
+    daily_fc = np.where(use_ses[:, None], ses_fc, naive_fc)[:, :remaining]
+    daily_fc = np.clip(daily_fc, 0, None)
+
+    # 用所选模型最近的一步残差估计日波动
+    naive_tail = naive_res[:, -eval_days:]
+    ses_tail = ses_res[:, -eval_days:]
+    width = min(naive_tail.shape[1], ses_tail.shape[1])
+    if width:
+        res = np.where(use_ses[:, None], ses_tail[:, -width:], naive_tail[:, -width:])
+        sigma = np.std(res, axis=1)
+    else:
+        sigma = np.zeros(len(categories))
+
+    so_far = matrix[:, dates >= month_start].sum(axis=1)
+    remaining_fc = daily_fc.sum(axis=1)
+    projected = so_far + remaining_fc
+    z = Z_SCORES.get(level, 1.2816)
+    half_width = z * sigma * np.sqrt(remaining)
+    lower = np.maximum(projected - half_width, so_far)
+    upper = projected + half_width
+
+    models = np.where(use_ses, [f"指数平滑(α={a:g})" for a in ses_alpha], "季节性朴素")
+    table = pd.DataFrame({
+        '分类': categories.astype(str),
+        '本月已支出': so_far,
+        '预测剩余': remaining_fc,
+        '预测月末': projected,
+        '下限': lower,
+        '上限': upper,
+        '模型': models,
+    })
+    table = table.sort_values('预测月末', ascending=False, kind='stable').reset_index(drop=True)
+
+    total_half = z * np.sqrt(np.sum(sigma ** 2) * remaining)
+    total_projected = float(projected.sum())
+    total_so_far = float(so_far.sum())
+    table.loc[len(table)] = {
+        '分类': '合计',
+        '本月已支出': total_so_far,
+        '预测剩余': float(remaining_fc.sum()),
+        '预测月末': total_projected,
+        '下限': max(total_projected - total_half, total_so_far),
+        '上限': total_projected + total_half,
+        '模型': '',
+    }
+    numeric = FORECAST_COLUMNS[1:-1]
+    table[numeric] = table[numeric].astype(float).round(2)
+
+    month = f"{as_of.year}-{as_of.month:02d}"
+    logger.info(f"{month} 月末支出预测: {total_projected:.2f} 元（{len(categories)} 个分类，剩余 {remaining} 天）")
+    return MonthEndForecast(month=month, as_of=as_of, remaining_days=remaining, table=table[FORECAST_COLUMNS])
@@ -0,0 +1,252 @@
+"""
+消费洞察模块
+把支出按 分类 / 商户 / 时段 汇总为月度聚合表，在聚合表上一次性计算最新月份的环比和同比变化，
+按相对于各对象历史波动的显著程度排序，生成简短的洞察语句（如 “2024-06 餐饮类支出比上月增加 30%”）。
+明细只在汇总时扫描一次，之后的计算量只与 对象数 × 月份数 有关，多年数据也能在亚秒内完成
+"""
+import html
+import json
+import os
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from utils import HOUR_KEY, MISSING_TIME_KEY, MONTH_KEY, ensure_time_keys, month_labels
+
+
+AMOUNT_COL = '金额(元)'
+MERCHANT_COL = '交易对方'
+CATEGORY_COL = '分类'
+TYPE_COLS = ['收/支/其他', '收/支']
+
+TOTAL_DIM = '总计'
+CATEGORY_DIM = '分类'
+MERCHANT_DIM = '商户'
+HOUR_DIM = '时段'
+
+# 时段划分：按小时的分界点和对应的名称
+HOUR_EDGES = [6, 11, 14, 18]
+HOUR_BUCKETS = ['凌晨 (0-6点)', '上午 (6-11点)', '中午 (11-14点)', '下午 (14-18点)', '晚上 (18-24点)']
+
+# MAD 换算为标准差的系数
+MAD_SCALE = 1.4826
+# 计算历史波动使用的月数
+HISTORY_MONTHS = 12
+
+MONTHLY_COLUMNS = ['维度', '对象', MONTH_KEY, AMOUNT_COL, '笔数']
+
+
+@dataclass
+class Insight:
+    """
+    一条消费洞察
+
+    Attributes:
+        kind: 对比方式（环比 / 同比）
+        dimension: 维度（总计 / 分类 / 商户 / 时段）
+        subject: 对象名称
+        month: 最新月份（YYYY-MM）
+        current: 本期支出
+        previous: 对比期支出
+        change: 变化比例（对比期为 0 时为 None）
+        score: 显著程度（变化额 / 该对象历史月度波动）
+        text: 洞察语句
+    """
+    kind: str
+    dimension: str
+    subject: str
+    month: str
+    current: float
+    previous: float
+    change: Optional[float]
+    score: float
+    text: str
+
+
+def _hour_bucket(hours: np.ndarray) -> np.ndarray:
+    labels = np.array(HOUR_BUCKETS, dtype=object)
+    return labels[np.digitize(hours, HOUR_EDGES)]
+
+
+def compute_monthly_aggregates(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    把支出明细汇总为 (维度, 对象, 月序号) 的月度聚合表
+
+    Args:
+        df: 交易数据（需包含交易时间和金额列；分类、交易对方列可选）
+
+    Returns:
+        列为 维度 / 对象 / 月序号 / 金额(元) / 笔数 的长表
+    """
+    if df is None or df.empty or AMOUNT_COL not in df.columns:
+        return pd.DataFrame(columns=MONTHLY_COLUMNS)
+    df = ensure_time_keys(df)
+    if MONTH_KEY not in df.columns:
+        return pd.DataFrame(columns=MONTHLY_COLUMNS)
+
+    type_col = next((col for col in TYPE_COLS if col in df.columns), None)
+    mask = df[MONTH_KEY].to_numpy() != MISSING_TIME_KEY
+    if type_col is not None:
+        mask &= (df[type_col] == '支出').to_numpy()
+    expense = df.loc[mask]
+    if expense.empty:
+        return pd.DataFrame(columns=MONTHLY_COLUMNS)
+
+    month = expense[MONTH_KEY].astype(np.int64)
+    amount = expense[AMOUNT_COL].astype(float)
+    keys = [(TOTAL_DIM, pd.Series(TOTAL_DIM, index=expense.index))]
+    if CATEGORY_COL in expense.columns:
+        keys.append((CATEGORY_DIM, expense[CATEGORY_COL]))
+    if MERCHANT_COL in expense.columns:
+        keys.append((MERCHANT_DIM, expense[MERCHANT_COL]))
+    if HOUR_KEY in expense.columns:
+        keys.append((HOUR_DIM, pd.Series(_hour_bucket(expense[HOUR_KEY].to_numpy()), index=expense.index)))
+
+    parts = []
+    for dim, key in keys:
+        grouped = amount.groupby([key.rename('对象'), month.rename(MONTH_KEY)]).agg(['sum', 'size'])
+        part = grouped.reset_index().rename(columns={'sum': AMOUNT_COL, 'size': '笔数'})
+        part.insert(0, '维度', dim)
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)[MONTHLY_COLUMNS]
+
+
+def _describe(kind: str, dim: str, subject: str, month: str, current: float, previous: float) -> str:
+    """生成一条洞察语句"""
+    period = '上月' if kind == '环比' else '去年同月'
+    if dim == TOTAL_DIM:
+        target = '总支出'
+    elif dim == CATEGORY_DIM:
+        target = f'「{subject}」类支出'
+    elif dim == MERCHANT_DIM:
+        target = f'在「{subject}」的支出'
+    else:
+        target = f'{subject}时段的支出'
+    if previous <= 0:
+        return f"{month} {target} {current:.2f} 元，{period}没有此项支出"
+    delta = current - previous
+    verb = '增加' if delta > 0 else '减少'
+    return (f"{month} {target} {current:.2f} 元，比{period}{verb} {abs(delta) / previous:.0%}"
+            f"（{'+' if delta > 0 else '-'}{abs(delta):.2f} 元）")
+
+
+def generate_insights(
+    monthly: pd.DataFrame,
+    top_n: int = 5,
+    min_amount: float = 50.0,
+    min_change: float = 0.2
+) -> List[Insight]:
+    """
+    在月度聚合表上计算最新月份的环比 / 同比变化，返回最显著的若干条洞察
+
+    所有对象的变化一次性在 对象 × 月份 的宽表上计算：显著程度为变化额除以该对象
+    最近 HISTORY_MONTHS 个月支出的稳健波动（MAD，至少为对比期金额的 10% 且不低于 1 元）。
+
+    Args:
+        monthly: compute_monthly_aggregates 的结果
+        top_n: 返回的洞察条数
+        min_amount: 变化额低于该值的不报告
+        min_change: 变化比例低于该值的不报告
+
+    Returns:
+        按显著程度降序排列的洞察
+    """
+    if monthly is None or monthly.empty:
+        return []
+    wide = monthly.pivot_table(index=['维度', '对象'], columns=MONTH_KEY, values=AMOUNT_COL,
+                               aggfunc='sum', fill_value=0.0)
+    latest = int(wide.columns.max())
+    first = max(int(wide.columns.min()), latest - HISTORY_MONTHS)
+    wide = wide.reindex(columns=range(first, latest + 1), fill_value=0.0)
+    current = wide[latest].to_numpy()
+    month = month_labels([latest])[0]
+
+    # 历史波动：对比期之前（不含最新月）的月度支出
+    history = wide.drop(columns=latest).to_numpy()
+    if history.shape[1]:
+        median = np.median(history, axis=1)
+        mad = np.median(np.abs(history - median[:, None]), axis=1)
+    else:
+        median = mad = np.zeros(len(wide))
+
+    candidates = []
+    for kind, offset in (('环比', 1), ('同比', 12)):
+        if latest - offset not in wide.columns:
+            continue
+        previous = wide[latest - offset].to_numpy()
+        delta = current - previous
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = np.where(previous > 0, delta / previous, np.inf)
+        scale = np.maximum.reduce([MAD_SCALE * mad, 0.1 * previous, np.ones_like(previous)])
+        score = np.abs(delta) / scale
+        notable = (np.abs(delta) >= min_amount) & (np.abs(change) >= min_change)
+        for i in np.flatnonzero(notable):
+            dim, subject = wide.index[i]
+            candidates.append(Insight(
+                kind=kind,
+                dimension=dim,
+                subject=str(subject),
+                month=month,
+                current=round(float(current[i]), 2),
+                previous=round(float(previous[i]), 2),
+                change=round(float(change[i]), 4) if np.isfinite(change[i]) else None,
+                score=round(float(score[i]), 2),
+                text=_describe(kind, dim, str(subject), month, float(current[i]), float(previous[i])),
+            ))
+
+    # 同一对象的环比和同比只保留更显著的一条
+    candidates.sort(key=lambda item: item.score, reverse=True)
+    seen = set()
+    ranked = []
+    for item in candidates:
+        key = (item.dimension, item.subject)
+        if key not in seen:
+            seen.add(key)
+            ranked.append(item)
+        if len(ranked) >= top_n:
+            break
+    logger.info(f"{month} 消费洞察: 候选 {len(candidates)} 条，输出 {len(ranked)} 条")
+    return ranked
+
+
+def compute_insights(df: pd.DataFrame, **kwargs) -> List[Insight]:
+    """
+    从交易明细生成洞察（先汇总为月度聚合表，见 compute_monthly_aggregates）
+
+    Args:
+        df: 交易数据
+        **kwargs: 传递给 generate_insights 的参数
+
+    Returns:
+        洞察列表
+    """
+    return generate_insights(compute_monthly_aggregates(df), **kwargs)
+
+
+def insights_html(insights: List[Insight]) -> str:
+    """把洞察渲染为报表顶部的 HTML 列表（没有洞察时返回空字符串）"""
+    if not insights:
+        return ''
+    items = ''.join(f'<li>{html.escape(item.text)}</li>' for item in insights)
+    return f'<div class="insights"><h2>💡 消费洞察</h2><ol>{items}</ol></div>'
+
+
+def write_insights_json(insights: List[Insight], path: str) -> None:
+    """
+    把洞察写入 JSON 文件（先写临时文件再原子替换）
+
+    Args:
+        insights: 洞察列表
+        path: 输出路径
+    """
+    payload = {
+        'month': insights[0].month if insights else None,
+        'insights': [asdict(item) for item in insights],
+    }
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
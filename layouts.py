@@ -0,0 +1,184 @@
+"""
+账单版式注册表
+每种账单模板声明第一页上的廉价指纹（发行方字样、表头列名）和到标准列名的映射。
+解析时只读取第一页文字识别版式，再按该版式的表头学习列边界、映射列名和收支方向，
+混合批次中的每个文件都不需要逐个模板试解析
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# 标准列名（与微信账单一致，下游的分类、校验和报表都基于这些列）
+TIME_COL = '交易时间'
+AMOUNT_COL = '金额(元)'
+TYPE_COL = '收/支/其他'
+
+# 收支方向的确定方式
+DIRECTION_COLUMN = 'column'            # 账单自带收/支列，金额为正
+DIRECTION_SIGNED = 'signed'            # 金额带符号，负数为支出（借记卡流水）
+DIRECTION_CHARGE = 'charge'            # 金额带符号，正数为消费、负数为还款或退款（信用卡账单）
+DIRECTIONS = (DIRECTION_COLUMN, DIRECTION_SIGNED, DIRECTION_CHARGE)
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+@dataclass(frozen=True)
+class StatementLayout:
+    """
+    一种账单模板
+
+    Attributes:
+        name: 版式标识
+        title: 展示名称
+        headers: 表头中必须出现的列名（第一个为交易时间列，用于定位表头行）
+        issuers: 第一页上的发行方字样（任一出现即加分，用于区分表头相近的模板）
+        column_map: 原始列名 -> 标准列名（未列出的列保持原名）
+        direction: 收支方向的确定方式（见 DIRECTIONS）
+        time_format: 交易时间的格式（默认自动推断）
+    """
+    name: str
+    title: str
+    headers: Tuple[str, ...]
+    issuers: Tuple[str, ...] = ()
+    column_map: Dict[str, str] = field(default_factory=dict)
+    direction: str = DIRECTION_COLUMN
+    time_format: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.headers:
+            raise ValueError(f"版式 {self.name} 至少需要一个表头列名")
+        if self.direction not in DIRECTIONS:
+            raise ValueError(f"版式 {self.name} 的收支方向未知: {self.direction}")
+
+    @property
+    def time_column(self) -> str:
+        """原始表头中的交易时间列"""
+        return self.headers[0]
+
+    def score(self, text: str) -> Optional[Tuple[int, int]]:
+        """
+        计算与第一页文字的匹配程度
+
+        Args:
+            text: 去掉空白后的第一页文字
+
+        Returns:
+            (命中的发行方字样数, 表头列名数)，表头不全时返回 None
+        """
+        if any(header not in text for header in self.headers):
+            return None
+        return sum(1 for issuer in self.issuers if issuer in text), len(self.headers)
+
+    def rename(self, df: pd.DataFrame) -> pd.DataFrame:
+        """把原始列名映射为标准列名"""
+        mapping = {src: dst for src, dst in self.column_map.items() if src in df.columns and dst not in df.columns}
+        return df.rename(columns=mapping) if mapping else df
+
+    def apply_direction(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        根据带符号的金额补充收/支列并把金额转为正数（金额列已清洗为浮点数）
+
+        Args:
+            df: 已映射列名的交易数据
+
+        Returns:
+            处理后的 df（原地修改并返回）
+        """
+        if self.direction == DIRECTION_COLUMN or AMOUNT_COL not in df.columns:
+            return df
+        amount = df[AMOUNT_COL].to_numpy(dtype=float)
+        expense = amount < 0 if self.direction == DIRECTION_SIGNED else amount > 0
+        if TYPE_COL not in df.columns:
+            df[TYPE_COL] = np.where(expense, '支出', np.where(amount == 0, '其他', '收入'))
+        df[AMOUNT_COL] = np.abs(amount)
+        return df
+
+
+_REGISTRY: Dict[str, StatementLayout] = {}
+
+
+def register_layout(layout: StatementLayout) -> StatementLayout:
+    """
+    注册账单版式（同名版式会被替换）
+
+    Args:
+        layout: 版式
+
+    Returns:
+        传入的版式
+    """
+    _REGISTRY[layout.name] = layout
+    return layout
+
+
+def registered_layouts() -> List[StatementLayout]:
+    """返回已注册的全部版式"""
+    return list(_REGISTRY.values())
+
+
+def get_layout(name: str) -> StatementLayout:
+    """按名称获取版式"""
+    try:
+        return _REGISTRY[name]
+    except KeyError:
+        raise ValueError(f"未知的账单版式: {name}（可选 {', '.join(_REGISTRY)}）")
+
+
+def detect_layout(text: str) -> Optional[StatementLayout]:
+    """
+    根据第一页文字识别账单版式
+
+    表头列名全部出现的版式中，命中发行方字样多的优先，其次是表头列名多（更具体）的。
+
+    Args:
+        text: 第一页文字
+
+    Returns:
+        识别到的版式，都不匹配时返回 None
+    """
+    compact = _SPACE_RE.sub('', text or '')
+    best, best_score = None, None
+    for layout in _REGISTRY.values():
+        score = layout.score(compact)
+        if score is not None and (best_score is None or score > best_score):
+            best, best_score = layout, score
+    return best
+
+
+WECHAT = register_layout(StatementLayout(
+    name='wechat',
+    title='微信支付',
+    headers=(TIME_COL, AMOUNT_COL),
+    issuers=('微信支付', '财付通'),
+))
+
+BANK_DEBIT = register_layout(StatementLayout(
+    name='bank_debit',
+    title='银行借记卡',
+    headers=('交易日期', '交易金额', '账户余额'),
+    issuers=('银行', '借记卡', '账户交易明细'),
+    column_map={
+        '交易日期': TIME_COL,
+        '交易金额': AMOUNT_COL,
+        '对方户名': '交易对方',
+        '交易摘要': '交易类型',
+    },
+    direction=DIRECTION_SIGNED,
+))
+
+CREDIT_CARD = register_layout(StatementLayout(
+    name='credit_card',
+    title='信用卡',
+    headers=('交易日', '记账日', '人民币金额'),
+    issuers=('信用卡',),
+    column_map={
+        '交易日': TIME_COL,
+        '人民币金额': AMOUNT_COL,
+        '交易摘要': '交易对方',
+    },
+    direction=DIRECTION_CHARGE,
+))
@@ -1,27 +1,211 @@
 """
 日志配置模块
 统一的日志配置和工具函数
+
+日志记录器只挂一个 QueueHandler：调用方只把记录放入队列，格式化和写控制台 / 文件由
+后台 QueueListener 线程完成，热路径不再争用处理器的锁。队列是 multiprocessing 队列，
+进程池中的子进程（fork 继承，或通过 worker_initializer 配置）写入同一个队列，由主进程统一输出。
+
+环境变量:
+    BILL_HUB_LOG_LEVEL   日志级别（默认 INFO）
+    BILL_HUB_LOG_FORMAT  text（默认）或 json（每行一个 JSON 对象，包含 file / stage / page 等字段）
+    BILL_HUB_LOG_FILE    日志文件路径（可选）
 """
+import atexit
+import contextlib
+import contextvars
+import json
 import logging
+import logging.handlers
+import multiprocessing
 import os
-from typing import Optional
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+ENV_LOG_LEVEL = 'BILL_HUB_LOG_LEVEL'
+ENV_LOG_FORMAT = 'BILL_HUB_LOG_FORMAT'
+ENV_LOG_FILE = 'BILL_HUB_LOG_FILE'
+LOG_FORMATS = ('text', 'json')
+
+# 通过 log_context 或 extra 附加到日志记录上的结构化字段
+CONTEXT_FIELDS = ('file', 'stage', 'page')
+# 同一位置的 DEBUG 日志每个时间窗口内最多输出的条数（如逐页日志）
+DEBUG_BURST = 5
+DEBUG_INTERVAL = 1.0
+
+_context: contextvars.ContextVar[Dict[str, Any]] = contextvars.ContextVar('bill_hub_log_context', default={})
+# 日志记录器名称 -> (队列, 监听器, 创建监听器的进程号)
+_sinks: Dict[str, tuple] = {}
+# 终端中正在显示的进度条（见 progress.ProgressService），输出其他内容前先清除、输出后重绘
+_console_hook = None
+
+
+def set_console_hook(hook) -> None:
+    """注册终端进度条（需提供 clear() 和 draw()），传入 None 取消"""
+    global _console_hook
+    _console_hook = hook
+
+
+@contextlib.contextmanager
+def _around_console_hook() -> Iterator[None]:
+    hook = _console_hook
+    if hook is not None:
+        hook.clear()
+    try:
+        yield
+    finally:
+        if hook is not None:
+            hook.draw()
+
+
+@contextlib.contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """
+    在代码块内为日志附加结构化字段（如 file、stage），可嵌套
+
+    用法:
+        with log_context(file='a.pdf', stage='parse'):
+            logger.info("开始解析")
+    """
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def call_with_context(fields: Dict[str, Any], func: Callable[[Any], Any], item: Any) -> Any:
+    """在 log_context(**fields) 中调用 func(item)（可 pickle，供线程池 / 进程池使用）"""
+    with log_context(**fields):
+        return func(item)
+
+
+class ContextFilter(logging.Filter):
+    """把当前 log_context 中的字段写入日志记录（extra 中已提供的字段优先）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    限制同一代码位置的 DEBUG 日志频率（逐页日志在大文件上会刷屏并拖慢解析）
+
+    每个位置在 interval 秒内最多放行 burst 条，其余丢弃并计数，
+    下一条放行的日志末尾注明省略的条数。INFO 及以上级别不受限制。
+    """
+
+    def __init__(self, burst: int = DEBUG_BURST, interval: float = DEBUG_INTERVAL):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.setdefault(key, [now, 0, 0])  # 窗口开始时间、已放行、已省略
+            if now - window[0] >= self.interval:
+                window[0], window[1] = now, 0
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            suppressed, window[2] = window[2], 0
+        if suppressed:
+            record.msg = f"{record.getMessage()}（已省略 {suppressed} 条同类日志）"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式：每条日志一行 JSON，便于按文件 / 阶段检索和聚合"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%d %H:%M:%S'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.processName if record.processName != 'MainProcess' else record.process,
+            'message': record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """控制台处理器：输出日志前后清除并重绘进度条，避免与进度条混在同一行"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        with _around_console_hook():
+            super().emit(record)
+
+
+class _ConsoleFilter(logging.Filter):
+    """控制台处理器跳过已由 ConsoleReporter 打印过的记录，避免同一条信息显示两次"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return not getattr(record, 'reported', False)
+
+
+def _make_formatter(fmt: str) -> logging.Formatter:
+    if fmt == 'json':
+        return JsonFormatter()
+    return logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+
+def _make_queue_handler(queue) -> logging.Handler:
+    handler = logging.handlers.QueueHandler(queue)
+    handler.addFilter(RateLimitFilter())
+    handler.addFilter(ContextFilter())
+    return handler
+
 
 def setup_logger(
     name: str = "bill-hub",
-    level: int = logging.INFO,
-    log_file: Optional[str] = None
+    level: Optional[int] = None,
+    log_file: Optional[str] = None,
+    fmt: Optional[str] = None
 ) -> logging.Logger:
     """
-    配置并返回日志记录器
+    配置并返回日志记录器（异步输出）
 
     Args:
         name: 日志记录器名称
-        level: 日志级别 (默认: INFO)
-        log_file: 日志文件路径（可选）
+        level: 日志级别 (默认: BILL_HUB_LOG_LEVEL 或 INFO)
+        log_file: 日志文件路径（默认: BILL_HUB_LOG_FILE，可选）
+        fmt: 输出格式 text / json（默认: BILL_HUB_LOG_FORMAT 或 text）
 
     Returns:
         配置好的 Logger 实例
     """
+    if level is None:
+        level = logging.getLevelName(os.environ.get(ENV_LOG_LEVEL, 'INFO').upper())
+        level = level if isinstance(level, int) else logging.INFO
+    log_file = log_file or os.environ.get(ENV_LOG_FILE) or None
+    fmt = (fmt or os.environ.get(ENV_LOG_FORMAT) or 'text').lower()
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"未知的日志格式: {fmt}（可选 {', '.join(LOG_FORMATS)}）")
+
     logger = logging.getLogger(name)
     logger.setLevel(level)
 
@@ -29,35 +213,114 @@ def setup_logger(
     if logger.handlers:
         return logger
 
-    # 清除现有的处理器
-    logger.handlers.clear()
-
-    # 创建格式化器
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
+    formatter = _make_formatter(fmt)
+    handlers = []
 
     # 控制台处理器
-    console_handler = logging.StreamHandler()
+    console_handler = _ConsoleHandler()
     console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    console_handler.addFilter(_ConsoleFilter())
+    handlers.append(console_handler)
 
     # 文件处理器（可选）
     if log_file:
         # 确保日志目录存在
         log_dir = os.path.dirname(log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
 
         file_handler = logging.FileHandler(log_file, encoding='utf-8')
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
 
+    queue = multiprocessing.Queue(-1)
+    listener = logging.handlers.QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _sinks[name] = (queue, listener, os.getpid())
+    # atexit 按注册的逆序执行：在创建队列（导入 multiprocessing.util 并注册其退出清理）之后注册，
+    # 保证先取完队列中的日志、停止监听线程，再由 multiprocessing 关闭队列
+    atexit.register(shutdown_logging, name)
+    logger.addHandler(_make_queue_handler(queue))
     return logger
 
 
+def log_queue(name: str = "bill-hub"):
+    """返回日志记录器的队列（传给 worker_initializer，用于 spawn 方式启动的子进程）"""
+    return _sinks[name][0] if name in _sinks else None
+
+
+def worker_initializer(queue, name: str = "bill-hub", level: int = logging.INFO) -> None:
+    """
+    子进程初始化：把日志写入主进程的队列
+
+    fork 启动的子进程会继承队列，无需调用；spawn 启动时作为进程池的 initializer 使用。
+    """
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    logger.handlers.clear()
+    if queue is not None:
+        logger.addHandler(_make_queue_handler(queue))
+
+
+def shutdown_logging(name: Optional[str] = None) -> None:
+    """输出队列中剩余的日志并停止后台线程（程序退出时自动调用）"""
+    for key in [name] if name else list(_sinks):
+        if key not in _sinks:
+            continue
+        queue, listener, owner = _sinks[key]
+        # fork 出的子进程也持有监听器的副本，只有创建它的进程才能停止（否则会向共享队列发送结束标记）
+        if owner != os.getpid():
+            continue
+        del _sinks[key]
+        # 先摘下 QueueHandler，结束标记之后不会再有本进程的记录进入队列
+        logging.getLogger(key).handlers.clear()
+        listener.stop()
+        # 监听线程已处理完结束标记之前的所有记录，缓冲区中不会再有需要写出的数据；
+        # 不等待写入线程，避免管道已满且无人读取时在退出阶段阻塞
+        queue.close()
+        queue.cancel_join_thread()
+
+
+class ConsoleReporter:
+    """
+    面向用户的进度提示：打印到标准输出，同时写入日志
+
+    写入日志的记录带有 reported 标记，控制台日志处理器不再重复显示，文件 / JSON 日志照常记录。
+    """
+
+    def __init__(self, logger: logging.Logger, stream=None):
+        """
+        Args:
+            logger: 同时写入的日志记录器
+            stream: 输出流（默认当前的 sys.stdout）
+        """
+        self.logger = logger
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def _emit(self, level: int, message: str, indent: bool) -> None:
+        text = message.strip()
+        if text:
+            self.logger.log(level, text, extra={'reported': True}, stacklevel=3)
+        with self._lock, _around_console_hook():
+            stream = self.stream or sys.stdout
+            stream.write(("  " if indent else "") + message + "\n")
+            stream.flush()
+
+    def info(self, message: str, indent: bool = True) -> None:
+        """打印提示（indent 为 True 时缩进两格，作为上一个标题下的条目）"""
+        self._emit(logging.INFO, message, indent)
+
+    def warning(self, message: str, indent: bool = True) -> None:
+        self._emit(logging.WARNING, message, indent)
+
+    def error(self, message: str, indent: bool = True) -> None:
+        self._emit(logging.ERROR, message, indent)
+
+
 # 创建默认日志记录器
-logger = setup_logger()
\ No newline at end of file
+logger = setup_logger()
+# 面向用户的终端输出
+console = ConsoleReporter(logger)
@@ -2,19 +2,44 @@
 微信支付账单批处理解析器主程序
 支持 ZIP 压缩包和独立 PDF 文件的批量处理
 """
+import itertools
 import os
 import sys
-from typing import Optional, List
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
-from logger_config import logger
-from utils import extract_zip, parse_pdf_to_df, validate_transaction_data
-from visualize import generate_visualizations
+from anomaly import ALERT_COLUMNS, AnomalyDetector, detect_spending_anomalies
+from budget import get_default_tracker
+from bundle import ArtifactPackager, packager_from_env
+from categorize import assign_categories
+from distributed import ENV_LOCAL_WORKERS, ENV_QUEUE, run_coordinator
+from logger_config import console, logger
+from memory import FrameSpool, MemoryMonitor, memory_budget
+from merchants import canonicalize_merchants
+from password_provider import ENV_PASSWORD, PasswordProvider, file_fingerprint
+from pipeline import Pipeline, Stage, parse_concurrency
+from progress import ProgressService
+from receipts import import_receipts, is_receipt_image
+from utils import (
+    TIME_KEY_COLUMNS, artifact_is_fresh, data_fingerprint, default_checkpoint_dir, extract_zip, parse_pdf_to_df,
+    record_artifact_fingerprint, remove_artifact, stream_fingerprint
+)
+from validation import TransactionValidator, validate_transactions
+from visualize import export_report_png, generate_visualizations
+from writers import ExcelStreamWriter
+
+# 各阶段并发数配置，如 "parse=2,render=2"
+ENV_PIPELINE = 'BILL_HUB_PIPELINE'
+# 小票图片的输出文件名（不含扩展名）
+RECEIPTS_BASE = 'receipts'
+# 溢写后汇总报表只读取的列（宽文本列如单号、备注只进入汇总 Excel）
+REPORT_COLUMNS = ['交易时间', '金额(元)', '收/支/其他', '收/支', '交易对方', '分类'] + TIME_KEY_COLUMNS
 
 
 def main() -> None:
     """主函数：处理账单文件并生成可视化报告"""
-    print("=== 微信支付账单批处理解析器 ===")
+    console.info("=== 微信支付账单批处理解析器 ===", indent=False)
 
     input_dir = 'input'
     output_dir = 'output'
@@ -23,9 +48,7 @@ def main() -> None:
     # 确保目录存在
     if not os.path.exists(input_dir):
         os.makedirs(input_dir)
-        msg = f"提示: 已创建 {input_dir} 目录，请将 ZIP 或 PDF 文件放入其中后再次运行。"
-        logger.info(msg)
-        print(msg)
+        console.info(f"提示: 已创建 {input_dir} 目录，请将 ZIP 或 PDF 文件放入其中后再次运行。", indent=False)
         return
 
     if not os.path.exists(output_dir):
@@ -35,126 +58,281 @@ def main() -> None:
     # 扫描 input 目录
     zip_files = sorted([f for f in os.listdir(input_dir) if f.lower().endswith('.zip')])
     pdf_files = sorted([f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')])
+    image_files = sorted([f for f in os.listdir(input_dir) if is_receipt_image(f)])
 
-    if not zip_files and not pdf_files:
-        msg = f"错误: 在 {input_dir} 目录中未找到 .zip 或 .pdf 文件"
-        logger.error(msg)
-        print(msg)
+    if not zip_files and not pdf_files and not image_files:
+        console.error(f"错误: 在 {input_dir} 目录中未找到 .zip、.pdf 文件或小票图片", indent=False)
         return
 
-    logger.info(f"找到 {len(zip_files)} 个 ZIP 文件和 {len(pdf_files)} 个 PDF 文件")
-
-    # 用于存放所有解析出的数据
-    all_dfs: List[pd.DataFrame] = []
-    # 记录通用密码
-    common_password: Optional[str] = None
-
-    # 处理 ZIP 文件
-    for zip_file in zip_files:
-        zip_path = os.path.join(input_dir, zip_file)
-        logger.info(f"[处理压缩包] {zip_file}")
-        print(f"\n[处理压缩包] {zip_file}")
-
-        password = common_password
-        retry_count = 0
-        while retry_count < 3:
-            if not password:
-                # 使用 getpass 获取密码（但在非交互环境会失败）
-                try:
-                    import getpass
-                    password = getpass.getpass(f"请输入解压密码: ")
-                except Exception:
-                    logger.error("无法获取密码（非交互环境）")
-                    break
-
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-
-            try:
-                extracted_files = extract_zip(zip_path, temp_dir, password)
-                common_password = password  # 更新通用密码
-
-                # 查找解压出的 PDF
-                extracted_pdfs = [f for f in extracted_files if f.lower().endswith('.pdf')]
-                if not extracted_pdfs:
-                    msg = "  警告: 压缩包内未找到 PDF 文件"
-                    logger.warning(msg)
-                    print(msg)
-
-                for pdf_path in extracted_pdfs:
-                    df = process_pdf(pdf_path, output_dir, password)
-                    if df is not None:
-                        all_dfs.append(df)
-                break  # 成功处理，跳出重试循环
-            except Exception as e:
-                logger.error(f"处理压缩包失败 {zip_file}: {e}")
-                print(f"  错误: {e}")
-                password = None  # 清空密码以便重新输入
-                retry_count += 1
-                if retry_count < 3:
-                    print(f"  请重试密码 (剩余次数: {3-retry_count})")
+    logger.info(f"找到 {len(zip_files)} 个 ZIP 文件、{len(pdf_files)} 个 PDF 文件和 {len(image_files)} 张小票图片")
+
+    # 非交互式密码来源（环境变量 / keyring 文件 / 按文件映射 / 缓存）
+    provider = PasswordProvider.from_env(input_dir)
+    interactive = sys.stdin is not None and sys.stdin.isatty()
+
+    sources = [os.path.join(input_dir, f) for f in zip_files + pdf_files]
+    images = [os.path.join(input_dir, f) for f in image_files]
+    queue_root = os.environ.get(ENV_QUEUE)
+
+    # 内存受限模式（设置 BILL_HUB_MEMORY_BUDGET）：各账单交给 FrameSpool，接近预算时溢写到磁盘
+    monitor = MemoryMonitor(memory_budget())
+    spool = FrameSpool(monitor) if monitor.enabled else None
+    # 设置 BILL_HUB_PACKAGE 时，各账单的产物生成后立即交给打包器并行压缩
+    packager = packager_from_env(output_dir)
+    try:
+        with monitor.stage('处理账单'):
+            all_dfs = _process_sources(sources, queue_root, output_dir, temp_dir, provider, interactive, spool, images,
+                                       packager)
+
+        # 清理临时目录
+        if os.path.exists(temp_dir):
+            import shutil
+            shutil.rmtree(temp_dir)
+            logger.info(f"清理临时目录: {temp_dir}")
+
+        # === 合并汇总逻辑 ===（分布式模式不导出单个文件，只输出汇总）
+        count = len(spool) if spool is not None else len(all_dfs)
+        if count > 1 or (queue_root and count):
+            with monitor.stage('合并汇总'):
+                if spool is not None:
+                    merge_and_report_spooled(spool, output_dir)
                 else:
-                    print(f"  跳过该文件。")
-
-    # 处理 input 目录直接存放的 PDF 文件
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(input_dir, pdf_file)
-        logger.info(f"[处理独立 PDF] {pdf_file}")
-        print(f"\n[处理独立 PDF] {pdf_file}")
-        df = process_pdf(pdf_path, output_dir, common_password)
-        if df is not None:
+                    merge_and_report(all_dfs, output_dir)
+            if packager is not None:
+                packager.add_artifacts(output_dir, 'merged_bill')
+    finally:
+        if packager is not None:
+            report = packager.close()
+            console.info(f"产物已打包: {report.path}（{report.members} 个文件，{report.packed_bytes / 1024:.1f} KB）",
+                         indent=False)
+        if spool is not None:
+            spool.close()
+        if monitor.enabled:
+            console.info(f"\n内存统计:\n{monitor.report(spool)}", indent=False)
+            monitor.close()
+
+    console.info("\n=== 所有任务处理完成 ===", indent=False)
+
+
+def _process_sources(
+    sources: List[str],
+    queue_root: Optional[str],
+    output_dir: str,
+    temp_dir: str,
+    provider: PasswordProvider,
+    interactive: bool,
+    spool: Optional[FrameSpool] = None,
+    images: Optional[List[str]] = None,
+    packager: Optional[ArtifactPackager] = None
+) -> List[pd.DataFrame]:
+    """
+    处理全部输入文件，返回各账单的 DataFrame（传入 spool 时账单交给 spool，返回空列表）
+
+    小票图片在账单之后作为一份 receipts 账单处理（分布式模式下也在本机识别）。
+    传入 packager 时各账单的产物生成后立即加入归档。
+    """
+    if queue_root:
+        # 分布式模式：本机作为协调者，ZIP 解压到共享的队列目录后分片交给 worker
+        pdfs = []
+        for source in sources:
+            if source.lower().endswith('.zip'):
+                pdfs.extend(extract_zip_pdfs(source, os.path.join(queue_root, 'inputs'), provider, interactive))
+            else:
+                pdfs.append((source, provider.resolve_pdf_password(source)))
+        local_workers = int(os.environ.get(ENV_LOCAL_WORKERS) or 0)
+        all_dfs = []
+        # worker 已完成自动分类、协调者已规范化商户名称，这里补上与本地 normalize 阶段相同的验证和预算累计
+        for pdf_path, df in run_coordinator(pdfs, queue_root, local_workers=local_workers):
+            _validate_bill(df, pdf_path)
+            track_budget(df, pdf_path)
             all_dfs.append(df)
+        if spool is not None:
+            for order, df in enumerate(all_dfs):
+                spool.add((order,), df)
+            all_dfs = []
+    else:
+        # 解密、解析、规范化、导出、渲染、截图分阶段并发执行
+        concurrency = parse_concurrency(os.environ.get(ENV_PIPELINE))
+        all_dfs = run_bill_pipeline(sources, output_dir, temp_dir, provider, interactive, concurrency,
+                                    spool=spool, packager=packager)
+
+    if images:
+        receipts_df = process_receipts(images, output_dir)
+        if receipts_df is not None and packager is not None:
+            packager.add_artifacts(output_dir, RECEIPTS_BASE)
+        if receipts_df is not None and spool is not None:
+            spool.add((len(sources),), receipts_df)
+        elif receipts_df is not None:
+            all_dfs.append(receipts_df)
+    return all_dfs
+
+
+def merge_and_report(all_dfs: List[pd.DataFrame], output_dir: str, merged_base: str = "merged_bill") -> pd.DataFrame:
+    """
+    合并多份账单并导出汇总 Excel、异常消费提醒和汇总报表
 
-    # 清理临时目录
-    if os.path.exists(temp_dir):
-        import shutil
-        shutil.rmtree(temp_dir)
-        logger.info(f"清理临时目录: {temp_dir}")
+    各部分按自己的输入分别记录指纹：合并数据不变时跳过汇总 Excel，异常提醒不变时跳过提醒表，
+    报表汇总数据不变时跳过 HTML 和 PNG（见 visualize.generate_visualizations）。
 
-    # === 合并汇总逻辑 ===
-    if len(all_dfs) > 1:
-        logger.info("正在生成合并汇总报告")
-        print("\n--- 正在生成合并汇总报告 ---")
-        merged_df = pd.concat(all_dfs, ignore_index=True)
+    Args:
+        all_dfs: 各账单的 DataFrame
+        output_dir: 输出目录
+        merged_base: 输出文件名（不含扩展名）
+
+    Returns:
+        按交易时间排序的合并数据
+    """
+    console.info("\n--- 正在生成合并汇总报告 ---", indent=False)
+    merged_df = pd.concat(all_dfs, ignore_index=True)
+
+    # 按交易时间排序
+    if '交易时间' in merged_df.columns:
+        merged_df.sort_values(by='交易时间', inplace=True)
+
+    # 跨文件验证（如重复的交易单号）
+    merged_report = validate_transactions(merged_df)
+    if not merged_report.is_valid:
+        logger.warning(f"汇总数据验证: {', '.join(merged_report.messages())}")
+
+    merged_xlsx = os.path.join(output_dir, f"{merged_base}.xlsx")
+    merged_html = os.path.join(output_dir, f"{merged_base}.html")
+    alerts_xlsx = os.path.join(output_dir, f"{merged_base}_alerts.xlsx")
+
+    # 异常消费检测
+    alerts = detect_spending_anomalies(merged_df)
+    if not alerts.empty:
+        console.info(f"发现 {len(alerts)} 条异常消费提醒")
+        _export_excel(alerts, alerts_xlsx)
+    elif remove_artifact(alerts_xlsx):
+        logger.info(f"没有异常消费提醒，已删除上次的提醒表: {alerts_xlsx}")
+
+    # 导出汇总 Excel
+    _export_excel(merged_df, merged_xlsx)
+
+    # 生成汇总可视化
+    try:
+        generate_visualizations(merged_df, merged_html, alerts=alerts)
+        console.info(f"汇总可视化报表已生成: {merged_html}")
+    except Exception as ev:
+        console.error(f"生成汇总报表失败: {ev}")
+
+    return merged_df
 
-        # 按交易时间排序
-        if '交易时间' in merged_df.columns:
-            merged_df.sort_values(by='交易时间', inplace=True)
 
-        merged_base = "merged_bill"
-        merged_xlsx = os.path.join(output_dir, f"{merged_base}.xlsx")
-        merged_html = os.path.join(output_dir, f"{merged_base}.html")
+def merge_and_report_spooled(spool: FrameSpool, output_dir: str, merged_base: str = "merged_bill") -> None:
+    """
+    从 FrameSpool 合并多份账单并导出汇总（内存受限模式）
+
+    没有发生溢写时与 merge_and_report 相同；发生溢写时按月份逐块读取溢写数据：
+    第一遍做跨文件验证、增量异常检测，计算汇总 Excel 的指纹并收集报表所需的窄列；
+    汇总 Excel 有变化时第二遍用 ExcelStreamWriter 逐块写出。报表只基于窄列数据生成。
 
-        # 导出汇总 Excel
+    Args:
+        spool: 收集了各账单数据的 FrameSpool
+        output_dir: 输出目录
+        merged_base: 输出文件名（不含扩展名）
+    """
+    if not spool.spilled:
+        merge_and_report(spool.frames(), output_dir, merged_base)
+        return
+
+    console.info("\n--- 正在从溢写数据生成合并汇总报告 ---", indent=False)
+    merged_xlsx = os.path.join(output_dir, f"{merged_base}.xlsx")
+    merged_html = os.path.join(output_dir, f"{merged_base}.html")
+    alerts_xlsx = os.path.join(output_dir, f"{merged_base}_alerts.xlsx")
+
+    validator = TransactionValidator()
+    detector = AnomalyDetector()
+    alert_parts = []
+    report_parts = []
+
+    def exported_chunks():
+        for chunk in spool.iter_months():
+            validator.update(chunk)
+            alert_parts.append(detector.update(chunk))
+            report_parts.append(chunk[[c for c in REPORT_COLUMNS if c in chunk.columns]])
+            yield chunk.drop(columns=TIME_KEY_COLUMNS, errors='ignore')
+
+    fingerprint = stream_fingerprint(itertools.chain(['xlsx'], exported_chunks()))
+
+    report = validator.report
+    if not report.is_valid:
+        logger.warning(f"汇总数据验证: {', '.join(report.messages())}")
+
+    alert_parts = [part for part in alert_parts if not part.empty]
+    if alert_parts:
+        alerts = pd.concat(alert_parts, ignore_index=True)
+        alerts = alerts.sort_values('偏离度', ascending=False, kind='stable').reset_index(drop=True)
+        console.info(f"发现 {len(alerts)} 条异常消费提醒")
+        _export_excel(alerts, alerts_xlsx)
+    else:
+        alerts = pd.DataFrame(columns=ALERT_COLUMNS)
+        if remove_artifact(alerts_xlsx):
+            logger.info(f"没有异常消费提醒，已删除上次的提醒表: {alerts_xlsx}")
+
+    if artifact_is_fresh(merged_xlsx, fingerprint):
+        console.info(f"内容未变化，跳过导出: {merged_xlsx}")
+    else:
         try:
-            with pd.ExcelWriter(
-                merged_xlsx,
-                engine='xlsxwriter',
-                datetime_format='yyyy-mm-dd hh:mm:ss'
-            ) as writer:
-                merged_df.to_excel(writer, index=False)
-            logger.info(f"汇总 Excel 已导出: {merged_xlsx}")
-            print(f"  汇总 Excel 已导出: {merged_xlsx}")
+            with ExcelStreamWriter(merged_xlsx) as writer:
+                for chunk in spool.iter_months():
+                    writer.write(chunk)
+            record_artifact_fingerprint(merged_xlsx, fingerprint)
+            console.info(f"成功导出: {merged_xlsx}")
         except Exception as e:
-            logger.error(f"导出汇总 Excel 失败: {e}")
-            print(f"  导出汇总 Excel 失败: {e}")
+            console.error(f"导出 Excel 失败 {merged_xlsx}: {e}")
+
+    try:
+        report_df = pd.concat(report_parts, ignore_index=True)
+        report_parts.clear()
+        generate_visualizations(report_df, merged_html, alerts=alerts)
+        console.info(f"汇总可视化报表已生成: {merged_html}")
+    except Exception as ev:
+        console.error(f"生成汇总报表失败: {ev}")
 
-        # 生成汇总可视化
-        try:
-            generate_visualizations(merged_df, merged_html)
-            logger.info(f"汇总可视化报表已生成: {merged_html}")
-            print(f"  汇总可视化报表已生成: {merged_html}")
-        except Exception as ev:
-            logger.error(f"生成汇总报表失败: {ev}")
-            print(f"  生成汇总报表失败: {ev}")
 
-    logger.info("所有任务处理完成")
-    print("\n=== 所有任务处理完成 ===")
+def process_receipts(image_paths: List[str], output_dir: str) -> Optional[pd.DataFrame]:
+    """
+    识别一批小票图片（见 receipts.import_receipts），导出为 receipts.xlsx / receipts.html
+
+    Args:
+        image_paths: 图片路径
+        output_dir: 输出目录
+
+    Returns:
+        小票交易数据，没有识别出任何小票时返回 None
+    """
+    console.info(f"\n[处理小票图片] 共 {len(image_paths)} 张", indent=False)
+    try:
+        df = import_receipts(image_paths)
+    except Exception as e:
+        console.error(f"识别小票图片失败: {e}")
+        return None
+    if df is None:
+        console.warning("没有识别出任何小票")
+        return None
+
+    report = validate_transactions(df)
+    if not report.is_valid:
+        logger.warning(f"小票数据验证失败: {', '.join(report.messages())}")
+    assign_categories(df)
+    canonicalize_merchants(df)
+    # 每张小票单独计入预算，之后新增的图片不会使已计入的小票重复累计
+    for order_id, receipt in df.groupby('交易单号', sort=False):
+        track_budget(receipt, source=order_id)
+
+    _export_excel(df, os.path.join(output_dir, f"{RECEIPTS_BASE}.xlsx"))
+    html_output_path = os.path.join(output_dir, f"{RECEIPTS_BASE}.html")
+    try:
+        generate_visualizations(df, html_output_path)
+    except Exception as ev:
+        console.error(f"生成可视化报表失败 {html_output_path}: {ev}")
+    return df
 
 
 def process_pdf(pdf_path: str, output_dir: str, password: Optional[str] = None) -> Optional[pd.DataFrame]:
     """
-    处理单个 PDF 文件
+    处理单个 PDF 文件：依次执行流水线的 parse → normalize → persist → render 阶段（含截图）
 
     Args:
         pdf_path: PDF 文件路径
@@ -165,51 +343,286 @@ def process_pdf(pdf_path: str, output_dir: str, password: Optional[str] = None)
         处理后的 DataFrame，如果失败则返回 None
     """
     try:
-        df = parse_pdf_to_df(pdf_path, password)
-
-        if df is None:
+        job = _parse_stage(BillJob((0, 0), pdf_path, password))
+        if job is None:
             return None
+        _normalize_stage(job)
+    except Exception as e:
+        console.error(f"解析 PDF 失败 {pdf_path}: {e}")
+        return None
 
-        # 验证数据有效性
-        is_valid, errors = validate_transaction_data(df)
-        if not is_valid:
-            logger.warning(f"数据验证失败 {pdf_path}: {', '.join(errors)}")
+    if not _persist_stage(job, output_dir):
+        return job.df  # 即使导出失败也返回数据
+    try:
+        _render_stage(job, output_dir, snapshot=True)
+    except Exception as ev:
+        console.error(f"生成可视化报表失败 {job.html_path}: {ev}")
+    return job.df
+
+
+def extract_zip_pdfs(
+    zip_path: str,
+    temp_dir: str,
+    provider: PasswordProvider,
+    interactive: bool = False,
+    max_retries: int = 3
+) -> List[Tuple[str, Optional[str]]]:
+    """
+    解压 ZIP 并返回其中的 PDF 及其密码，密码错误时（交互环境下）最多重试 max_retries 次
+
+    Args:
+        zip_path: ZIP 文件路径
+        temp_dir: 解压目录（每个压缩包解压到以其文件名命名的子目录）
+        provider: 密码来源
+        interactive: 是否允许通过 getpass 输入密码
+        max_retries: 最大尝试次数
 
-        base_name = os.path.splitext(os.path.basename(pdf_path))[0]
-        output_path = os.path.join(output_dir, f"{base_name}.xlsx")
+    Returns:
+        (PDF 路径, PDF 密码) 列表，失败时为空列表
+    """
+    zip_file = os.path.basename(zip_path)
+    console.info(f"\n[处理压缩包] {zip_file}", indent=False)
+    extract_dir = os.path.join(temp_dir, os.path.splitext(zip_file)[0])
+
+    password = provider.resolve_zip_password(zip_path)
+    tried: List[str] = []
+    retry_count = 0
+    while retry_count < max_retries:
+        if not password:
+            if not interactive:
+                console.error(f"未找到可用密码，跳过 {zip_file}（可通过 {ENV_PASSWORD} 或 passwords.json 提供）")
+                return []
+            import getpass
+            password = getpass.getpass(f"请输入解压密码: ")
+
+        os.makedirs(extract_dir, exist_ok=True)
 
-        # 使用 ExcelWriter 并指定日期时间格式
         try:
-            with pd.ExcelWriter(
-                output_path,
-                engine='xlsxwriter',
-                datetime_format='yyyy-mm-dd hh:mm:ss'
-            ) as writer:
-                df.to_excel(writer, index=False)
-
-            logger.info(f"成功导出: {output_path}")
-            print(f"  成功导出: {output_path}")
+            extracted_files = extract_zip(zip_path, extract_dir, password)
+            provider.remember(zip_path, password)
+
+            # 查找解压出的 PDF
+            extracted_pdfs = [f for f in extracted_files if f.lower().endswith('.pdf')]
+            if not extracted_pdfs:
+                console.warning(f"警告: 压缩包 {zip_file} 内未找到 PDF 文件")
+            return [(pdf_path, provider.resolve_pdf_password(pdf_path, extra=[password]))
+                    for pdf_path in extracted_pdfs]
         except Exception as e:
-            logger.error(f"导出 Excel 失败 {output_path}: {e}")
-            print(f"  导出 Excel 失败: {e}")
-            return df  # 即使导出失败也返回数据
+            console.error(f"处理压缩包失败 {zip_file}: {e}")
+            provider.forget(zip_path)
+            tried.append(password)
+            retry_count += 1
+            # 先换用其余候选密码，都不可用时（交互环境下）再重新输入
+            password = provider.resolve_zip_password(zip_path, exclude=tried)
+            if retry_count < max_retries and password:
+                console.info(f"改用其他候选密码重试 (剩余次数: {max_retries - retry_count})")
+            elif retry_count < max_retries and interactive:
+                console.info(f"请重试密码 (剩余次数: {max_retries - retry_count})")
+            else:
+                console.info("跳过该文件。")
+                return []
+    return []
+
+
+@dataclass
+class BillJob:
+    """流水线中流转的单个账单：order 用于按输入顺序汇总结果"""
+    order: Tuple[int, int]
+    pdf_path: str
+    password: Optional[str] = None
+    df: Optional[pd.DataFrame] = None
+    html_path: Optional[str] = None
+
+    @property
+    def base_name(self) -> str:
+        return os.path.splitext(os.path.basename(self.pdf_path))[0]
+
+
+def job_label(item) -> str:
+    """流水线条目对应的文件名（作为日志的 file 字段）：BillJob 或 (序号, 路径)"""
+    return os.path.basename(item.pdf_path if isinstance(item, BillJob) else item[1])
+
+
+def _parse_stage(job: BillJob) -> Optional[BillJob]:
+    """解析 PDF（在进程池中执行）"""
+    job.df = parse_pdf_to_df(job.pdf_path, job.password, checkpoint_dir=default_checkpoint_dir())
+    job.password = None
+    return job if job.df is not None else None
+
+
+def _normalize_stage(job: BillJob) -> BillJob:
+    """验证、自动分类、规范化商户名称并计入预算"""
+    _validate_bill(job.df, job.pdf_path)
+    assign_categories(job.df)
+    canonicalize_merchants(job.df)
+    track_budget(job.df, job.pdf_path)
+    return job
+
+
+def _persist_stage(job: BillJob, output_dir: str) -> Optional[BillJob]:
+    """导出账单 Excel，导出失败时返回 None"""
+    return job if _export_excel(job.df, os.path.join(output_dir, f"{job.base_name}.xlsx")) else None
+
+
+def _render_stage(job: BillJob, output_dir: str, snapshot: bool = False) -> BillJob:
+    """生成账单 HTML 报表（流水线中 PNG 由单独的 snapshot 阶段导出）"""
+    job.html_path = os.path.join(output_dir, f"{job.base_name}.html")
+    if not generate_visualizations(job.df, job.html_path, snapshot=snapshot):
+        job.html_path = None
+    return job
+
+
+def _validate_bill(df: pd.DataFrame, pdf_path: str) -> None:
+    """验证单份账单的数据，有问题时记录警告和各规则的统计"""
+    report = validate_transactions(df)
+    if not report.is_valid:
+        logger.warning(f"数据验证失败 {pdf_path}: {', '.join(report.messages())}")
+        logger.info(f"验证规则统计 {pdf_path}: {report.counts}")
+
+
+def track_budget(df: pd.DataFrame, pdf_path: Optional[str] = None, source: Optional[str] = None) -> None:
+    """
+    把新账单计入预算的月度累计（配置了预算时），越过提醒阈值时提示
 
-        # 生成可视化报表
-        html_output_path = os.path.join(output_dir, f"{base_name}.html")
-        try:
-            generate_visualizations(df, html_output_path)
-            logger.info(f"可视化报表已生成: {html_output_path}")
-            print(f"  可视化报表已生成: {html_output_path}")
-        except Exception as ev:
-            logger.error(f"生成可视化报表失败 {html_output_path}: {ev}")
-            print(f"  生成可视化报表失败: {ev}")
+    同一来源只计入一次：来源指纹 source 未给出时使用 PDF 文件的内容指纹。
+    """
+    tracker = get_default_tracker()
+    if tracker is None:
+        return
+    for alert in tracker.update(df, source or file_fingerprint(pdf_path)):
+        console.warning(f"预算提醒: {alert.text}")
+
+
+def build_bill_pipeline(
+    output_dir: str,
+    temp_dir: str,
+    provider: PasswordProvider,
+    interactive: bool = False,
+    concurrency: Optional[Dict[str, int]] = None,
+    snapshot: bool = True,
+    spool: Optional[FrameSpool] = None,
+    packager: Optional[ArtifactPackager] = None
+) -> Pipeline:
+    """
+    构建账单处理流水线：decrypt → parse → normalize → persist → render → snapshot（→ package → spill）
+
+    输入条目为 (序号, ZIP 或 PDF 路径)，输出为处理完成的 BillJob。
+
+    Args:
+        output_dir: 输出目录
+        temp_dir: ZIP 解压目录
+        provider: 密码来源
+        interactive: 是否允许交互输入密码（解密阶段并发固定为 1，避免多个提示交错）
+        concurrency: 各阶段并发数，如 {'parse': 2}
+        snapshot: 是否包含截图阶段
+        spool: 内存受限模式下收集账单数据的 FrameSpool（传入时追加 spill 阶段，交出数据后 job.df 置空）
+        packager: 产物打包器（传入时追加 package 阶段，把该账单的产物交给打包器，压缩在打包器的线程池中进行）
+
+    Returns:
+        流水线对象
+    """
+    concurrency = concurrency or {}
+
+    def decrypt(item: Tuple[int, str]) -> List[BillJob]:
+        index, source = item
+        if source.lower().endswith('.zip'):
+            pdfs = extract_zip_pdfs(source, temp_dir, provider, interactive)
+        else:
+            console.info(f"\n[处理独立 PDF] {os.path.basename(source)}", indent=False)
+            pdfs = [(source, provider.resolve_pdf_password(source))]
+        return [BillJob((index, k), path, password) for k, (path, password) in enumerate(pdfs)]
+
+    def persist(job: BillJob) -> BillJob:
+        _persist_stage(job, output_dir)
+        return job
+
+    def render(job: BillJob) -> BillJob:
+        return _render_stage(job, output_dir)
+
+    def take_snapshot(job: BillJob) -> BillJob:
+        if job.html_path is not None:
+            export_report_png(job.df, job.html_path)
+        return job
+
+    def package(job: BillJob) -> BillJob:
+        packager.add_artifacts(output_dir, job.base_name)
+        return job
+
+    def spill(job: BillJob) -> BillJob:
+        spool.add(job.order, job.df)
+        job.df = None
+        return job
+
+    def width(name: str, default: int = 1) -> int:
+        return concurrency.get(name, default)
+
+    stages = [
+        Stage('decrypt', decrypt, concurrency=1 if interactive else width('decrypt'), fan_out=True),
+        Stage('parse', _parse_stage, concurrency=width('parse'), executor='process'),
+        Stage('normalize', _normalize_stage, concurrency=width('normalize')),
+        Stage('persist', persist, concurrency=width('persist')),
+        Stage('render', render, concurrency=width('render')),
+    ]
+    if snapshot:
+        stages.append(Stage('snapshot', take_snapshot, concurrency=width('snapshot')))
+    if packager is not None:
+        stages.append(Stage('package', package))
+    if spool is not None:
+        # FrameSpool 不是线程安全的，并发固定为 1
+        stages.append(Stage('spill', spill))
+    unknown = set(concurrency) - {s.name for s in stages}
+    if unknown:
+        raise ValueError(f"未知的流水线阶段: {', '.join(sorted(unknown))}")
+    return Pipeline(stages, label=job_label)
+
+
+def run_bill_pipeline(
+    sources: List[str],
+    output_dir: str,
+    temp_dir: str,
+    provider: PasswordProvider,
+    interactive: bool = False,
+    concurrency: Optional[Dict[str, int]] = None,
+    snapshot: bool = True,
+    spool: Optional[FrameSpool] = None,
+    packager: Optional[ArtifactPackager] = None
+) -> List[pd.DataFrame]:
+    """
+    用分阶段流水线处理一批 ZIP / PDF 文件
+
+    Returns:
+        成功解析的账单 DataFrame（按输入顺序；传入 spool 时数据已交给 spool，返回空列表）
+    """
+    pipeline = build_bill_pipeline(output_dir, temp_dir, provider, interactive, concurrency, snapshot, spool, packager)
+    with ProgressService("处理账单"):
+        jobs = pipeline.run_sync(enumerate(sources))
+    logger.info(f"流水线阶段统计:\n{pipeline.report()}")
+    if spool is not None:
+        return []
+    return [job.df for job in sorted(jobs, key=lambda job: job.order)]
 
-        return df
 
+def _export_excel(df: pd.DataFrame, output_path: str) -> bool:
+    """导出 Excel（内容与上次导出时相同则跳过，见 utils.artifact_is_fresh），返回是否成功"""
+    try:
+        exported = df.drop(columns=TIME_KEY_COLUMNS, errors='ignore')
+        fingerprint = data_fingerprint('xlsx', exported)
+        if artifact_is_fresh(output_path, fingerprint):
+            console.info(f"内容未变化，跳过导出: {output_path}")
+            return True
+        with pd.ExcelWriter(
+            output_path,
+            engine='xlsxwriter',
+            datetime_format='yyyy-mm-dd hh:mm:ss'
+        ) as writer:
+            exported.to_excel(writer, index=False)
+        record_artifact_fingerprint(output_path, fingerprint)
+
+        console.info(f"成功导出: {output_path}")
+        return True
     except Exception as e:
-        logger.error(f"解析 PDF 失败 {pdf_path}: {e}")
-        print(f"  解析 PDF 失败: {e}")
-        return None
+        console.error(f"导出 Excel 失败 {output_path}: {e}")
+        return False
 
 
 if __name__ == "__main__":
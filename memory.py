@@ -0,0 +1,319 @@
+"""
+内存预算模块
+设置 BILL_HUB_MEMORY_BUDGET（如 "512M"、"2G"）后进入内存受限模式：
+按阶段记录 tracemalloc 峰值和进程 RSS，RSS 接近预算时把已完成的单个账单数据按月份溢写到磁盘，
+合并与报表再按月份逐块读取溢写的数据，不会同时持有全部账单、合并结果和排序副本
+"""
+import gc
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from logger_config import logger
+from utils import MISSING_TIME_KEY, MONTH_KEY, ensure_time_keys
+
+# 可选依赖：psutil 读取 RSS（未安装时读取 /proc/self/statm），pyarrow 用于 Parquet 溢写（否则使用 pickle）
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+ENV_MEMORY_BUDGET = 'BILL_HUB_MEMORY_BUDGET'
+# 溢写目录（默认系统临时目录）
+ENV_SPILL_DIR = 'BILL_HUB_SPILL_DIR'
+# RSS 达到预算的该比例时开始溢写
+SPILL_RATIO = 0.7
+TIME_COL = '交易时间'
+
+_SIZE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2, 'G': 1024 ** 3, 'GB': 1024 ** 3}
+
+
+def parse_size(text: str) -> int:
+    """
+    解析内存大小，如 "512M"、"1.5G"、"1048576"
+
+    Args:
+        text: 数字加可选的单位（K / M / G，不区分大小写）
+
+    Returns:
+        字节数
+    """
+    value = str(text).strip().upper()
+    number = value.rstrip('KMGB')
+    unit = value[len(number):]
+    try:
+        size = float(number) * _SIZE_UNITS[unit]
+    except (KeyError, ValueError):
+        raise ValueError(f"无效的内存大小: {text}（示例: 512M、2G）")
+    if size <= 0:
+        raise ValueError(f"内存大小必须大于 0: {text}")
+    return int(size)
+
+
+def format_size(size: Optional[float]) -> str:
+    """把字节数格式化为 MB"""
+    return '-' if size is None else f"{size / 1024 ** 2:.1f} MB"
+
+
+def memory_budget() -> Optional[int]:
+    """读取 BILL_HUB_MEMORY_BUDGET，未设置时返回 None（不启用内存受限模式）"""
+    value = os.environ.get(ENV_MEMORY_BUDGET)
+    return parse_size(value) if value else None
+
+
+def current_rss() -> int:
+    """当前进程的常驻内存（字节），无法获取时返回 0"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # 只能拿到历史峰值（Linux 单位为 KB），作为近似值
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+@dataclass
+class StageMemory:
+    """
+    单个阶段的内存统计
+
+    Attributes:
+        name: 阶段名称
+        seconds: 耗时
+        traced_peak: tracemalloc 记录的 Python 分配峰值
+        rss_before: 进入阶段时的 RSS
+        rss_after: 离开阶段时的 RSS
+        rss_peak: 阶段内采样到的最高 RSS
+    """
+    name: str
+    seconds: float = 0.0
+    traced_peak: int = 0
+    rss_before: int = 0
+    rss_after: int = 0
+    rss_peak: int = 0
+
+
+class MemoryMonitor:
+    """
+    按阶段记录内存峰值
+
+    阶段不嵌套：每个阶段开始时重置 tracemalloc 峰值。RSS 在阶段进出和每次 sample() 时采样，
+    进程池子进程中的分配不计入。未设置预算时不启用，stage() 不做任何统计。
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        """
+        Args:
+            budget: RSS 预算（字节），为 None 时不启用
+        """
+        self.budget = budget
+        self.stages: List[StageMemory] = []
+        self._current: Optional[StageMemory] = None
+        self._started_tracing = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget is not None
+
+    def sample(self) -> int:
+        """采样当前 RSS 并计入正在进行的阶段，返回 RSS"""
+        rss = current_rss()
+        if self._current is not None:
+            self._current.rss_peak = max(self._current.rss_peak, rss)
+        return rss
+
+    def near_budget(self, ratio: float = SPILL_RATIO) -> bool:
+        """RSS 是否达到预算的 ratio 比例"""
+        return self.enabled and self.sample() >= self.budget * ratio
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """记录一个阶段的耗时和内存峰值"""
+        if not self.enabled:
+            yield
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        rss = current_rss()
+        self._current = StageMemory(name, rss_before=rss, rss_peak=rss)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self._current
+            stats.seconds = time.perf_counter() - start
+            stats.traced_peak = tracemalloc.get_traced_memory()[1]
+            stats.rss_after = self.sample()
+            self._current = None
+            self.stages.append(stats)
+            logger.info(f"阶段 {name} 内存峰值: Python 分配 {format_size(stats.traced_peak)}，"
+                        f"RSS {format_size(stats.rss_peak)}")
+
+    def report(self, spool: Optional['FrameSpool'] = None) -> str:
+        """返回各阶段内存统计表"""
+        lines = [f"{'阶段':<10}{'耗时(s)':>9}{'分配峰值':>12}{'RSS起始':>12}{'RSS结束':>12}{'RSS峰值':>12}"]
+        for s in self.stages:
+            lines.append(
+                f"{s.name:<10}{s.seconds:>11.2f}{format_size(s.traced_peak):>16}{format_size(s.rss_before):>15}"
+                f"{format_size(s.rss_after):>15}{format_size(s.rss_peak):>15}"
+            )
+        peak = max((s.rss_peak for s in self.stages), default=0)
+        summary = f"RSS 预算 {format_size(self.budget)}，最高 {format_size(peak)}"
+        if peak > (self.budget or 0):
+            summary += "（超出预算）"
+        if spool is not None:
+            summary += f"；溢写 {spool.spilled_frames} 个账单，{spool.spilled_parts} 个分块，{format_size(spool.spilled_bytes)}"
+        lines.append(summary)
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        """停止由本监视器启动的 tracemalloc"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+
+class FrameSpool:
+    """
+    按输入顺序收集各账单的 DataFrame，RSS 接近预算时溢写到磁盘
+
+    溢写时每个账单按月序号拆分，写入 month=<月序号>/ 下的独立文件（有 pyarrow 时为 Parquet，否则为 pickle）；
+    iter_months() 按月份顺序逐月读取、合并并按交易时间排序，任一时刻只有一个月的数据在内存中。
+    """
+
+    def __init__(self, monitor: Optional[MemoryMonitor] = None, directory: Optional[str] = None,
+                 spill_ratio: float = SPILL_RATIO):
+        """
+        Args:
+            monitor: 内存监视器（决定何时溢写；为 None 时只在 spill() 被显式调用时溢写）
+            directory: 溢写目录（默认在 BILL_HUB_SPILL_DIR 或系统临时目录下新建，仅当前用户可读写）
+            spill_ratio: RSS 达到预算的该比例时溢写
+        """
+        self.monitor = monitor
+        self.spill_ratio = spill_ratio
+        self._directory = directory
+        self._frames: Dict[Tuple, pd.DataFrame] = {}
+        self._parts: Dict[int, List[Tuple[Tuple, str]]] = {}
+        self.columns: List[str] = []
+        self.count = 0
+        self.rows = 0
+        self.spilled_frames = 0
+        self.spilled_parts = 0
+        self.spilled_bytes = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def format(self) -> str:
+        return 'parquet' if pq is not None else 'pickle'
+
+    @property
+    def spilled(self) -> bool:
+        return self.spilled_frames > 0
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            # mkdtemp 创建的目录权限为 0700
+            self._directory = tempfile.mkdtemp(prefix='bill-hub-spill-', dir=os.environ.get(ENV_SPILL_DIR))
+        return self._directory
+
+    def add(self, key: Tuple, df: Optional[pd.DataFrame]) -> None:
+        """
+        加入一个账单的数据，RSS 接近预算时把内存中的账单全部溢写
+
+        Args:
+            key: 排序键（如流水线的输入序号），合并时按该顺序拼接
+            df: 账单数据（为 None 或为空时忽略）
+        """
+        if df is None or df.empty:
+            return
+        df = ensure_time_keys(df)
+        self.columns.extend(c for c in df.columns if c not in self.columns)
+        self._frames[key] = df
+        self.count += 1
+        self.rows += len(df)
+        if self.monitor is not None and self.monitor.near_budget(self.spill_ratio):
+            logger.info(f"内存接近预算，溢写 {len(self._frames)} 个账单到 {self.directory}")
+            self.spill()
+
+    def frames(self) -> List[pd.DataFrame]:
+        """内存中的账单数据（按排序键顺序）"""
+        return [self._frames[key] for key in sorted(self._frames)]
+
+    def spill(self) -> None:
+        """把内存中的账单全部按月份溢写到磁盘"""
+        for key in sorted(self._frames):
+            self._write(key, self._frames.pop(key))
+            self.spilled_frames += 1
+        gc.collect()
+
+    def _write(self, key: Tuple, df: pd.DataFrame) -> None:
+        for month, part in df.groupby(MONTH_KEY, sort=False):
+            folder = os.path.join(self.directory, f"month={int(month)}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"{self.spilled_parts:06d}.{self.format}")
+            if pq is not None:
+                part.to_parquet(path, index=False)
+            else:
+                part.to_pickle(path)
+            self._parts.setdefault(int(month), []).append((key, path))
+            self.spilled_parts += 1
+            self.spilled_bytes += os.path.getsize(path)
+
+    def _read(self, path: str) -> pd.DataFrame:
+        return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+
+    def iter_months(self) -> Iterator[pd.DataFrame]:
+        """
+        按月份顺序产出合并后的数据块（先溢写仍在内存中的账单）
+
+        每块为一个月份内全部账单的数据，列统一为所有账单的列，按交易时间稳定排序；
+        交易时间缺失的记录最后产出（与合并后整体排序的结果一致），行号在各块之间连续。
+        """
+        self.spill()
+        months = sorted(self._parts, key=lambda m: (m == MISSING_TIME_KEY, m))
+        offset = 0
+        for month in months:
+            parts = sorted(self._parts[month], key=lambda item: item[0])
+            chunk = pd.concat([self._read(path) for _, path in parts], ignore_index=True)
+            chunk = chunk.reindex(columns=self.columns)
+            if TIME_COL in chunk.columns:
+                chunk = chunk.sort_values(TIME_COL, kind='stable')
+            # 行号在整个合并结果中连续，验证报告中的行号可以直接定位
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        """删除溢写目录"""
+        self._frames.clear()
+        self._parts.clear()
+        if self._directory is not None and os.path.isdir(self._directory):
+            shutil.rmtree(self._directory, ignore_errors=True)
+        self._directory = None
@@ -0,0 +1,258 @@
+"""
+商户名称规范化模块
+同一商户在账单中的写法常有差异（全角/半角、空格、“(个人)”等后缀、个别字符不同），
+分组统计时会被拆成多个商户。本模块只对唯一值做规范化，再按分块做近似匹配把相近的名称归并，
+结果写入持久化的别名缓存，再次运行时直接查表
+"""
+import json
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from password_provider import DEFAULT_CONFIG_DIR
+
+
+MERCHANT_COL = '交易对方'
+# 规范化前的原始名称
+RAW_MERCHANT_COL = '原始交易对方'
+
+ENV_ALIAS_FILE = 'BILL_HUB_MERCHANT_ALIASES'
+DEFAULT_ALIAS_FILE = os.path.join(DEFAULT_CONFIG_DIR, 'merchant_aliases.json')
+ALIAS_FORMAT_VERSION = 1
+
+# 末尾的身份后缀，如 "(个人)"、"（个体户）"（全角括号在 NFKC 后已转为半角）
+_SUFFIX_RE = re.compile(r'(?:\((?:个人|个体|个体户|个体工商户|商户|商家)\))+$')
+_SPACE_RE = re.compile(r'\s+')
+# 近似匹配的相似度阈值，以及参与近似匹配的最短名称（短名称差一个字就是另一个商户）
+SIMILARITY_THRESHOLD = 0.85
+MIN_FUZZY_LENGTH = 4
+# 分块键的长度：只有前缀相同的名称之间才做两两比较
+BLOCK_PREFIX = 2
+
+
+def normalize_merchant(name: str) -> str:
+    """
+    商户名称的快速规范化：全角转半角（NFKC）、去掉空白和末尾的身份后缀
+
+    Args:
+        name: 原始名称
+
+    Returns:
+        规范化后的名称（用于展示）
+    """
+    text = _SPACE_RE.sub('', unicodedata.normalize('NFKC', name))
+    stripped = _SUFFIX_RE.sub('', text)
+    return stripped or text
+
+
+def merchant_key(name: str) -> str:
+    """比较用的键：规范化后再忽略英文大小写"""
+    return normalize_merchant(name).casefold()
+
+
+@dataclass
+class CanonicalizationReport:
+    """
+    规范化统计
+
+    Attributes:
+        before: 规范化前的唯一名称数
+        after: 规范化后的唯一名称数
+        cached: 直接从别名缓存得到结果的唯一名称数
+        fuzzy: 通过近似匹配归并的唯一名称数
+    """
+    before: int
+    after: int
+    cached: int = 0
+    fuzzy: int = 0
+
+    @property
+    def reduction(self) -> float:
+        """唯一名称数减少的比例"""
+        return 1 - self.after / self.before if self.before else 0.0
+
+
+class MerchantCanonicalizer:
+    """商户名称规范化器，维护 原始名称 -> 规范名称 的别名表"""
+
+    def __init__(self, aliases: Optional[Dict[str, str]] = None, path: Optional[str] = None,
+                 threshold: float = SIMILARITY_THRESHOLD):
+        """
+        Args:
+            aliases: 已知的别名表
+            path: 别名缓存文件（提供时新的别名会写回该文件）
+            threshold: 近似匹配的相似度阈值（0-1）
+        """
+        self.aliases: Dict[str, str] = dict(aliases or {})
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        # 比较键 -> 规范名称；分块键 -> 该块中的比较键
+        self._canonical: Dict[str, str] = {}
+        self._blocks: Dict[str, List[str]] = {}
+        for canonical in set(self.aliases.values()):
+            self._register(merchant_key(canonical), canonical)
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "MerchantCanonicalizer":
+        """
+        从别名缓存文件加载（文件不存在或损坏时从空表开始）
+
+        Args:
+            path: 缓存文件路径（默认读取环境变量 BILL_HUB_MERCHANT_ALIASES，其次 ~/.bill-hub/merchant_aliases.json）
+        """
+        path = path or os.environ.get(ENV_ALIAS_FILE) or DEFAULT_ALIAS_FILE
+        aliases: Dict[str, str] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == ALIAS_FORMAT_VERSION:
+                    aliases = data.get('aliases', {})
+            except (OSError, ValueError, AttributeError) as e:
+                logger.warning(f"商户别名缓存读取失败，重新生成 {path}: {e}")
+        return cls(aliases, path)
+
+    def save(self) -> None:
+        """把别名表写回缓存文件"""
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': ALIAS_FORMAT_VERSION, 'aliases': self.aliases}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def _register(self, key: str, canonical: str) -> None:
+        if key not in self._canonical:
+            self._canonical[key] = canonical
+            self._blocks.setdefault(key[:BLOCK_PREFIX], []).append(key)
+
+    def _find_similar(self, key: str) -> Optional[str]:
+        """在同一分块中查找相似度达到阈值的已知比较键"""
+        if len(key) < MIN_FUZZY_LENGTH:
+            return None
+        best, best_ratio = None, self.threshold
+        matcher = SequenceMatcher(autojunk=False)
+        matcher.set_seq2(key)
+        for other in self._blocks.get(key[:BLOCK_PREFIX], ()):
+            if len(other) < MIN_FUZZY_LENGTH:
+                continue
+            matcher.set_seq1(other)
+            # 先用长度和字符计数的上界排除，再计算准确的相似度
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                best, best_ratio = other, ratio
+        return best
+
+    def resolve(self, names: List[str], counts: Optional[List[int]] = None) -> CanonicalizationReport:
+        """
+        为一批唯一名称确定规范名称（结果写入 self.aliases）
+
+        未知名称按出现次数从多到少处理，这样同一组近似名称中最常见的写法成为规范名称。
+
+        Args:
+            names: 唯一的原始名称
+            counts: 每个名称的出现次数
+
+        Returns:
+            规范化统计（after 为这批名称对应的规范名称数）
+        """
+        counts = counts or [1] * len(names)
+        cached = sum(1 for name in names if name in self.aliases)
+        fuzzy = 0
+        pending = sorted((i for i, name in enumerate(names) if name not in self.aliases),
+                         key=lambda i: -counts[i])
+        for i in pending:
+            name = names[i]
+            key = merchant_key(name)
+            if key not in self._canonical:
+                similar = self._find_similar(key)
+                if similar is not None:
+                    self._canonical[key] = self._canonical[similar]
+                    fuzzy += 1
+                else:
+                    self._register(key, normalize_merchant(name))
+            self.aliases[name] = self._canonical[key]
+        after = len({self.aliases[name] for name in names})
+        return CanonicalizationReport(len(names), after, cached, fuzzy)
+
+    def canonicalize(self, df: pd.DataFrame, column: str = MERCHANT_COL) -> CanonicalizationReport:
+        """
+        原地把商户列替换为规范名称，原始名称保存在 原始交易对方 列
+
+        只对唯一值处理：已在别名表中的名称直接查表，其余名称做规范化和近似匹配后加入别名表并保存。
+
+        Args:
+            df: 交易数据
+            column: 商户列
+
+        Returns:
+            规范化统计
+        """
+        if df.empty or column not in df.columns:
+            return CanonicalizationReport(0, 0)
+        raw = df[RAW_MERCHANT_COL] if RAW_MERCHANT_COL in df.columns else df[column]
+        codes, uniques = pd.factorize(raw)
+        names = [str(v) for v in uniques]
+        counts = np.bincount(codes[codes >= 0], minlength=len(names)).tolist()
+
+        with self._lock:
+            known = len(self.aliases)
+            report = self.resolve(names, counts)
+            canonical = [self.aliases[name] for name in names]
+            if len(self.aliases) != known:
+                try:
+                    self.save()
+                except OSError as e:
+                    logger.warning(f"商户别名缓存写入失败 {self.path}: {e}")
+
+        if RAW_MERCHANT_COL not in df.columns:
+            df[RAW_MERCHANT_COL] = df[column]
+        if names:
+            # 编码 -1（缺失值）保持原值
+            values = np.array(canonical, dtype=object)[codes]
+            df[column] = pd.Series(values, index=df.index).where(codes >= 0, df[column])
+        logger.info(
+            f"商户名称规范化: {report.before} → {report.after} 个（减少 {report.reduction:.1%}），"
+            f"缓存命中 {report.cached}，近似归并 {report.fuzzy}"
+        )
+        return report
+
+
+_default_canonicalizer: Optional[MerchantCanonicalizer] = None
+
+
+def get_default_canonicalizer() -> MerchantCanonicalizer:
+    """获取进程内共享的默认规范化器（首次调用时加载别名缓存）"""
+    global _default_canonicalizer
+    if _default_canonicalizer is None:
+        _default_canonicalizer = MerchantCanonicalizer.from_file()
+    return _default_canonicalizer
+
+
+def canonicalize_merchants(df: pd.DataFrame, canonicalizer: Optional[MerchantCanonicalizer] = None) -> pd.DataFrame:
+    """
+    规范化交易数据中的商户名称
+
+    Args:
+        df: 交易数据
+        canonicalizer: 规范化器（默认使用共享的默认规范化器）
+
+    Returns:
+        规范化后的 DataFrame（原地修改并返回）
+    """
+    (canonicalizer or get_default_canonicalizer()).canonicalize(df)
+    return df
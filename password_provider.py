@@ -0,0 +1,315 @@
+"""
+密码提供模块
+为 ZIP 压缩包和 PDF 文件提供非交互式的密码来源，并支持多候选密码并行试解
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import pdfplumber
+import pyzipper
+
+from logger_config import logger
+
+
+# 环境变量名称
+ENV_PASSWORD = "BILL_HUB_PASSWORD"
+ENV_PASSWORDS = "BILL_HUB_PASSWORDS"
+ENV_KEYRING_FILE = "BILL_HUB_KEYRING"
+ENV_MAPPING_FILE = "BILL_HUB_PASSWORD_MAP"
+ENV_CACHE_FILE = "BILL_HUB_PASSWORD_CACHE"
+
+# 默认文件位置
+DEFAULT_CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".bill-hub")
+DEFAULT_KEYRING_FILE = os.path.join(DEFAULT_CONFIG_DIR, "keyring")
+DEFAULT_CACHE_FILE = os.path.join(DEFAULT_CONFIG_DIR, "password_cache.json")
+DEFAULT_MAPPING_NAME = "passwords.json"
+# 校验 ZIP 密码时每次读取的字节数
+VERIFY_CHUNK_SIZE = 64 * 1024
+
+
+def file_fingerprint(path: str) -> str:
+    """
+    计算文件内容的 SHA-256 指纹，用作密码缓存的键
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        十六进制指纹字符串
+    """
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+
+def verify_zip_password(zip_path: str, password: str) -> bool:
+    """
+    读取最小的加密成员到结尾来判断密码是否正确，不解压整个文件
+
+    ZipCrypto 的校验字节只有 1 字节，错误密码约有 1/256 的概率通过头部校验；
+    读完整个成员时 zipfile 会校验 CRC（AES 加密时校验 HMAC），从而排除这种碰撞。
+
+    Args:
+        zip_path: ZIP 文件路径
+        password: 待校验的密码
+
+    Returns:
+        密码是否正确（压缩包未加密时也返回 True）
+    """
+    try:
+        with pyzipper.AESZipFile(zip_path) as zf:
+            encrypted = [m for m in zf.infolist() if m.flag_bits & 0x1]
+            if not encrypted:
+                return True
+            smallest = min(encrypted, key=lambda m: m.compress_size)
+            with zf.open(smallest, pwd=password.encode('utf-8')) as f:
+                while f.read(VERIFY_CHUNK_SIZE):
+                    pass
+            return True
+    except (RuntimeError, zlib.error, pyzipper.BadZipFile, EOFError, NotImplementedError):
+        return False
+
+
+def verify_pdf_password(pdf_path: str, password: Optional[str]) -> bool:
+    """
+    校验 PDF 密码，只解析文档的加密字典，不读取页面内容
+
+    Args:
+        pdf_path: PDF 文件路径
+        password: 待校验的密码，None 表示无密码
+
+    Returns:
+        是否能够成功打开
+    """
+    try:
+        with pdfplumber.open(pdf_path, password=password):
+            return True
+    except Exception:
+        return False
+
+
+class PasswordProvider:
+    """
+    密码提供者
+
+    候选密码按以下优先级收集：
+    缓存 > 按文件映射 > 环境变量 > 本地 keyring 文件 > 本次运行已成功的密码
+    """
+
+    def __init__(
+        self,
+        keyring_file: Optional[str] = None,
+        mapping_file: Optional[str] = None,
+        cache_file: Optional[str] = None,
+        env: Optional[Dict[str, str]] = None,
+        max_workers: int = 4
+    ):
+        """
+        Args:
+            keyring_file: keyring 风格的本地密码文件，每行一个密码，# 开头为注释
+            mapping_file: 按文件名映射密码的 JSON 文件，键支持通配符
+            cache_file: 成功密码的缓存文件（JSON）
+            env: 环境变量字典（默认使用 os.environ）
+            max_workers: 并行试解的线程数
+        """
+        self.env = os.environ if env is None else env
+        self.keyring_file = keyring_file
+        self.mapping_file = mapping_file
+        self.cache_file = cache_file
+        self.max_workers = max_workers
+        self._session_passwords: List[str] = []
+        self._cache: Dict[str, str] = self._load_json(cache_file)
+        self._mapping: Dict[str, str] = self._load_json(mapping_file)
+
+    @classmethod
+    def from_env(cls, input_dir: str = 'input') -> "PasswordProvider":
+        """
+        根据环境变量和默认路径创建密码提供者
+
+        Args:
+            input_dir: 输入目录，默认在其中查找 passwords.json 映射文件
+
+        Returns:
+            PasswordProvider 实例
+        """
+        return cls(
+            keyring_file=os.environ.get(ENV_KEYRING_FILE, DEFAULT_KEYRING_FILE),
+            mapping_file=os.environ.get(ENV_MAPPING_FILE, os.path.join(input_dir, DEFAULT_MAPPING_NAME)),
+            cache_file=os.environ.get(ENV_CACHE_FILE, DEFAULT_CACHE_FILE),
+        )
+
+    @staticmethod
+    def _load_json(path: Optional[str]) -> Dict[str, str]:
+        if not path or not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return {str(k): str(v) for k, v in data.items()}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"读取密码配置失败 {path}: {e}")
+            return {}
+
+    def _keyring_passwords(self) -> List[str]:
+        if not self.keyring_file or not os.path.exists(self.keyring_file):
+            return []
+        with open(self.keyring_file, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    def _env_passwords(self) -> List[str]:
+        passwords: List[str] = []
+        if self.env.get(ENV_PASSWORD):
+            passwords.append(self.env[ENV_PASSWORD])
+        if self.env.get(ENV_PASSWORDS):
+            passwords.extend(p for p in self.env[ENV_PASSWORDS].split(',') if p)
+        return passwords
+
+    def _mapped_passwords(self, source_path: str) -> List[str]:
+        name = os.path.basename(source_path)
+        if name in self._mapping:
+            return [self._mapping[name]]
+        return [pwd for pattern, pwd in self._mapping.items() if fnmatch.fnmatch(name, pattern)]
+
+    def cached_password(self, source_path: str) -> Optional[str]:
+        """
+        查询缓存中该文件的成功密码
+
+        Args:
+            source_path: 源文件路径
+
+        Returns:
+            缓存的密码，没有则返回 None
+        """
+        if not self._cache:
+            return None
+        return self._cache.get(file_fingerprint(source_path))
+
+    def candidates(self, source_path: str, extra: Iterable[Optional[str]] = ()) -> List[str]:
+        """
+        收集某个文件的候选密码（去重并保持优先级顺序）
+
+        Args:
+            source_path: 源文件路径
+            extra: 额外的候选密码（如所属压缩包的密码）
+
+        Returns:
+            候选密码列表
+        """
+        ordered = self._mapped_passwords(source_path) + self._env_passwords() \
+            + self._keyring_passwords() + self._session_passwords + [p for p in extra if p]
+        return list(dict.fromkeys(ordered))
+
+    def remember(self, source_path: str, password: str) -> None:
+        """
+        记录成功的密码：加入本次运行的候选，并写入缓存文件
+
+        Args:
+            source_path: 源文件路径
+            password: 成功的密码
+        """
+        if password not in self._session_passwords:
+            self._session_passwords.append(password)
+
+        key = file_fingerprint(source_path)
+        if self._cache.get(key) == password:
+            return
+        self._cache[key] = password
+        self._save_cache()
+
+    def forget(self, source_path: str) -> None:
+        """
+        移除缓存中失效的密码（同时写回缓存文件，下次运行不会再使用）
+
+        Args:
+            source_path: 源文件路径
+        """
+        if self._cache.pop(file_fingerprint(source_path), None) is not None:
+            self._save_cache()
+
+    def _save_cache(self) -> None:
+        """写回缓存文件：文件创建时即为 0600，先写临时文件再原子替换"""
+        if not self.cache_file:
+            return
+        tmp = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.cache_file)
+        except OSError as e:
+            logger.warning(f"写入密码缓存失败 {self.cache_file}: {e}")
+
+    def _trial(self, verify, path: str, candidates: List[str]) -> Optional[str]:
+        if not candidates:
+            return None
+        if len(candidates) == 1:
+            return candidates[0] if verify(path, candidates[0]) else None
+        workers = min(self.max_workers, len(candidates))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda pwd: verify(path, pwd), candidates))
+        # 按优先级返回第一个成功的密码
+        for pwd, ok in zip(candidates, results):
+            if ok:
+                return pwd
+        return None
+
+    def resolve_zip_password(self, zip_path: str, extra: Iterable[Optional[str]] = (),
+                             exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        为 ZIP 文件查找可用密码，缓存命中时跳过试解
+
+        Args:
+            zip_path: ZIP 文件路径
+            extra: 额外的候选密码
+            exclude: 已经试过、不再使用的密码（如解压失败的密码）
+
+        Returns:
+            可用的密码，找不到时返回 None
+        """
+        exclude = set(exclude)
+        cached = self.cached_password(zip_path)
+        if cached is not None and cached not in exclude:
+            logger.info(f"使用缓存密码: {os.path.basename(zip_path)}")
+            return cached
+
+        candidates = [p for p in self.candidates(zip_path, extra) if p not in exclude]
+        password = self._trial(verify_zip_password, zip_path, candidates)
+        if password is not None:
+            self.remember(zip_path, password)
+        return password
+
+    def resolve_pdf_password(self, pdf_path: str, extra: Iterable[Optional[str]] = ()) -> Optional[str]:
+        """
+        为 PDF 文件查找可用密码，未加密的 PDF 返回 None（缓存的密码先校验，失效时改用其余候选）
+
+        Args:
+            pdf_path: PDF 文件路径
+            extra: 额外的候选密码
+
+        Returns:
+            可用的密码；无需密码或找不到时返回 None
+        """
+        cached = self.cached_password(pdf_path)
+        if cached is not None:
+            # 缓存的密码可能已失效（如银行更换了密码），校验失败时移除缓存并重新试解其余候选
+            if verify_pdf_password(pdf_path, cached or None):
+                return cached or None
+            logger.info(f"缓存的密码已失效，重新查找: {os.path.basename(pdf_path)}")
+            self.forget(pdf_path)
+
+        if verify_pdf_password(pdf_path, None):
+            return None
+
+        password = self._trial(verify_pdf_password, pdf_path, self.candidates(pdf_path, extra))
+        if password is not None:
+            self.remember(pdf_path, password)
+        else:
+            logger.warning(f"未找到可用的 PDF 密码: {os.path.basename(pdf_path)}")
+        return password
@@ -0,0 +1,261 @@
+"""
+分阶段处理流水线模块
+各阶段通过有界队列串联，在 asyncio 中并发运行：每个阶段有独立的并发数和执行器，
+下游处理不过来时上游会在队列满时阻塞（背压），并统计各阶段的利用率以定位瓶颈
+"""
+import asyncio
+import inspect
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import progress
+from logger_config import call_with_context, log_context, log_queue, logger, worker_initializer
+
+
+EXECUTOR_KINDS = ('thread', 'process', 'inline')
+
+# 队列结束标记
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """
+    流水线阶段
+
+    Attributes:
+        name: 阶段名称
+        func: 处理函数，接收一个条目并返回下一阶段的条目（返回 None 表示丢弃该条目）
+        concurrency: 同时处理的条目数
+        queue_size: 输入队列容量，队列满时上游阻塞
+        executor: thread（I/O 或释放 GIL 的工作）、process（CPU 密集，func 和条目需可 pickle）
+                  或 inline（在事件循环中直接调用，适合很快的函数或协程函数）
+        fan_out: 为 True 时 func 返回可迭代对象，其中每个元素作为一个条目进入下一阶段
+    """
+    name: str
+    func: Callable[[Any], Any]
+    concurrency: int = 1
+    queue_size: int = 4
+    executor: str = 'thread'
+    fan_out: bool = False
+
+    def __post_init__(self):
+        if self.executor not in EXECUTOR_KINDS:
+            raise ValueError(f"未知的执行器类型: {self.executor}（可选 {', '.join(EXECUTOR_KINDS)}）")
+        if self.concurrency < 1 or self.queue_size < 1:
+            raise ValueError(f"阶段 {self.name} 的并发数和队列容量必须大于 0")
+
+
+@dataclass
+class StageStats:
+    """
+    阶段运行统计
+
+    busy 为处理条目的累计耗时，blocked 为因下游队列已满而等待的累计耗时，
+    max_queue 为输入队列的最大积压条目数。
+    """
+    name: str
+    concurrency: int
+    processed: int = 0
+    failed: int = 0
+    emitted: int = 0
+    busy: float = 0.0
+    blocked: float = 0.0
+    max_queue: int = 0
+
+    def utilization(self, elapsed: float) -> float:
+        """阶段利用率：处理耗时占 (总耗时 × 并发数) 的比例"""
+        if elapsed <= 0:
+            return 0.0
+        return min(self.busy / (elapsed * self.concurrency), 1.0)
+
+
+class Pipeline:
+    """
+    有界队列串联的异步流水线
+
+    用法:
+        pipeline = Pipeline([Stage('parse', parse, concurrency=2), Stage('persist', persist)])
+        results = pipeline.run_sync(paths)
+        print(pipeline.report())
+    """
+
+    def __init__(self, stages: List[Stage], label: Optional[Callable[[Any], Optional[str]]] = None):
+        """
+        Args:
+            stages: 按顺序执行的阶段
+            label: 返回条目名称（如文件名）的函数，处理时作为日志的 file 字段
+        """
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"阶段名称重复: {names}")
+        self.stages = stages
+        self.label = label
+        self.stats: Dict[str, StageStats] = {}
+        self.elapsed = 0.0
+
+    async def run(self, items: Iterable[Any]) -> List[Any]:
+        """
+        运行流水线
+
+        Args:
+            items: 输入条目（依次送入第一个阶段的队列）
+
+        Returns:
+            最后一个阶段产出的条目（按完成顺序）
+        """
+        self.stats = {s.name: StageStats(s.name, s.concurrency) for s in self.stages}
+        queues = [asyncio.Queue(maxsize=s.queue_size) for s in self.stages]
+        results: List[Any] = []
+        executors = [self._make_executor(s) for s in self.stages]
+        start = time.perf_counter()
+        try:
+            tasks = [asyncio.create_task(self._feed(items, queues[0]))]
+            for i, stage in enumerate(self.stages):
+                out = queues[i + 1] if i + 1 < len(queues) else None
+                workers = [
+                    asyncio.create_task(self._work(stage, executors[i], queues[i], out, results))
+                    for _ in range(stage.concurrency)
+                ]
+                tasks.append(asyncio.create_task(self._close_after(workers, out, i + 1)))
+            await asyncio.gather(*tasks)
+        finally:
+            for executor in executors:
+                if executor is not None:
+                    executor.shutdown(wait=True)
+            self.elapsed = time.perf_counter() - start
+        return results
+
+    def run_sync(self, items: Iterable[Any]) -> List[Any]:
+        """在新的事件循环中运行流水线（供同步代码调用）"""
+        return asyncio.run(self.run(items))
+
+    @staticmethod
+    def _make_executor(stage: Stage) -> Optional[Executor]:
+        # 每个阶段使用独立的执行器，慢阶段不会占满其他阶段的线程
+        if stage.executor == 'thread':
+            return ThreadPoolExecutor(max_workers=stage.concurrency, thread_name_prefix=f"stage-{stage.name}")
+        if stage.executor == 'process':
+            # 子进程的日志写入主进程的日志队列
+            return ProcessPoolExecutor(max_workers=stage.concurrency, initializer=_init_worker,
+                                       initargs=(log_queue(logger.name), logger.level, progress.progress_channel()))
+        return None
+
+    async def _feed(self, items: Iterable[Any], queue: asyncio.Queue) -> None:
+        first = self.stats[self.stages[0].name]
+        for item in items:
+            await queue.put(item)
+            first.max_queue = max(first.max_queue, queue.qsize())
+        for _ in range(self.stages[0].concurrency):
+            await queue.put(_DONE)
+
+    async def _close_after(self, workers: List[asyncio.Task], out: Optional[asyncio.Queue], next_index: int) -> None:
+        # 本阶段所有 worker 结束后，通知下一阶段的每个 worker 退出
+        await asyncio.gather(*workers)
+        if out is not None:
+            for _ in range(self.stages[next_index].concurrency):
+                await out.put(_DONE)
+
+    def _log_fields(self, stage: Stage, item: Any) -> Dict[str, Any]:
+        """条目的日志字段：阶段名和条目名称"""
+        fields = {'stage': stage.name}
+        if self.label is not None:
+            fields['file'] = self.label(item)
+        return fields
+
+    async def _call(self, stage: Stage, executor: Optional[Executor], item: Any, fields: Dict[str, Any]) -> Any:
+        # 阶段函数中的日志带上阶段名和条目名称（执行器中的线程 / 进程不继承事件循环的上下文）
+        if executor is not None:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, partial(call_with_context, fields, stage.func), item)
+        with log_context(**fields):
+            result = stage.func(item)
+            if inspect.isawaitable(result):
+                result = await result
+        return result
+
+    async def _work(self, stage: Stage, executor: Optional[Executor], inbox: asyncio.Queue,
+                    out: Optional[asyncio.Queue], results: List[Any]) -> None:
+        stats = self.stats[stage.name]
+        next_stats = self.stats[self.stages[self.stages.index(stage) + 1].name] if out is not None else None
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+
+            start = time.perf_counter()
+            fields = self._log_fields(stage, item)
+            try:
+                result = await self._call(stage, executor, item, fields)
+            except Exception as e:
+                stats.failed += 1
+                with log_context(**fields):
+                    logger.error(f"流水线阶段 {stage.name} 处理失败: {e}", exc_info=True)
+                continue
+            finally:
+                stats.busy += time.perf_counter() - start
+            stats.processed += 1
+            progress.report(stage.name, items=1)
+
+            outputs = (list(result) if result is not None else []) if stage.fan_out else [result]
+            for output in outputs:
+                if output is None:
+                    continue
+                stats.emitted += 1
+                if out is None:
+                    results.append(output)
+                    continue
+                start = time.perf_counter()
+                await out.put(output)
+                stats.blocked += time.perf_counter() - start
+                next_stats.max_queue = max(next_stats.max_queue, out.qsize())
+
+    def bottleneck(self) -> Optional[str]:
+        """返回利用率最高的阶段名称"""
+        if not self.stats:
+            return None
+        return max(self.stats.values(), key=lambda s: s.utilization(self.elapsed)).name
+
+    def report(self) -> str:
+        """返回各阶段统计表"""
+        lines = [f"{'阶段':<10}{'并发':>4}{'完成':>6}{'失败':>6}{'利用率':>8}{'处理(s)':>9}{'阻塞(s)':>9}{'积压':>6}"]
+        for s in self.stats.values():
+            lines.append(
+                f"{s.name:<12}{s.concurrency:>5}{s.processed:>8}{s.failed:>8}"
+                f"{s.utilization(self.elapsed):>10.0%}{s.busy:>10.2f}{s.blocked:>10.2f}{s.max_queue:>8}"
+            )
+        lines.append(f"总耗时 {self.elapsed:.2f}s，瓶颈阶段: {self.bottleneck()}")
+        return "\n".join(lines)
+
+
+def _init_worker(log_channel, log_level: int, progress_channel) -> None:
+    """进程池子进程初始化：日志和进度报告发送到主进程"""
+    worker_initializer(log_channel, logger.name, log_level)
+    progress.worker_initializer(progress_channel)
+
+
+def parse_concurrency(spec: Optional[str]) -> Dict[str, int]:
+    """
+    解析阶段并发配置，如 "parse=2,render=2"
+
+    Args:
+        spec: 逗号分隔的 阶段=并发数 配置（为空时返回空字典）
+
+    Returns:
+        阶段名称到并发数的映射
+    """
+    result: Dict[str, int] = {}
+    for part in (spec or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, sep, value = part.partition('=')
+        if not sep or not value.strip().isdigit() or int(value) < 1:
+            raise ValueError(f"无效的阶段并发配置: {part}（格式: 阶段=并发数）")
+        result[name.strip()] = int(value)
+    return result
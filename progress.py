@@ -0,0 +1,234 @@
+"""
+进度汇总模块
+各阶段（包括进程池中的子进程）把处理的页数、行数和条目数报告给主进程中的进度服务，由服务统一显示：
+终端中刷新一条汇总进度条（速度、预计剩余时间、各阶段完成数），非终端环境（日志文件、CI）中定期输出一行进度日志
+
+用法:
+    with ProgressService("处理账单"):
+        ...                                     # 任意位置调用 report('parse', pages=1, rows=30)
+"""
+import multiprocessing
+import os
+import queue as queue_module
+import shutil
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from logger_config import logger, set_console_hook
+
+
+ENV_PROGRESS = 'BILL_HUB_PROGRESS'
+PROGRESS_MODES = ('auto', 'bar', 'log', 'off')
+# 终端进度条刷新间隔、非终端环境进度日志间隔（秒）
+REFRESH_INTERVAL = 0.2
+LOG_INTERVAL = 10.0
+BAR_WIDTH = 20
+
+# 主进程中运行的进度服务；子进程通过 _channel 队列报告
+_active: Optional["ProgressService"] = None
+_channel = None
+
+
+def report(stage: str, pages: int = 0, rows: int = 0, items: int = 0, total_pages: int = 0) -> None:
+    """
+    报告进度（没有运行中的进度服务时什么也不做，开销只有一次判断）
+
+    Args:
+        stage: 阶段名称
+        pages: 新完成的页数
+        rows: 新产出的行数
+        items: 新完成的条目数（文件、分片等）
+        total_pages: 新发现的待处理页数（用于计算百分比和预计剩余时间）
+    """
+    if _active is not None and _active.pid == os.getpid():
+        _active.update(stage, pages, rows, items, total_pages)
+    elif _channel is not None:
+        try:
+            _channel.put_nowait((stage, pages, rows, items, total_pages))
+        except Exception:
+            pass
+
+
+def progress_channel():
+    """返回运行中进度服务的队列（传给 worker_initializer，用于 spawn 方式启动的子进程）"""
+    return _active.queue if _active is not None else None
+
+
+def worker_initializer(channel) -> None:
+    """子进程初始化：把进度报告发送到主进程的队列（fork 启动的子进程会继承队列，无需调用）"""
+    global _active, _channel
+    _active = None
+    _channel = channel
+
+
+@dataclass
+class StageProgress:
+    """单个阶段的累计进度"""
+    pages: int = 0
+    rows: int = 0
+    items: int = 0
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class ProgressService:
+    """汇总所有阶段和进程的进度并统一显示"""
+
+    def __init__(
+        self,
+        title: str = "处理进度",
+        mode: Optional[str] = None,
+        stream=None,
+        refresh: float = REFRESH_INTERVAL,
+        log_interval: float = LOG_INTERVAL
+    ):
+        """
+        Args:
+            title: 进度条 / 进度日志的标题
+            mode: auto（终端用进度条，否则输出日志）/ bar / log / off（默认读取 BILL_HUB_PROGRESS，未设置时为 auto）
+            stream: 进度条输出流（默认 sys.stderr）
+            refresh: 进度条刷新间隔（秒）
+            log_interval: 进度日志间隔（秒）
+        """
+        mode = (mode or os.environ.get(ENV_PROGRESS) or 'auto').lower()
+        if mode not in PROGRESS_MODES:
+            raise ValueError(f"未知的进度显示方式: {mode}（可选 {', '.join(PROGRESS_MODES)}）")
+        self.stream = stream or sys.stderr
+        if mode == 'auto':
+            isatty = getattr(self.stream, 'isatty', None)
+            mode = 'bar' if isatty is not None and isatty() else 'log'
+        self.title = title
+        self.mode = mode
+        self.refresh = refresh
+        self.log_interval = log_interval
+        self.stages: Dict[str, StageProgress] = {}
+        self.total_pages = 0
+        self.pid = os.getpid()
+        self.queue = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._started = time.monotonic()
+        self._elapsed: Optional[float] = None
+
+    def __enter__(self) -> "ProgressService":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """开始接收进度报告"""
+        global _active, _channel
+        if self.mode == 'off':
+            return
+        self.pid = os.getpid()
+        self.queue = multiprocessing.Queue()
+        self._started = time.monotonic()
+        self._elapsed = None
+        self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+        self._thread.start()
+        _active, _channel = self, self.queue
+        if self.mode == 'bar':
+            set_console_hook(self)
+
+    def stop(self) -> None:
+        """停止显示，收取剩余的报告并输出汇总"""
+        global _active, _channel
+        if self._thread is None:
+            return
+        if _active is self:
+            _active, _channel = None, None
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self.queue.close()
+        self.queue.join_thread()
+        self._elapsed = time.monotonic() - self._started
+        if self.mode == 'bar':
+            set_console_hook(None)
+            self.clear()
+        logger.info(f"{self.title}完成: {self.summary()}")
+
+    def update(self, stage: str, pages: int = 0, rows: int = 0, items: int = 0, total_pages: int = 0) -> None:
+        """累加进度（线程安全）"""
+        with self._lock:
+            progress = self.stages.setdefault(stage, StageProgress())
+            progress.pages += pages
+            progress.rows += rows
+            progress.items += items
+            self.total_pages += total_pages
+
+    def _run(self) -> None:
+        last_draw = last_log = time.monotonic()
+        while True:
+            try:
+                message = self.queue.get(timeout=self.refresh)
+            except queue_module.Empty:
+                message = ()
+            if message is None:
+                return
+            if message:
+                self.update(*message)
+            # 每次循环都检查刷新间隔，持续有报告时也按时重绘 / 输出日志
+            now = time.monotonic()
+            if self.mode == 'bar':
+                if now - last_draw >= self.refresh:
+                    self.draw()
+                    last_draw = now
+            elif now - last_log >= self.log_interval:
+                logger.info(f"{self.title}: {self.summary()}")
+                last_log = now
+
+    def summary(self) -> str:
+        """返回一行进度摘要：百分比、页数、速度、预计剩余时间和各阶段完成数"""
+        with self._lock:
+            pages = sum(s.pages for s in self.stages.values())
+            rows = sum(s.rows for s in self.stages.values())
+            total = self.total_pages
+            stage_items = [(name, s.items) for name, s in self.stages.items() if s.items]
+        elapsed = self._elapsed if self._elapsed is not None else time.monotonic() - self._started
+        page_rate = pages / elapsed if elapsed > 0 else 0.0
+        row_rate = rows / elapsed if elapsed > 0 else 0.0
+
+        parts = []
+        if total:
+            ratio = min(pages / total, 1.0)
+            filled = int(ratio * BAR_WIDTH)
+            parts.append(f"[{'█' * filled}{'░' * (BAR_WIDTH - filled)}] {ratio:4.0%} {pages}/{total} 页")
+        else:
+            parts.append(f"{pages} 页")
+        parts.append(f"{rows} 行")
+        parts.append(f"{page_rate:.1f} 页/s {row_rate:.0f} 行/s")
+        if self._elapsed is None and total and page_rate > 0 and pages < total:
+            parts.append(f"剩余 {_format_duration((total - pages) / page_rate)}")
+        else:
+            parts.append(f"用时 {_format_duration(elapsed)}")
+        if stage_items:
+            parts.append(' '.join(f"{name} {count}" for name, count in stage_items))
+        return ' | '.join(parts)
+
+    def clear(self) -> None:
+        """清除终端中的进度条（输出其他内容之前调用）"""
+        if self.mode != 'bar':
+            return
+        with self._lock:
+            self.stream.write("\r\x1b[2K")
+            self.stream.flush()
+
+    def draw(self) -> None:
+        """重绘终端中的进度条"""
+        if self.mode != 'bar' or self._thread is None:
+            return
+        line = f"{self.title} {self.summary()}"
+        width = shutil.get_terminal_size().columns - 1
+        with self._lock:
+            self.stream.write("\r\x1b[2K" + line[:width])
+            self.stream.flush()
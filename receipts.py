@@ -0,0 +1,427 @@
+"""
+小票图片导入模块
+对 input/ 中的小票照片做预处理（灰度、纠偏、二值化），分批调用本地 Tesseract 识别文字，
+再用预编译的正则表达式提取商户、金额和日期，转换为与账单解析结果相同列名的交易数据。
+识别结果按图片内容哈希缓存，重复导入同一张图片不再做预处理和 OCR
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from password_provider import DEFAULT_CONFIG_DIR
+from utils import add_time_keys
+
+# 可选依赖：Pillow 用于图片预处理
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+ENV_OCR_CACHE = 'BILL_HUB_OCR_CACHE'
+ENV_OCR_LANG = 'BILL_HUB_OCR_LANG'
+DEFAULT_OCR_CACHE_DIR = os.path.join(DEFAULT_CONFIG_DIR, 'ocr_cache')
+DEFAULT_OCR_LANG = 'chi_sim+eng'
+# 预处理或 OCR 参数变化时递增，使旧缓存失效
+OCR_VERSION = 1
+# 每次调用 tesseract 处理的图片数（模型只加载一次）
+OCR_BATCH_SIZE = 16
+
+# 预处理参数
+MIN_WIDTH = 1000          # 宽度不足时放大，小字体的识别率明显更高
+MAX_SKEW = 5.0            # 纠偏搜索的最大角度（度）
+SKEW_STEP = 0.25
+SKEW_SAMPLE_WIDTH = 400   # 估计倾角时使用的缩略图宽度
+
+RECEIPT_TYPE = '小票'
+SOURCE_COL = '来源文件'
+
+# 前后不能紧挨数字或小数点，避免把 2024.05.03 这样的日期识别为金额
+_AMOUNT_VALUE = r'[¥￥]?\s*(?<![\d.．])(-?\d{1,7}(?:,\d{3})*[.．]\d{1,2})(?![.．]?\d)'
+# 按优先级排列：实付 > 合计 > 金额
+_AMOUNT_PATTERNS = [
+    re.compile(r'(?:实付|实收|应付|付款金额|支付金额|实付金额)\s*[:：]?\s*' + _AMOUNT_VALUE),
+    re.compile(r'(?:合计|总计|总额|小计|TOTAL|Total|total)\s*[:：]?\s*' + _AMOUNT_VALUE),
+    re.compile(r'(?:金额|AMOUNT|Amount)\s*[:：]?\s*' + _AMOUNT_VALUE),
+]
+_ANY_AMOUNT = re.compile(_AMOUNT_VALUE)
+_DATE_PATTERN = re.compile(
+    r'(20\d{2})\s*[-/.年]\s*(\d{1,2})\s*[-/.月]\s*(\d{1,2})\s*日?'
+    r'(?:\s*(\d{1,2})\s*[:：]\s*(\d{2})(?:\s*[:：]\s*(\d{2}))?)?'
+)
+_MERCHANT_PATTERN = re.compile(r'(?:商户名称|商户|店名|门店|商家|MERCHANT|Merchant)\s*[:：]\s*(.+)')
+# 不作为商户名的行：纯数字符号、常见的抬头和客套话（金额和日期另行排除）
+_NOT_MERCHANT = re.compile(r'^[\d\s\W]*$|小票|收据|欢迎|光临|谢谢|惠顾|RECEIPT|Receipt|单号|电话|TEL|Tel')
+
+
+@dataclass
+class ReceiptFields:
+    """
+    从小票文字中提取的字段
+
+    Attributes:
+        merchant: 商户名称（无法识别时为 None）
+        amount: 实付金额
+        time: 交易时间（无法识别时为 NaT）
+    """
+    merchant: Optional[str]
+    amount: Optional[float]
+    time: pd.Timestamp
+
+
+def is_receipt_image(path: str) -> bool:
+    """是否为支持的小票图片格式"""
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def image_hash(path: str) -> str:
+    """图片内容的 SHA-256（作为 OCR 缓存键和交易单号）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ocr_available() -> bool:
+    """是否安装了 Pillow 和 tesseract 命令行"""
+    return Image is not None and shutil.which('tesseract') is not None
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """
+    用 Otsu 方法计算灰度图的二值化阈值
+
+    Args:
+        gray: uint8 灰度图
+
+    Returns:
+        阈值（小于等于阈值的像素视为前景文字）
+    """
+    hist = np.bincount(gray.ravel(), minlength=256).astype(float)
+    total = hist.sum()
+    if total == 0:
+        return 127
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * np.arange(256))
+    background = total - weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mean[-1] * weight - mean * total) ** 2 / (weight * background)
+    between[~np.isfinite(between)] = 0
+    return int(np.argmax(between))
+
+
+def estimate_skew(ink: np.ndarray, max_angle: float = MAX_SKEW, step: float = SKEW_STEP) -> float:
+    """
+    用投影法估计文字行的倾斜角度
+
+    把前景像素按候选角度投影到纵轴，文字行对齐时行投影的起伏（平方和）最大。
+
+    Args:
+        ink: 布尔数组，True 为文字像素
+        max_angle: 搜索范围（±度）
+        step: 搜索步长（度）
+
+    Returns:
+        倾斜角度（度，逆时针为正；按该角度顺时针旋转即可摆正）
+    """
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 10:
+        return 0.0
+    angles = np.arange(-max_angle, max_angle + step / 2, step)
+    height = ink.shape[0]
+    best_angle, best_score = 0.0, -1.0
+    for angle in angles:
+        shifted = np.round(ys + xs * np.tan(np.radians(angle))).astype(np.int64)
+        shifted -= shifted.min()
+        profile = np.bincount(shifted, minlength=height)
+        score = float(np.sum(np.diff(profile).astype(float) ** 2))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess_image(path: str, output_path: str) -> str:
+    """
+    小票图片预处理：按 EXIF 方向摆正、转灰度、放大、纠偏、Otsu 二值化
+
+    在进程池中执行，处理结果写入 output_path（PNG）而不是通过进程间传递图片。
+
+    Args:
+        path: 原始图片路径
+        output_path: 预处理结果路径
+
+    Returns:
+        output_path
+    """
+    if Image is None:
+        raise ImportError("小票识别需要安装 Pillow: pip install Pillow")
+    with Image.open(path) as img:
+        gray = ImageOps.exif_transpose(img).convert('L')
+    if gray.width < MIN_WIDTH:
+        scale = MIN_WIDTH / gray.width
+        gray = gray.resize((MIN_WIDTH, max(1, round(gray.height * scale))), Image.LANCZOS)
+
+    # 在缩略图上估计倾角，旋转使用原图
+    thumb = gray if gray.width <= SKEW_SAMPLE_WIDTH else gray.resize(
+        (SKEW_SAMPLE_WIDTH, max(1, round(gray.height * SKEW_SAMPLE_WIDTH / gray.width))))
+    thumb_pixels = np.asarray(thumb)
+    angle = estimate_skew(thumb_pixels <= otsu_threshold(thumb_pixels))
+    if angle:
+        gray = gray.rotate(-angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    pixels = np.asarray(gray)
+    binary = np.where(pixels <= otsu_threshold(pixels), 0, 255).astype(np.uint8)
+    Image.fromarray(binary).save(output_path)
+    return output_path
+
+
+def run_tesseract_batch(image_paths: Sequence[str], lang: str = DEFAULT_OCR_LANG) -> List[str]:
+    """
+    一次调用 tesseract 识别多张图片（图片列表文件作为输入，模型只加载一次）
+
+    Args:
+        image_paths: 预处理后的图片路径
+        lang: 识别语言
+
+    Returns:
+        各图片的文字（与输入顺序一致）
+    """
+    if not image_paths:
+        return []
+    with tempfile.TemporaryDirectory(prefix='bill-hub-ocr-') as tmp:
+        list_path = os.path.join(tmp, 'images.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(os.path.abspath(p) for p in image_paths) + '\n')
+        result = subprocess.run(
+            ['tesseract', list_path, 'stdout', '-l', lang, '--psm', '6'],
+            capture_output=True, check=True,
+        )
+    # 每张图片的结果以分页符结束
+    pages = result.stdout.decode('utf-8', errors='replace').split('\f')
+    if len(pages) < len(image_paths):
+        raise RuntimeError(f"tesseract 返回 {len(pages)} 页结果，期望 {len(image_paths)} 页")
+    return pages[:len(image_paths)]
+
+
+def _parse_amount(text: str) -> Optional[float]:
+    for pattern in _AMOUNT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return abs(float(match.group(1).replace(',', '').replace('．', '.')))
+    # 没有关键字时取最大的金额（通常是合计）
+    values = [abs(float(v.replace(',', '').replace('．', '.'))) for v in _ANY_AMOUNT.findall(text)]
+    return max(values) if values else None
+
+
+def _parse_time(text: str) -> pd.Timestamp:
+    match = _DATE_PATTERN.search(text)
+    if not match:
+        return pd.NaT
+    year, month, day, hour, minute, second = match.groups()
+    try:
+        return pd.Timestamp(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+    except ValueError:
+        return pd.NaT
+
+
+def _parse_merchant(lines: List[str]) -> Optional[str]:
+    for line in lines:
+        match = _MERCHANT_PATTERN.search(line)
+        if match and match.group(1).strip():
+            return match.group(1).strip()
+    # 没有关键字时取第一行有文字的内容（小票抬头通常是店名）
+    for line in lines:
+        if not _NOT_MERCHANT.search(line) and not _DATE_PATTERN.search(line) and not _ANY_AMOUNT.search(line):
+            return line
+    return None
+
+
+def parse_receipt_text(text: str) -> ReceiptFields:
+    """
+    从 OCR 文字中提取商户、金额和日期
+
+    Args:
+        text: 一张小票的识别结果
+
+    Returns:
+        ReceiptFields（无法识别的字段为 None / NaT）
+    """
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in (text or '').splitlines()]
+    lines = [line for line in lines if line]
+    joined = '\n'.join(lines)
+    return ReceiptFields(merchant=_parse_merchant(lines), amount=_parse_amount(joined), time=_parse_time(joined))
+
+
+class OcrCache:
+    """按图片内容哈希缓存 OCR 文字（每张图片一个 JSON 文件）"""
+
+    def __init__(self, directory: Optional[str] = None, lang: str = DEFAULT_OCR_LANG):
+        """
+        Args:
+            directory: 缓存目录（默认 BILL_HUB_OCR_CACHE 或 ~/.bill-hub/ocr_cache）
+            lang: 识别语言（不同语言的结果分开缓存）
+        """
+        self.directory = directory or os.environ.get(ENV_OCR_CACHE) or DEFAULT_OCR_CACHE_DIR
+        self.lang = lang
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, digest: str) -> Optional[str]:
+        """读取缓存的文字，不存在或参数不一致时返回 None"""
+        try:
+            with open(self._path(digest), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != OCR_VERSION or entry.get('lang') != self.lang:
+            return None
+        return entry.get('text')
+
+    def put(self, digest: str, text: str) -> None:
+        """写入缓存（先写临时文件再原子替换）"""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        path = self._path(digest)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': OCR_VERSION, 'lang': self.lang, 'text': text}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def ocr_receipts(
+    paths: Sequence[str],
+    cache: Optional[OcrCache] = None,
+    workers: Optional[int] = None,
+    batch_size: int = OCR_BATCH_SIZE,
+    digests: Optional[Dict[str, str]] = None
+) -> Dict[str, str]:
+    """
+    识别一批小票图片的文字（缓存命中的图片不做预处理和 OCR）
+
+    未命中缓存的图片在进程池中预处理，再按 batch_size 分批交给 tesseract（整批失败时逐张重试）。
+    预处理或识别失败的图片记录警告后跳过，不影响其余图片；没有安装 tesseract 时跳过未缓存的图片并给出警告。
+
+    Args:
+        paths: 图片路径
+        cache: OCR 缓存（默认使用 OcrCache()）
+        workers: 预处理进程数（默认为 CPU 核数）
+        batch_size: 每次调用 tesseract 的图片数
+        digests: 已计算的图片哈希（路径 -> 哈希，缺少的会补算）
+
+    Returns:
+        图片路径 -> 识别文字
+    """
+    cache = cache or OcrCache(lang=os.environ.get(ENV_OCR_LANG) or DEFAULT_OCR_LANG)
+    texts: Dict[str, str] = {}
+    pending: List[Tuple[str, str]] = []
+    digests = digests or {}
+    for path in paths:
+        digest = digests.get(path) or image_hash(path)
+        cached = cache.get(digest)
+        if cached is not None:
+            texts[path] = cached
+        else:
+            pending.append((path, digest))
+    if len(texts):
+        logger.info(f"OCR 缓存命中 {len(texts)} 张图片")
+    if not pending:
+        return texts
+    if not ocr_available():
+        logger.warning(f"未安装 tesseract 或 Pillow，跳过 {len(pending)} 张未识别过的小票图片")
+        return texts
+
+    with tempfile.TemporaryDirectory(prefix='bill-hub-receipts-') as tmp:
+        # 每张图片单独提交，损坏或无法读取的图片只跳过它自己
+        ready: List[Tuple[str, str, str]] = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(path, digest, pool.submit(preprocess_image, path, os.path.join(tmp, f"{i:05d}.png")))
+                       for i, (path, digest) in enumerate(pending)]
+            for path, digest, future in futures:
+                try:
+                    ready.append((path, digest, future.result()))
+                except Exception as e:
+                    logger.warning(f"小票图片预处理失败，已跳过: {os.path.basename(path)}: {e}")
+        recognized = 0
+        for start in range(0, len(ready), batch_size):
+            batch = ready[start:start + batch_size]
+            for (path, digest, _), text in zip(batch, _ocr_batch([image for _, _, image in batch], cache.lang)):
+                if text is None:
+                    logger.warning(f"小票图片 OCR 失败，已跳过: {os.path.basename(path)}")
+                    continue
+                cache.put(digest, text)
+                texts[path] = text
+                recognized += 1
+    logger.info(f"OCR 识别 {recognized}/{len(pending)} 张小票图片，共 {(len(ready) + batch_size - 1) // batch_size} 批")
+    return texts
+
+
+def _ocr_batch(image_paths: List[str], lang: str) -> List[Optional[str]]:
+    """整批识别，失败时逐张重试，仍然失败的图片结果为 None"""
+    try:
+        return run_tesseract_batch(image_paths, lang)
+    except Exception as e:
+        if len(image_paths) == 1:
+            logger.warning(f"tesseract 识别失败: {e}")
+            return [None]
+        logger.warning(f"tesseract 整批识别失败，逐张重试 {len(image_paths)} 张图片: {e}")
+    return [_ocr_batch([path], lang)[0] for path in image_paths]
+
+
+def import_receipts(paths: Sequence[str], cache: Optional[OcrCache] = None,
+                    workers: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """
+    导入小票图片为交易数据（每张小票一笔支出）
+
+    列名与账单解析结果一致（交易时间 / 交易类型 / 交易对方 / 收/支/其他 / 金额(元) / 交易单号），
+    交易单号为 OCR- 加图片哈希前缀，同一张图片重复导入时可被重复单号校验发现。
+    无法识别出金额的小票会被跳过。
+
+    Args:
+        paths: 图片路径
+        cache: OCR 缓存
+        workers: 预处理进程数
+
+    Returns:
+        交易数据，没有成功识别的小票时返回 None
+    """
+    digests = {path: image_hash(path) for path in paths}
+    texts = ocr_receipts(paths, cache, workers, digests=digests)
+    rows = []
+    for path in paths:
+        if path not in texts:
+            continue
+        fields = parse_receipt_text(texts[path])
+        if fields.amount is None:
+            logger.warning(f"小票未识别出金额，已跳过: {os.path.basename(path)}")
+            continue
+        if pd.isna(fields.time):
+            logger.warning(f"小票未识别出日期: {os.path.basename(path)}")
+        rows.append({
+            '交易时间': fields.time,
+            '交易类型': RECEIPT_TYPE,
+            '交易对方': fields.merchant or '未知商户',
+            '收/支/其他': '支出',
+            '金额(元)': fields.amount,
+            '交易单号': f"OCR-{digests[path][:16]}",
+            SOURCE_COL: os.path.basename(path),
+        })
+    if not rows:
+        return None
+    df = pd.DataFrame(rows)
+    df['交易时间'] = pd.to_datetime(df['交易时间'])
+    logger.info(f"小票导入完成: {len(df)}/{len(paths)} 张")
+    return add_time_keys(df)
@@ -10,6 +10,8 @@ from selenium.webdriver.support import expected_conditions as EC
 import time
 import os
 
+from logger_config import console
+
 def make_full_page_snapshot(html_path, png_path, width=1200):
     """
     生成完整长页面截图
@@ -63,7 +65,7 @@ def make_full_page_snapshot(html_path, png_path, width=1200):
         return True
         
     except Exception as e:
-        print(f"  截图失败: {e}")
+        console.error(f"截图失败: {e}")
         return False
         
     finally:
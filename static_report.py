@@ -0,0 +1,201 @@
+"""
+静态报表图片模块
+使用 matplotlib 的 Agg 后端在进程内直接把报表汇总数据绘制为 PNG，无需启动浏览器
+"""
+import warnings
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+
+from logger_config import logger
+
+# 可选依赖：未安装 matplotlib 时 render_report_png 返回 False
+try:
+    from matplotlib import font_manager, rc_context
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+except ImportError:
+    Figure = None
+
+
+# 按优先级尝试的中文字体
+CJK_FONTS = [
+    'Noto Sans CJK SC', 'Source Han Sans SC', 'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei',
+    'PingFang SC', 'Heiti SC', 'Microsoft YaHei', 'SimHei',
+]
+COLORS = ['#d14b41', '#5793f3', '#675bba', '#fac858', '#91cc75', '#73c0de', '#ee6666', '#3ba272']
+# 每行图表的高度（英寸）
+ROW_HEIGHT = 4.0
+
+
+@lru_cache(maxsize=1)
+def _font_family() -> List[str]:
+    """返回可用的中文字体（找不到时使用默认字体，中文可能显示为方框）"""
+    available = {f.name for f in font_manager.fontManager.ttflist}
+    return [name for name in CJK_FONTS if name in available] + ['DejaVu Sans']
+
+
+def _barh(ax, labels: List[str], values: List[float], color: str, title: str) -> None:
+    positions = np.arange(len(labels))
+    ax.barh(positions, values, color=color)
+    ax.set_yticks(positions, labels, fontsize=8)
+    ax.set_title(title, loc='left', fontsize=12)
+    for pos, value in zip(positions, values):
+        ax.annotate(f"{value:g}", (value, pos), xytext=(3, 0), textcoords='offset points',
+                    va='center', fontsize=7)
+
+
+def render_report_png(agg, png_path: str, width_px: int = 1400, dpi: int = 100) -> bool:
+    """
+    把报表汇总数据绘制为一张竖向长图
+
+    包含核心摘要、月度走势（含月末预测）、每日走势、资金结构与消费构成、商户排行、
+    24 小时交易分布、商户消费频率和异常消费提醒（有数据时）。
+
+    Args:
+        agg: visualize.compute_report_aggregates 返回的汇总数据
+        png_path: 输出 PNG 路径
+        width_px: 图片宽度（像素）
+        dpi: 分辨率
+
+    Returns:
+        是否导出成功
+    """
+    if Figure is None:
+        logger.warning("未安装 matplotlib，无法使用 matplotlib 后端导出 PNG")
+        return False
+
+    # 每一行放一张或两张图
+    rows = [['summary'], ['trend']]
+    if agg.daily_expense is not None:
+        rows.append(['daily'])
+    if agg.type_dist is not None and agg.composition is not None:
+        rows.append(['type', 'composition'])
+    if agg.top_merchants is not None:
+        rows.append(['merchants'])
+    bottom = [name for name, data in (('hourly', agg.hourly_counts), ('consecutive', agg.consecutive))
+              if data is not None]
+    if bottom:
+        rows.append(bottom)
+    if agg.top_alerts is not None:
+        rows.append(['alerts'])
+
+    width_in = width_px / dpi
+    heights = [1.6 if row == ['summary'] else ROW_HEIGHT for row in rows]
+    header = 1.0
+    total_height = sum(heights) + header
+
+    # 缺少中文字体时 matplotlib 会对每个字形告警
+    with warnings.catch_warnings(), rc_context({'font.family': 'sans-serif', 'font.sans-serif': _font_family()}):
+        warnings.simplefilter('ignore', UserWarning)
+        fig = Figure(figsize=(width_in, total_height), dpi=dpi)
+        FigureCanvasAgg(fig)
+        fig.suptitle("微信支付账单分析报告", fontsize=18, fontweight='bold', y=1 - 0.25 / total_height)
+        grid = fig.add_gridspec(len(rows), 2, height_ratios=heights, hspace=0.55, wspace=0.3,
+                                top=1 - header / total_height, bottom=0.02, left=0.12, right=0.97)
+        for r, row in enumerate(rows):
+            for c, name in enumerate(row):
+                ax = fig.add_subplot(grid[r, :] if len(row) == 1 else grid[r, c])
+                _draw(ax, name, agg)
+
+        try:
+            fig.savefig(png_path, dpi=dpi, facecolor='white')
+        except Exception as e:
+            logger.error(f"PNG 绘制失败 {png_path}: {e}")
+            return False
+    return True
+
+
+def _draw(ax, name: str, agg) -> None:
+    """绘制单个图表"""
+    from visualize import SUMMARY_LABELS
+
+    if name == 'summary':
+        positions = np.arange(len(SUMMARY_LABELS))
+        values = [float(v) for v in agg.summary_values]
+        ax.bar(positions, values, color=[COLORS[i % len(COLORS)] for i in positions])
+        ax.set_xticks(positions, SUMMARY_LABELS, fontsize=9)
+        ax.set_yticks([])
+        for pos, value in zip(positions, values):
+            ax.annotate(f"{value:g}", (pos, value), xytext=(0, 3), textcoords='offset points',
+                        ha='center', fontsize=8, fontweight='bold')
+        ax.set_title(f"财务数据核心摘要  |  总交易笔数: {agg.total_transactions}  |  跨度: {agg.trading_days} 天",
+                     fontsize=12)
+        for side in ('top', 'right', 'left'):
+            ax.spines[side].set_visible(False)
+
+    elif name == 'trend':
+        positions = np.arange(len(agg.months))
+        ax.bar(positions - 0.2, agg.monthly_expense, width=0.4, color=COLORS[0], label="月度支出")
+        ax.bar(positions + 0.2, agg.monthly_income, width=0.4, color=COLORS[1], label="月度收入")
+        title = "月度收支走势分析"
+        if agg.forecast is not None:
+            projected, lower, upper = agg.forecast.total
+            last = positions[-1] - 0.2
+            ax.errorbar([last], [projected], yerr=[[projected - lower], [upper - projected]],
+                        fmt='D', color=COLORS[2], capsize=6, label="月末预测")
+            title += f"  |  {agg.forecast.month} 预测月末支出 {projected:.2f} 元"
+        step = max(1, len(positions) // 24)
+        ax.set_xticks(positions[::step], agg.months[::step], fontsize=8, rotation=45)
+        ax.set_title(title, loc='left', fontsize=12)
+        ax.legend(fontsize=8, loc='upper left')
+
+    elif name == 'daily':
+        daily = agg.daily_expense
+        ax.plot(daily.index, daily.to_numpy(dtype=float), color=COLORS[0], linewidth=0.8)
+        ax.set_title(f"每日支出走势（共 {len(daily)} 天）", loc='left', fontsize=12)
+        ax.tick_params(labelsize=8)
+
+    elif name in ('type', 'composition'):
+        data = agg.type_dist if name == 'type' else agg.composition
+        labels = [str(d[0]) for d in data]
+        values = [max(float(d[1]), 0.0) for d in data]
+        if sum(values) > 0:
+            ax.pie(values, labels=labels, autopct='%1.1f%%', colors=COLORS * 2,
+                   wedgeprops={'width': 0.45}, textprops={'fontsize': 8})
+        ax.set_title("资金结构分布" if name == 'type' else agg.composition_title, fontsize=12)
+
+    elif name == 'merchants':
+        top = agg.top_merchants
+        _barh(ax, [str(i) for i in top.index], top.round(2).tolist(), '#005ea1', "商户支出排行榜 (Top 20)")
+
+    elif name == 'hourly':
+        hours = np.arange(24)
+        ax.plot(hours, agg.hourly_counts, color='#ff9900', linewidth=2)
+        ax.fill_between(hours, agg.hourly_counts, color='#ff9900', alpha=0.1)
+        ax.set_xticks(hours[::2], [f"{h}点" for h in hours[::2]], fontsize=8)
+        ax.set_title("24小时交易习惯分析", loc='left', fontsize=12)
+
+    elif name == 'consecutive':
+        stats = agg.consecutive
+        _barh(ax, [str(i) for i in stats.index], stats.tolist(), '#fc8d59', "商户消费频率分析（最高连续消费天数）")
+
+    elif name == 'alerts':
+        top = agg.top_alerts
+        labels = [f"{o} ({m})" for o, m in zip(top['对象'], top['月份'])]
+        positions = np.arange(len(labels))
+        ax.barh(positions + 0.2, top['金额(元)'], height=0.4, color=COLORS[0], label="实际金额")
+        ax.barh(positions - 0.2, top['基线'], height=0.4, color=COLORS[4], label="常规基线")
+        ax.set_yticks(positions, labels, fontsize=8)
+        ax.set_title(f"异常消费提醒（共 {agg.alerts_total} 条，展示前 {len(labels)} 条）", loc='left', fontsize=12)
+        ax.legend(fontsize=8, loc='lower right')
+
+
+def render_report_pngs(items: list, max_workers: Optional[int] = None) -> List[bool]:
+    """
+    并发绘制多份报表图片（进程池，每个进程独立使用 Agg 画布）
+
+    Args:
+        items: (汇总数据, PNG 路径) 的列表
+        max_workers: 进程数（默认 CPU 核数）
+
+    Returns:
+        每份报表是否导出成功
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if len(items) <= 1 or max_workers == 1:
+        return [render_report_png(agg, path) for agg, path in items]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(render_report_png, *zip(*items)))
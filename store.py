@@ -0,0 +1,276 @@
+"""
+账单数据存储模块
+把规范化后的交易数据按月份分区持久化，查询时按日期范围、月份和商户裁剪分区，避免重新解析 PDF
+
+目录结构:
+    manifest.json                      来源文件和分区统计（行数、时间范围、商户列表）
+    month=YYYY-MM/<来源指纹>.<格式>    每个来源文件在每个月份的数据
+"""
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+from utils import MISSING_TIME_KEY, MONTH_KEY, ensure_time_keys, month_labels
+
+# 分区使用 Parquet（支持列裁剪和行过滤下推），读写分区需要安装 pyarrow；
+# 不回退到 pickle：加载 pickle 会执行文件中的任意代码
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+
+ENV_STORE = 'BILL_HUB_STORE'
+DEFAULT_STORE_DIR = os.path.join('output', 'store')
+TIME_COL = '交易时间'
+MERCHANT_COL = '交易对方'
+CATEGORY_COL = '分类'
+# 交易时间缺失的记录所在分区
+UNKNOWN_MONTH = 'unknown'
+STORE_FORMAT = 'parquet'
+
+
+@dataclass
+class QueryFilter:
+    """
+    查询条件
+
+    Attributes:
+        start: 起始时间（含）
+        end: 结束时间（不含）
+        months_of_year: 只保留这些月份（1-12），如第二季度为 {4, 5, 6}；为 None 时不限，为空时不匹配任何记录
+        merchants: 交易对方包含其中任意一个关键字
+        categories: 分类属于其中之一
+    """
+    start: Optional[pd.Timestamp] = None
+    end: Optional[pd.Timestamp] = None
+    months_of_year: Optional[Sequence[int]] = None
+    merchants: Optional[Sequence[str]] = None
+    categories: Optional[Sequence[str]] = None
+
+    def month_in_range(self, month_key: int) -> bool:
+        """按分区月份裁剪"""
+        if self.months_of_year is not None and month_key % 12 + 1 not in self.months_of_year:
+            return False
+        month_start = pd.Timestamp(year=month_key // 12, month=month_key % 12 + 1, day=1)
+        if self.end is not None and month_start >= self.end:
+            return False
+        if self.start is not None and month_start + pd.offsets.MonthBegin(1) <= self.start:
+            return False
+        return True
+
+    def partition_matches(self, stats: Dict) -> bool:
+        """按分区统计（时间范围、商户、分类）裁剪"""
+        if self.start is not None and pd.Timestamp(stats['max']) < self.start:
+            return False
+        if self.end is not None and pd.Timestamp(stats['min']) >= self.end:
+            return False
+        if self.merchants and not any(m in name for name in stats['merchants'] for m in self.merchants):
+            return False
+        if self.categories and not set(self.categories) & set(stats.get('categories', [])):
+            return False
+        return True
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """对已读取的分区数据做行过滤"""
+        mask = np.ones(len(df), dtype=bool)
+        times = df[TIME_COL]
+        if self.start is not None:
+            mask &= (times >= self.start).to_numpy()
+        if self.end is not None:
+            mask &= (times < self.end).to_numpy()
+        if self.months_of_year is not None:
+            months = df[MONTH_KEY]
+            mask &= ((months != MISSING_TIME_KEY) & (months % 12 + 1).isin(list(self.months_of_year))).to_numpy()
+        if self.merchants and MERCHANT_COL in df.columns:
+            names = df[MERCHANT_COL].astype(str)
+            hit = np.zeros(len(df), dtype=bool)
+            for merchant in self.merchants:
+                hit |= names.str.contains(merchant, regex=False).to_numpy()
+            mask &= hit
+        if self.categories and CATEGORY_COL in df.columns:
+            mask &= df[CATEGORY_COL].isin(list(self.categories)).to_numpy()
+        return df[mask]
+
+    @property
+    def has_time_bounds(self) -> bool:
+        return self.start is not None or self.end is not None or self.months_of_year is not None
+
+
+class BillStore:
+    """按月份分区的账单数据存储"""
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Args:
+            root: 存储目录（默认 BILL_HUB_STORE 或 output/store）
+        """
+        self.root = root or os.environ.get(ENV_STORE) or DEFAULT_STORE_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self._manifest_path = os.path.join(self.root, 'manifest.json')
+        self.manifest = self._load_manifest()
+        if self.format != STORE_FORMAT:
+            raise ValueError(f"不支持的存储格式 {self.format}（旧版本的 pickle 分区不再读取），"
+                             f"请删除 {self.root} 后重新导入")
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'format': STORE_FORMAT, 'sources': {}}
+
+    def _save_manifest(self) -> None:
+        tmp = self._manifest_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self._manifest_path)
+
+    @property
+    def format(self) -> str:
+        return self.manifest['format']
+
+    def has_source(self, fingerprint: str) -> bool:
+        """是否已存入该来源文件"""
+        return fingerprint in self.manifest['sources']
+
+    @staticmethod
+    def _require_pyarrow() -> None:
+        if pq is None:
+            raise ImportError("账单存储使用 Parquet 格式，需要安装 pyarrow: pip install pyarrow")
+
+    def _write(self, df: pd.DataFrame, path: str) -> None:
+        self._require_pyarrow()
+        tmp = path + '.tmp'
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+
+    def _read(self, path: str, columns: Optional[List[str]], query: QueryFilter) -> pd.DataFrame:
+        self._require_pyarrow()
+        filters = []
+        if query.start is not None:
+            filters.append((TIME_COL, '>=', query.start))
+        if query.end is not None:
+            filters.append((TIME_COL, '<', query.end))
+        table = pq.read_table(path, columns=columns, filters=filters or None)
+        return table.to_pandas()
+
+    def ingest(self, df: pd.DataFrame, fingerprint: str, source_name: str) -> int:
+        """
+        存入一个来源文件的规范化数据（同一来源重复存入时覆盖）
+
+        Args:
+            df: 规范化后的交易数据（需包含整数时间键）
+            fingerprint: 来源文件内容指纹
+            source_name: 来源文件名（仅用于展示）
+
+        Returns:
+            写入的分区数
+        """
+        df = ensure_time_keys(df)
+        self.remove_source(fingerprint)
+        partitions = {}
+        for month_key, part in df.groupby(MONTH_KEY, sort=True):
+            month_key = int(month_key)
+            month = UNKNOWN_MONTH if month_key == MISSING_TIME_KEY else month_labels([month_key])[0]
+            directory = os.path.join(self.root, f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{fingerprint[:16]}.{STORE_FORMAT}")
+            part = part.reset_index(drop=True)
+            self._write(part, path)
+            times = part[TIME_COL].dropna()
+            partitions[month] = {
+                'path': os.path.relpath(path, self.root),
+                'month_key': month_key,
+                'rows': len(part),
+                'min': str(times.min()) if not times.empty else None,
+                'max': str(times.max()) if not times.empty else None,
+                'merchants': sorted(part[MERCHANT_COL].dropna().astype(str).unique().tolist())
+                if MERCHANT_COL in part.columns else [],
+                'categories': sorted(part[CATEGORY_COL].dropna().astype(str).unique().tolist())
+                if CATEGORY_COL in part.columns else [],
+            }
+        self.manifest['sources'][fingerprint] = {
+            'name': source_name,
+            'rows': len(df),
+            'ingested_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'partitions': partitions,
+        }
+        self._save_manifest()
+        logger.info(f"已存入 {source_name}：{len(df)} 行，{len(partitions)} 个月份分区")
+        return len(partitions)
+
+    def remove_source(self, fingerprint: str) -> None:
+        """删除一个来源文件的全部分区"""
+        source = self.manifest['sources'].pop(fingerprint, None)
+        if source is None:
+            return
+        for stats in source['partitions'].values():
+            try:
+                os.remove(os.path.join(self.root, stats['path']))
+            except OSError:
+                pass
+        self._save_manifest()
+
+    def partitions(self, query: Optional[QueryFilter] = None) -> List[Dict]:
+        """返回满足查询条件的分区统计（分区裁剪）"""
+        query = query or QueryFilter()
+        selected = []
+        for source in self.manifest['sources'].values():
+            for stats in source['partitions'].values():
+                if stats['month_key'] == MISSING_TIME_KEY:
+                    if query.has_time_bounds:
+                        continue
+                elif not query.month_in_range(stats['month_key']) or not query.partition_matches(stats):
+                    continue
+                selected.append(stats)
+        return sorted(selected, key=lambda s: (s['month_key'], s['path']))
+
+    def scan(self, query: Optional[QueryFilter] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        读取满足条件的数据：先按分区统计裁剪，再对读取的分区做行过滤
+
+        Args:
+            query: 查询条件
+            columns: 需要的列（默认全部；过滤所需的列会自动加入）
+
+        Returns:
+            按交易时间排序的数据
+        """
+        query = query or QueryFilter()
+        read_columns = None
+        if columns is not None:
+            needed = [TIME_COL, MONTH_KEY, MERCHANT_COL, CATEGORY_COL]
+            read_columns = list(dict.fromkeys(list(columns) + needed))
+        total = sum(len(p['partitions']) for p in self.manifest['sources'].values())
+        selected = self.partitions(query)
+        frames = []
+        for stats in selected:
+            path = os.path.join(self.root, stats['path'])
+            cols = None
+            if read_columns is not None:
+                self._require_pyarrow()
+                names = set(pq.read_schema(path).names)
+                cols = [c for c in read_columns if c in names]
+            frame = query.apply(self._read(path, cols, query))
+            if not frame.empty:
+                frames.append(frame)
+        logger.info(f"扫描 {len(selected)}/{total} 个分区")
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True).sort_values(TIME_COL, kind='stable', ignore_index=True)
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        return df
+
+    def sources(self) -> List[Dict]:
+        """已存入的来源文件"""
+        return [
+            {'fingerprint': key, 'name': value['name'], 'rows': value['rows'], 'ingested_at': value['ingested_at']}
+            for key, value in self.manifest['sources'].items()
+        ]
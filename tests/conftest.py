@@ -31,10 +31,171 @@ def sample_df():
     }
     return pd.DataFrame(data)
 
+@pytest.fixture(autouse=True)
+def isolated_checkpoints(tmp_path, monkeypatch):
+    """页面检查点写入临时目录，不污染用户目录"""
+    monkeypatch.setenv('BILL_HUB_CHECKPOINT_DIR', str(tmp_path / 'checkpoints'))
+
+
+@pytest.fixture(autouse=True)
+def isolated_merchant_aliases(tmp_path, monkeypatch):
+    """商户别名缓存写入临时目录，每个测试从空表开始"""
+    import merchants
+
+    monkeypatch.setenv('BILL_HUB_MERCHANT_ALIASES', str(tmp_path / 'merchant_aliases.json'))
+    monkeypatch.setattr(merchants, '_default_canonicalizer', None)
+
+
+@pytest.fixture(autouse=True)
+def isolated_budgets(tmp_path, monkeypatch):
+    """预算配置指向临时目录中不存在的文件（默认不启用预算）"""
+    import budget
+
+    monkeypatch.setenv('BILL_HUB_BUDGETS', str(tmp_path / 'budgets.json'))
+    monkeypatch.setattr(budget, '_default_tracker', None)
+
+
+@pytest.fixture(autouse=True)
+def isolated_ocr_cache(tmp_path, monkeypatch):
+    """小票 OCR 缓存写入临时目录"""
+    monkeypatch.setenv('BILL_HUB_OCR_CACHE', str(tmp_path / 'ocr_cache'))
+
+
 @pytest.fixture
 def temp_dir():
     """创建临时目录用于测试"""
     temp_dir = tempfile.mkdtemp()
     yield temp_dir
     # 清理临时目录
-    shutil.rmtree(temp_dir, ignore_errors=True)
\ No newline at end of file
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+# 微信账单表头及列宽（PDF 坐标单位）
+WECHAT_COLUMNS = ['交易单号', '交易时间', '交易类型', '收/支/其他', '交易方式', '金额(元)', '交易对方', '商户单号']
+WECHAT_WIDTHS = [150, 90, 80, 60, 80, 70, 150, 150]
+
+
+def _pdf_text(text: str) -> str:
+    return '<' + ''.join(f'{ord(ch):04X}' for ch in text) + '>'
+
+
+def write_statement_pdf(path, rows, rows_per_page=20, title="微信支付交易明细证明",
+                        columns=None, widths=None):
+    """
+    生成带表格线的账单 PDF（使用 Identity-H 编码和 ToUnicode 映射，无需嵌入字体）
+
+    Args:
+        path: 输出路径
+        rows: 数据行（字符串列表的列表），单元格内的换行会被绘制为多行
+        rows_per_page: 每页的数据行数
+        title: 第一页顶部的标题
+        columns: 表头（默认微信账单表头）
+        widths: 列宽
+    """
+    columns = columns or WECHAT_COLUMNS
+    widths = widths or WECHAT_WIDTHS
+    font_size, line_height, left = 7, 9, 20
+    xs = [left]
+    for w in widths:
+        xs.append(xs[-1] + w)
+
+    def draw_table(table_rows, top):
+        ops = []
+        y = top
+        ops.append(f"{xs[0]} {y} m {xs[-1]} {y} l S")
+        for row in table_rows:
+            lines = max(len(str(cell).split('\n')) for cell in row)
+            height = lines * line_height + 6
+            for x, cell in zip(xs, row):
+                for k, part in enumerate(str(cell).split('\n')):
+                    ty = y - 3 - font_size - k * line_height
+                    ops.append(f"BT /F1 {font_size} Tf {x + 2} {ty} Td {_pdf_text(part)} Tj ET")
+            y -= height
+            ops.append(f"{xs[0]} {y} m {xs[-1]} {y} l S")
+        for x in xs:
+            ops.append(f"{x} {top} m {x} {y} l S")
+        return ops
+
+    chunks = [rows[i:i + rows_per_page] for i in range(0, len(rows), rows_per_page)] or [[]]
+    contents = []
+    for i, chunk in enumerate(chunks):
+        ops = ["0.5 w"]
+        top = 560
+        if i == 0:
+            ops.append(f"BT /F1 12 Tf {left} 575 Td {_pdf_text(title)} Tj ET")
+            top = 565
+        ops.extend(draw_table([columns] + chunk, top))
+        contents.append("\n".join(ops).encode('latin-1'))
+
+    objects = []
+    n_pages = len(contents)
+    page_ids = [6 + 2 * i for i in range(n_pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{' '.join(f'{p} 0 R' for p in page_ids)}] /Count {n_pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type0 /BaseFont /TestFont /Encoding /Identity-H "
+                   b"/DescendantFonts [4 0 R] /ToUnicode 5 0 R >>")
+    objects.append(b"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /TestFont "
+                   b"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+                   b"/FontDescriptor << /Type /FontDescriptor /FontName /TestFont /Flags 4 "
+                   b"/FontBBox [0 -200 1000 900] /ItalicAngle 0 /Ascent 900 /Descent -200 /CapHeight 700 /StemV 80 >> "
+                   b"/DW 1000 /W [32 [" + b" ".join([b"500"] * 95) + b"]] >>")
+    cmap = (b"/CIDInit /ProcSet findresource begin 12 dict begin begincmap "
+            b"/CMapName /Test def 1 begincodespacerange <0000> <FFFF> endcodespacerange "
+            b"1 beginbfrange <0000> <FFFF> <0000> endbfrange endcmap "
+            b"CMapName currentdict /CMap defineresource pop end end")
+    objects.append(b"<< /Length %d >>\nstream\n" % len(cmap) + cmap + b"\nendstream")
+    for content in contents:
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 842 595] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects) + 2))
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, 'wb') as f:
+        f.write(out)
+    return path
+
+
+def make_wechat_rows(n, start='2024-01-01 08:00:00'):
+    """生成 n 条微信账单数据行（交易时间的日期和时刻分两行显示）"""
+    times = pd.date_range(start, periods=n, freq='7h')
+    rows = []
+    for i, t in enumerate(times):
+        rows.append([
+            f"4200000{i:08d}",
+            f"{t:%Y-%m-%d}\n{t:%H:%M:%S}",
+            "商户消费",
+            "支出" if i % 5 else "收入",
+            "零钱",
+            f"¥{(i % 17) * 3 + 1.5:.2f}",
+            f"商户{i % 7}",
+            f"M{i:010d}",
+        ])
+    return rows
+
+
+@pytest.fixture
+def pdf_writer():
+    """返回账单 PDF 生成函数 write_statement_pdf"""
+    return write_statement_pdf
+
+
+@pytest.fixture
+def wechat_rows():
+    """返回账单数据行生成函数 make_wechat_rows"""
+    return make_wechat_rows
+
+
+@pytest.fixture
+def statement_pdf(temp_dir):
+    """生成一份 3 页的微信账单 PDF，返回 (路径, 数据行)"""
+    rows = make_wechat_rows(50)
+    path = write_statement_pdf(os.path.join(temp_dir, "statement.pdf"), rows)
+    return path, rows
@@ -0,0 +1,85 @@
+"""
+测试 anomaly.py 模块的功能
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly import ALERT_COLUMNS, AnomalyDetector, detect_spending_anomalies
+from visualize import generate_visualizations
+
+
+@pytest.fixture
+def history_df():
+    """创建一年的规律消费数据，并在最后一个月插入异常"""
+    rng = np.random.default_rng(42)
+    times = pd.date_range('2024-01-01', '2024-12-31', freq='D')
+    df = pd.DataFrame({
+        '交易时间': times,
+        '收/支': '支出',
+        '金额(元)': rng.normal(30, 3, len(times)).round(2),
+        '交易对方': '楼下餐厅',
+        '分类': '餐饮',
+    })
+    # 12 月的一笔大额单笔消费
+    df.loc[df['交易时间'] == '2024-12-20', '金额(元)'] = 600.0
+    return df
+
+
+class TestDetectSpendingAnomalies:
+    """测试 detect_spending_anomalies 函数"""
+
+    def test_flags_single_transaction(self, history_df):
+        """测试标记异常的单笔交易"""
+        alerts = detect_spending_anomalies(history_df)
+        singles = alerts[alerts['类型'] == '单笔异常']
+        assert len(singles) == 1
+        assert singles.iloc[0]['金额(元)'] == 600.0
+        assert singles.iloc[0]['月份'] == '2024-12'
+
+    def test_flags_monthly_spike(self, history_df):
+        """测试标记月度支出激增"""
+        df = history_df.copy()
+        df.loc[df['交易时间'].dt.month == 12, '金额(元)'] *= 3
+        alerts = detect_spending_anomalies(df)
+        monthly = alerts[(alerts['类型'] == '月度激增') & (alerts['维度'] == '分类')]
+        assert monthly['月份'].tolist() == ['2024-12']
+        assert monthly.iloc[0]['环比'] > 2
+
+    def test_regular_spending_has_no_alerts(self, history_df):
+        """测试规律消费不产生提醒"""
+        df = history_df[history_df['金额(元)'] < 100]
+        assert detect_spending_anomalies(df).empty
+
+    def test_income_is_ignored(self, history_df):
+        """测试收入不参与检测"""
+        df = history_df.copy()
+        df.loc[df['金额(元)'] == 600.0, '收/支'] = '收入'
+        alerts = detect_spending_anomalies(df)
+        assert (alerts['类型'] != '单笔异常').all()
+
+    def test_empty_input(self):
+        """测试空数据"""
+        alerts = detect_spending_anomalies(pd.DataFrame())
+        assert alerts.empty
+        assert list(alerts.columns) == ALERT_COLUMNS
+
+    def test_incremental_matches_full(self, history_df):
+        """测试按月追加与一次性检测的结果一致"""
+        full = detect_spending_anomalies(history_df)
+        detector = AnomalyDetector()
+        parts = [detector.update(g) for _, g in history_df.groupby(history_df['交易时间'].dt.month)]
+        incremental = pd.concat([p for p in parts if not p.empty], ignore_index=True)
+        assert sorted(incremental['金额(元)'].tolist()) == sorted(full['金额(元)'].tolist())
+
+
+def test_alerts_chart_in_report(history_df, temp_dir):
+    """测试报表中包含异常消费图表"""
+    output_path = os.path.join(temp_dir, "alerts_report.html")
+    alerts = detect_spending_anomalies(history_df)
+    generate_visualizations(history_df, output_path, alerts=alerts)
+    with open(output_path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+    assert '异常消费提醒' in html_content
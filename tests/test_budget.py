@@ -0,0 +1,132 @@
+"""
+测试 budget.py 模块的功能
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import budget
+from budget import BudgetConfig, BudgetTracker, compute_budget_burn, get_default_tracker, load_budgets
+from visualize import generate_visualizations
+
+
+def _bill(dates, amounts, category='餐饮', merchant='食堂'):
+    return pd.DataFrame({
+        '交易时间': pd.to_datetime(dates),
+        '收/支/其他': '支出',
+        '金额(元)': amounts,
+        '交易对方': merchant,
+        '分类': category,
+    })
+
+
+@pytest.fixture
+def config():
+    return BudgetConfig.from_dict({'categories': {'餐饮': 1000}, 'merchants': {'咖啡馆': 200}})
+
+
+class TestBudgetConfig:
+    """测试预算配置"""
+
+    def test_load_from_env_file(self, tmp_path):
+        """读取 BILL_HUB_BUDGETS 指定的配置，阈值升序"""
+        with open(tmp_path / 'budgets.json', 'w', encoding='utf-8') as f:
+            json.dump({'categories': {'餐饮': 1500}, 'thresholds': [1.0, 0.5]}, f)
+        config = load_budgets()
+        assert config.limits == {'分类': {'餐饮': 1500.0}}
+        assert config.thresholds == (0.5, 1.0)
+
+    def test_missing_or_invalid_config_disables(self, tmp_path):
+        """没有配置或配置错误时不启用预算"""
+        assert load_budgets() is None
+        assert get_default_tracker() is None
+        with open(tmp_path / 'budgets.json', 'w', encoding='utf-8') as f:
+            json.dump({'categories': {'餐饮': -1}}, f)
+        assert load_budgets() is None
+
+
+class TestBudgetTracker:
+    """测试增量累计和越过阈值的提醒"""
+
+    def test_alerts_when_crossing_thresholds(self, config):
+        """累计支出越过 80% 和 100% 时各提醒一次"""
+        tracker = BudgetTracker(config)
+        assert tracker.update(_bill(['2024-05-02'], [500.0])) == []
+        alerts = tracker.update(_bill(['2024-05-10'], [350.0]))
+        assert [(a.subject, a.threshold, a.spent) for a in alerts] == [('餐饮', 0.8, 850.0)]
+        alerts = tracker.update(_bill(['2024-05-20', '2024-06-01'], [200.0, 100.0]))
+        assert [(a.subject, a.month, a.threshold) for a in alerts] == [('餐饮', '2024-05', 1.0)]
+        assert '超出预算' in alerts[0].text
+        assert tracker.spent('分类', '餐饮', 2024 * 12 + 5) == 100.0
+
+    def test_state_is_persisted_and_sources_counted_once(self, config, tmp_path):
+        """累计保存在状态文件中，同一份账单不重复计入"""
+        path = str(tmp_path / 'state.json')
+        bill = _bill(['2024-05-02', '2024-05-03'], [50.0, 60.0], category='其他', merchant='咖啡馆')
+        BudgetTracker(config, path).update(bill, 'fp-1')
+
+        tracker = BudgetTracker(config, path)
+        assert tracker.update(bill, 'fp-1') == []
+        assert tracker.spent('商户', '咖啡馆', 2024 * 12 + 4) == 110.0
+        alerts = tracker.update(_bill(['2024-05-09'], [60.0], category='其他', merchant='咖啡馆'), 'fp-2')
+        assert [a.threshold for a in alerts] == [0.8]
+
+    def test_ignores_income_and_unbudgeted_items(self, config):
+        """收入和没有预算的对象不计入"""
+        bill = _bill(['2024-05-02', '2024-05-03'], [5000.0, 5000.0], category='交通')
+        bill.loc[0, '分类'] = '餐饮'
+        bill.loc[0, '收/支/其他'] = '收入'
+        tracker = BudgetTracker(config)
+        assert tracker.update(bill) == []
+        assert tracker.totals == {}
+
+
+class TestBudgetBurn:
+    """测试报表中的预算消耗进度"""
+
+    def test_daily_burn_and_crossing_dates(self, config):
+        """最后一个月逐日累计百分比，提醒带越过阈值的日期"""
+        df = pd.concat([_bill(['2024-04-30'], [900.0]),
+                        _bill(['2024-05-02', '2024-05-15', '2024-05-20'], [300.0, 600.0, 300.0])])
+        burn = compute_budget_burn(df, config)
+        assert burn.month == '2024-05'
+        assert len(burn.days) == 31
+        series = burn.series['分类: 餐饮']
+        assert series[0] == 0.0 and series[1] == 30.0 and series[-1] == 120.0
+        assert [(a.date, a.threshold) for a in burn.alerts] == [
+            (pd.Timestamp('2024-05-15'), 0.8), (pd.Timestamp('2024-05-20'), 1.0)]
+
+    def test_no_config_or_no_spending(self, config):
+        """没有预算或当月没有预算项支出时不绘制"""
+        assert compute_budget_burn(_bill(['2024-05-02'], [10.0]), None) is None
+        assert compute_budget_burn(_bill(['2024-05-02'], [10.0], category='交通'), config) is None
+
+    def test_report_includes_burn_chart(self, tmp_path, temp_dir):
+        """配置了预算时报表包含消耗进度图和预算提醒"""
+        with open(tmp_path / 'budgets.json', 'w', encoding='utf-8') as f:
+            json.dump({'categories': {'餐饮': 100}}, f)
+        output_path = os.path.join(temp_dir, 'report.html')
+        generate_visualizations(_bill(['2024-05-02', '2024-05-03'], [60.0, 50.0]), output_path, snapshot=False)
+        with open(output_path, encoding='utf-8') as f:
+            content = f.read()
+        assert '预算消耗进度' in content
+        assert '🎯 预算提醒' in content
+
+
+def test_process_pdf_tracks_budget(statement_pdf, tmp_path, temp_dir, capsys):
+    """process_pdf 把新账单计入预算累计，再次处理同一文件不重复计入"""
+    from main import process_pdf
+
+    with open(tmp_path / 'budgets.json', 'w', encoding='utf-8') as f:
+        json.dump({'merchants': {'商户1': 10}}, f)
+    process_pdf(statement_pdf[0], temp_dir)
+    assert '预算提醒' in capsys.readouterr().out
+    tracker = budget.get_default_tracker()
+    totals = dict(tracker.totals)
+    assert totals
+
+    process_pdf(statement_pdf[0], temp_dir)
+    assert tracker.totals == totals
+    assert os.path.exists(tmp_path / 'budgets_state.json')
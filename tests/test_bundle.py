@@ -0,0 +1,121 @@
+"""
+测试 bundle.py 模块的功能
+"""
+import os
+import zipfile
+
+import pytest
+
+from bundle import ArtifactPackager, artifact_paths, packager_from_env
+from utils import extract_zip
+
+
+@pytest.fixture
+def artifacts(temp_dir):
+    """一组大小不同的产物文件"""
+    paths = []
+    for i in range(8):
+        path = os.path.join(temp_dir, f'bill_{i}.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<p>账单报表</p>' * (200 * i + 1))
+        paths.append(path)
+    return paths
+
+
+class TestArtifactPackager:
+    """测试并行压缩和流式写入"""
+
+    def test_parallel_deflate_archive(self, temp_dir, artifacts):
+        """并行压缩写出的归档可以被 zipfile 读取，内容与原文件一致"""
+        archive = os.path.join(temp_dir, 'out', 'bundle.zip')
+        with ArtifactPackager(archive, workers=4) as packager:
+            for path in artifacts:
+                packager.add(path)
+            packager.add(artifacts[0])  # 同名成员只写入一次
+            packager.add(artifacts[1], arcname='reports/第二份.html')
+
+        with zipfile.ZipFile(archive) as zf:
+            assert zf.testzip() is None
+            assert sorted(zf.namelist()) == sorted([os.path.basename(p) for p in artifacts] + ['reports/第二份.html'])
+            for path in artifacts:
+                with open(path, 'rb') as f:
+                    assert zf.read(os.path.basename(path)) == f.read()
+            assert all(info.compress_type == zipfile.ZIP_DEFLATED for info in zf.infolist())
+
+        report = packager.report
+        assert report.members == 9
+        assert report.packed_bytes < report.raw_bytes
+        assert not os.path.exists(f"{archive}.{os.getpid()}.tmp")
+
+    def test_encrypted_archive_matches_extract_zip(self, temp_dir, artifacts):
+        """设置密码时写出 AES 加密归档，可用 extract_zip 和同一密码解压"""
+        archive = os.path.join(temp_dir, 'secret.zip')
+        with ArtifactPackager(archive, password='客户密码') as packager:
+            for path in artifacts[:3]:
+                packager.add(path)
+        assert packager.report.members == 3
+
+        extracted = extract_zip(archive, os.path.join(temp_dir, 'x'), '客户密码')
+        assert sorted(os.path.basename(p) for p in extracted) == ['bill_0.html', 'bill_1.html', 'bill_2.html']
+        with pytest.raises(Exception):
+            extract_zip(archive, os.path.join(temp_dir, 'y'), 'wrong')
+
+    def test_missing_file_is_reported(self, temp_dir, artifacts):
+        """读取失败的文件记入 failed，其余成员正常写出"""
+        archive = os.path.join(temp_dir, 'bundle.zip')
+        with ArtifactPackager(archive) as packager:
+            packager.add(artifacts[0])
+            packager.add(os.path.join(temp_dir, 'missing.xlsx'))
+        assert packager.report.failed == [os.path.join(temp_dir, 'missing.xlsx')]
+        with zipfile.ZipFile(archive) as zf:
+            assert zf.namelist() == ['bill_0.html']
+
+    def test_add_after_close(self, temp_dir, artifacts):
+        """关闭后不能再加入文件"""
+        packager = ArtifactPackager(os.path.join(temp_dir, 'bundle.zip'))
+        packager.close()
+        with pytest.raises(ValueError):
+            packager.add(artifacts[0])
+
+
+class TestArtifactDiscovery:
+    """测试产物查找和环境变量配置"""
+
+    def test_artifact_paths(self, temp_dir):
+        """只包含该账单的产物，不含指纹文件和前缀相同的其他账单"""
+        for name in ('a.xlsx', 'a.xlsx.fingerprint', 'a.html', 'a_full_page.png', 'a_insights.json', 'a_b.xlsx'):
+            open(os.path.join(temp_dir, name), 'w').close()
+        names = [os.path.basename(p) for p in artifact_paths(temp_dir, 'a')]
+        assert names == ['a.xlsx', 'a.html', 'a_full_page.png', 'a_insights.json']
+
+    def test_packager_from_env(self, temp_dir, monkeypatch):
+        """未设置 BILL_HUB_PACKAGE 时不打包，设置名称时写入输出目录"""
+        monkeypatch.delenv('BILL_HUB_PACKAGE', raising=False)
+        assert packager_from_env(temp_dir) is None
+
+        monkeypatch.setenv('BILL_HUB_PACKAGE', 'customer_a')
+        monkeypatch.setenv('BILL_HUB_PACKAGE_PASSWORD', 'pw')
+        packager = packager_from_env(temp_dir)
+        assert packager.encrypted
+        assert packager.close().path == os.path.join(temp_dir, 'customer_a.zip')
+
+
+class TestPipelinePackaging:
+    """测试流水线中的打包阶段"""
+
+    def test_pipeline_streams_artifacts(self, temp_dir, pdf_writer, wechat_rows):
+        """每个账单处理完成即加入归档"""
+        from main import run_bill_pipeline
+        from password_provider import PasswordProvider
+
+        output_dir = os.path.join(temp_dir, 'output')
+        os.makedirs(output_dir)
+        sources = [pdf_writer(os.path.join(temp_dir, f'{name}.pdf'), wechat_rows(6)) for name in ('a', 'b')]
+        archive = os.path.join(output_dir, 'bundle.zip')
+        with ArtifactPackager(archive) as packager:
+            run_bill_pipeline(sources, output_dir, os.path.join(temp_dir, 'tmp'), PasswordProvider(env={}),
+                              snapshot=False, packager=packager)
+
+        with zipfile.ZipFile(archive) as zf:
+            names = set(zf.namelist())
+        assert {'a.xlsx', 'a.html', 'b.xlsx', 'b.html'} <= names
@@ -0,0 +1,101 @@
+"""
+测试 categorize.py 模块的功能
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from categorize import CATEGORY_COL, DEFAULT_CATEGORY, Categorizer, assign_categories
+
+
+class TestCategorizer:
+    """测试 Categorizer 类"""
+
+    def test_keyword_match(self):
+        """测试关键词匹配"""
+        categorizer = Categorizer()
+        assert categorizer.classify("美团外卖订单") == "餐饮"
+        assert categorizer.classify("滴滴出行") == "交通"
+        assert categorizer.classify("KFC 肯德基") == "餐饮"
+        assert categorizer.classify("未知商户") == DEFAULT_CATEGORY
+
+    def test_rule_order_is_priority(self):
+        """测试多条规则同时命中时按声明顺序取优先"""
+        rules = [
+            {"category": "A", "keywords": ["超市"]},
+            {"category": "B", "keywords": ["便利", "超市便利店"]},
+        ]
+        categorizer = Categorizer(rules)
+        assert categorizer.classify("某某超市便利店") == "A"
+        assert categorizer.classify("便利蜂") == "B"
+
+    def test_overlapping_keywords(self):
+        """测试自动机对重叠关键词的匹配（失败指针）"""
+        categorizer = Categorizer([
+            {"category": "X", "keywords": ["abcd"]},
+            {"category": "Y", "keywords": ["bc"]},
+        ])
+        assert categorizer.classify("zabcz") == "Y"
+        assert categorizer.classify("zabcdz") == "X"
+
+    def test_regex_patterns(self):
+        """测试正则规则"""
+        categorizer = Categorizer([{"category": "房租", "patterns": [r"^房东.+月租$"]}])
+        assert categorizer.classify("房东张三3月租") == "房租"
+        assert categorizer.classify("张三") == DEFAULT_CATEGORY
+
+    def test_categorize_dataframe(self, sample_df):
+        """测试对 DataFrame 批量分类"""
+        result = Categorizer().categorize(sample_df)
+        assert list(result.index) == list(sample_df.index)
+        assert result.tolist() == ['餐饮', '收入', '购物', '交通', '餐饮']
+
+    def test_all_missing_text_column(self):
+        """某个文本列整列缺失时不报错，其他列照常匹配"""
+        df = pd.DataFrame({'交易对方': ['美团', '滴滴'], '商品': [np.nan, np.nan]})
+        assert Categorizer().categorize(df).tolist() == ['餐饮', '交通']
+
+        df = pd.DataFrame({'交易对方': [np.nan, np.nan], '商品': ['美团外卖', np.nan]})
+        categorizer = Categorizer(overrides={'滴滴': '出行'})
+        assert categorizer.categorize(df).tolist() == ['餐饮', DEFAULT_CATEGORY]
+
+    def test_correction_is_incremental(self, sample_df):
+        """测试用户纠正立即生效"""
+        categorizer = Categorizer()
+        categorizer.categorize(sample_df)
+        categorizer.correct('交通', '出行')
+        assert categorizer.categorize(sample_df).iloc[3] == '出行'
+
+    def test_add_keyword_updates_memo(self):
+        """测试新增关键词会更新已缓存的结果"""
+        categorizer = Categorizer()
+        assert categorizer.classify("健身房月卡") == DEFAULT_CATEGORY
+        categorizer.add_keyword("运动", "健身")
+        assert categorizer.classify("健身房月卡") == "运动"
+
+    def test_save_and_load(self, temp_dir):
+        """测试规则文件的保存与加载"""
+        path = os.path.join(temp_dir, "categories.json")
+        categorizer = Categorizer()
+        categorizer.correct('张三', '房租')
+        categorizer.add_keyword('运动', '健身')
+        categorizer.save(path)
+
+        loaded = Categorizer.from_file(path)
+        assert loaded.overrides == {'张三': '房租'}
+        assert loaded.classify("健身房") == "运动"
+
+
+def test_assign_categories(sample_df):
+    """测试 assign_categories 添加分类列"""
+    df = assign_categories(sample_df.copy(), Categorizer())
+    assert CATEGORY_COL in df.columns
+    assert df[CATEGORY_COL].notna().all()
+
+
+def test_assign_categories_without_text_columns():
+    """测试没有文本列时全部归为默认分类"""
+    df = pd.DataFrame({'金额(元)': [1.0, 2.0]})
+    df = assign_categories(df, Categorizer())
+    assert (df[CATEGORY_COL] == DEFAULT_CATEGORY).all()
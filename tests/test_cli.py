@@ -0,0 +1,148 @@
+"""
+测试 cli.py 模块的功能
+"""
+import os
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+import cli
+from store import BillStore
+
+
+@pytest.fixture
+def ingested(statement_pdf, temp_dir, capsys):
+    """把 3 页账单存入临时存储，返回存储目录"""
+    store_dir = os.path.join(temp_dir, 'store')
+    assert cli.main(['--store', store_dir, 'ingest', statement_pdf[0]]) == 0
+    capsys.readouterr()
+    return store_dir
+
+
+class TestBuildFilter:
+    """测试命令行参数到查询条件的转换"""
+
+    @staticmethod
+    def _filter(*argv):
+        return cli.build_filter(cli.build_parser().parse_args(['query', *argv]))
+
+    def test_quarter_and_month_intersect(self):
+        """--quarter 与 --month 同时指定时取交集"""
+        assert self._filter('--quarter', '2', '--month', '5', '--month', '9').months_of_year == [5]
+        assert self._filter('--quarter', '2').months_of_year == [4, 5, 6]
+        assert self._filter('--month', '1', '--month', '12').months_of_year == [1, 12]
+        assert self._filter().months_of_year is None
+
+    def test_disjoint_quarter_and_month_match_nothing(self, ingested, capsys):
+        """季度和月份没有重叠时不匹配任何记录（而不是返回全部）"""
+        query = self._filter('--quarter', '2', '--month', '1')
+        assert query.months_of_year == []
+        assert BillStore(ingested).scan(query).empty
+        assert cli.main(['--store', ingested, 'query', '--quarter', '2', '--month', '1']) == 0
+        assert '没有符合条件的记录' in capsys.readouterr().out
+
+
+class TestCli:
+    """测试查询命令行"""
+
+    def test_ingest_skips_known_files(self, ingested, statement_pdf, capsys):
+        """内容已存入的文件不再解析"""
+        assert len(BillStore(ingested).scan()) == len(statement_pdf[1])
+
+        assert cli.main(['--store', ingested, 'ingest', statement_pdf[0]]) == 0
+        out = capsys.readouterr().out
+        assert '跳过已存入的文件' in out
+        assert '新存入 0 个文件' in out
+
+    def test_query_by_month_prints_timing(self, ingested, capsys):
+        """按月汇总并输出耗时"""
+        assert cli.main(['--store', ingested, 'query', '--by', 'month']) == 0
+        out = capsys.readouterr().out
+        assert '2024-01' in out
+        assert '[query] 耗时' in out
+        assert '扫描' in out
+
+    def test_top_merchants(self, ingested, capsys):
+        """商户排行只保留前 N 个"""
+        assert cli.main(['--store', ingested, 'top-merchants', '-n', '3']) == 0
+        out = capsys.readouterr().out
+        assert sum('商户' in line for line in out.splitlines()[2:-1]) == 3
+
+    def test_export_with_filters(self, ingested, temp_dir, statement_pdf):
+        """导出按商户和日期过滤后的数据（结束日期为闭区间）"""
+        output = os.path.join(temp_dir, 'out.csv')
+        argv = ['--store', ingested, 'export', '--merchant', '商户3', '--to', '2024-01-05', '--output', output]
+        assert cli.main(argv) == 0
+
+        df = pd.read_csv(output)
+        assert set(df['交易对方']) == {'商户3'}
+        assert pd.to_datetime(df['交易时间']).max() < pd.Timestamp('2024-01-06')
+        assert '月序号' not in df.columns
+
+    def test_export_skipped_when_query_result_unchanged(self, ingested, temp_dir, capsys):
+        """查询结果和输出格式不变时跳过写出，条件变化或 --force 时重新导出"""
+        output = os.path.join(temp_dir, 'out.xlsx')
+        argv = ['--store', ingested, 'export', '--month', '1', '--output', output]
+        assert cli.main(argv) == 0
+        assert os.path.exists(output + '.fingerprint')
+        stamp = os.stat(output).st_mtime_ns
+        capsys.readouterr()
+
+        assert cli.main(argv) == 0
+        assert '查询结果未变化，跳过导出' in capsys.readouterr().out
+        assert os.stat(output).st_mtime_ns == stamp
+
+        assert cli.main(argv + ['--merchant', '商户3']) == 0
+        assert '已导出' in capsys.readouterr().out
+        assert cli.main(argv + ['--merchant', '商户3', '--force']) == 0
+        assert '已导出' in capsys.readouterr().out
+
+    def test_report_named_by_query(self, ingested, temp_dir):
+        """报表文件名包含查询条件"""
+        output = os.path.join(temp_dir, 'reports')
+        assert cli.main(['--store', ingested, 'report', '--quarter', '1', '--output', output]) == 0
+        assert sorted(os.listdir(output)) == ['report_Q1.html', 'report_Q1.html.fingerprint',
+                                              'report_Q1.html.source.fingerprint', 'report_Q1_insights.json']
+
+    def test_report_skipped_when_query_result_unchanged(self, ingested, temp_dir, capsys):
+        """查询结果和渲染选项不变时跳过异常检测和渲染，--force 时重新生成"""
+        output = os.path.join(temp_dir, 'reports')
+        argv = ['--store', ingested, 'report', '--month', '1', '--output', output]
+        assert cli.main(argv) == 0
+        html_path = os.path.join(output, 'report_M1.html')
+        stamp = os.stat(html_path).st_mtime_ns
+        capsys.readouterr()
+
+        with patch('anomaly.detect_spending_anomalies') as mock_detect, \
+                patch('visualize.generate_visualizations') as mock_render:
+            assert cli.main(argv) == 0
+            mock_detect.assert_not_called()
+            mock_render.assert_not_called()
+        assert '查询结果未变化，跳过报表' in capsys.readouterr().out
+        assert os.stat(html_path).st_mtime_ns == stamp
+
+        # 选项变化（导出 PNG）或 --force 时重新生成
+        with patch('visualize.generate_visualizations') as mock_render:
+            assert cli.main(argv + ['--png']) == 0
+            assert cli.main(argv + ['--force']) == 0
+        assert mock_render.call_count == 2
+
+    def test_empty_result(self, ingested, capsys):
+        """没有匹配记录时给出提示"""
+        assert cli.main(['--store', ingested, 'query', '--year', '2030']) == 0
+        assert '没有符合条件的记录' in capsys.readouterr().out
+
+    def test_stream_writes_excel_and_parquet(self, statement_pdf, temp_dir, capsys):
+        """stream 命令流式写出 Excel 和 Parquet，打印月度汇总，不写入存储"""
+        pytest.importorskip("pyarrow")
+        path, rows = statement_pdf
+        output = os.path.join(temp_dir, 'stream')
+        store_dir = os.path.join(temp_dir, 'store')
+        assert cli.main(['--store', store_dir, 'stream', path, '--output', output, '--parquet',
+                         '--batch-rows', '10']) == 0
+        base = os.path.join(output, os.path.splitext(os.path.basename(path))[0])
+        assert len(pd.read_excel(f"{base}.xlsx")) == len(rows)
+        assert len(pd.read_parquet(f"{base}.parquet")) == len(rows)
+        assert '笔数' in capsys.readouterr().out
+        assert not os.path.exists(os.path.join(store_dir, 'manifest.json'))
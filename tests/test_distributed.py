@@ -0,0 +1,161 @@
+"""
+测试 distributed.py 模块的功能
+"""
+import os
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+
+import distributed
+from distributed import JobQueue, Shard, process_shard, run_coordinator, run_worker
+from utils import parse_pdf_to_df
+
+
+@pytest.fixture
+def statements(pdf_writer, wechat_rows, temp_dir):
+    """两份 3 页的账单 PDF"""
+    return [
+        pdf_writer(os.path.join(temp_dir, 'a.pdf'), wechat_rows(50)),
+        pdf_writer(os.path.join(temp_dir, 'b.pdf'), wechat_rows(45, start='2024-06-01 08:00:00')),
+    ]
+
+
+class TestJobQueue:
+    """测试共享目录任务队列"""
+
+    def test_submit_splits_pages_and_dedups_content(self, statements, temp_dir):
+        """按页拆分分片，内容相同的文件只提交一次"""
+        queue = JobQueue(os.path.join(temp_dir, 'queue'))
+        copy = os.path.join(temp_dir, 'copy.pdf')
+        with open(statements[0], 'rb') as src, open(copy, 'wb') as dst:
+            dst.write(src.read())
+
+        per_file = queue.submit([(statements[0], None), (copy, None)], pages_per_shard=2)
+
+        assert len(per_file[0]) == 2
+        assert per_file[1] == []
+        assert queue.status()['pending'] == 2
+
+    def test_claim_is_exclusive(self, statements, temp_dir):
+        """每个分片只能被认领一次"""
+        queue = JobQueue(os.path.join(temp_dir, 'queue'))
+        queue.submit([(statements[0], None)])
+        assert queue.claim('w1') is not None
+        assert queue.claim('w2') is None
+
+    def test_retry_then_fail(self, statements, temp_dir):
+        """失败的分片重试，超过最大尝试次数后移入 failed"""
+        queue = JobQueue(os.path.join(temp_dir, 'queue'), max_attempts=2)
+        [ids] = queue.submit([(statements[0], None)])
+        for _ in range(2):
+            shard = queue.claim('w1')
+            queue.fail(shard, "boom")
+        assert queue.state(ids[0]) == 'failed'
+        assert Shard.from_file(os.path.join(temp_dir, 'queue', 'failed', f"{ids[0]}.json")).attempts == 2
+
+    def test_expired_lease_is_requeued(self, statements, temp_dir):
+        """租约过期的分片重新放回待处理"""
+        queue = JobQueue(os.path.join(temp_dir, 'queue'), lease_seconds=5)
+        [ids] = queue.submit([(statements[0], None)])
+        queue.claim('lost-worker')
+        claimed = os.path.join(temp_dir, 'queue', 'claimed', f"{ids[0]}.json")
+        os.utime(claimed, (time.time() - 10, time.time() - 10))
+
+        assert queue.requeue_expired() == 1
+        assert queue.state(ids[0]) == 'pending'
+
+    def test_duplicate_completion_merges_once(self, statements, temp_dir):
+        """同一分片被两个 worker 完成时只合并一次，重新提交不会重复处理"""
+        queue = JobQueue(os.path.join(temp_dir, 'queue'), lease_seconds=5)
+        [ids] = queue.submit([(statements[0], None)], pages_per_shard=10)
+        first = queue.claim('slow')
+        os.utime(os.path.join(temp_dir, 'queue', 'claimed', f"{ids[0]}.json"), (0, 0))
+        queue.requeue_expired()
+        second = queue.claim('fast')
+
+        queue.complete(second, process_shard(second))
+        queue.complete(first, process_shard(first))
+
+        assert len(queue.collect(ids + ids)) == 50
+        assert queue.submit([(statements[0], None)], pages_per_shard=10) == [ids]
+        assert queue.status()['pending'] == 0
+
+
+class TestResultsAndSecrets:
+    """测试部分结果格式和分片中的敏感信息"""
+
+    def test_shard_files_do_not_store_passwords(self, statements, temp_dir):
+        """提交时的密码只用于统计页数，不写入分片文件；worker 通过 PasswordProvider 查找"""
+        queue = JobQueue(os.path.join(temp_dir, 'queue'))
+        queue.submit([(statements[0], 'top-secret')], pages_per_shard=10)
+        pending = os.path.join(temp_dir, 'queue', 'pending')
+        for name in os.listdir(pending):
+            with open(os.path.join(pending, name), encoding='utf-8') as f:
+                assert 'top-secret' not in f.read()
+
+        provider = MagicMock()
+        provider.resolve_pdf_password.return_value = None
+        shard = queue.claim('w1')
+        assert len(process_shard(shard, provider)) == 50
+        provider.resolve_pdf_password.assert_called_once_with(shard.path)
+
+    @pytest.mark.parametrize("fmt", ['json', 'parquet'])
+    def test_results_are_not_pickled(self, statements, temp_dir, monkeypatch, fmt):
+        """部分结果写为 JSON / Parquet，读回的数据和类型与 worker 产出的一致"""
+        if fmt == 'parquet':
+            pytest.importorskip("pyarrow")
+        monkeypatch.setattr(distributed, 'RESULT_FORMAT', fmt)
+        queue = JobQueue(os.path.join(temp_dir, 'queue'))
+        [ids] = queue.submit([(statements[0], None)], pages_per_shard=10)
+        shard = queue.claim('w1')
+        df = process_shard(shard)
+        queue.complete(shard, df)
+
+        assert os.listdir(os.path.join(temp_dir, 'queue', 'results')) == [f"{ids[0]}.{fmt}"]
+        expected = df.reset_index(drop=True)
+        pd.testing.assert_frame_equal(queue.collect(ids), expected, check_dtype=(fmt == 'json'))
+
+
+class TestCoordinator:
+    """测试协调者与多个本地 worker"""
+
+    def test_local_workers_match_single_process_parse(self, statements, temp_dir):
+        """多个 worker 进程的分片结果合并后与单进程解析一致"""
+        results = run_coordinator([(path, None) for path in statements], os.path.join(temp_dir, 'queue'),
+                                  pages_per_shard=1, local_workers=2, timeout=60, poll_interval=0.1)
+
+        assert [path for path, _ in results] == statements
+        for path, df in results:
+            expected = parse_pdf_to_df(path).reset_index(drop=True)
+            pd.testing.assert_frame_equal(df.drop(columns=['分类', '原始交易对方']), expected)
+
+    def test_failed_shards_mark_file_incomplete(self, statements, temp_dir, monkeypatch):
+        """有分片失败的文件不合并（collect 报错），其余文件照常返回"""
+        root = os.path.join(temp_dir, 'queue')
+        original = distributed.iter_pdf_batches
+
+        def flaky(path, password=None, pages=None, **kwargs):
+            if os.path.basename(path) == 'b.pdf' and pages is not None and 1 in pages:
+                raise RuntimeError("模拟解析失败")
+            return original(path, password, pages=pages, **kwargs)
+
+        monkeypatch.setattr(distributed, 'iter_pdf_batches', flaky)
+        JobQueue(root, max_attempts=2)
+        worker = threading.Thread(target=run_worker, args=(root, 'w1', 0.01))
+        worker.start()
+        try:
+            results = run_coordinator([(path, None) for path in statements], root, pages_per_shard=1,
+                                       timeout=60, poll_interval=0.05)
+        finally:
+            worker.join(timeout=30)
+
+        assert [(path, len(df)) for path, df in results] == [(statements[0], 50)]
+        queue = JobQueue(root)
+        failed = [os.path.basename(p)[:-len('.json')] for p in os.listdir(os.path.join(root, 'failed'))]
+        assert len(failed) == 1
+        b_ids = queue.submit([(statements[1], None)], pages_per_shard=1)[0]
+        with pytest.raises(RuntimeError, match="没有结果"):
+            queue.collect(b_ids)
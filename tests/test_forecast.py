@@ -0,0 +1,82 @@
+"""
+测试 forecast.py 模块的功能
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast import FORECAST_COLUMNS, build_daily_matrix, forecast_month_end
+from visualize import generate_visualizations
+
+
+@pytest.fixture
+def daily_df():
+    """创建截至 2024-03-20 的每日固定支出数据"""
+    times = pd.date_range('2024-01-01 12:00', '2024-03-20 12:00', freq='D')
+    return pd.DataFrame({
+        '交易时间': np.concatenate([times, times]),
+        '收/支': '支出',
+        '金额(元)': np.concatenate([np.full(len(times), 10.0), np.full(len(times), 5.0)]),
+        '分类': ['餐饮'] * len(times) + ['交通'] * len(times),
+        '交易对方': 'x',
+    })
+
+
+class TestBuildDailyMatrix:
+    """测试 build_daily_matrix 函数"""
+
+    def test_matrix_shape_and_totals(self, sample_df):
+        """测试按分类和日期汇总"""
+        df = sample_df.assign(分类=['餐饮', '收入', '购物', '交通', '餐饮'])
+        matrix, categories, dates = build_daily_matrix(df)
+        assert matrix.shape == (len(categories), len(dates))
+        assert len(dates) == 18  # 2024-01-15 ~ 2024-02-01
+        assert matrix.sum() == pytest.approx(df['金额(元)'].sum())
+
+
+class TestForecastMonthEnd:
+    """测试 forecast_month_end 函数"""
+
+    def test_constant_series(self, daily_df):
+        """测试固定日支出能被准确外推到月末"""
+        result = forecast_month_end(daily_df)
+        assert result.month == '2024-03'
+        assert result.remaining_days == 11
+        assert list(result.table.columns) == FORECAST_COLUMNS
+
+        table = result.table.set_index('分类')
+        assert table.loc['餐饮', '本月已支出'] == pytest.approx(200.0)
+        assert table.loc['餐饮', '预测月末'] == pytest.approx(310.0)
+        assert table.loc['交通', '预测月末'] == pytest.approx(155.0)
+
+        projected, lower, upper = result.total
+        assert projected == pytest.approx(465.0)
+        assert lower <= projected <= upper
+
+    def test_interval_contains_projection(self, daily_df):
+        """测试有波动时区间包含预测值且下限不低于已支出"""
+        rng = np.random.default_rng(1)
+        df = daily_df.copy()
+        df['金额(元)'] = df['金额(元)'] * rng.uniform(0.5, 1.5, len(df))
+        row = forecast_month_end(df).table.iloc[-1]
+        assert row['下限'] < row['预测月末'] < row['上限']
+        assert row['下限'] >= row['本月已支出']
+
+    def test_income_only_returns_none(self, daily_df):
+        """测试没有支出时返回 None"""
+        assert forecast_month_end(daily_df.assign(**{'收/支': '收入'})) is None
+
+    def test_without_category_column(self, daily_df):
+        """测试没有分类列时整体预测"""
+        result = forecast_month_end(daily_df.drop(columns=['分类']))
+        assert result.table['分类'].tolist() == ['全部', '合计']
+
+
+def test_forecast_overlay_in_report(daily_df, temp_dir):
+    """测试月度走势图中包含月末预测"""
+    output_path = os.path.join(temp_dir, "forecast_report.html")
+    generate_visualizations(daily_df, output_path)
+    with open(output_path, 'r', encoding='utf-8') as f:
+        assert '月末预测' in f.read()
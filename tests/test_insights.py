@@ -0,0 +1,109 @@
+"""
+测试 insights.py 模块的功能
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from insights import compute_insights, compute_monthly_aggregates, generate_insights, insights_html
+from visualize import generate_visualizations
+
+
+def _ledger(months, rows_per_month, seed=0):
+    """生成若干个月的支出明细，每月各分类金额稳定"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i, month in enumerate(pd.period_range('2023-01', periods=months, freq='M')):
+        n = rows_per_month
+        days = rng.integers(0, 28, n)
+        frames.append(pd.DataFrame({
+            '交易时间': month.start_time + pd.to_timedelta(days, unit='D') + pd.to_timedelta(rng.integers(8, 22, n), unit='h'),
+            '收/支/其他': '支出',
+            '金额(元)': rng.uniform(20, 40, n).round(2),
+            '交易对方': np.array(['食堂', '地铁', '超市'])[np.arange(n) % 3],
+            '分类': np.array(['餐饮', '交通', '购物'])[np.arange(n) % 3],
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+class TestMonthlyAggregates:
+    """测试月度聚合表"""
+
+    def test_dimensions_and_totals(self, sample_df):
+        """按总计、商户和时段汇总，只统计支出"""
+        monthly = compute_monthly_aggregates(sample_df)
+        assert set(monthly['维度']) == {'总计', '商户', '时段'}
+        total = monthly[monthly['维度'] == '总计'].set_index('月序号')['金额(元)']
+        assert total.sum() == sample_df.loc[sample_df['收/支'] == '支出', '金额(元)'].sum()
+        assert monthly['笔数'].sum() == 4 * 3
+
+    def test_empty_input(self):
+        """没有支出时返回空表"""
+        assert compute_monthly_aggregates(pd.DataFrame()).empty
+        assert generate_insights(compute_monthly_aggregates(pd.DataFrame())) == []
+
+
+class TestGenerateInsights:
+    """测试环比 / 同比洞察"""
+
+    def test_detects_category_jump(self):
+        """最新月份某分类翻倍时排在最前，并给出百分比"""
+        df = _ledger(6, 90)
+        latest = df['交易时间'] >= '2023-06-01'
+        dining = latest & (df['分类'] == '餐饮')
+        df.loc[dining, '金额(元)'] *= 3
+
+        insights = compute_insights(df)
+        top = insights[0]
+        assert (top.dimension, top.subject, top.kind, top.month) == ('分类', '餐饮', '环比', '2023-06')
+        assert top.change > 1.0
+        assert '「餐饮」类支出' in top.text and '比上月增加' in top.text
+        assert len(insights) <= 5
+        assert [i.score for i in insights] == sorted((i.score for i in insights), reverse=True)
+
+    def test_stable_spending_has_no_insights(self):
+        """各月支出稳定时不输出洞察"""
+        df = _ledger(6, 300)
+        assert compute_insights(df) == []
+
+    def test_year_over_year(self):
+        """与去年同月相比的变化"""
+        monthly = pd.DataFrame({
+            '维度': '分类', '对象': '旅行',
+            '月序号': [2023 * 12 + 6, 2024 * 12 + 5, 2024 * 12 + 6],
+            '金额(元)': [1000.0, 3000.0, 3000.0], '笔数': 1,
+        })
+        insights = generate_insights(monthly)
+        assert [(i.kind, i.previous, i.change) for i in insights] == [('同比', 1000.0, 2.0)]
+        assert '比去年同月增加 200%' in insights[0].text
+
+    def test_multi_year_is_fast(self):
+        """多年数据在亚秒内完成"""
+        monthly = compute_monthly_aggregates(_ledger(60, 2000))
+        start = time.perf_counter()
+        generate_insights(monthly)
+        assert time.perf_counter() - start < 1.0
+
+    def test_html_escapes_names(self):
+        """商户名称写入报表时转义"""
+        monthly = pd.DataFrame({'维度': '商户', '对象': '<b>店</b>', '月序号': [100, 101],
+                                '金额(元)': [10.0, 500.0], '笔数': 1})
+        assert '&lt;b&gt;' in insights_html(generate_insights(monthly))
+
+
+def test_report_embeds_insights_and_writes_json(temp_dir):
+    """报表顶部包含洞察，旁边写出 JSON 文件"""
+    df = _ledger(3, 60)
+    df.loc[df['交易时间'] >= '2023-03-01', '金额(元)'] *= 2
+    output_path = os.path.join(temp_dir, 'report.html')
+    assert generate_visualizations(df, output_path, snapshot=False)
+
+    with open(output_path, encoding='utf-8') as f:
+        assert '💡 消费洞察' in f.read()
+    with open(os.path.join(temp_dir, 'report_insights.json'), encoding='utf-8') as f:
+        payload = json.load(f)
+    assert payload['month'] == '2023-03'
+    assert payload['insights'][0]['text']
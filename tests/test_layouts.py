@@ -0,0 +1,115 @@
+"""
+测试 layouts.py 模块和按版式分派的 PDF 解析
+"""
+import os
+
+import pandas as pd
+import pdfplumber
+import pytest
+
+import layouts
+import utils
+from layouts import (
+    BANK_DEBIT, CREDIT_CARD, WECHAT, StatementLayout, detect_layout, get_layout, register_layout,
+)
+from utils import detect_statement_layout, parse_pdf_to_df
+
+BANK_COLUMNS = ['交易日期', '交易摘要', '交易金额', '账户余额', '对方户名']
+BANK_WIDTHS = [100, 100, 90, 90, 200]
+CARD_COLUMNS = ['交易日', '记账日', '交易摘要', '人民币金额', '卡号末四位']
+CARD_WIDTHS = [90, 90, 220, 90, 90]
+
+
+@pytest.fixture
+def bank_pdf(temp_dir, pdf_writer):
+    """两页银行借记卡流水"""
+    rows = [[f"2024-03-{d:02d}", "消费" if d % 3 else "工资", f"{'-' if d % 3 else ''}{d * 10:.2f}",
+             f"{5000 - d:.2f}", f"对方{d % 4}"] for d in range(1, 31)]
+    return pdf_writer(os.path.join(temp_dir, 'bank.pdf'), rows, title="某某银行借记卡账户交易明细",
+                      columns=BANK_COLUMNS, widths=BANK_WIDTHS), rows
+
+
+@pytest.fixture
+def card_pdf(temp_dir, pdf_writer):
+    """信用卡账单：正数为消费，负数为还款"""
+    rows = [["2024/04/01", "2024/04/02", "超市购物", "128.50", "1234"],
+            ["2024/04/03", "2024/04/03", "还款", "-500.00", "1234"],
+            ["2024/04/05", "2024/04/06", "加油站", "300.00", "1234"]]
+    return pdf_writer(os.path.join(temp_dir, 'card.pdf'), rows, title="信用卡对账单",
+                      columns=CARD_COLUMNS, widths=CARD_WIDTHS), rows
+
+
+class TestDetectLayout:
+    """测试第一页指纹识别"""
+
+    def test_detects_builtin_layouts(self):
+        """表头和发行方字样确定版式，空白不影响匹配"""
+        assert detect_layout("微信支付交易明细证明\n交易单号 交易时间 金额(元)") is WECHAT
+        assert detect_layout("招商银行 账户交易明细\n交易日期 交易金额 账户 余额") is BANK_DEBIT
+        assert detect_layout("信用卡账单\n交易日 记账日 交易摘要 人民币金额") is CREDIT_CARD
+        assert detect_layout("时间 金额") is None
+
+    def test_issuer_breaks_ties(self):
+        """表头相同时命中发行方字样的版式优先"""
+        custom = StatementLayout(name='test_wallet', title='测试钱包', headers=('交易时间', '金额(元)'),
+                                 issuers=('测试钱包',))
+        try:
+            register_layout(custom)
+            assert detect_layout("测试钱包 交易时间 金额(元)") is custom
+            assert detect_layout("微信支付 交易时间 金额(元)") is WECHAT
+        finally:
+            layouts._REGISTRY.pop('test_wallet')
+
+    def test_invalid_layout(self):
+        """未知的收支方向和未注册的版式名称报错"""
+        with pytest.raises(ValueError):
+            StatementLayout(name='x', title='x', headers=('a',), direction='guess')
+        with pytest.raises(ValueError):
+            get_layout('nope')
+
+
+class TestLayoutDispatch:
+    """测试按识别到的版式解析 PDF"""
+
+    @pytest.mark.parametrize("fast", [True, False])
+    def test_bank_statement(self, bank_pdf, fast):
+        """银行流水映射为统一列名，负数金额为支出"""
+        path, rows = bank_pdf
+        df = parse_pdf_to_df(path, fast=fast)
+
+        assert len(df) == len(rows)
+        assert df['交易时间'].iloc[0] == pd.Timestamp('2024-03-01')
+        assert df['交易对方'].iloc[0] == '对方1'
+        assert df['交易类型'].iloc[2] == '工资'
+        assert df['收/支/其他'].tolist()[:3] == ['支出', '支出', '收入']
+        assert (df['金额(元)'] >= 0).all()
+        assert df['金额(元)'].iloc[0] == 10.0
+
+    def test_credit_card_statement(self, card_pdf):
+        """信用卡账单：正数为支出，负数（还款）为收入"""
+        path, _ = card_pdf
+        df = parse_pdf_to_df(path)
+
+        assert df['交易对方'].tolist() == ['超市购物', '还款', '加油站']
+        assert df['收/支/其他'].tolist() == ['支出', '收入', '支出']
+        assert df['金额(元)'].tolist() == [128.5, 500.0, 300.0]
+        assert df['交易时间'].iloc[1] == pd.Timestamp('2024-04-03')
+
+    def test_detection_reads_only_first_page(self, bank_pdf, monkeypatch):
+        """版式识别只读取第一页文字"""
+        path, _ = bank_pdf
+        pages = []
+        original = utils.detect_statement_layout
+
+        def spy(page):
+            pages.append(page.page_number)
+            return original(page)
+
+        monkeypatch.setattr(utils, 'detect_statement_layout', spy)
+        parse_pdf_to_df(path)
+        assert pages == [1]
+
+    def test_wechat_pdf_is_detected(self, statement_pdf):
+        """微信账单识别为微信版式"""
+        with pdfplumber.open(statement_pdf[0]) as pdf:
+            assert detect_statement_layout(pdf.pages[0]) is WECHAT
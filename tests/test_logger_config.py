@@ -0,0 +1,113 @@
+"""
+测试 logger_config.py 模块的功能
+"""
+import io
+import json
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+from logger_config import ConsoleReporter, RateLimitFilter, log_context, setup_logger, shutdown_logging
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def json_logger(temp_dir, request):
+    """输出 JSON Lines 到临时文件的日志记录器，返回 (记录器, 读取日志的函数)"""
+    name = f"test-{request.node.name}"
+    path = os.path.join(temp_dir, 'run.log')
+    logger = setup_logger(name, level=logging.DEBUG, log_file=path, fmt='json')
+    logger.propagate = False
+
+    def read():
+        shutdown_logging(name)
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    yield logger, read
+    shutdown_logging(name)
+
+
+class TestLoggerConfig:
+    """测试异步日志输出"""
+
+    def test_json_lines_with_context_fields(self, json_logger):
+        """JSON 日志包含 log_context 和 extra 提供的字段"""
+        logger, read = json_logger
+        with log_context(file='a.pdf', stage='parse'):
+            logger.info("开始解析")
+            logger.warning("第 3 页异常", extra={'page': 3})
+        logger.info("结束")
+
+        entries = read()
+        assert [e['message'] for e in entries] == ["开始解析", "第 3 页异常", "结束"]
+        assert entries[0]['file'] == 'a.pdf' and entries[0]['stage'] == 'parse'
+        assert entries[1]['page'] == 3 and entries[1]['level'] == 'WARNING'
+        assert 'file' not in entries[2]
+
+    def test_exception_is_serialized(self, json_logger):
+        """异常堆栈写入日志"""
+        logger, read = json_logger
+        try:
+            raise ValueError("坏数据")
+        except ValueError:
+            logger.error("处理失败", exc_info=True)
+
+        entry = read()[0]
+        assert '坏数据' in entry['message'] + entry.get('exception', '')
+
+    def test_debug_messages_are_rate_limited(self, json_logger):
+        """同一位置的 DEBUG 日志限流，并注明省略的条数"""
+        logger, read = json_logger
+        logger.handlers[0].filters[0].interval = 60.0
+        for page in range(100):
+            logger.debug(f"第 {page} 页")
+        for i in range(3):
+            logger.info(f"信息 {i}")
+
+        messages = [e['message'] for e in read()]
+        assert len([m for m in messages if m.startswith('第')]) == 5
+        assert len([m for m in messages if m.startswith('信息')]) == 3
+
+    def test_rate_limit_reports_suppressed_count(self):
+        """新的时间窗口中第一条日志注明上个窗口省略的条数"""
+        limiter = RateLimitFilter(burst=2, interval=3600)
+        records = [logging.LogRecord('t', logging.DEBUG, 'x.py', 1, f"m{i}", None, None) for i in range(5)]
+        assert [limiter.filter(r) for r in records] == [True, True, False, False, False]
+
+        limiter.interval = 0.0
+        record = logging.LogRecord('t', logging.DEBUG, 'x.py', 1, "m5", None, None)
+        assert limiter.filter(record)
+        assert '已省略 3 条' in record.getMessage()
+
+    def test_console_reporter_prints_once(self, json_logger):
+        """提示打印到输出流，同时写入日志"""
+        logger, read = json_logger
+        stream = io.StringIO()
+        reporter = ConsoleReporter(logger, stream=stream)
+        reporter.info("成功导出: a.xlsx")
+        reporter.error("失败", indent=False)
+
+        assert stream.getvalue() == "  成功导出: a.xlsx\n失败\n"
+        assert [e['message'] for e in read()] == ["成功导出: a.xlsx", "失败"]
+
+    def test_no_records_lost_at_exit(self, temp_dir):
+        """进程退出时队列中的日志全部写入文件，且没有错误输出"""
+        path = os.path.join(temp_dir, 'exit.log')
+        script = "from logger_config import logger\nfor i in range(2000): logger.info(f'record {i}')\n"
+        env = dict(os.environ, BILL_HUB_LOG_FILE=path, PYTHONPATH=ROOT)
+        result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, timeout=60)
+
+        assert result.returncode == 0
+        assert 'Traceback' not in result.stderr
+        with open(path, encoding='utf-8') as f:
+            assert sum(1 for _ in f) == 2000
+
+    def test_invalid_format(self):
+        """未知的日志格式报错"""
+        with pytest.raises(ValueError):
+            setup_logger('test-invalid-format', fmt='xml')
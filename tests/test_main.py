@@ -113,11 +113,178 @@ class TestProcessPdf:
         with patch('main.parse_pdf_to_df') as mock_parse:
             with patch('main.generate_visualizations') as mock_viz:
                 mock_parse.return_value = mock_df
-                mock_viz.side_effect = lambda df, path: open(path, 'w').write('<html>test</html>')
+                mock_viz.side_effect = lambda df, path, **kwargs: open(path, 'w').write('<html>test</html>')
                 
                 output_dir = temp_dir
                 result = process_pdf('/fake/test.pdf', output_dir, 'password')
                 
                 # 检查是否创建了 HTML 文件
                 html_path = os.path.join(output_dir, 'test.html')
-                assert os.path.exists(html_path)
\ No newline at end of file
+                assert os.path.exists(html_path)
+
+class TestBillPipeline:
+    """测试账单处理流水线"""
+
+    def test_pipeline_processes_pdfs(self, pdf_writer, wechat_rows, temp_dir):
+        """多个 PDF 经过流水线导出 Excel 和 HTML，结果按输入顺序返回"""
+        from main import run_bill_pipeline
+        from password_provider import PasswordProvider
+
+        input_dir = os.path.join(temp_dir, 'input')
+        output_dir = os.path.join(temp_dir, 'output')
+        os.makedirs(input_dir)
+        os.makedirs(output_dir)
+        sources = [
+            pdf_writer(os.path.join(input_dir, 'b.pdf'), wechat_rows(30)),
+            pdf_writer(os.path.join(input_dir, 'a.pdf'), wechat_rows(10)),
+        ]
+        provider = PasswordProvider(env={})
+
+        dfs = run_bill_pipeline(sources, output_dir, os.path.join(temp_dir, 'tmp'), provider,
+                                concurrency={'parse': 2}, snapshot=False)
+
+        assert [len(df) for df in dfs] == [30, 10]
+        assert '分类' in dfs[0].columns
+        for name in ('a', 'b'):
+            assert os.path.exists(os.path.join(output_dir, f'{name}.xlsx'))
+            assert os.path.exists(os.path.join(output_dir, f'{name}.html'))
+
+    def test_spool_receives_frames(self, temp_dir, pdf_writer, wechat_rows):
+        """传入 FrameSpool 时账单数据交给 spool，溢写后按月读取"""
+        from main import run_bill_pipeline
+        from memory import FrameSpool, MemoryMonitor
+        from password_provider import PasswordProvider
+
+        sources = [pdf_writer(os.path.join(temp_dir, f'{name}.pdf'), wechat_rows(n)) for name, n in (('a', 12), ('b', 8))]
+        spool = FrameSpool(MemoryMonitor(budget=1))
+        dfs = run_bill_pipeline(sources, temp_dir, os.path.join(temp_dir, 'tmp'), PasswordProvider(env={}),
+                                snapshot=False, spool=spool)
+
+        assert dfs == []
+        assert len(spool) == 2 and spool.spilled
+        assert sum(len(chunk) for chunk in spool.iter_months()) == 20
+        spool.close()
+
+    def test_unknown_stage(self, temp_dir):
+        """未知的阶段并发配置报错"""
+        from main import build_bill_pipeline
+        from password_provider import PasswordProvider
+
+        with pytest.raises(ValueError):
+            build_bill_pipeline(temp_dir, temp_dir, PasswordProvider(env={}), concurrency={'ocr': 2})
+
+
+class TestDistributedSources:
+    """测试分布式模式下协调者对结果的处理"""
+
+    def test_results_are_validated_and_tracked(self, sample_df, temp_dir):
+        """协调者收回的每份账单都经过验证并按来源 PDF 计入预算，与本地 normalize 阶段一致"""
+        from main import _process_sources
+        from validation import validate_transactions
+
+        paths = [os.path.join(temp_dir, 'a.pdf'), os.path.join(temp_dir, 'b.pdf')]
+        parts = [sample_df.iloc[:3].copy(), sample_df.iloc[3:].copy()]
+        provider = MagicMock()
+        provider.resolve_pdf_password.return_value = None
+        with patch('main.run_coordinator', return_value=list(zip(paths, parts))), \
+                patch('main.validate_transactions', wraps=validate_transactions) as validate, \
+                patch('main.track_budget') as track:
+            dfs = _process_sources(paths, os.path.join(temp_dir, 'queue'), temp_dir, temp_dir, provider, False)
+
+        assert len(dfs) == 2 and all(df is part for df, part in zip(dfs, parts))
+        assert validate.call_count == 2
+        assert all(c.args[0] is part for c, part in zip(validate.call_args_list, parts))
+        assert [c.args[1] for c in track.call_args_list] == paths
+        assert all(c.args[0] is part for c, part in zip(track.call_args_list, parts))
+
+
+class TestExtractZipPdfs:
+    """测试解压 ZIP 时的密码重试"""
+
+    def test_stale_cache_falls_back_to_other_candidates(self, temp_dir, pdf_writer, wechat_rows):
+        """缓存的密码失效时，非交互模式改用其余候选密码，并更新缓存文件"""
+        import json
+        import pyzipper
+        from main import extract_zip_pdfs
+        from password_provider import ENV_PASSWORDS, PasswordProvider, file_fingerprint
+
+        pdf = pdf_writer(os.path.join(temp_dir, 'bill.pdf'), wechat_rows(5))
+        zip_path = os.path.join(temp_dir, 'bill.zip')
+        with pyzipper.AESZipFile(zip_path, 'w', encryption=pyzipper.WZ_AES) as zf:
+            zf.setpassword(b'secret')
+            zf.write(pdf, 'bill.pdf')
+        cache_file = os.path.join(temp_dir, 'cache.json')
+        provider = PasswordProvider(cache_file=cache_file, env={ENV_PASSWORDS: 'wrong,secret'})
+        provider.remember(zip_path, 'stale')
+
+        pdfs = extract_zip_pdfs(zip_path, os.path.join(temp_dir, 'tmp'), provider, interactive=False)
+
+        assert [os.path.basename(path) for path, _ in pdfs] == ['bill.pdf']
+        with open(cache_file, encoding='utf-8') as f:
+            assert json.load(f)[file_fingerprint(zip_path)] == 'secret'
+
+
+class TestMergeAndReport:
+    """测试合并汇总的增量导出"""
+
+    def test_unchanged_sections_are_skipped(self, sample_df, temp_dir):
+        """合并数据不变时跳过汇总 Excel 和报表，数据变化时重新生成"""
+        from main import merge_and_report
+
+        parts = [sample_df.iloc[:3].copy(), sample_df.iloc[3:].copy()]
+        merge_and_report(parts, temp_dir)
+        xlsx = os.path.join(temp_dir, 'merged_bill.xlsx')
+        html = os.path.join(temp_dir, 'merged_bill.html')
+        stamps = (os.stat(xlsx).st_mtime_ns, os.stat(html).st_mtime_ns)
+        assert os.path.exists(xlsx + '.fingerprint')
+
+        merge_and_report(parts, temp_dir)
+        assert (os.stat(xlsx).st_mtime_ns, os.stat(html).st_mtime_ns) == stamps
+
+        parts[1].loc[parts[1].index[0], '金额(元)'] = 1.0
+        with patch('main.generate_visualizations') as mock_viz:
+            merge_and_report(parts, temp_dir)
+        assert os.stat(xlsx).st_mtime_ns != stamps[0]
+        mock_viz.assert_called_once()
+
+
+    def test_stale_alerts_file_is_removed(self, sample_df, temp_dir):
+        """本次没有异常提醒时删除上次留下的提醒表，避免被当作本次结果打包"""
+        from anomaly import ALERT_COLUMNS
+        from main import merge_and_report
+
+        alerts_xlsx = os.path.join(temp_dir, 'merged_bill_alerts.xlsx')
+        for path in (alerts_xlsx, alerts_xlsx + '.fingerprint'):
+            with open(path, 'w') as f:
+                f.write('stale')
+        with patch('main.detect_spending_anomalies', return_value=pd.DataFrame(columns=ALERT_COLUMNS)):
+            merge_and_report([sample_df.iloc[:3].copy(), sample_df.iloc[3:].copy()], temp_dir)
+        assert not os.path.exists(alerts_xlsx)
+        assert not os.path.exists(alerts_xlsx + '.fingerprint')
+
+
+class TestProcessReceipts:
+    """测试小票图片的处理"""
+
+    def test_exports_receipts(self, temp_dir):
+        """已缓存识别结果的小票导出为 receipts.xlsx，并完成自动分类"""
+        import receipts
+        from main import process_receipts
+
+        image = os.path.join(os.path.dirname(__file__), 'fixtures', 'receipts', 'coffee.png')
+        receipts.OcrCache().put(receipts.image_hash(image), "星巴克咖啡\n2024-05-03 08:15\n实付：¥38.00")
+
+        with patch('main.generate_visualizations') as mock_viz:
+            df = process_receipts([image], temp_dir)
+
+        assert df['金额(元)'].tolist() == [38.0]
+        assert '分类' in df.columns
+        assert os.path.exists(os.path.join(temp_dir, 'receipts.xlsx'))
+        mock_viz.assert_called_once()
+
+    def test_nothing_recognized(self, temp_dir):
+        """没有识别出小票时返回 None"""
+        from main import process_receipts
+
+        with patch('main.import_receipts', return_value=None):
+            assert process_receipts(['x.png'], temp_dir) is None
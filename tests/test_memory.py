@@ -0,0 +1,160 @@
+"""
+测试 memory.py 模块和内存受限模式下的合并汇总
+"""
+import os
+import tracemalloc
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from main import merge_and_report, merge_and_report_spooled
+from memory import FrameSpool, MemoryMonitor, current_rss, memory_budget, parse_size
+
+
+def _bill(start: str, periods: int, seed: int, freq: str = '7h') -> pd.DataFrame:
+    """生成跨月的账单数据"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '交易时间': pd.date_range(start, periods=periods, freq=freq),
+        '收/支/其他': rng.choice(['支出', '收入'], size=periods, p=[0.8, 0.2]),
+        '金额(元)': rng.gamma(2.0, 40.0, size=periods).round(2),
+        '交易对方': [f'商户{i % 7}' for i in range(periods)],
+        '交易单号': [f'{seed}-{i}' for i in range(periods)],
+    })
+
+
+class TestParseSize:
+    """测试内存大小解析"""
+
+    def test_units(self):
+        """支持 K / M / G 单位和小数"""
+        assert parse_size('1048576') == 1024 ** 2
+        assert parse_size('512m') == 512 * 1024 ** 2
+        assert parse_size('1.5G') == int(1.5 * 1024 ** 3)
+        assert parse_size('64KB') == 64 * 1024
+
+    @pytest.mark.parametrize("value", ['', 'abc', '10T', '0', '-1M'])
+    def test_invalid(self, value):
+        """无效的大小报错"""
+        with pytest.raises(ValueError):
+            parse_size(value)
+
+    def test_budget_from_env(self, monkeypatch):
+        """未设置 BILL_HUB_MEMORY_BUDGET 时不启用"""
+        monkeypatch.delenv('BILL_HUB_MEMORY_BUDGET', raising=False)
+        assert memory_budget() is None
+        monkeypatch.setenv('BILL_HUB_MEMORY_BUDGET', '256M')
+        assert memory_budget() == 256 * 1024 ** 2
+
+
+class TestMemoryMonitor:
+    """测试按阶段的内存统计"""
+
+    def test_stage_records_peaks(self):
+        """阶段记录 tracemalloc 峰值和 RSS，结束后停止 tracemalloc"""
+        monitor = MemoryMonitor(budget=parse_size('8G'))
+        with monitor.stage('分配'):
+            data = [bytes(1024) for _ in range(2048)]
+            del data
+        monitor.close()
+
+        stats = monitor.stages[0]
+        assert stats.name == '分配'
+        assert stats.traced_peak >= 2 * 1024 ** 2
+        assert stats.rss_peak >= stats.rss_before > 0
+        assert '分配' in monitor.report()
+        assert not tracemalloc.is_tracing()
+
+    def test_disabled_without_budget(self):
+        """未设置预算时不统计"""
+        monitor = MemoryMonitor()
+        with monitor.stage('x'):
+            pass
+        assert monitor.stages == []
+        assert not monitor.near_budget()
+
+    def test_current_rss(self):
+        """能读取当前进程的 RSS"""
+        assert current_rss() > 0
+
+
+class TestFrameSpool:
+    """测试账单数据的溢写和按月读取"""
+
+    def test_keeps_frames_in_memory_below_budget(self):
+        """远低于预算时不溢写"""
+        spool = FrameSpool(MemoryMonitor(budget=parse_size('64G')))
+        spool.add((1,), _bill('2024-02-01', 10, 1))
+        spool.add((0,), _bill('2024-01-01', 10, 0))
+        assert not spool.spilled
+        assert [df['交易单号'].iloc[0] for df in spool.frames()] == ['0-0', '1-0']
+        spool.close()
+
+    def test_spills_near_budget_and_merges_by_month(self):
+        """接近预算时溢写，按月读取的结果与整体合并排序一致"""
+        frames = [_bill('2024-01-01', 300, 0), _bill('2024-01-20', 200, 1)]
+        frames[1]['备注'] = '第二份'
+        frames[1].loc[3, '交易时间'] = pd.NaT
+        spool = FrameSpool(MemoryMonitor(budget=1))
+        for i, df in enumerate(frames):
+            spool.add((i,), df)
+        directory = spool.directory
+
+        assert spool.spilled and spool.spilled_frames == 2
+        assert spool.frames() == []
+        assert len(os.listdir(directory)) == 4  # 2024-01 ~ 2024-03 和缺失时间
+
+        chunks = list(spool.iter_months())
+        merged = pd.concat(chunks)
+        expected = pd.concat(frames, ignore_index=True).sort_values('交易时间', kind='stable')
+        assert merged['交易单号'].tolist() == expected['交易单号'].tolist()
+        assert list(merged.index) == list(range(len(merged)))
+        assert pd.isna(merged['交易时间'].iloc[-1])
+        assert '备注' in chunks[0].columns
+
+        spool.close()
+        assert not os.path.exists(directory)
+
+
+class TestMergeAndReportSpooled:
+    """测试从溢写数据合并汇总"""
+
+    def test_spilled_merge_matches_in_memory(self, temp_dir):
+        """溢写后的汇总 Excel 行与内存中合并的一致，报表只使用窄列"""
+        frames = [_bill('2024-01-01', 150, 0), _bill('2024-02-10', 150, 1)]
+        memory_dir = os.path.join(temp_dir, 'memory')
+        spilled_dir = os.path.join(temp_dir, 'spilled')
+        os.makedirs(memory_dir)
+        os.makedirs(spilled_dir)
+        merge_and_report([df.copy() for df in frames], memory_dir)
+
+        spool = FrameSpool(MemoryMonitor(budget=1))
+        for i, df in enumerate(frames):
+            spool.add((i,), df.copy())
+        with patch('main.generate_visualizations') as mock_viz:
+            merge_and_report_spooled(spool, spilled_dir)
+
+        expected = pd.read_excel(os.path.join(memory_dir, 'merged_bill.xlsx'))
+        actual = pd.read_excel(os.path.join(spilled_dir, 'merged_bill.xlsx'))
+        pd.testing.assert_frame_equal(actual, expected)
+        report_df = mock_viz.call_args[0][0]
+        assert len(report_df) == 300
+        assert '交易单号' not in report_df.columns
+
+        # 数据不变时跳过汇总 Excel
+        stamp = os.stat(os.path.join(spilled_dir, 'merged_bill.xlsx')).st_mtime_ns
+        with patch('main.generate_visualizations'):
+            merge_and_report_spooled(spool, spilled_dir)
+        assert os.stat(os.path.join(spilled_dir, 'merged_bill.xlsx')).st_mtime_ns == stamp
+        spool.close()
+
+    def test_without_spill_uses_in_memory_merge(self, sample_df, temp_dir):
+        """没有溢写时走内存中的合并"""
+        spool = FrameSpool(MemoryMonitor(budget=parse_size('64G')))
+        spool.add((0,), sample_df.iloc[:3].copy())
+        spool.add((1,), sample_df.iloc[3:].copy())
+        with patch('main.merge_and_report') as mock_merge:
+            merge_and_report_spooled(spool, temp_dir)
+        assert [len(df) for df in mock_merge.call_args[0][0]] == [3, 2]
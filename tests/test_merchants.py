@@ -0,0 +1,86 @@
+"""
+测试 merchants.py 模块的功能
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from merchants import (
+    RAW_MERCHANT_COL, MerchantCanonicalizer, canonicalize_merchants, merchant_key, normalize_merchant,
+)
+
+
+class TestNormalizeMerchant:
+    """测试商户名称的快速规范化"""
+
+    def test_width_spacing_and_suffix(self):
+        """全角转半角、去掉空白和身份后缀"""
+        assert normalize_merchant('ＫＦＣ 肯德基') == 'KFC肯德基'
+        assert normalize_merchant('张三（个人）') == '张三'
+        assert normalize_merchant('李记 小吃 (个体户)') == '李记小吃'
+        assert normalize_merchant('(个人)') == '(个人)'
+
+    def test_key_ignores_case(self):
+        """比较键忽略英文大小写"""
+        assert merchant_key('kfc肯德基') == merchant_key('ＫＦＣ 肯德基')
+
+
+class TestMerchantCanonicalizer:
+    """测试商户名称归并和别名缓存"""
+
+    def test_merges_variants_and_reports_reduction(self):
+        """不同写法归并为出现次数最多的写法"""
+        df = pd.DataFrame({'交易对方': ['星巴克咖啡国贸店', '星巴克咖啡国贸店', '星巴克咖啡 国贸店',
+                                    '星巴克咖啡国贸店 (商户)', '星巴克咖啡国贸点', '滴滴出行', '滴滴', np.nan]})
+        report = MerchantCanonicalizer().canonicalize(df)
+
+        assert report.before == 6
+        assert report.after == 3
+        assert report.fuzzy == 1
+        assert report.reduction == 0.5
+        assert df['交易对方'].iloc[:5].unique().tolist() == ['星巴克咖啡国贸店']
+        assert df['交易对方'].iloc[5:7].tolist() == ['滴滴出行', '滴滴']
+        assert pd.isna(df['交易对方'].iloc[7])
+        assert df[RAW_MERCHANT_COL].iloc[2] == '星巴克咖啡 国贸店'
+
+    def test_short_names_are_not_fuzzy_matched(self):
+        """短名称不做近似匹配"""
+        df = pd.DataFrame({'交易对方': ['滴滴', '滴答']})
+        assert MerchantCanonicalizer().canonicalize(df).after == 2
+
+    def test_cache_is_persisted_and_reused(self, temp_dir):
+        """别名写入缓存文件，再次运行时直接查表"""
+        path = os.path.join(temp_dir, 'aliases.json')
+        first = MerchantCanonicalizer.from_file(path)
+        first.canonicalize(pd.DataFrame({'交易对方': ['美团外卖平台服务', '美团 外卖平台服务（个人）']}))
+        with open(path, encoding='utf-8') as f:
+            assert json.load(f)['aliases']['美团 外卖平台服务（个人）'] == '美团外卖平台服务'
+
+        second = MerchantCanonicalizer.from_file(path)
+        df = pd.DataFrame({'交易对方': ['美团 外卖平台服务（个人）', '美团外卖平臺服务']})
+        report = second.canonicalize(df)
+        assert report.cached == 1
+        assert report.fuzzy == 1
+        assert df['交易对方'].tolist() == ['美团外卖平台服务', '美团外卖平台服务']
+
+    def test_idempotent_on_canonicalized_frame(self):
+        """重复规范化使用原始名称列，结果不变"""
+        df = pd.DataFrame({'交易对方': ['ＡＢＣ超市', 'ABC 超市']})
+        canonicalizer = MerchantCanonicalizer()
+        canonicalizer.canonicalize(df)
+        canonicalizer.canonicalize(df)
+        assert df['交易对方'].tolist() == ['ABC超市', 'ABC超市']
+        assert df[RAW_MERCHANT_COL].tolist() == ['ＡＢＣ超市', 'ABC 超市']
+
+    def test_default_canonicalizer_uses_env_cache(self, tmp_path):
+        """默认规范化器读写 BILL_HUB_MERCHANT_ALIASES 指定的缓存"""
+        canonicalize_merchants(pd.DataFrame({'交易对方': ['商户A']}))
+        assert os.path.exists(tmp_path / 'merchant_aliases.json')
+
+    def test_missing_column(self):
+        """没有商户列时不做处理"""
+        df = pd.DataFrame({'金额(元)': [1.0]})
+        assert MerchantCanonicalizer().canonicalize(df).before == 0
+        assert list(df.columns) == ['金额(元)']
@@ -0,0 +1,168 @@
+"""
+测试 password_provider.py 模块的功能
+"""
+import json
+import os
+import struct
+import zipfile
+import zlib
+
+import pytest
+import pyzipper
+
+from password_provider import (
+    ENV_PASSWORD,
+    ENV_PASSWORDS,
+    PasswordProvider,
+    file_fingerprint,
+    verify_zip_password,
+)
+
+
+@pytest.fixture
+def encrypted_zip(temp_dir):
+    """创建一个 AES 加密的 ZIP 文件"""
+    zip_path = os.path.join(temp_dir, "bill.zip")
+    with pyzipper.AESZipFile(zip_path, 'w', compression=pyzipper.ZIP_DEFLATED,
+                             encryption=pyzipper.WZ_AES) as zf:
+        zf.setpassword(b'secret')
+        zf.writestr('bill.pdf', b'%PDF-1.4 fake content' * 100)
+    return zip_path
+
+
+def _zipcrypto_zip(path, name, data, password):
+    """写出只有一个未压缩成员、使用 ZipCrypto 加密的 ZIP（标准库和 pyzipper 都不能写 ZipCrypto）"""
+    mask = 0xFFFFFFFF
+    keys = [0x12345678, 0x23456789, 0x34567890]
+
+    def update(byte):
+        keys[0] = zlib.crc32(bytes([byte]), keys[0] ^ mask) ^ mask
+        keys[1] = ((keys[1] + (keys[0] & 0xFF)) * 134775813 + 1) & mask
+        keys[2] = zlib.crc32(bytes([keys[1] >> 24]), keys[2] ^ mask) ^ mask
+
+    for byte in password.encode():
+        update(byte)
+    crc = zlib.crc32(data)
+    encrypted = bytearray()
+    for byte in bytes(range(11)) + bytes([crc >> 24]) + data:
+        temp = (keys[2] | 2) & 0xFFFF
+        encrypted.append(byte ^ (((temp * (temp ^ 1)) >> 8) & 0xFF))
+        update(byte)
+
+    name_bytes = name.encode()
+    local = struct.pack('<4s5H3L2H', b'PK\x03\x04', 20, 1, 0, 0, 0x21, crc, len(encrypted), len(data),
+                        len(name_bytes), 0) + name_bytes + bytes(encrypted)
+    central = struct.pack('<4s6H3L5H2L', b'PK\x01\x02', 20, 20, 1, 0, 0, 0x21, crc, len(encrypted), len(data),
+                          len(name_bytes), 0, 0, 0, 0, 0, 0) + name_bytes
+    end = struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, 1, 1, len(central), len(local), 0)
+    with open(path, 'wb') as f:
+        f.write(local + central + end)
+    return path
+
+
+class TestVerifyZipPassword:
+    """测试 verify_zip_password 函数"""
+
+    def test_correct_password(self, encrypted_zip):
+        """测试正确密码"""
+        assert verify_zip_password(encrypted_zip, 'secret') is True
+
+    def test_wrong_password(self, encrypted_zip):
+        """测试错误密码"""
+        assert verify_zip_password(encrypted_zip, 'wrong') is False
+
+    def test_zipcrypto_check_byte_collision(self, temp_dir):
+        """错误密码碰巧通过 ZipCrypto 校验字节时，读到成员结尾校验 CRC 后仍判定为错误"""
+        path = _zipcrypto_zip(os.path.join(temp_dir, 'legacy.zip'), 'bill.pdf', b'%PDF-1.4 ' * 2000, 'secret')
+        assert verify_zip_password(path, 'secret') is True
+
+        def passes_header_check(pwd):
+            try:
+                with zipfile.ZipFile(path) as zf:
+                    zf.open('bill.pdf', pwd=pwd.encode()).close()
+                return True
+            except RuntimeError:
+                return False
+
+        collision = next(pwd for pwd in (f'wrong{i}' for i in range(20000)) if passes_header_check(pwd))
+        assert verify_zip_password(path, collision) is False
+
+
+class TestPasswordProvider:
+    """测试 PasswordProvider 类"""
+
+    def test_env_candidates(self, encrypted_zip):
+        """测试从环境变量读取候选密码"""
+        provider = PasswordProvider(env={ENV_PASSWORD: 'a', ENV_PASSWORDS: 'b,c,a'})
+        assert provider.candidates(encrypted_zip) == ['a', 'b', 'c']
+
+    def test_mapping_has_priority(self, encrypted_zip, temp_dir):
+        """测试按文件映射的密码优先于环境变量"""
+        mapping_file = os.path.join(temp_dir, "passwords.json")
+        with open(mapping_file, 'w', encoding='utf-8') as f:
+            json.dump({"bill*.zip": "secret"}, f)
+        provider = PasswordProvider(mapping_file=mapping_file, env={ENV_PASSWORD: 'other'})
+        assert provider.candidates(encrypted_zip) == ['secret', 'other']
+
+    def test_parallel_trial_from_keyring(self, encrypted_zip, temp_dir):
+        """测试从 keyring 文件中并行试解出正确密码"""
+        keyring_file = os.path.join(temp_dir, "keyring")
+        with open(keyring_file, 'w', encoding='utf-8') as f:
+            f.write("# 注释\nwrong1\nwrong2\nsecret\nwrong3\n")
+        provider = PasswordProvider(keyring_file=keyring_file, env={})
+        assert provider.resolve_zip_password(encrypted_zip) == 'secret'
+
+    def test_no_candidate_returns_none(self, encrypted_zip):
+        """测试没有可用密码时返回 None"""
+        provider = PasswordProvider(env={ENV_PASSWORD: 'wrong'})
+        assert provider.resolve_zip_password(encrypted_zip) is None
+
+    def test_cache_skips_trial(self, encrypted_zip, temp_dir):
+        """测试缓存命中后不再试解"""
+        cache_file = os.path.join(temp_dir, "cache.json")
+        provider = PasswordProvider(cache_file=cache_file, env={ENV_PASSWORD: 'secret'})
+        assert provider.resolve_zip_password(encrypted_zip) == 'secret'
+        assert os.path.exists(cache_file)
+
+        # 新实例即使没有任何候选密码，也能从缓存中得到密码
+        rerun = PasswordProvider(cache_file=cache_file, env={})
+        assert rerun.cached_password(encrypted_zip) == 'secret'
+        assert rerun.resolve_zip_password(encrypted_zip) == 'secret'
+
+    def test_forget_persists_and_cache_is_private(self, encrypted_zip, temp_dir):
+        """缓存文件创建时即为 0600；forget 会写回缓存文件，新实例不再使用失效的密码"""
+        cache_file = os.path.join(temp_dir, "cache.json")
+        provider = PasswordProvider(cache_file=cache_file, env={})
+        provider.remember(encrypted_zip, 'stale')
+        assert os.stat(cache_file).st_mode & 0o777 == 0o600
+
+        provider.forget(encrypted_zip)
+        with open(cache_file, encoding='utf-8') as f:
+            assert file_fingerprint(encrypted_zip) not in json.load(f)
+        assert PasswordProvider(cache_file=cache_file, env={}).cached_password(encrypted_zip) is None
+
+    def test_stale_pdf_password_falls_back_to_candidates(self, statement_pdf, temp_dir, monkeypatch):
+        """缓存的 PDF 密码失效时移除缓存，改用其余候选密码并更新缓存"""
+        import password_provider
+        monkeypatch.setattr(password_provider, 'verify_pdf_password', lambda path, pwd: pwd == 'rotated')
+        path, _ = statement_pdf
+        cache_file = os.path.join(temp_dir, "cache.json")
+        provider = PasswordProvider(cache_file=cache_file, env={ENV_PASSWORDS: 'old,rotated'})
+        provider.remember(path, 'old')
+
+        assert provider.resolve_pdf_password(path) == 'rotated'
+        assert PasswordProvider(cache_file=cache_file, env={}).cached_password(path) == 'rotated'
+
+        # 没有其余可用候选时不再返回失效的缓存密码
+        monkeypatch.setattr(password_provider, 'verify_pdf_password', lambda path, pwd: False)
+        assert provider.resolve_pdf_password(path) is None
+        assert provider.cached_password(path) is None
+
+    def test_resolve_excludes_tried_passwords(self, encrypted_zip, temp_dir):
+        """排除已试过的密码后不再返回它（包括缓存中的密码）"""
+        cache_file = os.path.join(temp_dir, "cache.json")
+        provider = PasswordProvider(cache_file=cache_file, env={ENV_PASSWORDS: 'secret'})
+        provider.remember(encrypted_zip, 'stale')
+        assert provider.resolve_zip_password(encrypted_zip) == 'stale'
+        assert provider.resolve_zip_password(encrypted_zip, exclude=['stale']) == 'secret'
+        assert provider.resolve_zip_password(encrypted_zip, exclude=['stale', 'secret']) is None
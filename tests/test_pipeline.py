@@ -0,0 +1,113 @@
+"""
+测试 pipeline.py 模块的功能
+"""
+import asyncio
+import logging
+import math
+import time
+
+import pytest
+
+from logger_config import ContextFilter, logger
+from pipeline import Pipeline, Stage, parse_concurrency
+
+
+class TestPipeline:
+    """测试分阶段流水线"""
+
+    def test_items_pass_through_all_stages(self):
+        """每个条目依次经过所有阶段"""
+        pipeline = Pipeline([
+            Stage('double', lambda x: x * 2, concurrency=2),
+            Stage('inc', lambda x: x + 1, executor='inline'),
+        ])
+        assert sorted(pipeline.run_sync(range(10))) == [x * 2 + 1 for x in range(10)]
+        assert pipeline.stats['double'].processed == 10
+        assert pipeline.stats['inc'].emitted == 10
+
+    def test_fan_out_and_drop(self):
+        """fan_out 阶段展开多个条目，返回 None 的条目被丢弃"""
+        pipeline = Pipeline([
+            Stage('split', lambda x: [x] * x, fan_out=True),
+            Stage('odd', lambda x: x if x % 2 else None),
+        ])
+        assert sorted(pipeline.run_sync([1, 2, 3])) == [1, 3, 3, 3]
+
+    def test_failures_are_counted(self):
+        """单个条目失败不影响其他条目"""
+        pipeline = Pipeline([Stage('inverse', lambda x: 1 / x)])
+        assert sorted(pipeline.run_sync([0, 1, 2])) == [0.5, 1.0]
+        assert pipeline.stats['inverse'].failed == 1
+
+    def test_failure_is_logged_with_item_context(self):
+        """失败日志带有条目名称、阶段名和异常堆栈"""
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        handler.addFilter(ContextFilter())
+        logger.addHandler(handler)
+        try:
+            pipeline = Pipeline([Stage('inverse', lambda x: 1 / x)], label=lambda x: f'item-{x}')
+            pipeline.run_sync([0, 1])
+        finally:
+            logger.removeHandler(handler)
+
+        [record] = [r for r in records if '处理失败' in r.getMessage()]
+        assert record.levelno == logging.ERROR
+        assert (record.file, record.stage) == ('item-0', 'inverse')
+        assert record.exc_info[0] is ZeroDivisionError
+
+    def test_backpressure_and_bottleneck(self):
+        """下游慢时上游在有界队列上阻塞，瓶颈为慢阶段"""
+        def slow(x):
+            time.sleep(0.02)
+            return x
+
+        pipeline = Pipeline([
+            Stage('fast', lambda x: x, queue_size=1),
+            Stage('slow', slow, queue_size=1),
+        ])
+        pipeline.run_sync(range(10))
+        assert pipeline.stats['fast'].blocked > 0
+        assert pipeline.stats['slow'].max_queue <= 1
+        assert pipeline.bottleneck() == 'slow'
+        assert pipeline.stats['slow'].utilization(pipeline.elapsed) > 0.5
+        assert 'slow' in pipeline.report()
+
+    def test_concurrency_overlaps_work(self):
+        """并发数为 N 的线程阶段同时处理 N 个条目"""
+        def sleep(x):
+            time.sleep(0.05)
+            return x
+
+        pipeline = Pipeline([Stage('io', sleep, concurrency=4)])
+        start = time.perf_counter()
+        pipeline.run_sync(range(8))
+        assert time.perf_counter() - start < 0.3
+
+    def test_process_and_async_stages(self):
+        """进程池阶段和协程函数阶段"""
+        async def negate(x):
+            await asyncio.sleep(0)
+            return -x
+
+        pipeline = Pipeline([
+            Stage('sqrt', math.sqrt, concurrency=2, executor='process'),
+            Stage('negate', negate, executor='inline'),
+        ])
+        assert sorted(pipeline.run_sync([4, 9])) == [-3.0, -2.0]
+
+    def test_invalid_stages(self):
+        """无效的配置"""
+        with pytest.raises(ValueError):
+            Stage('x', abs, executor='gpu')
+        with pytest.raises(ValueError):
+            Pipeline([Stage('x', abs), Stage('x', abs)])
+
+
+def test_parse_concurrency():
+    """解析阶段并发配置"""
+    assert parse_concurrency("parse=2, render=3") == {'parse': 2, 'render': 3}
+    assert parse_concurrency(None) == {}
+    with pytest.raises(ValueError):
+        parse_concurrency("parse")
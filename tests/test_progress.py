@@ -0,0 +1,114 @@
+"""
+测试 progress.py 模块的功能
+"""
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import progress
+from progress import ProgressService, report
+from utils import parse_pdf_to_df
+
+
+def _report_pages(count):
+    """在子进程中报告进度"""
+    for _ in range(count):
+        report('parse', pages=1, rows=10)
+    return count
+
+
+class _TtyStream(io.StringIO):
+    def isatty(self):
+        return True
+
+
+class TestProgressService:
+    """测试进度汇总服务"""
+
+    def test_report_without_service_is_noop(self):
+        """没有运行中的进度服务时报告被忽略"""
+        report('parse', pages=1)
+        assert progress.progress_channel() is None
+
+    def test_aggregates_stages_and_worker_processes(self):
+        """主进程和子进程的报告汇总到同一个服务"""
+        with ProgressService(mode='log') as service:
+            report('parse', total_pages=12)
+            report('parse', pages=2, rows=20)
+            report('render', items=1)
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                assert sum(executor.map(_report_pages, [4, 6])) == 10
+
+        assert service.total_pages == 12
+        assert service.stages['parse'].pages == 12
+        assert service.stages['parse'].rows == 120
+        assert service.stages['render'].items == 1
+        assert progress.progress_channel() is None
+
+    def test_summary_has_rate_eta_and_stages(self):
+        """摘要包含百分比、速度、预计剩余时间和各阶段完成数"""
+        service = ProgressService(mode='log')
+        service.start()
+        try:
+            service.update('parse', total_pages=10)
+            service.update('parse', pages=5, rows=100, items=1)
+            service.update('render', items=2)
+            line = service.summary()
+        finally:
+            service.stop()
+
+        assert '50% 5/10 页' in line
+        assert '页/s' in line and '行/s' in line
+        assert '剩余' in line
+        assert 'parse 1 render 2' in line
+        assert '用时' in service.summary()
+
+    def test_bar_mode_redraws_single_line(self):
+        """终端中刷新同一行进度条，结束时清除"""
+        stream = _TtyStream()
+        with ProgressService("解析", stream=stream, refresh=0.01) as service:
+            assert service.mode == 'bar'
+            report('parse', pages=1, total_pages=4)
+            time.sleep(0.1)
+
+        output = stream.getvalue()
+        assert '\r\x1b[2K解析' in output
+        assert '\n' not in output
+        assert output.endswith('\r\x1b[2K')
+
+    @pytest.mark.parametrize('mode', ['log', 'bar'])
+    def test_refreshes_while_reports_keep_arriving(self, mode, monkeypatch):
+        """子进程持续报告时也按间隔输出进度日志 / 重绘进度条，而不是等队列空闲"""
+        logged, drawn = [], []
+        monkeypatch.setattr(progress.logger, 'info', lambda message, *a, **k: logged.append(message))
+        monkeypatch.setattr(ProgressService, 'draw', lambda self: drawn.append(time.monotonic()))
+        service = ProgressService("解析", mode=mode, stream=_TtyStream(), refresh=0.5, log_interval=0.1)
+        service.start()
+        try:
+            deadline = time.monotonic() + 0.6
+            while time.monotonic() < deadline:
+                progress._channel.put(('parse', 1, 10, 0, 0))
+                time.sleep(0.01)
+            interim = logged[:] if mode == 'log' else drawn[:]
+        finally:
+            service.stop()
+
+        assert len(interim) >= (3 if mode == 'log' else 1)
+        assert service.stages['parse'].pages > 0
+
+    def test_off_mode_and_invalid_mode(self):
+        """off 不启动服务，未知方式报错"""
+        with ProgressService(mode='off'):
+            assert progress.progress_channel() is None
+        with pytest.raises(ValueError):
+            ProgressService(mode='fancy')
+
+    def test_parser_reports_pages(self, statement_pdf):
+        """PDF 解析逐页报告页数和总页数"""
+        with ProgressService(mode='log') as service:
+            parse_pdf_to_df(statement_pdf[0])
+
+        assert service.total_pages == 3
+        assert service.stages['parse'].pages == 3
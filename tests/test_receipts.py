@@ -0,0 +1,173 @@
+"""
+测试 receipts.py 模块（图片预处理和字段提取离线运行，OCR 测试需要本地 tesseract）
+"""
+import os
+import shutil
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import receipts
+from receipts import (
+    OcrCache, estimate_skew, import_receipts, is_receipt_image, ocr_available, otsu_threshold, parse_receipt_text,
+    preprocess_image,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'receipts')
+COFFEE = os.path.join(FIXTURES, 'coffee.png')
+SKEWED = os.path.join(FIXTURES, 'market_skewed.png')
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _fixture_text(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class TestParseReceiptText:
+    """测试从 OCR 文字中提取字段"""
+
+    def test_chinese_receipt(self):
+        """实付优先于合计，商户取关键字后的名称"""
+        fields = parse_receipt_text(_fixture_text('supermarket.txt'))
+        assert fields.merchant == '华润万家(国贸店)'
+        assert fields.amount == 30.0
+        assert fields.time == pd.Timestamp('2024-06-18 19:42:05')
+
+    def test_english_receipt_without_keywords(self):
+        """没有商户关键字时取抬头行，TOTAL 作为金额"""
+        fields = parse_receipt_text("FRESH MART\nReceipt No 000123\n2024/06/18 19:42\nMilk 12.50\nTotal 22.40")
+        assert fields.merchant == 'FRESH MART'
+        assert fields.amount == 22.4
+        assert fields.time == pd.Timestamp('2024-06-18 19:42')
+
+    def test_dates_are_not_amounts(self):
+        """日期中的数字不会被当作金额"""
+        fields = parse_receipt_text("小店\n2024.05.03\n豆浆 3.50\n油条 2.00")
+        assert fields.amount == 3.5
+        assert fields.time == pd.Timestamp('2024-05-03')
+
+    def test_missing_fields(self):
+        """无法识别的字段为 None / NaT"""
+        fields = parse_receipt_text("谢谢惠顾\n\n")
+        assert fields.amount is None
+        assert fields.merchant is None
+        assert pd.isna(fields.time)
+
+
+class TestPreprocess:
+    """测试灰度、纠偏和二值化"""
+
+    def test_otsu_separates_two_levels(self):
+        """双峰灰度图的阈值落在两个灰度之间"""
+        gray = np.array([[40] * 10 + [230] * 30], dtype=np.uint8)
+        assert 40 <= otsu_threshold(gray) < 230
+
+    def test_estimates_skew_of_bundled_image(self):
+        """倾斜 3° 的样例估计出 3°，正向样例为 0°"""
+        for path, expected in ((SKEWED, 3.0), (COFFEE, 0.0)):
+            gray = np.asarray(Image.open(path).convert('L'))
+            assert estimate_skew(gray <= otsu_threshold(gray)) == pytest.approx(expected, abs=0.5)
+
+    def test_preprocess_deskews_and_binarizes(self, temp_dir):
+        """预处理结果为放大后的黑白图片，文字行已摆正"""
+        output = preprocess_image(SKEWED, os.path.join(temp_dir, 'out.png'))
+        pixels = np.asarray(Image.open(output))
+        assert set(np.unique(pixels)) == {0, 255}
+        assert pixels.shape[1] >= receipts.MIN_WIDTH
+        assert estimate_skew(pixels == 0) == pytest.approx(0.0, abs=0.5)
+
+    def test_image_extensions(self):
+        """识别常见图片格式"""
+        assert is_receipt_image('a.JPG') and is_receipt_image('b.png')
+        assert not is_receipt_image('c.pdf')
+
+
+class TestImportReceipts:
+    """测试小票导入和 OCR 缓存"""
+
+    def test_cached_text_skips_ocr(self, temp_dir):
+        """缓存命中时不做预处理和 OCR，结果转换为交易数据"""
+        image = shutil.copy(COFFEE, os.path.join(temp_dir, 'coffee.png'))
+        cache = OcrCache(os.path.join(temp_dir, 'cache'))
+        cache.put(receipts.image_hash(image), _fixture_text('supermarket.txt'))
+
+        with patch('receipts.preprocess_image') as mock_pre, patch('receipts.run_tesseract_batch') as mock_ocr:
+            df = import_receipts([image], cache=cache)
+        mock_pre.assert_not_called()
+        mock_ocr.assert_not_called()
+
+        row = df.iloc[0]
+        assert row['交易对方'] == '华润万家(国贸店)'
+        assert row['金额(元)'] == 30.0
+        assert row['收/支/其他'] == '支出'
+        assert row['交易单号'] == f"OCR-{receipts.image_hash(image)[:16]}"
+        assert row['月序号'] == 2024 * 12 + 5
+
+    def test_ocr_runs_in_batches_and_fills_cache(self, temp_dir):
+        """未缓存的图片分批识别并写入缓存，再次导入时直接读缓存"""
+        images = [shutil.copy(COFFEE, os.path.join(temp_dir, 'a.png')),
+                  shutil.copy(SKEWED, os.path.join(temp_dir, 'b.png'))]
+        cache = OcrCache(os.path.join(temp_dir, 'cache'), lang='eng')
+        texts = ["Merchant: Blue Bottle Coffee\n2024-05-03 08:15:22\nTOTAL 50.00",
+                 "FRESH MART\n2024/06/18 19:42\nTotal 22.40"]
+        batches = []
+
+        def fake_ocr(paths, lang):
+            batches.append(len(paths))
+            return texts[len(batches) - 1:len(batches) - 1 + len(paths)]
+
+        with patch('receipts.ocr_available', return_value=True), \
+                patch('receipts.run_tesseract_batch', side_effect=fake_ocr):
+            result = receipts.ocr_receipts(images, cache, workers=1, batch_size=1)
+        assert batches == [1, 1]
+        assert result[images[1]] == texts[1]
+
+        with patch('receipts.run_tesseract_batch') as mock_ocr:
+            df = import_receipts(images, cache=cache)
+        mock_ocr.assert_not_called()
+        assert df['交易对方'].tolist() == ['Blue Bottle Coffee', 'FRESH MART']
+        assert df['金额(元)'].tolist() == [50.0, 22.4]
+
+    def test_bad_images_are_skipped(self, temp_dir):
+        """损坏的图片和 OCR 失败的图片被跳过，其余图片照常识别；整批失败时逐张重试"""
+        import subprocess
+
+        broken = os.path.join(temp_dir, 'broken.png')
+        with open(broken, 'wb') as f:
+            f.write(b'not an image')
+        images = [broken, shutil.copy(COFFEE, os.path.join(temp_dir, 'a.png')),
+                  shutil.copy(SKEWED, os.path.join(temp_dir, 'b.png'))]
+        cache = OcrCache(os.path.join(temp_dir, 'cache'), lang='eng')
+        calls = []
+
+        def fake_ocr(paths, lang):
+            calls.append(len(paths))
+            if len(paths) > 1 or len(calls) > 2:
+                raise subprocess.CalledProcessError(1, 'tesseract')
+            return ["FRESH MART\n2024/06/18 19:42\nTotal 22.40"]
+
+        with patch('receipts.ocr_available', return_value=True), \
+                patch('receipts.run_tesseract_batch', side_effect=fake_ocr):
+            result = receipts.ocr_receipts(images, cache, workers=1)
+        assert calls == [2, 1, 1]
+        assert list(result) == [images[1]]
+        assert cache.get(receipts.image_hash(images[1])) is not None
+        assert cache.get(receipts.image_hash(images[2])) is None
+
+    def test_without_tesseract_uncached_images_are_skipped(self, temp_dir):
+        """没有 tesseract 时跳过未识别过的图片"""
+        cache = OcrCache(os.path.join(temp_dir, 'cache'))
+        with patch('receipts.ocr_available', return_value=False):
+            assert import_receipts([COFFEE], cache=cache) is None
+
+    @pytest.mark.skipif(not ocr_available(), reason="需要本地安装 tesseract")
+    def test_tesseract_on_bundled_images(self, temp_dir):
+        """本地 tesseract 识别样例图片"""
+        cache = OcrCache(os.path.join(temp_dir, 'cache'), lang='eng')
+        df = import_receipts([COFFEE, SKEWED], cache=cache)
+        assert df['金额(元)'].tolist() == [50.0, 22.4]
+        assert df['交易时间'].tolist() == [pd.Timestamp('2024-05-03 08:15:22'), pd.Timestamp('2024-06-18 19:42')]
@@ -0,0 +1,60 @@
+"""
+测试 static_report.py 模块及 PNG 导出后端选择
+"""
+import os
+
+import pytest
+
+import visualize
+from visualize import compute_report_aggregates, generate_visualizations
+
+pytest.importorskip("matplotlib")
+
+from static_report import render_report_png, render_report_pngs  # noqa: E402
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def _is_png(path):
+    with open(path, 'rb') as f:
+        return f.read(8) == PNG_SIGNATURE
+
+
+class TestRenderReportPng:
+    """测试 matplotlib 绘制报表图片"""
+
+    def test_render_writes_png(self, sample_df, temp_dir):
+        """汇总数据可以直接绘制为 PNG"""
+        png_path = os.path.join(temp_dir, "report.png")
+        assert render_report_png(compute_report_aggregates(sample_df), png_path)
+        assert _is_png(png_path)
+
+    def test_render_many(self, sample_df, temp_dir):
+        """多份报表并发绘制"""
+        agg = compute_report_aggregates(sample_df)
+        items = [(agg, os.path.join(temp_dir, f"report_{i}.png")) for i in range(2)]
+        assert render_report_pngs(items, max_workers=2) == [True, True]
+        assert all(_is_png(path) for _, path in items)
+
+
+class TestPngBackendSelection:
+    """测试 generate_visualizations 的 PNG 后端选择"""
+
+    def test_matplotlib_backend(self, sample_df, temp_dir):
+        """matplotlib 后端输出 _summary.png，不需要浏览器"""
+        output_path = os.path.join(temp_dir, "report.html")
+        assert generate_visualizations(sample_df, output_path, png_backend='matplotlib')
+        assert _is_png(os.path.join(temp_dir, "report_summary.png"))
+        assert not os.path.exists(os.path.join(temp_dir, "report_full_page.png"))
+
+    def test_backend_from_env(self, sample_df, temp_dir, monkeypatch):
+        """未传参时读取 BILL_HUB_PNG_BACKEND"""
+        monkeypatch.setenv(visualize.ENV_PNG_BACKEND, 'matplotlib')
+        output_path = os.path.join(temp_dir, "report.html")
+        generate_visualizations(sample_df, output_path)
+        assert os.path.exists(os.path.join(temp_dir, "report_summary.png"))
+
+    def test_unknown_backend(self, sample_df, temp_dir):
+        """未知后端报错"""
+        with pytest.raises(ValueError):
+            generate_visualizations(sample_df, os.path.join(temp_dir, "report.html"), png_backend='svg')
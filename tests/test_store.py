@@ -0,0 +1,115 @@
+"""
+测试 store.py 模块的功能
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import store as store_module
+from store import BillStore, QueryFilter
+from utils import MONTH_KEY
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def ledger():
+    """跨 2023、2024 两年的交易数据（每 5 天一条）"""
+    times = pd.date_range('2023-01-03 12:00:00', '2024-12-28', freq='5D')
+    n = len(times)
+    return pd.DataFrame({
+        '交易时间': times,
+        '收/支/其他': ['收入' if i % 6 == 0 else '支出' for i in range(n)],
+        '金额(元)': [float(i % 13 + 1) for i in range(n)],
+        '交易对方': [f"商户{i % 4}" for i in range(n)],
+        '分类': ['餐饮' if i % 2 else '交通' for i in range(n)],
+    })
+
+
+@pytest.fixture
+def store(ledger, temp_dir):
+    bill_store = BillStore(os.path.join(temp_dir, 'store'))
+    bill_store.ingest(ledger, 'a' * 32, 'ledger.pdf')
+    return bill_store
+
+
+class TestBillStore:
+    """测试按月份分区的账单存储"""
+
+    def test_ingest_partitions_by_month(self, store, ledger):
+        """每个月份一个分区，全量扫描与原数据一致"""
+        assert len(store.partitions()) == 24
+        assert MONTH_KEY in store.scan().columns
+        result = store.scan()[ledger.columns]
+        pd.testing.assert_frame_equal(result, ledger, check_dtype=False)
+
+    def test_date_range_prunes_partitions(self, store, ledger):
+        """日期范围只读取相关月份，且按行精确过滤"""
+        query = QueryFilter(start=pd.Timestamp('2024-03-10'), end=pd.Timestamp('2024-05-01'))
+        assert len(store.partitions(query)) == 2
+
+        result = store.scan(query)
+        expected = ledger[(ledger['交易时间'] >= '2024-03-10') & (ledger['交易时间'] < '2024-05-01')]
+        assert len(result) == len(expected)
+        assert result['交易时间'].min() >= pd.Timestamp('2024-03-10')
+
+    def test_quarter_across_years(self, store):
+        """按季度月份过滤时跨所有年份"""
+        query = QueryFilter(months_of_year=[4, 5, 6])
+        assert len(store.partitions(query)) == 6
+        assert set(store.scan(query)['交易时间'].dt.month) == {4, 5, 6}
+
+    def test_merchant_and_category_filters(self, store):
+        """商户关键字和分类过滤，并支持列裁剪"""
+        result = store.scan(QueryFilter(merchants=['商户1'], categories=['餐饮']),
+                            columns=['交易时间', '金额(元)'])
+        assert list(result.columns) == ['交易时间', '金额(元)']
+        assert len(result) > 0
+
+        full = store.scan(QueryFilter(merchants=['商户1'], categories=['餐饮']))
+        assert set(full['交易对方']) == {'商户1'}
+        assert set(full['分类']) == {'餐饮'}
+
+    def test_unknown_merchant_prunes_everything(self, store):
+        """分区统计中没有的商户不读取任何分区"""
+        query = QueryFilter(merchants=['不存在的商户'])
+        assert store.partitions(query) == []
+        assert store.scan(query).empty
+
+    def test_reingest_replaces_source(self, store, ledger):
+        """同一来源重复存入时覆盖旧分区"""
+        store.ingest(ledger.head(10), 'a' * 32, 'ledger.pdf')
+
+        reopened = BillStore(store.root)
+        assert len(reopened.scan()) == 10
+        assert reopened.sources()[0]['rows'] == 10
+        files = [f for _, _, names in os.walk(store.root) for f in names if not f.endswith('.json')]
+        assert len(files) == len(reopened.partitions())
+
+    def test_missing_time_partition(self, store, ledger):
+        """交易时间缺失的记录只在没有时间条件时返回"""
+        broken = ledger.head(3).copy()
+        broken.loc[0, '交易时间'] = pd.NaT
+        store.ingest(broken, 'b' * 32, 'broken.pdf')
+
+        assert len(store.scan()) == len(ledger) + 3
+        assert len(store.scan(QueryFilter(start=pd.Timestamp('2023-01-01')))) == len(ledger) + 2
+
+    def test_requires_pyarrow(self, ledger, temp_dir, monkeypatch):
+        """未安装 pyarrow 时读写分区报错，不回退到 pickle"""
+        monkeypatch.setattr(store_module, 'pq', None)
+        bill_store = BillStore(os.path.join(temp_dir, 'store'))
+        with pytest.raises(ImportError, match="pyarrow"):
+            bill_store.ingest(ledger, 'a' * 32, 'ledger.pdf')
+        assert not any(names for _, _, names in os.walk(os.path.join(temp_dir, 'store', 'month=2023-01')))
+
+    def test_rejects_pickle_store(self, temp_dir):
+        """旧版本的 pickle 存储不再读取"""
+        root = os.path.join(temp_dir, 'store')
+        os.makedirs(root)
+        with open(os.path.join(root, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump({'format': 'pickle', 'sources': {}}, f)
+        with pytest.raises(ValueError, match="pickle"):
+            BillStore(root)
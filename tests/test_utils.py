@@ -1,10 +1,21 @@
 """
 测试 utils.py 模块的功能
 """
+import json
+import os
+import time
+
 import pytest
 import pandas as pd
 import numpy as np
-from utils import clean_amount, extract_zip
+import pdfplumber
+
+from utils import (
+    clean_amount, extract_table_rows_fast, extract_zip, iter_pdf_batches, learn_table_layout,
+    parse_pdf_to_df, pdf_page_count, PageCheckpoint, add_time_keys, ensure_time_keys, month_labels,
+    day_index_to_datetime, TIME_KEY_COLUMNS
+)
+import utils
 
 
 class TestCleanAmount:
@@ -77,4 +88,253 @@ class TestExtractZip:
     @pytest.mark.skip(reason="需要实际的 ZIP 文件")
     def test_extract_zip_wrong_password(self):
         """测试使用错误密码解压"""
-        pass
\ No newline at end of file
+        pass
+
+class TestParsePdfFastPath:
+    """测试微信账单的快速解析路径"""
+
+    def test_learn_layout(self, statement_pdf):
+        """测试从第一页表头学习列名和列边界"""
+        path, _ = statement_pdf
+        with pdfplumber.open(path) as pdf:
+            layout = learn_table_layout(pdf.pages[0])
+        assert layout.columns[:2] == ['交易单号', '交易时间']
+        assert '收/支/其他' in layout.columns
+        assert len(layout.bounds) == len(layout.columns) - 1
+
+    def test_fast_matches_generic(self, statement_pdf):
+        """测试快速路径与通用表格解析的结果一致，且跳过各页重复的表头"""
+        path, rows = statement_pdf
+        fast = parse_pdf_to_df(path, fast=True)
+        generic = parse_pdf_to_df(path, fast=False)
+        assert len(fast) == len(rows)
+        pd.testing.assert_frame_equal(fast, generic)
+        assert fast['交易时间'].iloc[1] == pd.Timestamp('2024-01-01 15:00:00')
+        assert fast['金额(元)'].iloc[0] == 1.5
+
+    def test_unknown_layout_falls_back(self, temp_dir, pdf_writer):
+        """测试表头不符合微信账单版式时回退到通用解析"""
+        path = pdf_writer(
+            os.path.join(temp_dir, "other.pdf"),
+            [["2024-01-01 08:00:00", "12.00"]],
+            columns=['时间', '金额'], widths=[200, 100]
+        )
+        with pdfplumber.open(path) as pdf:
+            assert learn_table_layout(pdf.pages[0]) is None
+        df = parse_pdf_to_df(path)
+        assert df is not None and len(df) == 2
+
+    def test_page_mismatch_returns_none(self, statement_pdf):
+        """测试页面与版式不匹配（交易时间列没有日期）时返回 None 以便逐页回退"""
+        path, _ = statement_pdf
+        with pdfplumber.open(path) as pdf:
+            layout = learn_table_layout(pdf.pages[0])
+            layout.bounds = layout.bounds + 1000
+            assert extract_table_rows_fast(pdf.pages[1], layout) is None
+
+
+class TestIterPdfBatches:
+    """测试流式解析"""
+
+    def test_batches_concat_to_full_parse(self, statement_pdf):
+        """测试各批次拼接后与整体解析结果一致"""
+        path, rows = statement_pdf
+        batches = list(iter_pdf_batches(path, batch_rows=15))
+        assert len(batches) > 1
+        assert all(list(b.columns) == list(batches[0].columns) for b in batches)
+        merged = pd.concat(batches, ignore_index=True)
+        pd.testing.assert_frame_equal(merged, parse_pdf_to_df(path))
+        assert len(merged) == len(rows)
+
+    def test_pages_are_released(self, statement_pdf, monkeypatch):
+        """测试每页处理完后立即释放页面缓存"""
+        path, _ = statement_pdf
+        closed = []
+        original = pdfplumber.page.Page.close
+
+        def spy(page):
+            closed.append(page.page_number)
+            original(page)
+
+        monkeypatch.setattr(pdfplumber.page.Page, 'close', spy)
+        batches = iter_pdf_batches(path, batch_rows=1)
+        next(batches)
+        # 第一批在第 2 页处理完后产出，此时前两页都已释放
+        assert closed == [1, 2]
+        batches.close()
+
+    def test_generic_path_drops_repeated_headers(self, statement_pdf):
+        """测试通用路径也会丢弃后续页面重复的表头"""
+        path, rows = statement_pdf
+        df = parse_pdf_to_df(path, fast=False)
+        assert len(df) == len(rows)
+        assert df['交易时间'].notna().all()
+
+    @pytest.mark.parametrize("fast", [True, False])
+    def test_page_ranges_concat_to_full_parse(self, statement_pdf, fast):
+        """测试按页码范围分片解析（不含第一页的分片沿用第一页表头）后拼接与整体解析一致"""
+        path, _ = statement_pdf
+        pages = pdf_page_count(path)
+        assert pages == 3
+        parts = [pd.concat(iter_pdf_batches(path, fast=fast, pages=[p])) for p in range(pages)]
+        merged = pd.concat(parts, ignore_index=True)
+        pd.testing.assert_frame_equal(merged, parse_pdf_to_df(path, fast=fast))
+
+
+class TestPageCheckpoint:
+    """测试逐页检查点续跑"""
+
+    def test_resume_after_crash(self, statement_pdf, temp_dir, monkeypatch):
+        """第 3 页失败后重跑只解析第 3 页，结果与完整解析一致，完成后删除检查点"""
+        path, rows = statement_pdf
+        root = os.path.join(temp_dir, 'ckpt')
+        original = utils.extract_table_rows_fast
+        calls, crash_on = [], [3]
+
+        def flaky(page, layout):
+            calls.append(page.page_number)
+            if page.page_number in crash_on:
+                raise RuntimeError("模拟崩溃")
+            return original(page, layout)
+
+        monkeypatch.setattr(utils, 'extract_table_rows_fast', flaky)
+        with pytest.raises(Exception):
+            parse_pdf_to_df(path, checkpoint_dir=root)
+        checkpoint = PageCheckpoint.for_file(path, True, root)
+        assert [checkpoint.has(p) for p in range(3)] == [True, True, False]
+
+        calls.clear()
+        crash_on.clear()
+        df = parse_pdf_to_df(path, checkpoint_dir=root)
+        assert calls == [3]
+        assert len(df) == len(rows)
+        pd.testing.assert_frame_equal(df, parse_pdf_to_df(path))
+        assert not os.path.exists(root) or not os.listdir(root)
+
+    def test_generic_path_resume(self, statement_pdf, temp_dir):
+        """通用路径的检查点与快速路径分开保存"""
+        path, rows = statement_pdf
+        root = os.path.join(temp_dir, 'ckpt')
+        checkpoint = PageCheckpoint.for_file(path, False, root)
+        with pdfplumber.open(path) as pdf:
+            checkpoint.save(0, pdf.pages[0].extract_tables()[0])
+        assert not PageCheckpoint.for_file(path, True, root).has(0)
+        assert len(parse_pdf_to_df(path, fast=False, checkpoint_dir=root)) == len(rows)
+
+    def test_corrupt_page_is_reparsed(self, statement_pdf, temp_dir):
+        """损坏的检查点页重新解析"""
+        path, rows = statement_pdf
+        root = os.path.join(temp_dir, 'ckpt')
+        checkpoint = PageCheckpoint.for_file(path, True, root)
+        with open(checkpoint._path(1), 'wb') as f:
+            f.write(b'garbage')
+        assert checkpoint.load(1) is None
+        assert len(parse_pdf_to_df(path, checkpoint_dir=root)) == len(rows)
+
+    def test_pages_are_stored_as_json(self, statement_pdf, temp_dir):
+        """页面保存为 zlib 压缩的 JSON；pickle 内容不会被加载"""
+        import pickle
+        import zlib
+
+        path, _ = statement_pdf
+        checkpoint = PageCheckpoint.for_file(path, True, os.path.join(temp_dir, 'ckpt'))
+        checkpoint.save(0, [['交易时间', None], ['2024-01-01', '商户']])
+        with open(checkpoint._path(0), 'rb') as f:
+            assert json.loads(zlib.decompress(f.read())) == [['交易时间', None], ['2024-01-01', '商户']]
+        assert checkpoint.load(0) == [['交易时间', None], ['2024-01-01', '商户']]
+
+        with open(checkpoint._path(1), 'wb') as f:
+            f.write(zlib.compress(pickle.dumps([['x']])))
+        assert checkpoint.load(1) is None
+
+    def test_private_permissions_and_format_version(self, statement_pdf, temp_dir, monkeypatch):
+        """检查点目录为 0700、页面文件为 0600；格式版本变化后不读取旧的检查点"""
+        path, _ = statement_pdf
+        root = os.path.join(temp_dir, 'ckpt')
+        checkpoint = PageCheckpoint.for_file(path, True, root)
+        checkpoint.save(0, [['a']])
+        assert os.stat(checkpoint.work_dir).st_mode & 0o777 == 0o700
+        assert os.stat(os.path.dirname(checkpoint.work_dir)).st_mode & 0o777 == 0o700
+        assert os.stat(checkpoint._path(0)).st_mode & 0o777 == 0o600
+
+        monkeypatch.setattr(utils, 'CHECKPOINT_FORMAT_VERSION', utils.CHECKPOINT_FORMAT_VERSION + 1)
+        assert not PageCheckpoint.for_file(path, True, root).has(0)
+
+    def test_concurrent_job_does_not_clear_checkpoint(self, statement_pdf, temp_dir):
+        """另一个任务持有检查点时，本次解析不读写也不删除它"""
+        path, rows = statement_pdf
+        root = os.path.join(temp_dir, 'ckpt')
+        other = PageCheckpoint.for_file(path, True, root)
+        assert other.acquire()
+        other.save(0, [['进行中']])
+
+        assert len(parse_pdf_to_df(path, checkpoint_dir=root)) == len(rows)
+        assert other.load(0) == [['进行中']]
+        assert not other.has(1)
+
+        other.clear()
+        assert not os.listdir(root)
+        # 锁释放后可以重新取得
+        again = PageCheckpoint.for_file(path, True, root)
+        assert again.acquire()
+        again.release()
+
+    def test_expired_checkpoints_are_pruned(self, statement_pdf, temp_dir, monkeypatch):
+        """超过保留期的检查点在下次解析时删除，未过期的保留"""
+        path, rows = statement_pdf
+        root = os.path.join(temp_dir, 'ckpt')
+        stale = os.path.join(root, 'stale-v1', 'fast')
+        fresh = os.path.join(root, 'fresh-v1', 'fast')
+        for work_dir in (stale, fresh):
+            PageCheckpoint(work_dir).save(0, [['x']])
+        old = time.time() - 8 * 86400
+        for folder in (stale, os.path.dirname(stale)):
+            for name in os.listdir(folder):
+                os.utime(os.path.join(folder, name), (old, old))
+        os.utime(os.path.dirname(stale), (old, old))
+
+        monkeypatch.setenv('BILL_HUB_CHECKPOINT_MAX_AGE', '7')
+        assert len(parse_pdf_to_df(path, checkpoint_dir=root)) == len(rows)
+        assert sorted(os.listdir(root)) == ['fresh-v1']
+
+        # 同一进程中不再重复遍历该根目录
+        calls = []
+        monkeypatch.setattr(utils, 'prune_checkpoints', lambda *args, **kwargs: calls.append(args))
+        parse_pdf_to_df(path, checkpoint_dir=root)
+        assert calls == []
+
+    def test_checkpoints_can_be_disabled(self, monkeypatch):
+        """BILL_HUB_CHECKPOINTS=0 时不使用检查点"""
+        assert utils.default_checkpoint_dir() is not None
+        monkeypatch.setenv('BILL_HUB_CHECKPOINTS', '0')
+        assert utils.default_checkpoint_dir() is None
+
+
+class TestTimeKeys:
+    """测试整数时间键"""
+
+    def test_keys_match_datetime_fields(self):
+        """月序号、日序号、小时、星期与 datetime 字段一致，缺失时间为 -1"""
+        times = pd.Series(pd.to_datetime(['2024-01-15 10:30:00', '2023-12-31 23:59:59', None, '2024-03-03 00:00:00']))
+        df = add_time_keys(pd.DataFrame({'交易时间': times}))
+        valid = times.notna()
+        assert (df['月序号'][valid] == times[valid].dt.year * 12 + times[valid].dt.month - 1).all()
+        assert (df['小时'][valid] == times[valid].dt.hour).all()
+        assert (df['星期'][valid] == times[valid].dt.weekday).all()
+        assert (day_index_to_datetime(df['日序号'][valid]) == times[valid].dt.normalize()).all()
+        assert df.loc[2, TIME_KEY_COLUMNS].tolist() == [-1, -1, -1, -1]
+        assert month_labels(df['月序号'][valid]) == ['2024-01', '2023-12', '2024-03']
+
+    def test_parse_adds_keys(self, statement_pdf):
+        """解析结果已带有时间键"""
+        path, _ = statement_pdf
+        df = parse_pdf_to_df(path)
+        assert all(col in df.columns for col in TIME_KEY_COLUMNS)
+        assert df['日序号'].dtype == np.int32
+
+    def test_ensure_does_not_mutate(self, sample_df):
+        """补算时间键时不修改传入的数据"""
+        result = ensure_time_keys(sample_df)
+        assert '月序号' in result.columns
+        assert '月序号' not in sample_df.columns
+        assert ensure_time_keys(result) is result
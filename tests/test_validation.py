@@ -0,0 +1,84 @@
+"""
+测试 validation.py 模块的功能
+"""
+import pytest
+import pandas as pd
+
+from utils import validate_transaction_data
+from validation import TransactionValidator, validate_transactions
+
+
+@pytest.fixture
+def dirty_df():
+    """创建包含多种问题的 DataFrame"""
+    return pd.DataFrame({
+        '交易单号': ['A1', 'A2', 'A1', 'A3', None, 'A2'],
+        '交易时间': pd.to_datetime([
+            '2024-01-15 10:30:00', None, '2024-01-16 09:00:00',
+            '1990-01-01 00:00:00', '2024-02-01 12:00:00', '2024-02-02 08:00:00'
+        ]),
+        '收/支': ['支出', '收入', '支出', '转账', '支出', '/'],
+        '金额(元)': [50.0, 2000.0, -35.5, 128.0, 99.99, 10.0],
+    })
+
+
+class TestValidateTransactions:
+    """测试 validate_transactions 函数"""
+
+    def test_valid_data(self, sample_df):
+        """测试有效数据通过验证"""
+        report = validate_transactions(sample_df)
+        assert report.is_valid
+        assert report.messages() == []
+        assert report.total_rows == len(sample_df)
+
+    def test_empty_data(self):
+        """测试空数据"""
+        report = validate_transactions(pd.DataFrame())
+        assert not report.is_valid
+        assert report.messages() == ["数据为空"]
+
+    def test_missing_columns(self, sample_df):
+        """测试缺少必要列"""
+        report = validate_transactions(sample_df.drop(columns=['金额(元)']))
+        assert not report.is_valid
+        assert "缺少必要列: 金额(元)" in report.messages()
+
+    def test_rule_counts_and_indices(self, dirty_df):
+        """测试各规则的统计数量与行索引"""
+        report = validate_transactions(dirty_df)
+        counts = report.counts
+        assert counts['null_time'] == 1
+        assert counts['negative_amount'] == 1
+        assert counts['date_out_of_range'] == 1
+        assert counts['duplicate_order'] == 2
+        assert counts['unknown_type'] == 1
+        assert report.results['duplicate_order'].indices.tolist() == [2, 5]
+        assert report.results['unknown_type'].indices.tolist() == [3]
+
+    def test_chunked_matches_single_pass(self, dirty_df):
+        """测试分块验证与整体验证结果一致（跨块检测重复单号）"""
+        whole = validate_transactions(dirty_df)
+        chunked = validate_transactions(dirty_df, chunk_size=2)
+        assert chunked.counts == whole.counts
+        assert chunked.results['duplicate_order'].indices.tolist() == [2, 5]
+
+    def test_streaming_chunks(self, dirty_df):
+        """测试直接传入数据块迭代器"""
+        chunks = (dirty_df.iloc[i:i + 3] for i in range(0, len(dirty_df), 3))
+        report = validate_transactions(chunks)
+        assert report.total_rows == len(dirty_df)
+        assert report.counts['duplicate_order'] == 2
+
+    def test_string_times_are_parsed(self):
+        """测试字符串形式的交易时间也能被验证"""
+        df = pd.DataFrame({'交易时间': ['2024-01-01 10:00:00', 'abc'], '金额(元)': [1.0, 2.0]})
+        validator = TransactionValidator()
+        validator.update(df)
+        assert validator.report.counts['null_time'] == 1
+
+    def test_legacy_wrapper(self, dirty_df):
+        """测试 utils.validate_transaction_data 兼容接口"""
+        is_valid, errors = validate_transaction_data(dirty_df)
+        assert is_valid is False
+        assert "有 1 条记录的金额为负数" in errors
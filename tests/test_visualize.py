@@ -2,9 +2,14 @@
 测试 visualize.py 模块的功能
 """
 import pytest
+import numpy as np
 import pandas as pd
 import os
-from visualize import generate_visualizations
+import visualize
+from visualize import (
+    _max_consecutive_days, collapse_long_tail, generate_visualizations, generate_visualizations_batch,
+    lttb_downsample
+)
 
 
 class TestGenerateVisualizations:
@@ -121,4 +126,171 @@ class TestGenerateVisualizations:
         # 应该成功生成
         generate_visualizations(df, output_path)
         assert os.path.exists(output_path)
-        assert os.path.getsize(output_path) > 0
\ No newline at end of file
+        assert os.path.getsize(output_path) > 0
+
+
+class TestBatchRendering:
+    """测试批量渲染"""
+
+    @pytest.mark.parametrize("use_processes", [False, True])
+    def test_batch_renders_all_jobs(self, sample_df, temp_dir, use_processes):
+        """测试线程池和进程池批量生成报表"""
+        paths = [os.path.join(temp_dir, f"batch_{i}.html") for i in range(3)]
+        jobs = [(sample_df, path) for path in paths]
+        result = generate_visualizations_batch(jobs, max_workers=2, use_processes=use_processes)
+        assert result == paths
+        assert all(os.path.getsize(path) > 0 for path in paths)
+
+    def test_batch_skips_empty_data(self, sample_df, temp_dir):
+        """测试空数据的任务不计入成功列表"""
+        good = os.path.join(temp_dir, "good.html")
+        bad = os.path.join(temp_dir, "bad.html")
+        result = generate_visualizations_batch([(sample_df, good), (pd.DataFrame(), bad)], max_workers=1)
+        assert result == [good]
+        assert not os.path.exists(bad)
+
+    def test_json_fallback_without_orjson(self, sample_df, temp_dir, monkeypatch):
+        """测试未安装 orjson 时使用标准库序列化，输出包含图表配置和颜色函数"""
+        monkeypatch.setattr(visualize, "orjson", None)
+        output_path = os.path.join(temp_dir, "fallback.html")
+        assert generate_visualizations(sample_df, output_path, snapshot=False)
+        with open(output_path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        assert '商户支出排行榜' in html_content
+        assert 'colorList[params.dataIndex]' in html_content
+
+
+def test_max_consecutive_days():
+    """测试商户最长连续消费天数"""
+    df = pd.DataFrame({
+        '交易时间': pd.to_datetime([
+            '2024-01-01 08:00', '2024-01-01 20:00', '2024-01-02 09:00', '2024-01-03 09:00',
+            '2024-01-05 09:00', '2024-01-01 09:00', '2024-01-03 09:00',
+        ]),
+        '交易对方': ['A', 'A', 'A', 'A', 'A', 'B', 'B'],
+    })
+    result = _max_consecutive_days(df, '交易对方')
+    assert result.to_dict() == {'A': 3, 'B': 1}
+
+
+class TestLargeLedgers:
+    """测试大数据量账单的降采样与数据量控制"""
+
+    @pytest.fixture
+    def long_df(self):
+        """创建跨度约 5 年、每天一笔支出的账单"""
+        times = pd.date_range('2020-01-01 12:00', periods=1800, freq='D')
+        rng = np.random.default_rng(0)
+        return pd.DataFrame({
+            '交易时间': times,
+            '收/支': '支出',
+            '金额(元)': rng.gamma(2, 40, len(times)).round(2),
+            '交易对方': [f"商户{i % 50}" for i in range(len(times))],
+        })
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        """测试 LTTB 保留首尾点和极值点"""
+        y = np.zeros(1000)
+        y[437] = 100.0
+        index = lttb_downsample(np.arange(1000, dtype=float), y, 50)
+        assert len(index) == 50
+        assert index[0] == 0 and index[-1] == 999
+        assert 437 in index
+        assert np.all(np.diff(index) > 0)
+
+    def test_lttb_short_series_unchanged(self):
+        """测试点数不超过目标时原样返回"""
+        assert lttb_downsample(np.arange(5.0), np.arange(5.0), 10).tolist() == [0, 1, 2, 3, 4]
+
+    def test_collapse_long_tail(self):
+        """测试长尾项合并"""
+        values = pd.Series({'a': 5.0, 'b': 3.0, 'c': 1.0, 'd': 1.0})
+        assert collapse_long_tail(values, 2, '其他') == [['a', 5.0], ['b', 3.0], ['其他', 2.0]]
+        assert collapse_long_tail(values, 10, '其他') == [['a', 5.0], ['b', 3.0], ['c', 1.0], ['d', 1.0]]
+
+    def test_daily_series_is_downsampled(self, long_df, temp_dir):
+        """测试长周期每日走势按 LTTB 降采样"""
+        output_path = os.path.join(temp_dir, "long.html")
+        generate_visualizations(long_df, output_path, snapshot=False, max_points=200)
+        with open(output_path, 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        assert '每日支出走势' in html_content
+        assert '已按 LTTB 降采样为 200 个点' in html_content
+
+    def test_payload_cap_shrinks_series(self, long_df, temp_dir):
+        """测试超过数据量上限时进一步压缩时间序列"""
+        full_path = os.path.join(temp_dir, "full.html")
+        capped_path = os.path.join(temp_dir, "capped.html")
+        generate_visualizations(long_df, full_path, snapshot=False, max_points=2000)
+        generate_visualizations(long_df, capped_path, snapshot=False, max_points=2000, max_payload=40_000)
+        assert os.path.getsize(capped_path) < os.path.getsize(full_path)
+
+
+class TestReportFingerprint:
+    """测试报表指纹：数据未变化时跳过渲染和截图"""
+
+    @pytest.fixture
+    def writes(self, monkeypatch):
+        """记录实际写入 HTML 的次数"""
+        calls = []
+        original = visualize._write_report
+
+        def spy(page, output_path, *args):
+            calls.append(output_path)
+            return original(page, output_path, *args)
+
+        monkeypatch.setattr(visualize, '_write_report', spy)
+        return calls
+
+    def test_unchanged_report_is_skipped(self, sample_df, temp_dir, writes):
+        """第二次生成时指纹一致，不再渲染"""
+        output_path = os.path.join(temp_dir, "report.html")
+        assert generate_visualizations(sample_df, output_path, snapshot=False)
+        assert generate_visualizations(sample_df.copy(), output_path, snapshot=False)
+        assert len(writes) == 1
+        assert os.path.exists(output_path + '.fingerprint')
+
+    def test_changed_data_or_options_rerender(self, sample_df, temp_dir, writes):
+        """数据或渲染参数变化时重新渲染"""
+        output_path = os.path.join(temp_dir, "report.html")
+        generate_visualizations(sample_df, output_path, snapshot=False)
+        changed = sample_df.copy()
+        changed.loc[0, '金额(元)'] = 51.0
+        generate_visualizations(changed, output_path, snapshot=False)
+        generate_visualizations(changed, output_path, snapshot=False, max_points=500)
+        assert len(writes) == 3
+
+    def test_force_and_missing_file_rerender(self, sample_df, temp_dir, writes, monkeypatch):
+        """强制刷新、环境变量或 HTML 被删除时重新渲染"""
+        output_path = os.path.join(temp_dir, "report.html")
+        generate_visualizations(sample_df, output_path, snapshot=False)
+        generate_visualizations(sample_df, output_path, snapshot=False, force=True)
+        monkeypatch.setenv('BILL_HUB_FORCE_REFRESH', '1')
+        generate_visualizations(sample_df, output_path, snapshot=False)
+        monkeypatch.delenv('BILL_HUB_FORCE_REFRESH')
+        os.remove(output_path)
+        generate_visualizations(sample_df, output_path, snapshot=False)
+        assert len(writes) == 4
+
+    def test_png_is_skipped_with_report(self, sample_df, temp_dir, monkeypatch):
+        """PNG 的指纹由报表指纹派生，报表未变化时不再截图"""
+        import static_report
+
+        renders = []
+
+        def fake_render(agg, png_path):
+            renders.append(png_path)
+            with open(png_path, 'wb') as f:
+                f.write(b'png')
+            return True
+
+        monkeypatch.setattr(static_report, 'render_report_png', fake_render)
+        output_path = os.path.join(temp_dir, "report.html")
+        generate_visualizations(sample_df, output_path, png_backend='matplotlib')
+        generate_visualizations(sample_df, output_path, png_backend='matplotlib')
+        visualize.export_report_png(sample_df, output_path, png_backend='matplotlib')
+        assert len(renders) == 1
+
+        os.remove(renders[0])
+        visualize.export_report_png(sample_df, output_path, png_backend='matplotlib')
+        assert len(renders) == 2
@@ -0,0 +1,125 @@
+"""
+测试 writers.py 模块的功能
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from writers import AggregateWriter, BatchWriter, ExcelStreamWriter, ParquetStreamWriter, stream_pdf_to_writers
+
+
+class TestExcelStreamWriter:
+    """测试 ExcelStreamWriter 类"""
+
+    def test_batches_match_single_write(self, sample_df, temp_dir):
+        """测试分批写出与一次性写出的内容一致"""
+        path = os.path.join(temp_dir, "stream.xlsx")
+        with ExcelStreamWriter(path) as writer:
+            writer.write(sample_df.iloc[:2])
+            writer.write(sample_df.iloc[2:])
+        result = pd.read_excel(path)
+        assert len(result) == len(sample_df)
+        assert result['交易时间'].tolist() == sample_df['交易时间'].tolist()
+        assert result['金额(元)'].tolist() == sample_df['金额(元)'].tolist()
+
+    def test_missing_values_are_blank(self, temp_dir):
+        """测试缺失值写为空单元格"""
+        path = os.path.join(temp_dir, "blank.xlsx")
+        df = pd.DataFrame({'交易时间': [pd.NaT, pd.Timestamp('2024-01-01')], '金额(元)': [1.0, None]})
+        with ExcelStreamWriter(path) as writer:
+            writer.write(df)
+        result = pd.read_excel(path)
+        assert result['交易时间'].isna().tolist() == [True, False]
+        assert result['金额(元)'].isna().tolist() == [False, True]
+
+    def test_empty_workbook(self, temp_dir):
+        """测试没有写入任何批次时仍生成有效文件"""
+        path = os.path.join(temp_dir, "empty.xlsx")
+        ExcelStreamWriter(path).close()
+        assert pd.read_excel(path).empty
+
+
+def test_aggregate_writer(sample_df):
+    """测试按月份和收支累计汇总"""
+    writer = AggregateWriter()
+    writer.write(sample_df.iloc[:3])
+    writer.write(sample_df.iloc[3:])
+    result = writer.result().set_index(['月份', '收/支'])
+    assert result.loc[('2024-01', '支出'), '金额(元)'] == pytest.approx(213.5)
+    assert result.loc[('2024-01', '支出'), '笔数'] == 3
+    assert result.loc[('2024-02', '支出'), '笔数'] == 1
+    assert writer.rows == len(sample_df)
+
+
+def test_batch_writer_requires_write():
+    """没有实现 write() 的写出器在实例化时报错"""
+    class Incomplete(BatchWriter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_parquet_writer(sample_df, temp_dir):
+    """测试分批写出 Parquet：每个批次一个 row group，读回的数据与原数据一致"""
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = os.path.join(temp_dir, "stream.parquet")
+    with ParquetStreamWriter(path) as writer:
+        writer.write(sample_df.iloc[:2])
+        writer.write(sample_df.iloc[2:])
+    assert writer.rows == len(sample_df)
+    assert pq.ParquetFile(path).num_row_groups == 2
+    pd.testing.assert_frame_equal(pd.read_parquet(path), sample_df.reset_index(drop=True), check_dtype=False)
+
+
+def test_parquet_writer_all_empty_first_batch(sample_df, temp_dir):
+    """第一批中某列全为空值（推断为 null 类型）时，之后有值的批次仍能写入"""
+    pytest.importorskip("pyarrow")
+    first, rest = sample_df.iloc[:2].copy(), sample_df.iloc[2:].copy()
+    first['备注'] = pd.Series([None] * len(first), index=first.index, dtype=object)
+    rest['备注'] = [f"备注{i}" for i in range(len(rest))]
+    path = os.path.join(temp_dir, "stream.parquet")
+    with ParquetStreamWriter(path) as writer:
+        writer.write(first)
+        writer.write(rest)
+    result = pd.read_parquet(path)
+    assert len(result) == len(sample_df)
+    assert result['备注'].iloc[:2].isna().all()
+    assert result['备注'].iloc[2:].tolist() == rest['备注'].tolist()
+
+
+def test_parquet_writer_requires_pyarrow(temp_dir, monkeypatch):
+    """未安装 pyarrow 时给出安装提示"""
+    import writers
+    monkeypatch.setattr(writers, 'pq', None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        ParquetStreamWriter(os.path.join(temp_dir, "stream.parquet"))
+
+
+def test_stream_pdf_to_writers(statement_pdf, temp_dir):
+    """测试流式解析 PDF 并增量写出"""
+    path, rows = statement_pdf
+    excel_path = os.path.join(temp_dir, "statement.xlsx")
+    aggregate = AggregateWriter()
+    report = stream_pdf_to_writers(path, [ExcelStreamWriter(excel_path), aggregate], batch_rows=10)
+
+    assert report.total_rows == len(rows)
+    assert report.is_valid
+    result = pd.read_excel(excel_path)
+    assert len(result) == len(rows)
+    assert '分类' in result.columns
+    assert '月序号' not in result.columns
+    assert aggregate.result()['笔数'].sum() == len(rows)
+
+
+def test_stream_pdf_to_parquet(statement_pdf, temp_dir):
+    """流式解析 PDF 时各批次的 Parquet 结构一致"""
+    pytest.importorskip("pyarrow")
+    path, rows = statement_pdf
+    parquet_path = os.path.join(temp_dir, "statement.parquet")
+    stream_pdf_to_writers(path, [ParquetStreamWriter(parquet_path)], batch_rows=10)
+    result = pd.read_parquet(parquet_path)
+    assert len(result) == len(rows)
+    assert '分类' in result.columns
+    assert result['交易时间'].notna().all()
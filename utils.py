@@ -2,17 +2,33 @@
 工具函数模块
 包含 ZIP 解压、PDF 解析和数据处理功能
 """
+import dataclasses
+import hashlib
+import json
 import os
 import re
-from typing import List, Optional, Tuple
+import shutil
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
 import pdfplumber
 import pyzipper
-from tqdm import tqdm
 
+from layouts import TIME_COL, WECHAT, StatementLayout, detect_layout
 from logger_config import logger
+from password_provider import DEFAULT_CONFIG_DIR, file_fingerprint
+from progress import report as report_progress
+from validation import validate_transactions
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 def extract_zip(zip_path: str, extract_to: str, password: str) -> List[str]:
@@ -64,23 +80,162 @@ def clean_amount(val) -> float:
         return 0.0
 
 
-def parse_pdf_to_df(pdf_path: str, password: Optional[str] = None) -> Optional[pd.DataFrame]:
+# 微信账单表格的固定表头（未指定版式时快速解析路径的版式校验）
+WECHAT_REQUIRED_HEADERS = list(WECHAT.headers)
+# 交易时间列的日期前缀（2024-01-15、2024/01/15、20240115 等）
+_DATE_PREFIX = re.compile(r'^\d{4}[-/.]?\d{2}[-/.]?\d{2}')
+
+
+@dataclass
+class TableLayout:
     """
-    解析 PDF 并返回 DataFrame，优先尝试无密码打开
+    从第一页表头学习到的表格版式
+
+    Attributes:
+        columns: 列名列表
+        bounds: 列分隔的 x 坐标（长度为列数 - 1）
+        x0: 表格左边界
+        x1: 表格右边界
+        time_column: 交易时间列的表头
+    """
+    columns: List[str]
+    bounds: np.ndarray
+    x0: float
+    x1: float
+    time_column: str = TIME_COL
+
+    @property
+    def time_index(self) -> int:
+        return self.columns.index(self.time_column)
+
+
+def _row_edges(page, x0: float, x1: float) -> np.ndarray:
+    """获取横跨表格的水平线 y 坐标（已去重、升序）"""
+    width = x1 - x0
+    ys = sorted(
+        e['top'] for e in page.horizontal_edges
+        if min(e['x1'], x1) - max(e['x0'], x0) >= width * 0.5
+    )
+    merged: List[float] = []
+    for y in ys:
+        if not merged or y - merged[-1] > 1.0:
+            merged.append(y)
+    return np.asarray(merged, dtype=float)
+
+
+def learn_table_layout(page, required: Optional[List[str]] = None,
+                       time_column: str = TIME_COL) -> Optional[TableLayout]:
+    """
+    从页面的表头行学习列边界：表头所在的两条水平线之间的文字按 x 方向聚类成列
 
     Args:
-        pdf_path: PDF 文件路径
-        password: PDF 密码（可选）
+        page: pdfplumber 页面
+        required: 必须出现的表头（默认为微信账单的交易时间和金额列）
+        time_column: 交易时间列的表头（用于定位表头行）
 
     Returns:
-        解析后的 DataFrame，如果失败则返回 None
-
-    Raises:
-        Exception: 解析过程出错时抛出异常
+        TableLayout，版式不匹配时返回 None
     """
-    all_data: List[pd.DataFrame] = []
+    required = required or WECHAT_REQUIRED_HEADERS
+    words = page.extract_words()
+    anchor = next((w for w in words if time_column in w['text']), None)
+    if anchor is None:
+        return None
+
+    h_edges = [e for e in page.horizontal_edges if e['x0'] <= anchor['x0'] <= e['x1']]
+    if not h_edges:
+        return None
+    x0 = min(e['x0'] for e in h_edges)
+    x1 = max(e['x1'] for e in h_edges)
+    ys = _row_edges(page, x0, x1)
+    mid = (anchor['top'] + anchor['bottom']) / 2
+    pos = int(np.searchsorted(ys, mid))
+    if pos == 0 or pos >= len(ys):
+        return None
+    band_top, band_bottom = ys[pos - 1], ys[pos]
+
+    # 表头单元格可能换行，按 x 方向重叠合并为列
+    header_words = sorted(
+        (w for w in words if band_top <= (w['top'] + w['bottom']) / 2 <= band_bottom and x0 <= w['x0'] <= x1),
+        key=lambda w: w['x0']
+    )
+    clusters: List[dict] = []
+    for w in header_words:
+        if clusters and w['x0'] <= clusters[-1]['x1']:
+            cluster = clusters[-1]
+            cluster['words'].append(w)
+            cluster['x1'] = max(cluster['x1'], w['x1'])
+        else:
+            clusters.append({'x0': w['x0'], 'x1': w['x1'], 'words': [w]})
+
+    columns = [
+        ''.join(w['text'] for w in sorted(c['words'], key=lambda w: (w['top'], w['x0'])))
+        for c in clusters
+    ]
+    if any(col not in columns for col in required):
+        return None
+
+    bounds = np.array([(a['x1'] + b['x0']) / 2 for a, b in zip(clusters, clusters[1:])], dtype=float)
+    return TableLayout(columns=columns, bounds=bounds, x0=x0, x1=x1, time_column=time_column)
+
+
+def extract_table_rows_fast(page, layout: TableLayout) -> Optional[List[List[str]]]:
+    """
+    按已知版式直接把页面文字分箱到单元格，跳过通用表格检测
+
+    Args:
+        page: pdfplumber 页面
+        layout: 表格版式
 
-    # 尝试打开 PDF 的辅助函数
+    Returns:
+        数据行列表（不含表头）；页面版式不匹配时返回 None
+    """
+    ys = _row_edges(page, layout.x0, layout.x1)
+    if len(ys) < 2:
+        return None
+
+    words = [w for w in page.extract_words() if layout.x0 <= (w['x0'] + w['x1']) / 2 <= layout.x1]
+    if not words:
+        return []
+
+    mids_y = np.array([(w['top'] + w['bottom']) / 2 for w in words])
+    mids_x = np.array([(w['x0'] + w['x1']) / 2 for w in words])
+    row_idx = np.searchsorted(ys, mids_y) - 1
+    col_idx = np.searchsorted(layout.bounds, mids_x)
+    inside = (row_idx >= 0) & (row_idx < len(ys) - 1)
+
+    n_rows, n_cols = len(ys) - 1, len(layout.columns)
+    cells: List[List[List[dict]]] = [[[] for _ in range(n_cols)] for _ in range(n_rows)]
+    for w, r, c, ok in zip(words, row_idx, col_idx, inside):
+        if ok:
+            cells[r][c].append(w)
+
+    rows: List[List[str]] = []
+    for row_cells in cells:
+        if not any(row_cells):
+            continue
+        row = []
+        for cell in row_cells:
+            # 同一行的文字以空格连接，换行的文字以换行符连接（与通用表格提取一致）
+            lines: List[List[dict]] = []
+            for w in sorted(cell, key=lambda w: (w['top'], w['x0'])):
+                if lines and abs(w['top'] - lines[-1][0]['top']) <= 1.0:
+                    lines[-1].append(w)
+                else:
+                    lines.append([w])
+            row.append('\n'.join(' '.join(w['text'] for w in line) for line in lines))
+        rows.append(row)
+
+    # 跳过每页重复的表头
+    time_idx = layout.time_index
+    rows = [r for r in rows if r[time_idx] != layout.time_column]
+    if rows and not any(_DATE_PREFIX.match(r[time_idx]) for r in rows):
+        return None
+    return rows
+
+
+def _open_pdf(pdf_path: str, password: Optional[str] = None) -> pdfplumber.PDF:
+    """优先尝试无密码打开 PDF，失败时使用密码"""
     def try_open(pwd: Optional[str]) -> Optional[pdfplumber.PDF]:
         try:
             return pdfplumber.open(pdf_path, password=pwd)
@@ -95,58 +250,521 @@ def parse_pdf_to_df(pdf_path: str, password: Optional[str] = None) -> Optional[p
         msg = f"无法打开 PDF (密码错误或文件损坏): {os.path.basename(pdf_path)}"
         logger.error(msg)
         raise Exception(msg)
+    return pdf
+
+
+ENV_CHECKPOINT_DIR = 'BILL_HUB_CHECKPOINT_DIR'
+# 设置为 0 / false / off 时不保存页面检查点（检查点中是解密后的账单数据）
+ENV_CHECKPOINTS = 'BILL_HUB_CHECKPOINTS'
+# 检查点保留天数，超过后在下次解析时删除
+ENV_CHECKPOINT_MAX_AGE = 'BILL_HUB_CHECKPOINT_MAX_AGE'
+DEFAULT_CHECKPOINT_DIR = os.path.join(DEFAULT_CONFIG_DIR, 'checkpoints')
+DEFAULT_CHECKPOINT_MAX_AGE_DAYS = 7
+# 逐页输出的格式版本，解析逻辑改变页面行的内容或结构时递增，旧版本的检查点不会被读取
+# （版本 2 起页面保存为 zlib 压缩的 JSON，版本 1 的 pickle 检查点不再读取）
+CHECKPOINT_FORMAT_VERSION = 2
+CHECKPOINT_LOCK = '.lock'
+
+# 本进程中已清理过过期检查点的根目录（每个进程只清理一次，不在每次解析时遍历整个目录）
+_pruned_checkpoint_roots: Set[str] = set()
 
+
+def default_checkpoint_dir() -> Optional[str]:
+    """页面检查点的根目录（BILL_HUB_CHECKPOINT_DIR，默认 ~/.bill-hub/checkpoints），关闭检查点时返回 None"""
+    if os.environ.get(ENV_CHECKPOINTS, '').lower() in ('0', 'false', 'no', 'off'):
+        return None
+    return os.environ.get(ENV_CHECKPOINT_DIR) or DEFAULT_CHECKPOINT_DIR
+
+
+def checkpoint_max_age() -> float:
+    """检查点保留的秒数（BILL_HUB_CHECKPOINT_MAX_AGE，单位为天，默认 7 天）"""
+    value = os.environ.get(ENV_CHECKPOINT_MAX_AGE)
     try:
-        with pdf:
-            filename = os.path.basename(pdf_path)
-            for page in tqdm(pdf.pages, desc=f"解析 PDF: {filename}", leave=False):
-                tables = page.extract_tables()
-                if not tables:
-                    continue
-                for table in tables:
-                    df_page = pd.DataFrame(table)
-                    all_data.append(df_page)
+        days = float(value) if value else DEFAULT_CHECKPOINT_MAX_AGE_DAYS
+    except ValueError:
+        logger.warning(f"无效的 {ENV_CHECKPOINT_MAX_AGE}: {value}，使用默认值 {DEFAULT_CHECKPOINT_MAX_AGE_DAYS} 天")
+        days = DEFAULT_CHECKPOINT_MAX_AGE_DAYS
+    return days * 86400
+
+
+def prune_checkpoints(root: str, max_age: Optional[float] = None) -> int:
+    """
+    删除超过保留期的检查点（按目录内最新文件的修改时间判断，正在使用的检查点不会被删除）
+
+    Args:
+        root: 检查点根目录
+        max_age: 保留秒数（默认 checkpoint_max_age()）
 
-        if not all_data:
-            logger.warning(f"{filename}: 未提取到任何表格数据")
+    Returns:
+        删除的检查点数
+    """
+    max_age = checkpoint_max_age() if max_age is None else max_age
+    cutoff = time.time() - max_age
+    removed = 0
+    try:
+        entries = list(os.scandir(root))
+    except OSError:
+        return 0
+    for entry in entries:
+        if not entry.is_dir(follow_symlinks=False):
+            continue
+        newest = entry.stat(follow_symlinks=False).st_mtime
+        for dirpath, _, filenames in os.walk(entry.path):
+            for name in filenames:
+                try:
+                    newest = max(newest, os.stat(os.path.join(dirpath, name)).st_mtime)
+                except OSError:
+                    pass
+        if newest < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"已删除 {removed} 个过期的页面检查点")
+    return removed
+
+
+class PageCheckpoint:
+    """
+    按页保存已提取的表格行，解析中断后重跑时直接读取已完成的页
+
+    工作目录按文件内容指纹、逐页输出的格式版本和解析路径区分，同一文件从不同位置（如重新解压）解析时也能续跑；
+    每页单独保存为 zlib 压缩的 JSON（只含字符串和 None 的行列表，读取时不会执行代码），
+    先写临时文件再原子替换，进程被杀时不会留下半页。
+    目录权限为 0700、文件为 0600。多个任务同时解析同一文件时，只有取得锁（acquire）的任务使用检查点，
+    其余任务照常解析但不读写检查点，不会互相删除对方的进度。
+    """
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+        self._lock_fd: Optional[int] = None
+        self._make_dirs()
+
+    def _make_dirs(self) -> None:
+        # makedirs 的 mode 只作用于最后一级，检查点自身的两级目录分别创建
+        os.makedirs(os.path.dirname(self.work_dir), mode=0o700, exist_ok=True)
+        os.makedirs(self.work_dir, mode=0o700, exist_ok=True)
+
+    @classmethod
+    def for_file(cls, pdf_path: str, fast: bool, root: Optional[str] = None) -> 'PageCheckpoint':
+        """
+        为 PDF 文件创建检查点
+
+        Args:
+            pdf_path: PDF 文件路径
+            fast: 是否使用快速解析路径（两条路径的逐页输出不同，分别保存）
+            root: 检查点根目录（默认 default_checkpoint_dir()）
+        """
+        key = f"{file_fingerprint(pdf_path)[:16]}-v{CHECKPOINT_FORMAT_VERSION}"
+        return cls(os.path.join(root or default_checkpoint_dir(), key, 'fast' if fast else 'generic'))
+
+    def _path(self, page_no: int) -> str:
+        return os.path.join(self.work_dir, f"page_{page_no:05d}.json.z")
+
+    @property
+    def _lock_path(self) -> str:
+        return os.path.join(self.work_dir, CHECKPOINT_LOCK)
+
+    def acquire(self) -> bool:
+        """
+        取得检查点的独占锁（不等待）
+
+        Returns:
+            是否取得锁；另一个任务正在使用该检查点时返回 False。没有 fcntl 的平台上总是返回 True
+        """
+        if fcntl is None:
+            return True
+        self._make_dirs()
+        fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # 加锁前锁文件可能已被持有者在 clear() 中删除，此时锁住的是已失效的文件
+            if os.fstat(fd).st_ino != os.stat(self._lock_path).st_ino:
+                raise OSError("锁文件已被替换")
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    def release(self) -> None:
+        """释放独占锁"""
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def has(self, page_no: int) -> bool:
+        return os.path.exists(self._path(page_no))
+
+    def load(self, page_no: int) -> Optional[List[list]]:
+        """读取某页的表格行（不存在或已损坏时返回 None）"""
+        try:
+            with open(self._path(page_no), 'rb') as f:
+                rows = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+                raise ValueError("不是表格行列表")
+            return rows
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"检查点损坏，重新解析第 {page_no + 1} 页: {e}")
             return None
 
-        final_df = pd.concat(all_data, ignore_index=True)
+    def save(self, page_no: int, rows: List[list]) -> None:
+        """保存某页的表格行"""
+        path = self._path(page_no)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'), 1))
+        os.replace(tmp, path)
+
+    def clear(self) -> None:
+        """解析完成后删除检查点（锁文件最后删除，之后才释放锁）"""
+        if os.path.isdir(self.work_dir):
+            for name in os.listdir(self.work_dir):
+                if name != CHECKPOINT_LOCK:
+                    os.remove(os.path.join(self.work_dir, name))
+        try:
+            os.remove(self._lock_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.rmdir(self.work_dir)
+            parent = os.path.dirname(self.work_dir)
+            if not os.listdir(parent):
+                os.rmdir(parent)
+        except OSError:
+            pass
+        self.release()
+
+
+def pdf_page_count(pdf_path: str, password: Optional[str] = None) -> int:
+    """返回 PDF 的页数（只读取页面目录，不解析页面内容）"""
+    with _open_pdf(pdf_path, password) as pdf:
+        return len(pdf.pages)
+
+
+def detect_statement_layout(page: pdfplumber.page.Page) -> Optional[StatementLayout]:
+    """只读取第一页文字识别账单版式（见 layouts.detect_layout）"""
+    return detect_layout(page.extract_text() or '')
+
+
+def _learn_layout(page: pdfplumber.page.Page, statement: Optional[StatementLayout]) -> Optional[TableLayout]:
+    """按识别到的账单版式学习列边界（未识别时按微信账单表头）"""
+    if statement is None:
+        return learn_table_layout(page)
+    return learn_table_layout(page, list(statement.headers), statement.time_column)
+
+
+def _read_header(
+    page: pdfplumber.page.Page,
+    fast: bool,
+    statement: Optional[StatementLayout] = None
+) -> Tuple[Optional[TableLayout], Optional[list]]:
+    """从第一页读取版式和表头行（分片从中间页开始时使用）"""
+    time_column = statement.time_column if statement is not None else TIME_COL
+    try:
+        layout = _learn_layout(page, statement) if fast else None
+        if layout is not None:
+            return layout, list(layout.columns)
+        for table in page.extract_tables():
+            for row in table:
+                if time_column in row:
+                    return None, row
+        return None, None
+    finally:
+        page.close()
+
+
+def _iter_page_rows(
+    pdf: pdfplumber.PDF,
+    filename: str,
+    fast: bool,
+    pages: Optional[Sequence[int]] = None,
+    checkpoint: Optional[PageCheckpoint] = None,
+    statement: Optional[StatementLayout] = None
+) -> Iterator[List[list]]:
+    """
+    逐页产出表格行，每页在产出之前释放 pdfplumber 的页面缓存
+
+    使用快速路径时，第一页会先产出表头行（与通用表格检测的输出保持一致）；
+    只解析部分页且不含第一页时，先产出第一页的表头行。
+    提供检查点时，已保存的页直接读取，新解析的页在产出之前保存。
+    statement 为第一页识别到的账单版式，快速路径按它的表头学习列边界。
+    """
+    layout: Optional[TableLayout] = None
+    indices = range(len(pdf.pages)) if pages is None else pages
+    if pages is not None and 0 not in pages:
+        layout, header = _read_header(pdf.pages[0], fast, statement)
+        if header is not None:
+            yield [header]
+    elif checkpoint is not None and fast and checkpoint.has(0):
+        # 第一页从检查点读取时，仍需从第一页学习版式来解析其余未完成的页
+        if not all(checkpoint.has(page_no) for page_no in indices):
+            layout, _ = _read_header(pdf.pages[0], fast, statement)
+
+    resumed = 0
+    report_progress('parse', total_pages=len(indices))
+    for page_no in indices:
+        if checkpoint is not None:
+            cached = checkpoint.load(page_no)
+            if cached is not None:
+                resumed += 1
+                report_progress('parse', pages=1, rows=len(cached))
+                yield cached
+                continue
+
+        page = pdf.pages[page_no]
+        page_rows: List[list] = []
+        try:
+            if fast and page_no == 0:
+                layout = _learn_layout(page, statement)
+                if layout is not None:
+                    page_rows.append(list(layout.columns))
+            rows = extract_table_rows_fast(page, layout) if layout is not None else None
+            if rows is not None:
+                page_rows.extend(rows)
+            else:
+                if layout is not None:
+                    logger.debug(f"{filename} 第 {page_no + 1} 页版式不匹配，回退到通用表格解析",
+                                 extra={'file': filename, 'page': page_no + 1})
+                for table in page.extract_tables():
+                    page_rows.extend(table)
+        finally:
+            page.close()
+        if checkpoint is not None:
+            checkpoint.save(page_no, page_rows)
+        # 逐页日志由日志处理器限流
+        logger.debug(f"{filename} 第 {page_no + 1} 页: {len(page_rows)} 行",
+                     extra={'file': filename, 'page': page_no + 1})
+        report_progress('parse', pages=1, rows=len(page_rows))
+        yield page_rows
+
+    if resumed:
+        logger.info(f"{filename}: 从检查点恢复 {resumed} 页")
+
+
+# 解析时预先计算的整数时间键，报表和聚合直接按整数分组，只在坐标轴标签处转换为文本
+MONTH_KEY = '月序号'    # 年 × 12 + 月 - 1
+DAY_KEY = '日序号'      # 自 1970-01-01 起的天数
+HOUR_KEY = '小时'
+WEEKDAY_KEY = '星期'    # 0 为周一
+TIME_KEY_COLUMNS = [MONTH_KEY, DAY_KEY, HOUR_KEY, WEEKDAY_KEY]
+# 交易时间缺失时的键值（1970 年以前的日期本就超出校验的合理范围，不与日序号冲突）
+MISSING_TIME_KEY = -1
+
+
+def month_index(times: pd.Series) -> np.ndarray:
+    """把时间列转换为月序号（年 × 12 + 月 - 1），缺失值为 MISSING_TIME_KEY"""
+    values = times.to_numpy(dtype='datetime64[ns]')
+    months = values.astype('datetime64[M]').astype(np.int64) + 1970 * 12
+    return np.where(np.isnat(values), MISSING_TIME_KEY, months).astype(np.int32)
+
+
+def add_time_keys(df: pd.DataFrame, time_col: str = '交易时间') -> pd.DataFrame:
+    """
+    根据交易时间一次性计算月序号、日序号、小时和星期四个整数列（原地添加）
+
+    Args:
+        df: 交易数据
+        time_col: 时间列名
+
+    Returns:
+        添加了时间键的 df（时间列不存在时原样返回）
+    """
+    if time_col not in df.columns:
+        return df
+    values = df[time_col].to_numpy(dtype='datetime64[ns]')
+    missing = np.isnat(values)
+    days = values.astype('datetime64[D]')
+    day_ordinal = days.astype(np.int64)
+    with np.errstate(invalid='ignore'):
+        hours = (values - days) // np.timedelta64(1, 'h')
+
+    df[MONTH_KEY] = month_index(df[time_col])
+    df[DAY_KEY] = np.where(missing, MISSING_TIME_KEY, day_ordinal).astype(np.int32)
+    df[HOUR_KEY] = np.where(missing, MISSING_TIME_KEY, hours).astype(np.int8)
+    # 1970-01-01 是周四
+    df[WEEKDAY_KEY] = np.where(missing, MISSING_TIME_KEY, (day_ordinal + 3) % 7).astype(np.int8)
+    return df
+
+
+def ensure_time_keys(df: pd.DataFrame, time_col: str = '交易时间') -> pd.DataFrame:
+    """已有全部时间键时原样返回，否则返回添加了时间键的副本（不修改传入的数据）"""
+    if all(col in df.columns for col in TIME_KEY_COLUMNS) or time_col not in df.columns:
+        return df
+    return add_time_keys(df.copy(), time_col)
+
+
+def month_labels(index) -> List[str]:
+    """把月序号转换为 YYYY-MM 标签"""
+    index = np.asarray(index, dtype=np.int64)
+    return [f"{y}-{m:02d}" for y, m in zip(index // 12, index % 12 + 1)]
+
+
+def day_index_to_datetime(index) -> pd.DatetimeIndex:
+    """把日序号转换为日期索引"""
+    return pd.DatetimeIndex(np.asarray(index, dtype=np.int64).astype('datetime64[D]').astype('datetime64[ns]'))
+
+
+def _normalize_batch(
+    rows: List[list],
+    columns: Optional[List[str]],
+    statement: Optional[StatementLayout] = None
+) -> pd.DataFrame:
+    """把一批原始表格行转换为 DataFrame，按账单版式映射列名，并清洗时间和金额列"""
+    df = pd.DataFrame(rows)
+    if columns is not None:
+        df = df.reindex(columns=range(len(columns)))
+        df.columns = columns
+        # 通用表格检测会把每页重复的表头当作数据行
+        time_column = statement.time_column if statement is not None else TIME_COL
+        if time_column in df.columns:
+            df = df[df[time_column] != time_column]
+        if statement is not None:
+            df = statement.rename(df)
+
+    if '交易时间' in df.columns:
+        time_format = statement.time_format if statement is not None else None
+        df['交易时间'] = pd.to_datetime(df['交易时间'], format=time_format, errors='coerce')
+
+    if '金额(元)' in df.columns:
+        df['金额(元)'] = df['金额(元)'].apply(clean_amount)
+        if statement is not None:
+            df = statement.apply_direction(df)
+
+    # 移除完全为空的行
+    return add_time_keys(df.dropna(how='all'))
+
+
+def iter_pdf_batches(
+    pdf_path: str,
+    password: Optional[str] = None,
+    fast: bool = True,
+    batch_rows: int = 5000,
+    pages: Optional[Sequence[int]] = None,
+    checkpoint_dir: Optional[str] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    流式解析 PDF，逐批产出已清洗的交易数据
+
+    每页解析后立即释放页面缓存，内存占用只与批大小有关、与页数无关。
+    先只读取第一页文字识别账单版式（见 layouts 模块），再按该版式定位表头、映射列名和收支方向；
+    未识别的版式按微信账单表头查找。
+    表头出现之前的行（标题、账户信息等）会被丢弃；整个文件都没有表头时原样产出。
+
+    Args:
+        pdf_path: PDF 文件路径
+        password: PDF 密码（可选）
+        fast: 是否启用按表头坐标分箱的快速解析路径
+        batch_rows: 每批的最大行数
+        pages: 只解析这些页（从 0 开始的页码，默认全部页），用于把大文件拆分为多个分片
+        checkpoint_dir: 页面检查点根目录（见 PageCheckpoint）；解析整个文件时每页结果都会保存，
+            中断后重跑从最后完成的页继续，完整解析后删除检查点；每个进程第一次使用某个根目录时清理其中过期的检查点
 
-        # 寻找表头
-        header_row_idx = -1
-        for idx, row in final_df.iterrows():
-            if '交易时间' in row.values:
-                header_row_idx = idx
-                break
+    Yields:
+        列名一致的 DataFrame 批次
 
-        if header_row_idx != -1:
-            final_df.columns = final_df.iloc[header_row_idx]
-            final_df = final_df.iloc[header_row_idx + 1:].reset_index(drop=True)
-            # 清洗列名，移除换行符
-            final_df.columns = [str(c).replace('\n', '') if c else c for c in final_df.columns]
+    Raises:
+        Exception: 打开或解析过程出错时抛出异常
+    """
+    pdf = _open_pdf(pdf_path, password)
+    filename = os.path.basename(pdf_path)
+    columns: Optional[List[str]] = None
+    pending: List[list] = []
+    checkpoint = None
+    if checkpoint_dir and pages is None:
+        if checkpoint_dir not in _pruned_checkpoint_roots:
+            _pruned_checkpoint_roots.add(checkpoint_dir)
+            prune_checkpoints(checkpoint_dir)
+        checkpoint = PageCheckpoint.for_file(pdf_path, fast, checkpoint_dir)
+        if not checkpoint.acquire():
+            logger.info(f"{filename}: 另一个任务正在解析同一文件，本次不使用检查点")
+            checkpoint = None
 
-        # 清洗数据
-        if '交易时间' in final_df.columns:
-            final_df['交易时间'] = pd.to_datetime(final_df['交易时间'], errors='coerce')
+    try:
+        with pdf:
+            statement = detect_statement_layout(pdf.pages[0]) if pdf.pages else None
+            if statement is not None:
+                logger.info(f"{filename}: 识别为{statement.title}账单")
+            else:
+                logger.info(f"{filename}: 未识别的账单版式，按通用表格解析")
+            time_column = statement.time_column if statement is not None else TIME_COL
+
+            for rows in _iter_page_rows(pdf, filename, fast, pages, checkpoint, statement):
+                if columns is None:
+                    # 寻找表头
+                    for idx, row in enumerate(rows):
+                        if time_column in row:
+                            columns = [str(c).replace('\n', '') if c else c for c in row]
+                            pending = list(rows[idx + 1:])
+                            break
+                    else:
+                        pending.extend(rows)
+                    continue
 
-        if '金额(元)' in final_df.columns:
-            final_df['金额(元)'] = final_df['金额(元)'].apply(clean_amount)
+                pending.extend(rows)
+                if len(pending) >= batch_rows:
+                    batch = _normalize_batch(pending, columns, statement)
+                    pending = []
+                    if not batch.empty:
+                        yield batch
 
-        # 移除完全为空的行
-        final_df.dropna(how='all', inplace=True)
+        if pending:
+            batch = _normalize_batch(pending, columns, statement)
+            if not batch.empty:
+                yield batch
 
-        logger.info(f"成功解析 {filename}，共 {len(final_df)} 条记录")
-        return final_df
+        if checkpoint is not None:
+            checkpoint.clear()
 
     except Exception as e:
         logger.error(f"解析过程出错 {pdf_path}: {e}")
         raise Exception(f"解析过程出错: {e}")
+    finally:
+        if checkpoint is not None:
+            checkpoint.release()
+
+
+def parse_pdf_to_df(
+    pdf_path: str,
+    password: Optional[str] = None,
+    fast: bool = True,
+    checkpoint_dir: Optional[str] = None
+) -> Optional[pd.DataFrame]:
+    """
+    解析 PDF 并返回 DataFrame，优先尝试无密码打开
+
+    按第一页识别的账单版式（微信、银行借记卡、信用卡等，见 layouts 模块）映射为统一的列名。
+    fast 为 True 时从第一页表头学习列边界，后续页面按坐标直接分箱文字；
+    某页版式不匹配时该页回退到通用的表格检测。
+
+    Args:
+        pdf_path: PDF 文件路径
+        password: PDF 密码（可选）
+        fast: 是否启用按表头坐标分箱的快速解析路径
+        checkpoint_dir: 页面检查点根目录（可选，用于中断后续跑，见 iter_pdf_batches）
+
+    Returns:
+        解析后的 DataFrame，如果失败则返回 None
+
+    Raises:
+        Exception: 解析过程出错时抛出异常
+    """
+    filename = os.path.basename(pdf_path)
+    batches = list(iter_pdf_batches(pdf_path, password, fast=fast, checkpoint_dir=checkpoint_dir))
+    if not batches:
+        logger.warning(f"{filename}: 未提取到任何表格数据")
+        return None
+
+    final_df = pd.concat(batches, ignore_index=True) if len(batches) > 1 else batches[0].reset_index(drop=True)
+    logger.info(f"成功解析 {filename}，共 {len(final_df)} 条记录")
+    return final_df
 
 
 def validate_transaction_data(df: pd.DataFrame) -> Tuple[bool, List[str]]:
     """
-    验证交易数据的有效性
+    验证交易数据的有效性（基于 validation 模块的规则引擎）
 
     Args:
         df: 待验证的 DataFrame
@@ -154,27 +772,109 @@ def validate_transaction_data(df: pd.DataFrame) -> Tuple[bool, List[str]]:
     Returns:
         (是否有效, 错误信息列表)
     """
-    errors: List[str] = []
+    report = validate_transactions(df)
+    return report.is_valid, report.messages()
+
+
+# 产物指纹：与输出文件放在一起的 <文件名>.fingerprint，记录生成该文件时输入数据和选项的哈希
+ENV_FORCE_REFRESH = 'BILL_HUB_FORCE_REFRESH'
+FINGERPRINT_SUFFIX = '.fingerprint'
 
-    if df.empty:
-        errors.append("数据为空")
-        return False, errors
 
-    required_columns = ['交易时间', '金额(元)']
-    for col in required_columns:
-        if col not in df.columns:
-            errors.append(f"缺少必要列: {col}")
+def force_refresh_requested() -> bool:
+    """是否通过 BILL_HUB_FORCE_REFRESH 要求忽略产物指纹、全部重新生成"""
+    return os.environ.get(ENV_FORCE_REFRESH, '').lower() in ('1', 'true', 'yes', 'on')
 
-    if errors:
-        return False, errors
 
-    # 检查数据质量
-    null_dates = df['交易时间'].isna().sum()
-    if null_dates > 0:
-        errors.append(f"有 {null_dates} 条记录的交易时间为空")
+def _update_digest(digest, value) -> None:
+    """把任意汇总数据（pandas 对象、dataclass、列表和标量）写入哈希"""
+    if isinstance(value, (pd.Series, pd.DataFrame)):
+        names = list(value.columns) if isinstance(value, pd.DataFrame) else [value.name]
+        digest.update(repr((type(value).__name__, names, [str(t) for t in np.atleast_1d(value.dtypes)])).encode())
+        digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+    elif dataclasses.is_dataclass(value) and not isinstance(value, type):
+        for field in dataclasses.fields(value):
+            digest.update(field.name.encode())
+            _update_digest(digest, getattr(value, field.name))
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"[{len(value)}".encode())
+        for item in value:
+            _update_digest(digest, item)
+    else:
+        digest.update(repr(value).encode())
 
-    invalid_amounts = (df['金额(元)'] < 0).sum()
-    if invalid_amounts > 0:
-        errors.append(f"有 {invalid_amounts} 条记录的金额为负数")
 
-    return len(errors) == 0, errors
\ No newline at end of file
+def data_fingerprint(*values) -> str:
+    """
+    计算数据和选项的指纹
+
+    Args:
+        values: DataFrame / Series、dataclass、列表或可 repr 的标量（版本号、渲染参数等）
+
+    Returns:
+        十六进制 SHA-256 指纹
+    """
+    return stream_fingerprint(values)
+
+
+def stream_fingerprint(values: Iterable) -> str:
+    """
+    计算逐个产出的数据的指纹（与 data_fingerprint 相同，但数据块不需要同时在内存中）
+
+    Args:
+        values: 依次产出 DataFrame / Series、dataclass、列表或标量的可迭代对象
+
+    Returns:
+        十六进制 SHA-256 指纹
+    """
+    digest = hashlib.sha256()
+    for value in values:
+        _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+def read_artifact_fingerprint(path: str) -> Optional[str]:
+    """读取产物旁边记录的指纹（不存在时返回 None）"""
+    try:
+        with open(path + FINGERPRINT_SUFFIX, 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def artifact_is_fresh(path: str, fingerprint: str, force: bool = False) -> bool:
+    """
+    判断产物是否可以直接复用：文件存在且记录的指纹与本次输入一致
+
+    Args:
+        path: 产物路径
+        fingerprint: 本次输入的指纹
+        force: 强制重新生成（BILL_HUB_FORCE_REFRESH 也会强制）
+
+    Returns:
+        是否跳过生成
+    """
+    if force or force_refresh_requested() or not os.path.exists(path):
+        return False
+    return read_artifact_fingerprint(path) == fingerprint
+
+
+def record_artifact_fingerprint(path: str, fingerprint: str) -> None:
+    """产物生成成功后记录其指纹（先写临时文件再原子替换）"""
+    target = path + FINGERPRINT_SUFFIX
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(fingerprint)
+    os.replace(tmp, target)
+
+
+def remove_artifact(path: str) -> bool:
+    """删除本次运行不再生成的产物及其指纹（避免上次运行留下的旧文件被当作本次结果），返回是否删除了产物"""
+    removed = False
+    for target in (path, path + FINGERPRINT_SUFFIX):
+        try:
+            os.remove(target)
+            removed = removed or target == path
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,283 @@
+"""
+数据验证模块
+基于布尔掩码的向量化规则引擎，支持分块处理大规模账单数据
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union
+
+import numpy as np
+import pandas as pd
+
+from logger_config import logger
+
+
+TIME_COL = '交易时间'
+AMOUNT_COL = '金额(元)'
+ORDER_COL = '交易单号'
+TYPE_COLS = ['收/支/其他', '收/支']
+
+REQUIRED_COLUMNS = [TIME_COL, AMOUNT_COL]
+KNOWN_TYPE_VALUES = ['收入', '支出', '/', '其他', '不计收支']
+DEFAULT_CHUNK_SIZE = 500_000
+
+
+@dataclass
+class ValidationRule:
+    """
+    单条验证规则
+
+    Attributes:
+        name: 规则名称
+        message: 错误信息模板，{count} 会被替换为违规条数
+        columns: 规则依赖的列（任一缺失时跳过该规则）
+        check: 接收数据块和验证器、返回违规布尔掩码的函数（返回 None 表示规则不适用）
+    """
+    name: str
+    message: str
+    columns: List[str]
+    check: Callable[[pd.DataFrame, "TransactionValidator"], Optional[pd.Series]]
+
+
+@dataclass
+class RuleResult:
+    """单条规则的统计结果"""
+    name: str
+    message: str
+    count: int = 0
+    row_indices: List[np.ndarray] = field(default_factory=list)
+
+    @property
+    def indices(self) -> np.ndarray:
+        """所有违规记录的行索引"""
+        if not self.row_indices:
+            return np.array([], dtype=np.int64)
+        return np.concatenate(self.row_indices)
+
+
+@dataclass
+class ValidationReport:
+    """
+    验证报告
+
+    Attributes:
+        total_rows: 已验证的总行数
+        missing_columns: 缺失的必要列
+        results: 各规则的统计结果
+    """
+    total_rows: int = 0
+    missing_columns: List[str] = field(default_factory=list)
+    results: Dict[str, RuleResult] = field(default_factory=dict)
+
+    @property
+    def is_valid(self) -> bool:
+        """是否通过全部验证"""
+        return (
+            self.total_rows > 0
+            and not self.missing_columns
+            and all(r.count == 0 for r in self.results.values())
+        )
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        """各规则的违规条数"""
+        return {name: r.count for name, r in self.results.items()}
+
+    def messages(self) -> List[str]:
+        """生成可读的错误信息列表"""
+        if self.total_rows == 0:
+            return ["数据为空"]
+        errors = [f"缺少必要列: {col}" for col in self.missing_columns]
+        errors.extend(
+            r.message.format(count=r.count) for r in self.results.values() if r.count > 0
+        )
+        return errors
+
+    def to_dict(self) -> Dict[str, object]:
+        """转换为可 JSON 序列化的字典"""
+        return {
+            'total_rows': self.total_rows,
+            'is_valid': self.is_valid,
+            'missing_columns': self.missing_columns,
+            'rules': {
+                name: {'count': r.count, 'row_indices': r.indices.tolist()}
+                for name, r in self.results.items()
+            },
+        }
+
+
+def _type_column(chunk: pd.DataFrame) -> Optional[str]:
+    for col in TYPE_COLS:
+        if col in chunk.columns:
+            return col
+    return None
+
+
+def _as_datetime(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors='coerce')
+
+
+def _check_null_time(chunk: pd.DataFrame, validator: "TransactionValidator") -> pd.Series:
+    return validator.times(chunk).isna()
+
+
+def _check_negative_amount(chunk: pd.DataFrame, validator: "TransactionValidator") -> pd.Series:
+    return pd.to_numeric(chunk[AMOUNT_COL], errors='coerce') < 0
+
+
+def _check_date_range(chunk: pd.DataFrame, validator: "TransactionValidator") -> pd.Series:
+    times = validator.times(chunk)
+    return times.notna() & ((times < validator.min_date) | (times > validator.max_date))
+
+
+def _duplicate_mask(orders: pd.Series) -> np.ndarray:
+    codes, uniques = pd.factorize(orders)
+    blank = np.flatnonzero(np.asarray(uniques == '', dtype=bool))
+    present = (codes >= 0) & ~np.isin(codes, blank)
+    return present & pd.Series(codes).duplicated(keep='first').to_numpy()
+
+
+def _check_duplicate_order(chunk: pd.DataFrame, validator: "TransactionValidator") -> pd.Series:
+    if validator.duplicate_mask is not None:
+        # 完整 DataFrame 已经一次性计算过全局重复掩码，直接按位置切片
+        start = validator.offset
+        return pd.Series(validator.duplicate_mask[start:start + len(chunk)], index=chunk.index)
+
+    # 流式数据块：块内重复用整数编码判断，跨块重复用集合查询唯一值
+    orders = chunk[ORDER_COL].astype('string').replace('', pd.NA)
+    codes, uniques = pd.factorize(orders)
+    present = codes >= 0
+    seen = validator.seen_orders
+    uniques = uniques.to_numpy(dtype=object).tolist()
+    seen_before = np.fromiter((v in seen for v in uniques), dtype=bool, count=len(uniques))
+    mask = np.zeros(len(codes), dtype=bool)
+    mask[present] = seen_before[codes[present]] | pd.Series(codes[present]).duplicated().to_numpy()
+    seen.update(uniques)
+    return pd.Series(mask, index=chunk.index)
+
+
+def _check_unknown_type(chunk: pd.DataFrame, validator: "TransactionValidator") -> Optional[pd.Series]:
+    type_col = _type_column(chunk)
+    if type_col is None:
+        return None
+    values = chunk[type_col]
+    return values.notna() & ~values.isin(validator.known_type_values)
+
+
+DEFAULT_RULES: List[ValidationRule] = [
+    ValidationRule('null_time', "有 {count} 条记录的交易时间为空或无法解析", [TIME_COL], _check_null_time),
+    ValidationRule('negative_amount', "有 {count} 条记录的金额为负数", [AMOUNT_COL], _check_negative_amount),
+    ValidationRule('date_out_of_range', "有 {count} 条记录的交易时间超出合理范围", [TIME_COL], _check_date_range),
+    ValidationRule('duplicate_order', "有 {count} 条记录的交易单号重复", [ORDER_COL], _check_duplicate_order),
+    ValidationRule('unknown_type', "有 {count} 条记录的收/支类型无法识别", [], _check_unknown_type),
+]
+
+
+class TransactionValidator:
+    """
+    分块交易数据验证器
+
+    每个数据块只计算一次时间列，所有规则以布尔掩码方式在同一轮中完成评估；
+    跨块的状态（如已出现的交易单号）保存在验证器中，因此可以直接接收流式数据块。
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[ValidationRule]] = None,
+        min_date: Union[str, pd.Timestamp] = '2000-01-01',
+        max_date: Optional[Union[str, pd.Timestamp]] = None,
+        known_type_values: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            rules: 验证规则列表（默认使用 DEFAULT_RULES）
+            min_date: 允许的最早交易时间
+            max_date: 允许的最晚交易时间（默认为当前时间加一天）
+            known_type_values: 合法的收/支取值
+        """
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.min_date = pd.Timestamp(min_date)
+        self.max_date = pd.Timestamp(max_date) if max_date is not None \
+            else pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+        self.known_type_values = KNOWN_TYPE_VALUES if known_type_values is None else known_type_values
+        self.seen_orders: Set[str] = set()
+        self.duplicate_mask: Optional[np.ndarray] = None
+        self.offset = 0
+        self.report = ValidationReport(
+            results={r.name: RuleResult(r.name, r.message) for r in self.rules}
+        )
+        self._checked_columns = False
+        self._time_cache: Optional[pd.Series] = None
+
+    def times(self, chunk: pd.DataFrame) -> pd.Series:
+        """获取当前数据块解析后的交易时间（每块只解析一次）"""
+        if self._time_cache is None:
+            self._time_cache = _as_datetime(chunk[TIME_COL])
+        return self._time_cache
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        """
+        验证一个数据块并累计统计结果
+
+        Args:
+            chunk: 数据块，行索引将被记录到报告中
+        """
+        if not self._checked_columns:
+            self.report.missing_columns = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+            self._checked_columns = True
+
+        self.report.total_rows += len(chunk)
+        if chunk.empty:
+            return
+
+        self._time_cache = None
+        for rule in self.rules:
+            if any(col not in chunk.columns for col in rule.columns):
+                continue
+            mask = rule.check(chunk, self)
+            if mask is None:
+                continue
+            mask = mask.fillna(False).to_numpy(dtype=bool)
+            hits = int(mask.sum())
+            if hits:
+                result = self.report.results[rule.name]
+                result.count += hits
+                result.row_indices.append(np.asarray(chunk.index[mask]))
+        self._time_cache = None
+        self.offset += len(chunk)
+
+
+def validate_transactions(
+    data: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    **kwargs
+) -> ValidationReport:
+    """
+    验证交易数据，返回结构化的验证报告
+
+    Args:
+        data: 完整的 DataFrame，或按顺序产出的数据块迭代器
+        chunk_size: 对完整 DataFrame 分块时的块大小
+        **kwargs: 传递给 TransactionValidator 的参数
+
+    Returns:
+        ValidationReport 验证报告
+    """
+    validator = TransactionValidator(**kwargs)
+
+    if isinstance(data, pd.DataFrame):
+        if ORDER_COL in data.columns:
+            validator.duplicate_mask = _duplicate_mask(data[ORDER_COL])
+        if data.empty:
+            validator.update(data)
+        for start in range(0, len(data), chunk_size):
+            validator.update(data.iloc[start:start + chunk_size])
+    else:
+        for chunk in data:
+            validator.update(chunk)
+
+    report = validator.report
+    if not report.is_valid:
+        logger.debug(f"数据验证统计: {report.counts}")
+    return report
@@ -2,97 +2,44 @@
 可视化模块
 生成基于 pyecharts 的交易数据分析报告
 """
+import json
 import os
-from typing import Optional
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 import pandas as pd
 import numpy as np
+from pyecharts import __version__ as PYECHARTS_VERSION
 from pyecharts.charts import Line, Pie, Bar, Page
+from pyecharts.charts.base import default as _options_default
 from pyecharts import options as opts
+from pyecharts.commons.utils import JsCode, replace_placeholder
 from pyecharts.globals import ThemeType
 
-from logger_config import logger
+from budget import BudgetBurn, budget_alerts_html, compute_budget_burn, load_budgets
+from forecast import MonthEndForecast, forecast_month_end
+from insights import Insight, compute_insights, insights_html, write_insights_json
+from logger_config import console, logger
+from utils import (
+    DAY_KEY, HOUR_KEY, MISSING_TIME_KEY, MONTH_KEY, artifact_is_fresh, data_fingerprint, day_index_to_datetime,
+    ensure_time_keys, month_labels, read_artifact_fingerprint, record_artifact_fingerprint
+)
 
-
-# 容错处理 JSCode 导入
+# 可选依赖：orjson 序列化图表配置更快，未安装时使用标准库 json
 try:
-    from pyecharts.commons.utils import JSCode
+    import orjson
 except ImportError:
-    class JSCode:
-        def __init__(self, code: str):
-            self.code = code
-        def __str__(self):
-            return self.code
+    orjson = None
 
 
-def generate_visualizations(df: pd.DataFrame, output_path: str) -> None:
-    """
-    基于交易数据生成可视化 HTML 报表，包含财务概览、趋势分析和消费洞察
-    支持移动端自适应和图表导出功能
+REPORT_TITLE = "微信支付账单分析报告"
+TITLE_HTML = f'<h1>📊 {REPORT_TITLE}</h1>'
 
-    Args:
-        df: 交易数据的 DataFrame
-        output_path: 输出 HTML 文件路径
-    """
-    if df is None or df.empty:
-        logger.warning("数据为空，跳过可视化生成")
-        return
-
-    if '金额(元)' not in df.columns or '交易时间' not in df.columns:
-        logger.warning("缺少必要的列（金额或交易时间），跳过可视化生成")
-        return
-
-    try:
-        df_plot = df.copy()
-        logger.info("开始生成可视化报表")
-
-        # 1. 数据深度预处理
-        type_col: Optional[str] = None
-        for col in ['收/支/其他', '收/支']:
-            if col in df_plot.columns:
-                type_col = col
-                break
-
-        df_plot['月份'] = df_plot['交易时间'].dt.to_period('M').astype(str)
-        df_plot['小时'] = df_plot['交易时间'].dt.hour
-        df_plot['日期'] = df_plot['交易时间'].dt.date
-
-        # 统计核心指标
-        if type_col:
-            total_expense = df_plot[df_plot[type_col] == '支出']['金额(元)'].sum()
-            total_income = df_plot[df_plot[type_col] == '收入']['金额(元)'].sum()
-            df_expense = df_plot[df_plot[type_col] == '支出']
-            df_income = df_plot[df_plot[type_col] == '收入']
-        else:
-            total_expense = 0
-            total_income = 0
-            df_expense = df_plot
-            df_income = pd.DataFrame()
-
-        net_flow = total_income - total_expense
-        merchant_count = df_plot['交易对方'].nunique() if '交易对方' in df_plot.columns else 0
-
-        # 计算更多统计指标
-        total_transactions = len(df_plot)
-        expense_count = len(df_expense)
-        income_count = len(df_income)
-        avg_expense = total_expense / expense_count if expense_count > 0 else 0
-        avg_income = total_income / income_count if income_count > 0 else 0
-        trading_days = df_plot['日期'].nunique()
-        daily_avg_expense = total_expense / trading_days if trading_days > 0 else 0
-        max_single_expense = df_expense['金额(元)'].max() if not df_expense.empty else 0
-        expense_days = df_expense['日期'].nunique() if not df_expense.empty else 0
-
-        # 创建页面，使用简洁布局并添加自定义样式
-        page = Page(
-            layout=Page.SimplePageLayout,
-            page_title="微信支付账单分析报告"
-        )
-
-        page.page_title = "微信支付账单分析报告"
-
-        # 自定义 CSS 样式（将在渲染后注入）
-        custom_css = """
+# 自定义 CSS 样式（将在渲染后注入）
+CUSTOM_CSS = """
         <style>
             body {
                 background: #ffffff;
@@ -111,264 +58,966 @@ def generate_visualizations(df: pd.DataFrame, output_path: str) -> None:
                 margin: 15px 0;
                 font-weight: 600;
             }
+            .insights {
+                max-width: 900px;
+                margin: 0 auto 10px;
+                padding: 10px 20px;
+                background: #f7f9fc;
+                border-left: 4px solid #5793f3;
+                color: #2c3e50;
+            }
+            .insights h2 {
+                font-size: 18px;
+                margin: 5px 0;
+            }
+            .insights li {
+                margin: 4px 0;
+                font-size: 14px;
+            }
         </style>
         """
 
-        # 通用工具栏配置（支持导出PNG）
-        common_toolbox = opts.ToolboxOpts(
-            feature=opts.ToolBoxFeatureOpts(
-                save_as_image=opts.ToolBoxFeatureSaveAsImageOpts(
-                    title="保存为图片",
-                    pixel_ratio=2  # 高清导出
-                ),
-                restore=opts.ToolBoxFeatureRestoreOpts(title="还原"),
-                data_view=opts.ToolBoxFeatureDataViewOpts(title="数据视图", is_read_only=True),
-            )
+# 以下配置对象在所有报表之间共享，只在导入时构建一次（图表只读取它们，不会修改）
+# 通用工具栏配置（支持导出PNG）
+COMMON_TOOLBOX = opts.ToolboxOpts(
+    feature=opts.ToolBoxFeatureOpts(
+        save_as_image=opts.ToolBoxFeatureSaveAsImageOpts(
+            title="保存为图片",
+            pixel_ratio=2  # 高清导出
+        ),
+        restore=opts.ToolBoxFeatureRestoreOpts(title="还原"),
+        data_view=opts.ToolBoxFeatureDataViewOpts(title="数据视图", is_read_only=True),
+    )
+)
+
+SUMMARY_ITEM_STYLE = opts.ItemStyleOpts(
+    color=JsCode("""
+        function(params) {
+            var colorList = ['#d14b41', '#5793f3', '#675bba', '#fac858', '#91cc75', '#73c0de', '#ee6666', '#3ba272'];
+            return colorList[params.dataIndex];
+        }
+    """)
+)
+
+
+# 大数据量渲染参数
+# 时间序列嵌入页面的最大点数，超过时在 NumPy 中用 LTTB 降采样
+MAX_SERIES_POINTS = 1000
+MIN_SERIES_POINTS = 100
+# 超过该点数时由 ECharts 在前端继续按 LTTB 抽样绘制
+SAMPLING_THRESHOLD = 500
+# 页面中全部图表配置 JSON 的总大小上限（字节）
+MAX_PAYLOAD_BYTES = 2_000_000
+# 饼图保留的最大扇区数，其余合并为一项
+PIE_TOP_N = 10
+
+# 报表模板版本：修改图表构建、样式或页面结构时递增，使已生成报表的指纹失效
+REPORT_TEMPLATE_VERSION = 2
+# 长页面截图的宽度（像素）
+SNAPSHOT_WIDTH = 1400
+
+
+@lru_cache(maxsize=None)
+def _init_opts(width: str = "900px", height: str = "500px") -> opts.InitOpts:
+    """按尺寸缓存的 InitOpts（统一使用 WALDEN 主题）"""
+    return opts.InitOpts(theme=ThemeType.WALDEN, width=width, height=height)
+
+
+def dump_chart_options(chart) -> str:
+    """
+    序列化单个图表的配置：优先使用 orjson，输出紧凑的 UTF-8 JSON（不做缩进和 \\u 转义）
+
+    Args:
+        chart: pyecharts 图表
+
+    Returns:
+        可直接嵌入页面的 JS 对象字面量
+    """
+    options = chart.get_options()
+    if orjson is not None:
+        raw = orjson.dumps(
+            options,
+            default=_options_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        ).decode('utf-8')
+    else:
+        raw = json.dumps(options, default=_options_default, ensure_ascii=False, separators=(',', ':'))
+    return replace_placeholder(raw)
+
+
+class ReportPage(Page):
+    """
+    使用 dump_chart_options 序列化各图表的 Page
+
+    serialized 中已有的图表（按 chart_id）直接复用已序列化的配置，不再重复序列化。
+    """
+
+    def __init__(self, *args, serialized: Optional[Dict[str, str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.serialized = serialized or {}
+
+    def _dump(self, chart) -> str:
+        if chart.chart_id not in self.serialized:
+            self.serialized[chart.chart_id] = dump_chart_options(chart)
+        return self.serialized[chart.chart_id]
+
+    def _prepare_render(self):
+        for chart in self:
+            if hasattr(chart, 'dump_options'):
+                chart.dump_options = partial(self._dump, chart)
+        super()._prepare_render()
+
+
+def _write_report(page: Page, output_path: str, header_html: str = '') -> int:
+    """渲染页面为 HTML 字符串，注入样式、标题和标题下方的内容后一次性写入文件，返回写入的字节数"""
+    html_content = page.render_embed()
+    # 在 </head> 前插入自定义样式，并添加页面标题
+    html_content = html_content.replace('</head>', f'{CUSTOM_CSS}</head>')
+    html_content = html_content.replace('<body >', f'<body >{TITLE_HTML}{header_html}')
+    data = html_content.encode('utf-8')
+    # 先写临时文件再原子替换，中途失败时不会留下与指纹不符的半个页面
+    tmp = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, output_path)
+    return len(data)
+
+
+def lttb_downsample(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets 降采样，保留序列的峰谷形状
+
+    除首尾两点外把序列均分为 n_out - 2 个桶，每个桶选出与“上一个选中点”和“下一个桶均值”
+    构成三角形面积最大的点。下一个桶的均值用前缀和一次算出，每个桶内的面积计算是向量化的。
+
+    Args:
+        x: 横坐标（升序）
+        y: 纵坐标
+        n_out: 输出点数
+
+    Returns:
+        选中点的下标（升序）
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    starts, ends = edges[:-1], edges[1:]
+
+    # 每个桶之后那个桶的均值（最后一个桶之后是终点）
+    cum_x = np.concatenate([[0.0], np.cumsum(x)])
+    cum_y = np.concatenate([[0.0], np.cumsum(y)])
+    next_starts = np.append(ends[:-1], n - 1)
+    next_ends = np.append(ends[1:], n)
+    counts = next_ends - next_starts
+    avg_x = (cum_x[next_ends] - cum_x[next_starts]) / counts
+    avg_y = (cum_y[next_ends] - cum_y[next_starts]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i, (lo, hi) in enumerate(zip(starts, ends)):
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i]) * (by - y[a]) - (x[a] - bx) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def collapse_long_tail(values: pd.Series, top_n: int, other_label: str) -> List[list]:
+    """
+    按数值降序保留前 top_n 项，其余合并为一项，用于控制饼图等图表的数据量
+
+    Returns:
+        [[名称, 数值], ...]（数值保留两位小数）
+    """
+    values = values.sort_values(ascending=False)
+    data = [[name, round(float(v), 2)] for name, v in values.head(top_n).items()]
+    others = float(values.iloc[top_n:].sum()) if len(values) > top_n else 0.0
+    if others > 0:
+        data.append([other_label, round(others, 2)])
+    return data
+
+
+def _daily_trend_chart(daily: pd.Series, max_points: int) -> Line:
+    """每日支出走势图：点数超过 max_points 时按 LTTB 降采样"""
+    values = daily.to_numpy(dtype=float)
+    total_days = len(values)
+    index = lttb_downsample(np.arange(total_days, dtype=float), values, max_points)
+    subtitle = f"共 {total_days} 天"
+    if len(index) < total_days:
+        subtitle += f"，已按 LTTB 降采样为 {len(index)} 个点"
+    return (
+        Line(init_opts=_init_opts())
+        .add_xaxis(daily.index[index].strftime('%Y-%m-%d').tolist())
+        .add_yaxis(
+            "每日支出",
+            np.round(values[index], 2).tolist(),
+            is_symbol_show=False,
+            sampling="lttb" if len(index) > SAMPLING_THRESHOLD else None,
+            color="#d14b41",
+            label_opts=opts.LabelOpts(is_show=False),
+        )
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title="📅 每日支出走势", subtitle=subtitle),
+            tooltip_opts=opts.TooltipOpts(trigger="axis"),
+            datazoom_opts=[opts.DataZoomOpts(), opts.DataZoomOpts(type_="inside")],
+            legend_opts=opts.LegendOpts(is_show=False),
+            toolbox_opts=COMMON_TOOLBOX,
         )
+    )
+
 
-        # --- 💎 顶部数据看板：核心摘要 (使用表格式展示) ---
-        summary_bar = (
-            Bar(init_opts=opts.InitOpts(theme=ThemeType.WALDEN, height="220px"))
-            .add_xaxis([
-                "总支出", "总收入", "收支净额", "交易天数",
-                "支出笔数", "收入笔数", "商户数",
-                "笔均支出", "笔均收入", "日均支出", "最大单笔", "支出天数"
-            ])
-            .add_yaxis(
-                "金额/数量",
-                [
-                    round(total_expense, 2),
-                    round(total_income, 2),
-                    round(net_flow, 2),
-                    trading_days,
-                    expense_count,
-                    income_count,
-                    merchant_count,
-                    round(avg_expense, 2),
-                    round(avg_income, 2),
-                    round(daily_avg_expense, 2),
-                    round(max_single_expense, 2),
-                    expense_days
-                ],
-                label_opts=opts.LabelOpts(
-                    is_show=True,
-                    position="top",
-                    formatter="{c}",
-                    font_size=11,
-                    font_weight="bold"
-                )
+def _max_consecutive_days(df_expense: pd.DataFrame, counterparty_col: str) -> pd.Series:
+    """
+    计算每个商户的最长连续消费天数（向量化：对去重后的 商户-日期 对按日期差分切分连续段）
+
+    Returns:
+        以商户为索引（升序）的最长连续天数
+    """
+    df_expense = ensure_time_keys(df_expense)
+    pairs = pd.DataFrame({
+        'merchant': df_expense[counterparty_col].to_numpy(),
+        'day': df_expense[DAY_KEY].to_numpy(dtype=np.int64),
+    })
+    pairs = pairs[pairs['day'] != MISSING_TIME_KEY].drop_duplicates().sort_values(['merchant', 'day'], kind='stable')
+    merchants = pairs['merchant'].to_numpy()
+    days = pairs['day'].to_numpy()
+    new_run = np.ones(len(pairs), dtype=bool)
+    new_run[1:] = (merchants[1:] != merchants[:-1]) | (np.diff(days) != 1)
+    run_id = np.cumsum(new_run)
+    run_length = np.bincount(run_id)[run_id]
+    result = pd.Series(run_length, index=pd.Index(merchants, name=counterparty_col)).groupby(level=0).max()
+    return result.astype(np.int64)
+
+
+def _count_days(df: pd.DataFrame) -> int:
+    """有交易的天数（按日序号）"""
+    days = df[DAY_KEY]
+    return int(days[days != MISSING_TIME_KEY].nunique())
+
+
+def _monthly_sum(df: pd.DataFrame) -> pd.Series:
+    """按月序号汇总金额"""
+    if df.empty:
+        return pd.Series(dtype=float, index=pd.Index([], dtype=np.int64))
+    months = df[MONTH_KEY]
+    valid = months != MISSING_TIME_KEY
+    return df.loc[valid, '金额(元)'].groupby(months[valid].astype(np.int64)).sum()
+
+
+SUMMARY_LABELS = [
+    "总支出", "总收入", "收支净额", "交易天数",
+    "支出笔数", "收入笔数", "商户数",
+    "笔均支出", "笔均收入", "日均支出", "最大单笔", "支出天数"
+]
+
+# PNG 导出后端：chrome（selenium 截取 HTML 长页面）或 matplotlib（进程内直接绘制）
+ENV_PNG_BACKEND = 'BILL_HUB_PNG_BACKEND'
+PNG_BACKENDS = ('chrome', 'matplotlib')
+
+
+@dataclass
+class ReportAggregates:
+    """
+    报表各图表所需的汇总数据，HTML 图表和 PNG 导出共用
+
+    序列均为 Python 列表或 pandas 对象，可直接交给不同的渲染后端。
+    """
+    summary_values: List[float]
+    total_transactions: int
+    trading_days: int
+    months: List[str]
+    monthly_expense: List[float]
+    monthly_income: List[float]
+    forecast: Optional[MonthEndForecast] = None
+    daily_expense: Optional[pd.Series] = None
+    type_dist: Optional[List[list]] = None
+    composition: Optional[List[list]] = None
+    composition_title: str = ""
+    top_merchants: Optional[pd.Series] = None
+    hourly_counts: Optional[List[int]] = None
+    consecutive: Optional[pd.Series] = None
+    top_alerts: Optional[pd.DataFrame] = None
+    alerts_total: int = 0
+    insights: Optional[List[Insight]] = None
+    budget_burn: Optional[BudgetBurn] = None
+
+
+def compute_report_aggregates(df: pd.DataFrame, alerts: Optional[pd.DataFrame] = None) -> ReportAggregates:
+    """
+    计算报表所需的全部汇总数据
+
+    Args:
+        df: 交易数据（需包含交易时间和金额列）
+        alerts: 异常消费提醒表（可选）
+
+    Returns:
+        ReportAggregates
+    """
+    # 1. 数据预处理：解析时已计算的整数时间键直接使用，缺少时补算
+    df_plot = ensure_time_keys(df)
+    type_col: Optional[str] = None
+    for col in ['收/支/其他', '收/支']:
+        if col in df_plot.columns:
+            type_col = col
+            break
+
+    # 统计核心指标
+    if type_col:
+        total_expense = df_plot[df_plot[type_col] == '支出']['金额(元)'].sum()
+        total_income = df_plot[df_plot[type_col] == '收入']['金额(元)'].sum()
+        df_expense = df_plot[df_plot[type_col] == '支出']
+        df_income = df_plot[df_plot[type_col] == '收入']
+    else:
+        total_expense = 0
+        total_income = 0
+        df_expense = df_plot
+        df_income = pd.DataFrame()
+
+    net_flow = total_income - total_expense
+    merchant_count = df_plot['交易对方'].nunique() if '交易对方' in df_plot.columns else 0
+
+    # 计算更多统计指标
+    total_transactions = len(df_plot)
+    expense_count = len(df_expense)
+    income_count = len(df_income)
+    avg_expense = total_expense / expense_count if expense_count > 0 else 0
+    avg_income = total_income / income_count if income_count > 0 else 0
+    trading_days = _count_days(df_plot)
+    daily_avg_expense = total_expense / trading_days if trading_days > 0 else 0
+    max_single_expense = df_expense['金额(元)'].max() if not df_expense.empty else 0
+    expense_days = _count_days(df_expense) if not df_expense.empty else 0
+
+    # 月度收支（按月序号分组，只在最后转换为坐标轴标签）
+    monthly_expense = _monthly_sum(df_expense)
+    monthly_income = _monthly_sum(df_income)
+    month_keys = monthly_expense.index.union(monthly_income.index)
+    months = month_labels(month_keys)
+
+    agg = ReportAggregates(
+        summary_values=[
+            round(total_expense, 2),
+            round(total_income, 2),
+            round(net_flow, 2),
+            trading_days,
+            expense_count,
+            income_count,
+            merchant_count,
+            round(avg_expense, 2),
+            round(avg_income, 2),
+            round(daily_avg_expense, 2),
+            round(max_single_expense, 2),
+            expense_days
+        ],
+        total_transactions=total_transactions,
+        trading_days=trading_days,
+        months=months,
+        monthly_expense=monthly_expense.reindex(month_keys, fill_value=0).round(2).tolist(),
+        monthly_income=monthly_income.reindex(month_keys, fill_value=0).round(2).tolist(),
+    )
+
+    # 月末支出预测（仅当最后一个月尚未结束时使用）
+    try:
+        month_forecast = forecast_month_end(df_plot)
+    except Exception as e:
+        logger.warning(f"月末支出预测失败: {e}")
+        month_forecast = None
+    if (
+        month_forecast is not None
+        and month_forecast.remaining_days > 0
+        and bool(months)
+        and months[-1] == month_forecast.month
+    ):
+        agg.forecast = month_forecast
+
+    # 每日支出（补齐无支出的日期）
+    if expense_days > 1:
+        valid = df_expense[DAY_KEY] != MISSING_TIME_KEY
+        days = df_expense[DAY_KEY].to_numpy()[valid]
+        first = int(days.min())
+        totals = np.bincount(days - first, weights=df_expense['金额(元)'].to_numpy(dtype=float)[valid])
+        agg.daily_expense = pd.Series(totals, index=day_index_to_datetime(np.arange(first, first + len(totals))))
+
+    # 收支结构与消费构成：有分类列时按分类统计，否则按交易对方统计
+    if type_col:
+        type_dist = df_plot.groupby(type_col)['金额(元)'].sum()
+        agg.type_dist = [list(z) for z in zip(type_dist.index.tolist(), type_dist.round(2).tolist())]
+        composition_col = '分类' if '分类' in df_plot.columns else (
+            '交易对方' if '交易对方' in df_plot.columns else None
+        )
+        if composition_col and not df_expense.empty:
+            cat_summary = df_expense.groupby(composition_col)['金额(元)'].sum()
+            agg.composition = collapse_long_tail(
+                cat_summary, PIE_TOP_N,
+                "其他分类汇总" if composition_col == '分类' else "其他商户汇总"
+            )
+            agg.composition_title = "消费分类构成" if composition_col == '分类' else "消费去向构成 (Top 10)"
+
+    counterparty_col = '交易对方' if '交易对方' in df_plot.columns else None
+    if counterparty_col and not df_expense.empty:
+        agg.top_merchants = df_expense.groupby(counterparty_col)['金额(元)'].sum().sort_values(ascending=True).tail(20)
+        agg.consecutive = _max_consecutive_days(df_expense, counterparty_col).sort_values(ascending=True).tail(15)
+
+    if not df_expense.empty:
+        hours = df_expense[HOUR_KEY].to_numpy()
+        agg.hourly_counts = np.bincount(hours[hours != MISSING_TIME_KEY], minlength=24)[:24].tolist()
+
+    if alerts is not None and not alerts.empty:
+        agg.top_alerts = alerts.head(15).iloc[::-1]
+        agg.alerts_total = len(alerts)
+
+    # 最新月份的环比 / 同比洞察
+    try:
+        agg.insights = compute_insights(df_plot)
+    except Exception as e:
+        logger.warning(f"消费洞察生成失败: {e}")
+
+    # 最后一个月的预算消耗进度（配置了预算时）
+    try:
+        agg.budget_burn = compute_budget_burn(df_plot, load_budgets())
+    except Exception as e:
+        logger.warning(f"预算消耗计算失败: {e}")
+
+    return agg
+
+
+def build_report_charts(agg: ReportAggregates, max_points: int = MAX_SERIES_POINTS) -> Tuple[list, Optional[int]]:
+    """
+    根据汇总数据构建 pyecharts 图表
+
+    Args:
+        agg: 报表汇总数据
+        max_points: 每日走势的最大点数
+
+    Returns:
+        (按页面顺序排列的图表列表, 每日走势图在列表中的位置)
+    """
+    charts: list = []
+
+    # --- 💎 顶部数据看板：核心摘要 (使用表格式展示) ---
+    summary_bar = (
+        Bar(init_opts=_init_opts(height="220px"))
+        .add_xaxis(SUMMARY_LABELS)
+        .add_yaxis(
+            "金额/数量",
+            agg.summary_values,
+            label_opts=opts.LabelOpts(
+                is_show=True,
+                position="top",
+                formatter="{c}",
+                font_size=11,
+                font_weight="bold"
+            )
+        )
+        .set_global_opts(
+            title_opts=opts.TitleOpts(
+                title="💎 财务数据核心摘要",
+                subtitle=f"账单周期概览 | 总交易笔数: {agg.total_transactions} | 跨度: {agg.trading_days} 天",
+                pos_left="center"
+            ),
+            xaxis_opts=opts.AxisOpts(
+                axislabel_opts=opts.LabelOpts(rotate=0, font_size=11),
+            ),
+            yaxis_opts=opts.AxisOpts(is_show=False),
+            legend_opts=opts.LegendOpts(is_show=False),
+            toolbox_opts=COMMON_TOOLBOX,
+        )
+        .set_series_opts(itemstyle_opts=SUMMARY_ITEM_STYLE)
+    )
+    charts.append(summary_bar)
+
+    # --- 📈 基础图表 1：月度收支趋势（叠加月末预测）---
+    months = agg.months
+    trend_subtitle = "观察跨月财务变动情况"
+    if agg.forecast is not None:
+        projected, lower, upper = agg.forecast.total
+        trend_subtitle += f" | {agg.forecast.month} 预测月末支出 {projected:.2f} 元（80% 区间 {lower:.2f} ~ {upper:.2f}）"
+
+    bar_trend = (
+        Bar(init_opts=_init_opts())
+        .add_xaxis(months)
+        .add_yaxis("月度支出", agg.monthly_expense, color="#d14b41")
+        .add_yaxis("月度收入", agg.monthly_income, color="#5793f3")
+        .set_global_opts(
+            title_opts=opts.TitleOpts(title="📈 月度收支走势分析", subtitle=trend_subtitle),
+            tooltip_opts=opts.TooltipOpts(trigger="axis"),
+            datazoom_opts=[opts.DataZoomOpts(), opts.DataZoomOpts(type_="inside")],
+            legend_opts=opts.LegendOpts(pos_top="5%"),
+            toolbox_opts=COMMON_TOOLBOX,
+        )
+    )
+    if agg.forecast is not None:
+        padding = [None] * (len(months) - 1)
+        line_forecast = (
+            Line()
+            .add_xaxis(months)
+            .add_yaxis("月末预测", padding + [round(projected, 2)], color="#675bba",
+                       symbol="diamond", symbol_size=14,
+                       label_opts=opts.LabelOpts(is_show=True, position="top"))
+            .add_yaxis("预测下限", padding + [round(lower, 2)], color="#b6a2de",
+                       symbol="triangle", symbol_size=8, label_opts=opts.LabelOpts(is_show=False))
+            .add_yaxis("预测上限", padding + [round(upper, 2)], color="#b6a2de",
+                       symbol="triangle", symbol_size=8, label_opts=opts.LabelOpts(is_show=False))
+        )
+        bar_trend.overlap(line_forecast)
+    charts.append(bar_trend)
+
+    # --- 📅 每日支出走势（长周期账单按 LTTB 降采样）---
+    daily_index = None
+    if agg.daily_expense is not None:
+        daily_index = len(charts)
+        charts.append(_daily_trend_chart(agg.daily_expense, max_points))
+
+    # --- 🎯 预算消耗进度：各预算项的逐日累计占预算的百分比 ---
+    if agg.budget_burn is not None:
+        burn = agg.budget_burn
+        n_days = len(burn.days)
+        line_budget = (
+            Line(init_opts=_init_opts())
+            .add_xaxis(burn.days)
+            .add_yaxis("均匀消耗", [round((d + 1) / n_days * 100, 1) for d in range(n_days)],
+                       color="#b0b0b0", is_symbol_show=False,
+                       linestyle_opts=opts.LineStyleOpts(type_="dashed"),
+                       label_opts=opts.LabelOpts(is_show=False))
+        )
+        for name, values in burn.series.items():
+            line_budget.add_yaxis(name, values, is_symbol_show=False, label_opts=opts.LabelOpts(is_show=False))
+        line_budget.set_series_opts(
+            markline_opts=opts.MarkLineOpts(data=[opts.MarkLineItem(y=100, name="预算")],
+                                            label_opts=opts.LabelOpts(formatter="预算 100%"))
+        ).set_global_opts(
+            title_opts=opts.TitleOpts(
+                title="🎯 预算消耗进度",
+                subtitle=f"{burn.month} 各预算项累计支出占月度预算的百分比 | {len(burn.alerts)} 条提醒"
+            ),
+            tooltip_opts=opts.TooltipOpts(trigger="axis"),
+            yaxis_opts=opts.AxisOpts(name="%"),
+            legend_opts=opts.LegendOpts(pos_top="5%"),
+            toolbox_opts=COMMON_TOOLBOX,
+        )
+        charts.append(line_budget)
+
+    # --- 🏦 基础图表 2 & 3：收支对比与分类构成的组合 (Pie) ---
+    if agg.type_dist is not None and agg.composition is not None:
+        pie_ratio = (
+            Pie(init_opts=_init_opts("480px", "400px"))
+            .add(
+                "",
+                agg.type_dist,
+                radius=["40%", "70%"],
             )
             .set_global_opts(
-                title_opts=opts.TitleOpts(
-                    title="💎 财务数据核心摘要",
-                    subtitle=f"账单周期概览 | 总交易笔数: {total_transactions} | 跨度: {trading_days} 天",
-                    pos_left="center"
-                ),
-                xaxis_opts=opts.AxisOpts(
-                    axislabel_opts=opts.LabelOpts(rotate=0, font_size=11),
-                ),
-                yaxis_opts=opts.AxisOpts(is_show=False),
+                title_opts=opts.TitleOpts(title="🏦 资金结构分布", pos_left="center"),
                 legend_opts=opts.LegendOpts(is_show=False),
-                toolbox_opts=common_toolbox,
+                toolbox_opts=COMMON_TOOLBOX,
+            )
+            .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {d}%"))
+        )
+        pie_cat = (
+            Pie(init_opts=_init_opts("480px", "400px"))
+            .add(
+                "",
+                agg.composition,
+                radius=["30%", "65%"],
+                rosetype="area"
+            )
+            .set_global_opts(
+                title_opts=opts.TitleOpts(title=f"🍔 {agg.composition_title}", pos_left="center"),
+                legend_opts=opts.LegendOpts(is_show=False),
+                toolbox_opts=COMMON_TOOLBOX,
+            )
+            .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {d}%"))
+        )
+        charts.extend([pie_ratio, pie_cat])
+
+    # --- 🥇 专题图表 1：单商户累计支出 Top 20 ---
+    if agg.top_merchants is not None:
+        top_merchants = agg.top_merchants
+        bar_top = (
+            Bar(init_opts=_init_opts())
+            .add_xaxis(top_merchants.index.tolist())
+            .add_yaxis("支出金额", top_merchants.round(2).tolist())
+            .reversal_axis()
+            .set_series_opts(label_opts=opts.LabelOpts(position="right"))
+            .set_global_opts(
+                title_opts=opts.TitleOpts(title="🥇 商户支出排行榜 (Top 20)", subtitle="识别主要消费对象"),
+                xaxis_opts=opts.AxisOpts(name="金额"),
+                visualmap_opts=opts.VisualMapOpts(is_show=False, min_=0, max_=float(top_merchants.max()), dimension=0, range_color=["#7fb9d8", "#005ea1"]),
+                toolbox_opts=COMMON_TOOLBOX,
+            )
+        )
+        charts.append(bar_top)
+
+    # --- 🕒 & 🔍 专题图表：交易时间分析 & 商户频率分析（并排显示）---
+    if agg.hourly_counts is not None:
+        line_time = (
+            Line(init_opts=_init_opts("700px", "400px"))
+            .add_xaxis([f"{h}点" for h in range(24)])
+            .add_yaxis("交易频次", agg.hourly_counts, is_smooth=True, linestyle_opts=opts.LineStyleOpts(width=3, color="#ff9900"))
+            .set_global_opts(
+                title_opts=opts.TitleOpts(title="🕒 24小时交易习惯分析", subtitle="了解日常消费时间分布"),
+                tooltip_opts=opts.TooltipOpts(trigger="axis"),
+                xaxis_opts=opts.AxisOpts(boundary_gap=False),
+                toolbox_opts=COMMON_TOOLBOX,
             )
             .set_series_opts(
-                itemstyle_opts=opts.ItemStyleOpts(
-                    color=JSCode("""
-                        function(params) {
-                            var colorList = ['#d14b41', '#5793f3', '#675bba', '#fac858', '#91cc75', '#73c0de', '#ee6666', '#3ba272'];
-                            return colorList[params.dataIndex];
-                        }
-                    """)
-                )
+                areastyle_opts=opts.AreaStyleOpts(opacity=0.1, color="#ff9900")
             )
         )
-        page.add(summary_bar)
-
-        # --- 📈 基础图表 1：月度收支趋势 ---
-        monthly_expense = df_expense.groupby('月份')['金额(元)'].sum() if not df_expense.empty else pd.Series(dtype=float)
-        monthly_income = df_income.groupby('月份')['金额(元)'].sum() if not df_income.empty else pd.Series(dtype=float)
-        months = sorted(list(set(monthly_expense.index.tolist() + monthly_income.index.tolist())))
-
-        bar_trend = (
-            Bar(init_opts=opts.InitOpts(theme=ThemeType.WALDEN))
-            .add_xaxis(months)
-            .add_yaxis("月度支出", [round(monthly_expense.get(m, 0), 2) for m in months], color="#d14b41")
-            .add_yaxis("月度收入", [round(monthly_income.get(m, 0), 2) for m in months], color="#5793f3")
+        charts.append(line_time)
+
+    if agg.consecutive is not None:
+        bar_consec = (
+            Bar(init_opts=_init_opts("700px", "400px"))
+            .add_xaxis(agg.consecutive.index.tolist())
+            .add_yaxis("最高连续消费天数", agg.consecutive.tolist(), color="#fc8d59")
+            .reversal_axis()
+            .set_series_opts(label_opts=opts.LabelOpts(position="right"))
+            .set_global_opts(
+                title_opts=opts.TitleOpts(title="🔍 商户消费频率分析", subtitle="识别高频消费商户"),
+                xaxis_opts=opts.AxisOpts(name="天数"),
+                toolbox_opts=COMMON_TOOLBOX,
+            )
+        )
+        charts.append(bar_consec)
+
+    # --- ⚠️ 专题图表：异常消费提醒 ---
+    if agg.top_alerts is not None:
+        top_alerts = agg.top_alerts
+        alert_labels = [f"{o} ({m})" for o, m in zip(top_alerts['对象'], top_alerts['月份'])]
+        bar_alerts = (
+            Bar(init_opts=_init_opts())
+            .add_xaxis(alert_labels)
+            .add_yaxis("实际金额", top_alerts['金额(元)'].round(2).tolist(), color="#d14b41")
+            .add_yaxis("常规基线", top_alerts['基线'].round(2).tolist(), color="#91cc75")
+            .reversal_axis()
+            .set_series_opts(label_opts=opts.LabelOpts(position="right"))
             .set_global_opts(
-                title_opts=opts.TitleOpts(title="📈 月度收支走势分析", subtitle="观察跨月财务变动情况"),
+                title_opts=opts.TitleOpts(
+                    title="⚠️ 异常消费提醒",
+                    subtitle=f"共 {agg.alerts_total} 条提醒，按偏离程度展示前 {len(top_alerts)} 条"
+                ),
                 tooltip_opts=opts.TooltipOpts(trigger="axis"),
-                datazoom_opts=[opts.DataZoomOpts(), opts.DataZoomOpts(type_="inside")],
+                xaxis_opts=opts.AxisOpts(name="金额"),
                 legend_opts=opts.LegendOpts(pos_top="5%"),
-                toolbox_opts=common_toolbox,
+                toolbox_opts=COMMON_TOOLBOX,
             )
         )
-        page.add(bar_trend)
-
-        # --- 🏦 基础图表 2 & 3：收支对比与分类构成的组合 (Pie) ---
-        if type_col:
-            type_dist = df_plot.groupby(type_col)['金额(元)'].sum()
-            pie_ratio = (
-                Pie(init_opts=opts.InitOpts(theme=ThemeType.WALDEN, width="480px", height="400px"))
-                .add(
-                    "",
-                    [list(z) for z in zip(type_dist.index.tolist(), type_dist.round(2).tolist())],
-                    radius=["40%", "70%"],
-                )
-                .set_global_opts(
-                    title_opts=opts.TitleOpts(title="🏦 资金结构分布", pos_left="center"),
-                    legend_opts=opts.LegendOpts(is_show=False),
-                    toolbox_opts=common_toolbox,
-                )
-                .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {d}%"))
-            )
+        charts.append(bar_alerts)
 
-            counterparty_col = '交易对方' if '交易对方' in df_plot.columns else None
-            if counterparty_col and not df_expense.empty:
-                cat_summary = df_expense.groupby(counterparty_col)['金额(元)'].sum().sort_values(ascending=False)
-                top_10_cats = cat_summary.head(10).to_dict()
-                others_val = cat_summary.iloc[10:].sum() if len(cat_summary) > 10 else 0
-                pie_data = [list(z) for z in top_10_cats.items()]
-                if others_val > 0:
-                    pie_data.append(["其他商户汇总", round(others_val, 2)])
-
-                pie_cat = (
-                    Pie(init_opts=opts.InitOpts(theme=ThemeType.WALDEN, width="480px", height="400px"))
-                    .add(
-                        "",
-                        pie_data,
-                        radius=["30%", "65%"],
-                        rosetype="area"
-                    )
-                    .set_global_opts(
-                        title_opts=opts.TitleOpts(title="🍔 消费去向构成 (Top 10)", pos_left="center"),
-                        legend_opts=opts.LegendOpts(is_show=False),
-                        toolbox_opts=common_toolbox,
-                    )
-                    .set_series_opts(label_opts=opts.LabelOpts(formatter="{b}: {d}%"))
-                )
-                page.add(pie_ratio, pie_cat)
-
-        # --- 🥇 专题图表 1：单商户累计支出 Top 20 ---
-        counterparty_col = '交易对方' if '交易对方' in df_plot.columns else None
-        if counterparty_col and not df_expense.empty:
-            top_merchants = df_expense.groupby(counterparty_col)['金额(元)'].sum().sort_values(ascending=True).tail(20)
-            bar_top = (
-                Bar(init_opts=opts.InitOpts(theme=ThemeType.WALDEN))
-                .add_xaxis(top_merchants.index.tolist())
-                .add_yaxis("支出金额", top_merchants.round(2).tolist())
-                .reversal_axis()
-                .set_series_opts(label_opts=opts.LabelOpts(position="right"))
-                .set_global_opts(
-                    title_opts=opts.TitleOpts(title="🥇 商户支出排行榜 (Top 20)", subtitle="识别主要消费对象"),
-                    xaxis_opts=opts.AxisOpts(name="金额"),
-                    visualmap_opts=opts.VisualMapOpts(is_show=False, min_=0, max_=float(top_merchants.max()), dimension=0, range_color=["#7fb9d8", "#005ea1"]),
-                    toolbox_opts=common_toolbox,
-                )
-            )
-            page.add(bar_top)
-
-        # --- 🕒 & 🔍 专题图表：交易时间分析 & 商户频率分析（并排显示）---
-        line_time = None
-        bar_consec = None
-
-        if not df_expense.empty:
-            hourly_stats = df_expense.groupby('小时')['金额(元)'].agg(['count', 'sum']).reindex(range(24), fill_value=0)
-            line_time = (
-                Line(init_opts=opts.InitOpts(theme=ThemeType.WALDEN, width="700px", height="400px"))
-                .add_xaxis([f"{h}点" for h in range(24)])
-                .add_yaxis("交易频次", hourly_stats['count'].tolist(), is_smooth=True, linestyle_opts=opts.LineStyleOpts(width=3, color="#ff9900"))
-                .set_global_opts(
-                    title_opts=opts.TitleOpts(title="🕒 24小时交易习惯分析", subtitle="了解日常消费时间分布"),
-                    tooltip_opts=opts.TooltipOpts(trigger="axis"),
-                    xaxis_opts=opts.AxisOpts(boundary_gap=False),
-                    toolbox_opts=common_toolbox,
-                )
-                .set_series_opts(
-                    areastyle_opts=opts.AreaStyleOpts(opacity=0.1, color="#ff9900")
-                )
-            )
+    return charts, daily_index
 
-        if counterparty_col and not df_expense.empty:
-            def calc_max_consecutive(group) -> int:
-                dates = sorted(group['日期'].unique())
-                if not dates:
-                    return 0
-                max_c = 1
-                curr_c = 1
-                for i in range(1, len(dates)):
-                    if (dates[i] - dates[i-1]).days == 1:
-                        curr_c += 1
-                    else:
-                        max_c = max(max_c, curr_c)
-                        curr_c = 1
-                return max(max_c, curr_c)
-
-            consecutive_stats = df_expense.groupby(counterparty_col).apply(calc_max_consecutive, include_groups=False).sort_values(ascending=True).tail(15)
-            bar_consec = (
-                Bar(init_opts=opts.InitOpts(theme=ThemeType.WALDEN, width="700px", height="400px"))
-                .add_xaxis(consecutive_stats.index.tolist())
-                .add_yaxis("最高连续消费天数", consecutive_stats.tolist(), color="#fc8d59")
-                .reversal_axis()
-                .set_series_opts(label_opts=opts.LabelOpts(position="right"))
-                .set_global_opts(
-                    title_opts=opts.TitleOpts(title="🔍 商户消费频率分析", subtitle="识别高频消费商户"),
-                    xaxis_opts=opts.AxisOpts(name="天数"),
-                    toolbox_opts=common_toolbox,
-                )
-            )
 
-        # 将两个图表并排添加
-        if line_time and bar_consec:
-            page.add(line_time, bar_consec)
-        elif line_time:
-            page.add(line_time)
-        elif bar_consec:
-            page.add(bar_consec)
+def report_fingerprint(agg: ReportAggregates, max_points: int = MAX_SERIES_POINTS,
+                       max_payload: int = MAX_PAYLOAD_BYTES) -> str:
+    """
+    报表的指纹：图表汇总数据、渲染参数与模板版本（含 pyecharts 版本和页面样式）一起哈希
+
+    指纹与已有 HTML 旁记录的一致时，渲染出的页面不会有任何变化，可以跳过渲染和截图。
 
-        # 渲染页面
-        page.render(output_path)
+    Args:
+        agg: 报表汇总数据
+        max_points: 每日走势的最大点数
+        max_payload: 图表配置 JSON 的总字节数上限
 
-        # 注入自定义样式
-        try:
-            with open(output_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
+    Returns:
+        十六进制指纹
+    """
+    return data_fingerprint(REPORT_TEMPLATE_VERSION, PYECHARTS_VERSION, CUSTOM_CSS, TITLE_HTML,
+                            max_points, max_payload, agg)
 
-            # 在 </head> 前插入自定义样式
-            html_content = html_content.replace('</head>', f'{custom_css}</head>')
 
-            # 添加页面标题
-            title_html = '<h1>📊 微信支付账单分析报告</h1>'
-            html_content = html_content.replace('<body >', f'<body >{title_html}')
+def _png_path(output_path: str, backend: str) -> str:
+    """报表 PNG 的路径：chrome 为长页面截图，matplotlib 为静态汇总图"""
+    return output_path.replace('.html', '_summary.png' if backend == 'matplotlib' else '_full_page.png')
 
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-        except Exception as e:
-            logger.error(f"样式注入失败: {e}")
 
-        logger.info(f"可视化报表已生成: {output_path}")
-        print(f"  可视化报表已生成: {output_path}")
-        print(f"  提示: 报表已支持移动端自适应，每个图表右上角可导出为 PNG 图片")
+def insights_path(output_path: str) -> str:
+    """报表的洞察 JSON 路径"""
+    return output_path.replace('.html', '_insights.json')
 
-        # 生成完整长页面 PNG
-        try:
-            from screenshot_utils import make_full_page_snapshot
 
-            png_path = output_path.replace('.html', '_full_page.png')
-            success = make_full_page_snapshot(output_path, png_path, width=1400)
+def report_png_path(output_path: str, png_backend: Optional[str] = None) -> str:
+    """报表 PNG 的路径（后端默认读取 BILL_HUB_PNG_BACKEND）"""
+    return _png_path(output_path, _resolve_png_backend(png_backend))
 
-            if success:
-                logger.info(f"完整长页面 PNG 已导出: {png_path}")
-                print(f"  ✓ 完整长页面 PNG 已导出: {png_path}")
-            else:
-                logger.warning("PNG 导出失败，请检查 Chrome 浏览器是否已安装")
-                print(f"  ✗ PNG 导出失败，请检查 Chrome 浏览器是否已安装")
+
+def report_source_fingerprint(df: pd.DataFrame, snapshot: bool = False, png_backend: Optional[str] = None,
+                              max_points: int = MAX_SERIES_POINTS, max_payload: int = MAX_PAYLOAD_BYTES) -> str:
+    """
+    报表输入的指纹：交易数据、预算配置、渲染参数与模板版本一起哈希
+
+    与 report_fingerprint 不同，不需要先计算汇总数据和异常提醒，适合调用方在做这些计算之前判断能否跳过整个报表。
+
+    Args:
+        df: 交易数据
+        snapshot: 是否导出 PNG
+        png_backend: PNG 导出后端
+        max_points: 每日走势的最大点数
+        max_payload: 图表配置 JSON 的总字节数上限
+
+    Returns:
+        十六进制指纹
+    """
+    backend = _resolve_png_backend(png_backend) if snapshot else None
+    return data_fingerprint(REPORT_TEMPLATE_VERSION, PYECHARTS_VERSION, CUSTOM_CSS, TITLE_HTML,
+                            max_points, max_payload, backend, SNAPSHOT_WIDTH, load_budgets(), df)
+
+
+def _png_fingerprint(report_fp: str, backend: str) -> str:
+    return data_fingerprint(report_fp, backend, SNAPSHOT_WIDTH)
+
+
+def _png_is_fresh(output_path: str, backend: str, report_fp: str, force: bool = False) -> bool:
+    """报表 PNG 已存在且由同一份报表数据生成时返回 True（并提示跳过）"""
+    png_path = _png_path(output_path, backend)
+    if not artifact_is_fresh(png_path, _png_fingerprint(report_fp, backend), force):
+        return False
+    console.info(f"报表数据未变化，跳过 PNG 导出: {png_path}")
+    return True
+
+
+def _resolve_png_backend(png_backend: Optional[str]) -> str:
+    """确定 PNG 导出后端：参数优先，其次 BILL_HUB_PNG_BACKEND，默认 chrome"""
+    backend = (png_backend or os.environ.get(ENV_PNG_BACKEND) or 'chrome').lower()
+    if backend not in PNG_BACKENDS:
+        raise ValueError(f"未知的 PNG 导出后端: {backend}（可选 {', '.join(PNG_BACKENDS)}）")
+    return backend
+
+
+def export_report_png(
+    df: pd.DataFrame,
+    output_path: str,
+    alerts: Optional[pd.DataFrame] = None,
+    png_backend: Optional[str] = None,
+    force: bool = False
+) -> None:
+    """
+    为已生成的 HTML 报表单独导出 PNG（用于把截图与报表渲染拆分为独立步骤）
+
+    PNG 的指纹由 HTML 旁记录的报表指纹派生，报表数据未变化且 PNG 已存在时跳过导出。
+
+    Args:
+        df: 交易数据的 DataFrame
+        output_path: 报表 HTML 路径（chrome 后端要求文件已存在）
+        alerts: 异常消费提醒表（可选）
+        png_backend: PNG 导出后端，见 generate_visualizations
+        force: 忽略指纹，强制重新导出
+    """
+    backend = _resolve_png_backend(png_backend)
+    agg = None
+    report_fp = read_artifact_fingerprint(output_path)
+    if report_fp is None:
+        agg = compute_report_aggregates(df, alerts)
+        report_fp = report_fingerprint(agg)
+    if _png_is_fresh(output_path, backend, report_fp, force):
+        return
+    # chrome 后端直接截取 HTML，不需要重新汇总数据
+    if backend == 'matplotlib' and agg is None:
+        agg = compute_report_aggregates(df, alerts)
+    _export_png(agg, output_path, backend, report_fp)
+
+
+def _export_png(agg: Optional[ReportAggregates], output_path: str, backend: str,
+                report_fp: Optional[str] = None) -> None:
+    """按所选后端导出报表 PNG，成功时记录由报表指纹派生的 PNG 指纹"""
+    png_path = _png_path(output_path, backend)
+    if backend == 'matplotlib':
+        try:
+            from static_report import render_report_png
         except ImportError:
-            logger.warning("screenshot_utils.py 未找到")
-            print(f"  提示: screenshot_utils.py 未找到")
-        except Exception as e:
-            logger.error(f"PNG 导出异常: {e}")
-            print(f"  PNG 导出异常: {e}")
+            logger.warning("static_report.py 未找到")
+            return
+        if render_report_png(agg, png_path):
+            if report_fp is not None:
+                record_artifact_fingerprint(png_path, _png_fingerprint(report_fp, backend))
+            console.info(f"✓ 报表 PNG 已导出: {png_path}")
+        else:
+            console.warning("✗ PNG 导出失败，请安装 matplotlib: pip install matplotlib")
+        return
+
+    # 生成完整长页面 PNG
+    try:
+        from screenshot_utils import make_full_page_snapshot
+
+        success = make_full_page_snapshot(output_path, png_path, width=SNAPSHOT_WIDTH)
+
+        if success:
+            if report_fp is not None:
+                record_artifact_fingerprint(png_path, _png_fingerprint(report_fp, backend))
+            console.info(f"✓ 完整长页面 PNG 已导出: {png_path}")
+        else:
+            console.warning("✗ PNG 导出失败，请检查 Chrome 浏览器是否已安装")
+    except ImportError:
+        console.warning("提示: screenshot_utils.py 未找到")
+    except Exception as e:
+        console.error(f"PNG 导出异常: {e}")
+
+
+def generate_visualizations(
+    df: pd.DataFrame,
+    output_path: str,
+    alerts: Optional[pd.DataFrame] = None,
+    snapshot: bool = True,
+    max_points: int = MAX_SERIES_POINTS,
+    max_payload: int = MAX_PAYLOAD_BYTES,
+    png_backend: Optional[str] = None,
+    force: bool = False
+) -> bool:
+    """
+    基于交易数据生成可视化 HTML 报表，包含财务概览、趋势分析和消费洞察
+    支持移动端自适应和图表导出功能
+
+    报表顶部列出最新月份的消费洞察（见 insights 模块），同时写入旁边的 *_insights.json。
+
+    汇总数据、渲染参数和模板版本的指纹（见 report_fingerprint）与已有报表旁记录的一致时，
+    跳过 HTML 渲染；PNG 同理。force 为 True 或设置 BILL_HUB_FORCE_REFRESH=1 时总是重新生成。
+
+    Args:
+        df: 交易数据的 DataFrame
+        output_path: 输出 HTML 文件路径
+        alerts: 异常消费提醒表（可选，见 anomaly.detect_spending_anomalies）
+        snapshot: 是否导出 PNG
+        max_points: 时间序列嵌入页面的最大点数（超过时 LTTB 降采样）
+        max_payload: 图表配置 JSON 的总字节数上限（超过时进一步压缩时间序列点数）
+        png_backend: PNG 导出后端 chrome / matplotlib（默认读取 BILL_HUB_PNG_BACKEND，未设置时为 chrome）
+        force: 忽略指纹，强制重新渲染和导出
+
+    Returns:
+        是否生成了报表（数据为空或缺少必要列时返回 False；报表未变化而跳过时返回 True）
+    """
+    if df is None or df.empty:
+        logger.warning("数据为空，跳过可视化生成")
+        return False
+
+    if '金额(元)' not in df.columns or '交易时间' not in df.columns:
+        logger.warning("缺少必要的列（金额或交易时间），跳过可视化生成")
+        return False
+
+    backend = _resolve_png_backend(png_backend)
+
+    try:
+        render_start = time.perf_counter()
+        logger.info("开始生成可视化报表")
+        agg = compute_report_aggregates(df, alerts)
+        fingerprint = report_fingerprint(agg, max_points, max_payload)
+        if artifact_is_fresh(output_path, fingerprint, force):
+            console.info(f"报表数据未变化，跳过渲染: {output_path}")
+            if not os.path.exists(insights_path(output_path)):
+                write_insights_json(agg.insights or [], insights_path(output_path))
+            if snapshot and not _png_is_fresh(output_path, backend, fingerprint, force):
+                _export_png(agg, output_path, backend, fingerprint)
+            return True
+
+        charts, daily_index = build_report_charts(agg, max_points)
+
+        # 控制嵌入页面的数据量：超过上限时按比例减少每日走势的点数
+        serialized = {c.chart_id: dump_chart_options(c) for c in charts}
+        payload = sum(len(v.encode('utf-8')) for v in serialized.values())
+        if payload > max_payload and daily_index is not None:
+            daily_id = charts[daily_index].chart_id
+            daily_size = len(serialized.pop(daily_id).encode('utf-8'))
+            budget = max(max_payload - (payload - daily_size), 0)
+            points = max(MIN_SERIES_POINTS, int(min(max_points, len(agg.daily_expense)) * budget / daily_size))
+            charts[daily_index] = _daily_trend_chart(agg.daily_expense, points)
+            serialized[charts[daily_index].chart_id] = dump_chart_options(charts[daily_index])
+            payload = sum(len(v.encode('utf-8')) for v in serialized.values())
+            logger.info(f"图表数据超过上限 {max_payload / 1024:.0f} KB，每日走势压缩为 {points} 个点")
+        if payload > max_payload:
+            logger.warning(f"图表数据 {payload / 1024:.1f} KB 仍超过上限 {max_payload / 1024:.0f} KB")
+
+        # 渲染页面
+        page = ReportPage(
+            layout=Page.SimplePageLayout,
+            page_title=REPORT_TITLE,
+            serialized=serialized
+        )
+        page.add(*charts)
+        header_html = insights_html(agg.insights or []) + budget_alerts_html(agg.budget_burn)
+        html_size = _write_report(page, output_path, header_html)
+        write_insights_json(agg.insights or [], insights_path(output_path))
+        record_artifact_fingerprint(output_path, fingerprint)
+        logger.info(
+            f"报表大小 {html_size / 1024:.1f} KB（图表数据 {payload / 1024:.1f} KB，{len(charts)} 个图表），"
+            f"渲染耗时 {(time.perf_counter() - render_start) * 1000:.0f} ms"
+        )
+
+        console.info(f"可视化报表已生成: {output_path}")
+        console.info("提示: 报表已支持移动端自适应，每个图表右上角可导出为 PNG 图片")
+
+        if snapshot and not _png_is_fresh(output_path, backend, fingerprint, force):
+            _export_png(agg, output_path, backend, fingerprint)
+
+        return True
 
     except Exception as e:
         logger.error(f"生成可视化报表失败: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+ReportJob = Tuple  # (df, output_path) 或 (df, output_path, alerts)
+
+
+def _render_job(job: ReportJob, snapshot: bool, png_backend: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """渲染单个报表任务，返回 (输出路径, 错误信息)"""
+    df, output_path, *rest = job
+    alerts = rest[0] if rest else None
+    try:
+        if not generate_visualizations(df, output_path, alerts=alerts, snapshot=snapshot,
+                                       png_backend=png_backend):
+            return output_path, "数据为空或缺少必要的列"
+        return output_path, None
+    except Exception as e:
+        return output_path, str(e)
+
+
+def generate_visualizations_batch(
+    jobs: Iterable[ReportJob],
+    max_workers: Optional[int] = None,
+    snapshot: bool = False,
+    use_processes: bool = True,
+    png_backend: Optional[str] = None
+) -> List[str]:
+    """
+    批量生成可视化报表
+
+    所有报表共享模块级的样式、工具栏和主题配置；多个任务时在进程池（或线程池）中并发渲染。
+
+    Args:
+        jobs: (DataFrame, 输出路径) 或 (DataFrame, 输出路径, 异常提醒表) 的序列
+        max_workers: 并发数（默认 CPU 核数）
+        snapshot: 是否为每份报表导出 PNG 长图（批量时默认关闭）
+        use_processes: 使用进程池（默认）还是线程池
+        png_backend: PNG 导出后端，见 generate_visualizations
+
+    Returns:
+        成功生成的报表路径列表（按任务顺序）
+    """
+    jobs: Sequence[ReportJob] = list(jobs)
+    if not jobs:
+        return []
+
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    start = time.perf_counter()
+    if workers <= 1:
+        results = [_render_job(job, snapshot, png_backend) for job in jobs]
+    else:
+        executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_cls(max_workers=workers) as executor:
+            results = list(executor.map(partial(_render_job, snapshot=snapshot, png_backend=png_backend), jobs))
+    elapsed = time.perf_counter() - start
+
+    succeeded = []
+    for path, error in results:
+        if error is None:
+            succeeded.append(path)
+        else:
+            logger.warning(f"跳过报表 {path}: {error}")
+    rate = len(jobs) / elapsed if elapsed > 0 else float('inf')
+    logger.info(f"批量生成报表 {len(succeeded)}/{len(jobs)} 份，耗时 {elapsed:.2f}s（{rate:.1f} 份/秒，并发 {workers}）")
+    return succeeded
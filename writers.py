@@ -0,0 +1,225 @@
+"""
+增量写出模块
+把流式解析产出的数据批次依次写入 Excel、Parquet 和汇总统计，写出过程中不保留完整数据
+"""
+import abc
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from categorize import assign_categories
+from logger_config import logger
+from utils import MISSING_TIME_KEY, MONTH_KEY, TIME_KEY_COLUMNS, iter_pdf_batches, month_index, month_labels
+from validation import TransactionValidator, ValidationReport
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+# Excel 单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1_048_576
+
+
+class BatchWriter(abc.ABC):
+    """增量写出器基类：依次调用 write() 写入批次，最后调用 close()"""
+
+    @abc.abstractmethod
+    def write(self, batch: pd.DataFrame) -> None:
+        """写入一个批次"""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'BatchWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ExcelStreamWriter(BatchWriter):
+    """
+    使用 xlsxwriter 的 constant_memory 模式逐行写出 Excel
+
+    每行写完即刷新到临时文件，内存占用与总行数无关；超过单表行数上限时自动新建工作表。
+    """
+
+    def __init__(self, path: str, sheet_name: str = 'Sheet1'):
+        self.path = path
+        self.sheet_name = sheet_name
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.datetime_format = self.workbook.add_format({'num_format': DATETIME_FORMAT})
+        self.columns: Optional[List[str]] = None
+        self.rows = 0
+        self._sheet_count = 0
+        self._sheet = None
+        self._row = 0
+
+    def _new_sheet(self) -> None:
+        self._sheet_count += 1
+        name = self.sheet_name if self._sheet_count == 1 else f"{self.sheet_name}_{self._sheet_count}"
+        self._sheet = self.workbook.add_worksheet(name)
+        self._sheet.write_row(0, 0, [str(c) for c in self.columns])
+        self._row = 1
+
+    def write(self, batch: pd.DataFrame) -> None:
+        if self.columns is None:
+            # 整数时间键只用于计算，不写入 Excel
+            self.columns = [c for c in batch.columns if c not in TIME_KEY_COLUMNS]
+            self._new_sheet()
+        batch = batch.reindex(columns=self.columns)
+
+        # 按列转换为 Python 值，缺失值写为空单元格
+        is_datetime = [pd.api.types.is_datetime64_any_dtype(batch[c]) for c in self.columns]
+        values = []
+        for col, is_dt in zip(self.columns, is_datetime):
+            series = batch[col]
+            column = series.astype(object).where(series.notna(), None).tolist()
+            if is_dt:
+                column = [v.to_pydatetime() if v is not None else None for v in column]
+            values.append(column)
+
+        for row in zip(*values):
+            if self._row >= EXCEL_MAX_ROWS:
+                self._new_sheet()
+            for c, value in enumerate(row):
+                if value is None:
+                    continue
+                if is_datetime[c]:
+                    self._sheet.write_datetime(self._row, c, value, self.datetime_format)
+                else:
+                    self._sheet.write(self._row, c, value)
+            self._row += 1
+        self.rows += len(batch)
+
+    def close(self) -> None:
+        if self.columns is None:
+            self.workbook.add_worksheet(self.sheet_name)
+        self.workbook.close()
+        logger.info(f"增量导出 Excel 完成: {self.path}，共 {self.rows} 行")
+
+
+class ParquetStreamWriter(BatchWriter):
+    """使用 pyarrow 的 ParquetWriter 按批写出 row group（需要安装 pyarrow）"""
+
+    def __init__(self, path: str, compression: str = 'snappy'):
+        if pq is None:
+            raise ImportError("写出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        self.path = path
+        self.compression = compression
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def write(self, batch: pd.DataFrame) -> None:
+        if self._writer is None:
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            # 第一批中全为空值的列推断为 null 类型，之后的批次有值时无法按该类型写入，改按字符串列写出
+            self._schema = pa.schema(
+                [field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in table.schema],
+                metadata=table.schema.metadata
+            )
+            table = table.cast(self._schema)
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+        else:
+            table = pa.Table.from_pandas(batch, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+        self.rows += len(batch)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            logger.info(f"增量导出 Parquet 完成: {self.path}，共 {self.rows} 行")
+
+
+class AggregateWriter(BatchWriter):
+    """
+    按月份和收支类型累计金额与笔数
+
+    每个批次只做一次 groupby，再与已有的汇总相加，状态大小与月份数成正比。
+    """
+
+    def __init__(self, time_col: str = '交易时间', amount_col: str = '金额(元)',
+                 type_cols: Sequence[str] = ('收/支/其他', '收/支')):
+        self.time_col = time_col
+        self.amount_col = amount_col
+        self.type_cols = list(type_cols)
+        self.rows = 0
+        self._sums: Optional[pd.Series] = None
+        self._counts: Optional[pd.Series] = None
+
+    def write(self, batch: pd.DataFrame) -> None:
+        self.rows += len(batch)
+        if self.time_col not in batch.columns or self.amount_col not in batch.columns:
+            return
+        type_col = next((c for c in self.type_cols if c in batch.columns), None)
+        # 按整数月序号累计，输出结果时再转换为 YYYY-MM
+        if MONTH_KEY in batch.columns:
+            month = batch[MONTH_KEY]
+        else:
+            month = pd.Series(month_index(batch[self.time_col]), index=batch.index)
+        kind = batch[type_col] if type_col else pd.Series('全部', index=batch.index)
+        valid = (month != MISSING_TIME_KEY).to_numpy()
+        grouped = batch[self.amount_col][valid].groupby([month[valid].rename('月份'), kind[valid].rename('收/支')])
+        sums, counts = grouped.sum(), grouped.size()
+        if self._sums is None:
+            self._sums, self._counts = sums, counts
+        else:
+            self._sums = self._sums.add(sums, fill_value=0)
+            self._counts = self._counts.add(counts, fill_value=0)
+
+    def result(self) -> pd.DataFrame:
+        """返回 月份 × 收/支 的金额与笔数汇总表"""
+        if self._sums is None:
+            return pd.DataFrame(columns=['月份', '收/支', self.amount_col, '笔数'])
+        table = pd.DataFrame({
+            self.amount_col: self._sums.round(2),
+            '笔数': self._counts.astype(np.int64),
+        }).sort_index().reset_index()
+        table['月份'] = month_labels(table['月份'])
+        return table
+
+
+def stream_pdf_to_writers(
+    pdf_path: str,
+    writers: Sequence[BatchWriter],
+    password: Optional[str] = None,
+    categorize: bool = True,
+    **kwargs
+) -> ValidationReport:
+    """
+    流式解析 PDF，并把每个批次依次交给各写出器，同时增量完成验证和分类
+
+    Args:
+        pdf_path: PDF 文件路径
+        writers: 写出器列表（结束时会被关闭）
+        password: PDF 密码（可选）
+        categorize: 是否为每个批次添加分类列
+        **kwargs: 传递给 iter_pdf_batches 的参数
+
+    Returns:
+        整个文件的验证报告
+    """
+    validator = TransactionValidator()
+    try:
+        for batch in iter_pdf_batches(pdf_path, password, **kwargs):
+            validator.update(batch)
+            if categorize:
+                assign_categories(batch)
+            for writer in writers:
+                writer.write(batch)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    report = validator.report
+    logger.info(f"流式处理完成 {pdf_path}，共 {report.total_rows} 条记录")
+    return report
+